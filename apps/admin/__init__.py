@@ -7,11 +7,14 @@ from .attraction import AttractionAdmin
 from .hotel import HotelAdmin
 from .restaurant import RestaurantAdmin
 from .itinerary import ItineraryAdmin, DailyScheduleAdmin
+from .currency_rate import CurrencyRateAdmin
+from .itinerary_ingest_job import ItineraryIngestJobAdmin
 from apps.models import Requirement
+from apps.api.utils.query_budget import query_budget
 from apps.models.attraction import Attraction
 from apps.models.hotel import Hotel
 from apps.models.restaurant import Restaurant
-from apps.models import Itinerary, DailySchedule
+from apps.models import Itinerary, DailySchedule, CurrencyRate, ItineraryIngestJob
 
 
 class SmartTripAdminSite(AdminSite):
@@ -21,6 +24,18 @@ class SmartTripAdminSite(AdminSite):
     site_title = getattr(settings, 'ADMIN_SITE_TITLE', '智能旅游规划系统')
     index_title = getattr(settings, 'ADMIN_INDEX_TITLE', '智能旅游规划系统管理')
 
+    def admin_view(self, view, cacheable=False):
+        """
+        为所有Admin视图加上查询预算，默认 ADMIN_QUERY_BUDGET；
+        ModelAdmin 可通过 query_budgets = {'changelist_view': 60} 按视图名覆盖
+        """
+        owner = getattr(view, '__self__', self)
+        max_queries = getattr(owner, 'query_budgets', {}).get(
+            view.__name__, getattr(settings, 'ADMIN_QUERY_BUDGET', 40)
+        )
+        view = query_budget(max_queries, name=f'{type(owner).__name__}.{view.__name__}')(view)
+        return super().admin_view(view, cacheable)
+
 
 # 创建自定义Admin站点实例
 admin_site = SmartTripAdminSite(name='smart_trip_admin')
@@ -32,8 +47,10 @@ admin_site.register(Hotel, HotelAdmin)
 admin_site.register(Restaurant, RestaurantAdmin)
 admin_site.register(Itinerary, ItineraryAdmin)
 admin_site.register(DailySchedule, DailyScheduleAdmin)
+admin_site.register(CurrencyRate, CurrencyRateAdmin)
+admin_site.register(ItineraryIngestJob, ItineraryIngestJobAdmin)
 # 注册用户和组模型
 admin_site.register(User, UserAdmin)
 admin_site.register(Group, GroupAdmin)
 
-__all__ = ['RequirementAdmin', 'AttractionAdmin', 'HotelAdmin', 'RestaurantAdmin', 'ItineraryAdmin', 'DailyScheduleAdmin', 'admin_site']
+__all__ = ['RequirementAdmin', 'AttractionAdmin', 'HotelAdmin', 'RestaurantAdmin', 'ItineraryAdmin', 'DailyScheduleAdmin', 'CurrencyRateAdmin', 'ItineraryIngestJobAdmin', 'admin_site']
@@ -86,7 +86,8 @@ class AttractionAdmin(admin.ModelAdmin):
             '基本信息', {
                 'fields': (
                     'attraction_name', 'country_code', 
-                    'city_name', 'district', 'region', 'address', 'category', 'subcategory'
+                    'city_name', 'district', 'region', 'address', 'latitude', 'longitude',
+                    'category', 'subcategory'
                 )
             }
         ),
@@ -0,0 +1,26 @@
+from django.contrib import admin
+from ..models.currency_rate import CurrencyRate
+
+
+class CurrencyRateAdmin(admin.ModelAdmin):
+    # 列表显示字段
+    list_display = (
+        'currency',
+        'base_currency',
+        'rate_to_base',
+        'source',
+        'effective_date',
+        'updated_at'
+    )
+    
+    # 搜索字段
+    search_fields = ('currency',)
+    
+    # 筛选字段
+    list_filter = ('base_currency', 'source')
+    
+    # 排序字段
+    ordering = ('currency',)
+    
+    # 只读字段
+    readonly_fields = ('created_at', 'updated_at')
@@ -13,12 +13,9 @@ from ..models import (
     DailySchedule,
     RequirementItinerary
 )
-
-# 模块级别的日志输出，确保在Django加载时执行
-print("====================================", file=sys.stdout, flush=True)
-print("itinerary.py 模块加载 ", file=sys.stdout, flush=True)
-print("====================================", file=sys.stdout, flush=True)
-sys.stdout.flush()
+from apps.admin_ext.actions import optimize_itinerary_routes
+from apps.api.utils.logging_utils import LogSanitizer
+from apps.api.utils.request_utils import log_excerpt
 
 # 定义TravelerStats的内联编辑类
 class TravelerStatsInline(admin.TabularInline):
@@ -59,7 +56,10 @@ class DayScheduleInline(admin.TabularInline):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.filter(day_number=self.day_number)
+        # 只读列逐行显示目的地、景点、酒店和餐厅
+        return qs.filter(day_number=self.day_number).select_related(
+            'destination_id', 'attraction_id', 'hotel_id', 'restaurant_id'
+        )
     
     # 添加编辑和删除按钮
     def edit_daily_schedule(self, obj):
@@ -213,6 +213,9 @@ class RequirementItineraryInline(admin.TabularInline):
     def has_delete_permission(self, request, obj=None):
         return False
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('requirement')
+    
     def display_requirement_id(self, obj):
         """显示需求ID并生成可点击的链接"""
         if obj.requirement:
@@ -273,6 +276,9 @@ class ItineraryAdmin(admin.ModelAdmin):
     # 指定主键URL参数名称，解决行程ID在URL中被编码的问题
     pk_url_kwarg = 'itinerary_id'
     
+    # 详情页每天一个日程内联，各查询一次
+    query_budgets = {'change_view': 60}
+    
     # 引入 EasyMDE 的 CSS 和 JS
     class Media:
         css = {
@@ -280,6 +286,10 @@ class ItineraryAdmin(admin.ModelAdmin):
         }
         js = ('easymde/easymde.min.js', 'easymde/easymde.init.js')
     
+    def get_queryset(self, request):
+        # 列表页逐行显示目的地城市
+        return super().get_queryset(request).prefetch_related('destinations')
+    
     # 重写get_object方法，确保正确处理行程ID
     def get_object(self, request, object_id, from_field=None):
         """获取行程对象，确保行程ID不被URL编码"""
@@ -358,7 +368,7 @@ class ItineraryAdmin(admin.ModelAdmin):
         logger = logging.getLogger('itinerary_admin')
         logger.info(f"开始response_change - 用户: {request.user.username}, 对象: {obj}")
         logger.info(f"请求方法: {request.method}")
-        logger.info(f"请求数据: {request.POST}")
+        logger.info(f"请求数据: {log_excerpt(LogSanitizer.sanitize_dict(dict(request.POST.items())))}")
         try:
             response = super().response_change(request, obj)
             logger.info(f"结束response_change - 响应类型: {type(response).__name__}")
@@ -491,7 +501,8 @@ class ItineraryAdmin(admin.ModelAdmin):
         """显示行程关联的目的地城市名称，多个城市用逗号分隔"""
         from django.utils.html import format_html
         try:
-            destinations = obj.destinations.all().order_by('destination_order')
+            # 目的地由 get_queryset 预取，这里排序而不是再次查询
+            destinations = sorted(obj.destinations.all(), key=lambda dest: dest.destination_order)
             if not destinations:
                 return '-'
             city_names = [dest.city_name for dest in destinations if dest.city_name]
@@ -545,6 +556,9 @@ class ItineraryAdmin(admin.ModelAdmin):
     # 排序字段
     ordering = ('-created_at',)
     
+    # 批量操作
+    actions = [optimize_itinerary_routes]
+    
     # 详情页字段分组
     fieldsets = (
         ('基本信息', {
@@ -684,52 +698,8 @@ class ItineraryAdmin(admin.ModelAdmin):
         import traceback
         from datetime import timedelta
         
-        # 确保输出不缓冲
-        sys.stdout.flush()
-        sys.stderr.flush()
-        
-        # 直接使用print语句确保输出，添加时间戳
-        import datetime
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # 输出到标准输出，确保Docker能够捕获
-        print(f"[{timestamp}] =====================================", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] 开始保存行程 - 直接输出", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] 行程ID: {obj.itinerary_id}", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] 行程名称: {obj.itinerary_name}", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] 用户: {request.user.username}", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] 请求方法: {request.method}", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] 请求数据: {request.POST}", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] =====================================", file=sys.stdout, flush=True)
-        
-        # 同时输出到标准错误，确保能够在Docker日志中看到
-        print(f"[{timestamp}] 开始保存行程 - 标准错误输出", file=sys.stderr, flush=True)
-        
-        # 使用settings.py中配置的日志记录器
         logger = logging.getLogger('itinerary_admin')
         
-        # 立即测试日志输出
-        logger.info("测试日志输出 - 确保日志系统正常工作")
-        
-        # 尝试使用不同的日志级别
-        logger.debug("调试信息 - 保存行程开始")
-        logger.warning("警告信息 - 保存行程开始")
-        logger.error("错误信息 - 保存行程开始")
-        
-        # 额外添加一些简单的print语句，确保能够在Docker日志中看到
-        print("====================================", file=sys.stdout, flush=True)
-        print("ITINERARY ADMIN LOG TEST", file=sys.stdout, flush=True)
-        print("====================================", file=sys.stdout, flush=True)
-        
-        # 额外输出到标准错误
-        print("====================================", file=sys.stderr, flush=True)
-        print("ITINERARY ADMIN LOG TEST - 标准错误", file=sys.stderr, flush=True)
-        print("====================================", file=sys.stderr, flush=True)
-        
-        # 强制刷新所有输出
-        sys.stdout.flush()
-        sys.stderr.flush()
-        
         # 设置创建人和更新人
         if not change:
             obj.created_by = request.user.username
@@ -806,7 +776,7 @@ class ItineraryAdmin(admin.ModelAdmin):
         
         try:
             logger.info(f"开始保存行程: {obj.itinerary_id} - {obj.itinerary_name}, 用户: {request.user.username}")
-            logger.info(f"请求数据: {request.POST}")
+            logger.info(f"请求数据: {log_excerpt(LogSanitizer.sanitize_dict(dict(request.POST.items())))}")
             
             # 验证关联的TravelerStats记录
             logger.info(f"验证关联的TravelerStats记录")
@@ -877,31 +847,8 @@ class ItineraryAdmin(admin.ModelAdmin):
         import sys
         import traceback
         
-        # 确保输出不缓冲
-        sys.stdout.flush()
-        
-        # 直接使用print语句确保输出，添加时间戳
-        import datetime
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # 输出到标准输出，确保Docker能够捕获
-        print(f"[{timestamp}] =====================================", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] 开始保存内联表单 - 直接输出", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] 表单模型: {formset.model.__name__}", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] 表单数量: {len(formset.forms)}", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] 用户: {request.user.username}", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] 请求方法: {request.method}", file=sys.stdout, flush=True)
-        print(f"[{timestamp}] =====================================", file=sys.stdout, flush=True)
-        sys.stdout.flush()
-        
-        # 使用全局配置的日志
         logger = logging.getLogger('itinerary_admin')
-        
-        # 立即测试日志输出
-        logger.info("测试内联表单日志输出 - 确保日志系统正常工作")
-        sys.stdout.flush()
-        
-        logger.info(f"开始保存内联表单: {formset.model.__name__}")
+        logger.info(f"开始保存内联表单: {formset.model.__name__}, 表单数量: {len(formset.forms)}, 用户: {request.user.username}")
         logger.info(f"表单集数据: {formset.cleaned_data if hasattr(formset, 'cleaned_data') else 'No cleaned data'}")
         
         try:
@@ -1065,6 +1012,8 @@ class DailyScheduleAdmin(admin.ModelAdmin):
         'end_time',
         'created_at'
     )
+    # destination_id 可为空，默认的 select_related() 不会关联
+    list_select_related = ('itinerary_id', 'destination_id')
     
     # 搜索字段
     search_fields = (
@@ -1179,6 +1128,14 @@ class DailyScheduleAdmin(admin.ModelAdmin):
             obj.updated_by = request.user.username
         super().save_model(request, obj, form, change)
     
+    def _get_editing_schedule(self, request):
+        """编辑页面当前的日程，每个外键字段都会用到，按请求缓存并一次取出关联对象"""
+        if not hasattr(request, '_editing_daily_schedule'):
+            request._editing_daily_schedule = self.model.objects.select_related(
+                'itinerary_id', 'destination_id', 'attraction_id', 'hotel_id', 'restaurant_id'
+            ).get(pk=request.resolver_match.kwargs['object_id'])
+        return request._editing_daily_schedule
+    
     # 重写formfield_for_foreignkey方法，过滤下拉菜单并确保编辑时默认选中
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         # 处理destination_id字段
@@ -1189,7 +1146,7 @@ class DailyScheduleAdmin(admin.ModelAdmin):
             # 从URL中获取itinerary_id（编辑页面）
             if 'object_id' in request.resolver_match.kwargs:
                 try:
-                    daily_schedule = self.model.objects.get(pk=request.resolver_match.kwargs['object_id'])
+                    daily_schedule = self._get_editing_schedule(request)
                     itinerary_id = daily_schedule.itinerary_id
                     # 确保已选中的destination在查询集中
                     if daily_schedule.destination_id:
@@ -1212,7 +1169,7 @@ class DailyScheduleAdmin(admin.ModelAdmin):
             # 在编辑页面时，确保已选中的attraction在查询集中
             if 'object_id' in request.resolver_match.kwargs:
                 try:
-                    daily_schedule = self.model.objects.get(pk=request.resolver_match.kwargs['object_id'])
+                    daily_schedule = self._get_editing_schedule(request)
                     if daily_schedule.attraction_id:
                         kwargs['initial'] = daily_schedule.attraction_id
                 except:
@@ -1233,7 +1190,7 @@ class DailyScheduleAdmin(admin.ModelAdmin):
             # 在编辑页面时，确保已选中的hotel在查询集中
             if 'object_id' in request.resolver_match.kwargs:
                 try:
-                    daily_schedule = self.model.objects.get(pk=request.resolver_match.kwargs['object_id'])
+                    daily_schedule = self._get_editing_schedule(request)
                     if daily_schedule.hotel_id:
                         kwargs['initial'] = daily_schedule.hotel_id
                 except:
@@ -1255,7 +1212,7 @@ class DailyScheduleAdmin(admin.ModelAdmin):
             # 在编辑页面时，确保已选中的restaurant在查询集中
             if 'object_id' in request.resolver_match.kwargs:
                 try:
-                    daily_schedule = self.model.objects.get(pk=request.resolver_match.kwargs['object_id'])
+                    daily_schedule = self._get_editing_schedule(request)
                     if daily_schedule.restaurant_id:
                         kwargs['initial'] = daily_schedule.restaurant_id
                 except:
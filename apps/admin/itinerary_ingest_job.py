@@ -0,0 +1,36 @@
+from django.contrib import admin
+from ..models.itinerary_ingest_job import ItineraryIngestJob
+from apps.admin_ext.actions import retry_ingest_jobs
+
+
+class ItineraryIngestJobAdmin(admin.ModelAdmin):
+    # 列表显示字段
+    list_display = (
+        'job_id',
+        'status',
+        'requirement_id',
+        'itinerary_id',
+        'attempts',
+        'created_at',
+        'finished_at'
+    )
+    
+    # 搜索字段
+    search_fields = ('job_id', 'requirement_id', 'itinerary_id', 'request_id')
+    
+    # 筛选字段
+    list_filter = ('status',)
+    
+    # 排序字段
+    ordering = ('-created_at',)
+    
+    # 只读字段，任务数据只由webhook和后台任务写入
+    readonly_fields = (
+        'job_id', 'status', 'request_id', 'requirement_id', 'payload', 'itinerary_id',
+        'attempts', 'last_error', 'started_at', 'finished_at', 'created_at', 'updated_at'
+    )
+    
+    actions = [retry_ingest_jobs]
+    
+    def has_add_permission(self, request):
+        return False
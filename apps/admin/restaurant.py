@@ -75,7 +75,8 @@ class RestaurantAdmin(admin.ModelAdmin):
             '基本信息', {
                 'fields': (
                     'restaurant_name', 'country_code', 
-                    'city_name', 'district', 'address', 'cuisine_type', 
+                    'city_name', 'district', 'address', 'latitude', 'longitude',
+                    'cuisine_type', 
                     'sub_cuisine_types', 'restaurant_type'
                 )
             }
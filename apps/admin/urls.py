@@ -1,11 +1,13 @@
 from django.urls import path, re_path
-from .views import preview_itinerary, get_filtered_resources, generate_itinerary, optimize_itinerary, quote_itinerary
+from .views import preview_itinerary, get_filtered_resources, generate_itinerary, optimize_itinerary, quote_itinerary, check_itinerary_feasibility, calculate_itinerary_quote
 import uuid
 
 urlpatterns = [
     re_path(r'itinerary/(?P<itinerary_id>[A-Z0-9_]+)/preview/', preview_itinerary, name='preview_itinerary'),
     re_path(r'itinerary/(?P<itinerary_id>[A-Z0-9_]+)/optimize/', optimize_itinerary, name='optimize_itinerary'),
+    re_path(r'itinerary/(?P<itinerary_id>[A-Z0-9_]+)/quote/calculate/', calculate_itinerary_quote, name='calculate_itinerary_quote'),
     re_path(r'itinerary/(?P<itinerary_id>[A-Z0-9_]+)/quote/', quote_itinerary, name='quote_itinerary'),
+    re_path(r'itinerary/(?P<itinerary_id>[A-Z0-9_]+)/feasibility/', check_itinerary_feasibility, name='check_itinerary_feasibility'),
     path('get_filtered_resources/', get_filtered_resources, name='get_filtered_resources'),
     path('requirement/<str:requirement_id>/generate-itinerary/', generate_itinerary, name='generate_itinerary'),
 ]
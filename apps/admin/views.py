@@ -1,7 +1,10 @@
 import uuid
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
 from django.contrib.admin.views.decorators import staff_member_required
 from django.http import JsonResponse
+from apps.api.metrics import n8n_dispatch
+from apps.api.utils.query_budget import query_budget
 from ..models import (
     Itinerary,
     TravelerStats,
@@ -13,6 +16,7 @@ from ..models import (
 )
 
 @staff_member_required
+@query_budget(10)
 def preview_itinerary(request, itinerary_id):
     """行程详情预览视图"""
     itinerary = get_object_or_404(Itinerary, itinerary_id=itinerary_id)
@@ -20,7 +24,9 @@ def preview_itinerary(request, itinerary_id):
     # 获取相关数据
     traveler_stats = TravelerStats.objects.filter(itinerary=itinerary).first()
     destinations = Destination.objects.filter(itinerary=itinerary).order_by('destination_order')
-    daily_schedules = DailySchedule.objects.filter(itinerary_id=itinerary).order_by('schedule_date', 'start_time')
+    daily_schedules = DailySchedule.objects.filter(itinerary_id=itinerary).select_related(
+        'destination_id'
+    ).order_by('schedule_date', 'start_time')
     
     # 按日期分组每日行程
     grouped_schedules = {}
@@ -37,9 +43,11 @@ def preview_itinerary(request, itinerary_id):
         'grouped_schedules': grouped_schedules
     }
     
-    return render(request, 'admin/preview_itinerary.html', context)
+    # TemplateResponse 延迟渲染，渲染耗时计入 PerformanceMiddleware 的 tpl 指标
+    return TemplateResponse(request, 'admin/preview_itinerary.html', context)
 
 @staff_member_required
+@query_budget(10)
 def get_filtered_resources(request):
     """根据destination获取过滤后的资源数据"""
     destination_id = request.GET.get('destination_id')
@@ -110,6 +118,7 @@ def get_filtered_resources(request):
         })
 
 @staff_member_required
+@query_budget(15)
 def generate_itinerary(request, requirement_id):
     """生成旅游行程规划，调用n8n webhook"""
     from django.conf import settings
@@ -185,13 +194,15 @@ def generate_itinerary(request, requirement_id):
                                 f"URL: {n8n_webhook_url}, "
                                 f"数据: {json.dumps(webhook_data)[:200]}...")
                     
-                    response = requests.post(
-                        n8n_webhook_url,
-                        headers=headers,
-                        json=webhook_data,
-                        timeout=timeout,
-                        verify=False  # 使用HTTP，不需要SSL
-                    )
+                    with n8n_dispatch('planning') as dispatch:
+                        response = requests.post(
+                            n8n_webhook_url,
+                            headers=headers,
+                            json=webhook_data,
+                            timeout=timeout,
+                            verify=False  # 使用HTTP，不需要SSL
+                        )
+                        dispatch.status_code = response.status_code
                     
                     status_code = response.status_code
                     response_text = response.text
@@ -241,6 +252,7 @@ def generate_itinerary(request, requirement_id):
         return JsonResponse({'success': False, 'error': f'服务器内部错误: {str(e)}'}, status=500)
 
 @staff_member_required
+@query_budget(10)
 def optimize_itinerary(request, itinerary_id):
     """优化行程规划，调用n8n webhook"""
     from django.conf import settings
@@ -260,9 +272,13 @@ def optimize_itinerary(request, itinerary_id):
         if not itinerary.itinerary_json_data:
             return JsonResponse({'success': False, 'error': '行程数据为空，无法进行优化'}, status=400)
         
+        # 行程关联资源的紧凑目录上下文
+        from apps.api.services.prompt_context_services import PromptContextService
+        
         webhook_data = {
             'itinerary_id': itinerary.itinerary_id,
-            'itinerary_json_data': itinerary.itinerary_json_data
+            'itinerary_json_data': itinerary.itinerary_json_data,
+            'catalog_context': PromptContextService.for_itinerary(itinerary)
         }
         
         # 打印 webhook 数据用于调试
@@ -300,13 +316,15 @@ def optimize_itinerary(request, itinerary_id):
                             f"请求ID: {request_id}, "
                             f"URL: {n8n_webhook_url}")
                 
-                response = requests.post(
-                    n8n_webhook_url,
-                    headers=headers,
-                    json=webhook_data,
-                    timeout=timeout,
-                    verify=False
-                )
+                with n8n_dispatch('optimization') as dispatch:
+                    response = requests.post(
+                        n8n_webhook_url,
+                        headers=headers,
+                        json=webhook_data,
+                        timeout=timeout,
+                        verify=False
+                    )
+                    dispatch.status_code = response.status_code
                 
                 status_code = response.status_code
                 logger.info(f"行程优化Webhook调用结果 - 状态码: {status_code}")
@@ -357,6 +375,7 @@ def optimize_itinerary(request, itinerary_id):
 
 
 @staff_member_required
+@query_budget(40)
 def quote_itinerary(request, itinerary_id):
     """行程报价，调用n8n webhook"""
     from django.conf import settings
@@ -390,10 +409,17 @@ def quote_itinerary(request, itinerary_id):
             except json.JSONDecodeError:
                 pass
         
+        # 本地计算结构化报价明细，n8n 仅负责报价文案
+        from apps.api.services.quote_services import QuoteEngineService
+        from apps.api.services.prompt_context_services import PromptContextService
+        computed_quote = QuoteEngineService.calculate(itinerary)
+        
         webhook_data = {
             'itinerary_id': itinerary.itinerary_id,
             'itinerary_json_data': itinerary.itinerary_json_data,
-            'itinerary_quote_json_data': quote_json_data
+            'itinerary_quote_json_data': quote_json_data,
+            'computed_quote': computed_quote,
+            'catalog_context': PromptContextService.for_itinerary(itinerary)
         }
         
         # 打印 webhook 数据用于调试
@@ -428,13 +454,15 @@ def quote_itinerary(request, itinerary_id):
                             f"请求ID: {request_id}, "
                             f"URL: {n8n_webhook_url}")
                 
-                response = requests.post(
-                    n8n_webhook_url,
-                    headers=headers,
-                    json=webhook_data,
-                    timeout=timeout,
-                    verify=False
-                )
+                with n8n_dispatch('quote') as dispatch:
+                    response = requests.post(
+                        n8n_webhook_url,
+                        headers=headers,
+                        json=webhook_data,
+                        timeout=timeout,
+                        verify=False
+                    )
+                    dispatch.status_code = response.status_code
                 
                 status_code = response.status_code
                 response_text = response.text
@@ -527,3 +555,29 @@ def quote_callback(request):
         logger.error(f"N8N报价回调异常 - 错误: {str(e)}")
         return JsonResponse({'success': False, 'error': f'服务器内部错误: {str(e)}'}, status=500)
 
+
+@staff_member_required
+@query_budget(10)
+def check_itinerary_feasibility(request, itinerary_id):
+    """检查行程每日时间窗口可行性，基于坐标距离在本地估算交通耗时"""
+    from apps.api.services.distance_services import DistanceMatrixService
+    
+    itinerary = get_object_or_404(Itinerary, itinerary_id=itinerary_id)
+    result = DistanceMatrixService.check_feasibility(itinerary)
+    
+    if request.GET.get('include_matrix') in ('1', 'true'):
+        result['matrix'] = DistanceMatrixService.build_distance_matrix(itinerary)
+    
+    return JsonResponse({'success': True, **result})
+
+
+@staff_member_required
+@query_budget(20)
+def calculate_itinerary_quote(request, itinerary_id):
+    """本地计算行程报价明细，不调用n8n"""
+    from apps.api.services.quote_services import QuoteEngineService
+    
+    itinerary = get_object_or_404(Itinerary, itinerary_id=itinerary_id)
+    result = QuoteEngineService.calculate(itinerary)
+    
+    return JsonResponse({'success': True, **result})
@@ -2,6 +2,8 @@ from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from apps.models import Requirement
+from apps.api.services.route_services import RouteOptimizerService
+from apps.api.services.ingest_services import ItineraryIngestService
 
 
 def mark_as_confirmed(modeladmin, request, queryset):
@@ -76,3 +78,24 @@ def delete_selected_with_confirmation(modeladmin, request, queryset):
     queryset.delete()
     messages.success(request, _(f'成功删除 {count} 条需求记录。'))
 delete_selected_with_confirmation.short_description = _('删除选中的需求')
+
+
+def optimize_itinerary_routes(modeladmin, request, queryset):
+    optimized = 0
+    schedules = 0
+    for itinerary in queryset:
+        success, summary, error_msg = RouteOptimizerService.optimize(itinerary)
+        if not success:
+            messages.error(request, _(f'行程 {itinerary.itinerary_id} 路线优化失败：{error_msg}'))
+            continue
+        optimized += 1
+        schedules += summary['updated_count']
+    if optimized:
+        messages.success(request, _(f'成功优化 {optimized} 条行程路线，共调整 {schedules} 个活动时间。'))
+optimize_itinerary_routes.short_description = _('优化每日路线顺序')
+
+
+def retry_ingest_jobs(modeladmin, request, queryset):
+    retried = sum(1 for job in queryset if ItineraryIngestService.retry(job))
+    messages.success(request, _(f'已重新提交 {retried} 个失败或处理超时的导入任务。'))
+retry_ingest_jobs.short_description = _('重试失败或处理超时的导入任务')
@@ -0,0 +1,100 @@
+"""
+Prometheus 指标输出
+指标定义在 apps/metrics.py，在进程内注册，由 /metrics 输出。gunicorn 多 worker 部署时需设置环境变量
+PROMETHEUS_MULTIPROC_DIR，各 worker 把指标写入该目录，输出时汇总所有进程。
+qcluster 等其他容器的进程写入各自的目录，在 web 上用 PROMETHEUS_MULTIPROC_EXTRA_DIRS
+（逗号分隔）列出后一并汇总
+"""
+import glob
+import hmac
+import os
+from contextlib import contextmanager
+from typing import Optional
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    generate_latest,
+    multiprocess,
+)
+
+from apps.api.utils.request_metrics import track_external
+from apps.metrics import N8N_DISPATCH_ERRORS, N8N_DISPATCH_LATENCY, REQUEST_LATENCY
+
+
+class N8nDispatch:
+    """n8n_dispatch 上下文中由调用方记录响应状态码"""
+
+    def __init__(self):
+        self.status_code: Optional[int] = None
+
+
+@contextmanager
+def n8n_dispatch(workflow: str):
+    """
+    记录一次n8n工作流调用的耗时和失败，耗时同时计入当前请求的 Server-Timing
+
+    Usage:
+        with n8n_dispatch('planning') as dispatch:
+            response = requests.post(url, json=payload, timeout=timeout)
+            dispatch.status_code = response.status_code
+    """
+    dispatch = N8nDispatch()
+    try:
+        with N8N_DISPATCH_LATENCY.labels(workflow).time(), track_external('n8n'):
+            yield dispatch
+    except Exception as e:
+        N8N_DISPATCH_ERRORS.labels(workflow, type(e).__name__).inc()
+        raise
+    if dispatch.status_code is not None and dispatch.status_code >= 400:
+        N8N_DISPATCH_ERRORS.labels(workflow, str(dispatch.status_code)).inc()
+
+
+def observe_request(endpoint: str, method: str, status_code: int, duration: float):
+    """记录请求耗时，状态码按类别（2xx/4xx/5xx）归并以控制标签数量"""
+    REQUEST_LATENCY.labels(endpoint, method, f'{status_code // 100}xx').observe(duration)
+
+
+class _MultiDirCollector:
+    """汇总多个多进程目录的指标，同名序列累加"""
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def collect(self):
+        files = [path for directory in self.paths for path in glob.glob(os.path.join(directory, '*.db'))]
+        return multiprocess.MultiProcessCollector.merge(files, accumulate=True)
+
+
+def _multiproc_dirs() -> list:
+    extra = os.environ.get('PROMETHEUS_MULTIPROC_EXTRA_DIRS', '')
+    return [os.environ['PROMETHEUS_MULTIPROC_DIR']] + [d.strip() for d in extra.split(',') if d.strip()]
+
+
+def collect_metrics() -> bytes:
+    """
+    输出 Prometheus 文本格式
+
+    多进程模式下汇总 PROMETHEUS_MULTIPROC_DIR 及 PROMETHEUS_MULTIPROC_EXTRA_DIRS 中所有进程的指标
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        registry.register(_MultiDirCollector(_multiproc_dirs()))
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def metrics_view(request):
+    """
+    /metrics 端点
+
+    配置了 METRICS_AUTH_TOKEN 时要求 Authorization: Bearer <token>
+    """
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponseForbidden()
+    return HttpResponse(collect_metrics(), content_type=CONTENT_TYPE_LATEST)
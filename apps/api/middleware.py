@@ -0,0 +1,164 @@
+"""
+API 中间件
+"""
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from apps.api.metrics import observe_request
+from apps.api.utils.log_pipeline import bind_request_id, reset_request_id, get_request_id
+from apps.api.utils.request_metrics import (
+    DEFAULT_TOP_QUERIES,
+    current_metrics,
+    start_request_metrics,
+    stop_request_metrics,
+    track_queries,
+)
+
+logger = logging.getLogger('apps.api.performance')
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+
+class RequestIdMiddleware:
+    """
+    请求关联ID中间件
+
+    沿用上游（nginx、n8n）传入的 X-Request-ID，没有则生成；
+    请求处理期间的日志都带上该ID，并在响应头中返回
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+        try:
+            request.request_id = get_request_id()
+            response = self.get_response(request)
+            response[REQUEST_ID_HEADER] = request.request_id
+            return response
+        finally:
+            reset_request_id(token)
+
+    async def __acall__(self, request):
+        token = bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+        try:
+            request.request_id = get_request_id()
+            response = await self.get_response(request)
+            response[REQUEST_ID_HEADER] = request.request_id
+            return response
+        finally:
+            reset_request_id(token)
+
+
+class PerformanceMiddleware:
+    """
+    请求性能指标中间件
+
+    记录总耗时、数据库查询数与耗时、n8n 调用耗时、模板渲染耗时和响应大小，
+    写入 Server-Timing 响应头和 Prometheus 请求耗时直方图，并输出一条日志；超过 PERF_SLOW_REQUEST_MS 或
+    PERF_SLOW_QUERY_COUNT 的请求以 WARNING 级别输出，并附带最慢的 PERF_TOP_QUERIES 条SQL
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PERF_METRICS_ENABLED', True)
+        self.server_timing = getattr(settings, 'PERF_SERVER_TIMING', True)
+        self.slow_request_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', 1000)
+        self.slow_query_count = getattr(settings, 'PERF_SLOW_QUERY_COUNT', 50)
+        self.top_queries = getattr(settings, 'PERF_TOP_QUERIES', DEFAULT_TOP_QUERIES)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        metrics, token = start_request_metrics(self.top_queries)
+        try:
+            with track_queries():
+                response = self.get_response(request)
+            self._finish(request, response, metrics)
+            return response
+        finally:
+            stop_request_metrics(token)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        # 异步视图的ORM操作在 run_in_db_thread 的工作线程中记录
+        metrics, token = start_request_metrics(self.top_queries)
+        try:
+            response = await self.get_response(request)
+            self._finish(request, response, metrics)
+            return response
+        finally:
+            stop_request_metrics(token)
+
+    def process_template_response(self, request, response):
+        """TemplateResponse 在此之后渲染，通过渲染回调记录耗时"""
+        metrics = current_metrics()
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def record_render_time(rendered):
+                metrics.template_time += time.perf_counter() - started
+
+            response.add_post_render_callback(record_render_time)
+        return response
+
+    def _finish(self, request, response, metrics):
+        total_ms = metrics.elapsed * 1000
+        db_ms = metrics.db_time * 1000
+        template_ms = metrics.template_time * 1000
+        external = {name: (count, duration * 1000) for name, (count, duration) in metrics.external.items()}
+        size = None if response.streaming else len(response.content)
+
+        if self.server_timing:
+            parts = [f'total;dur={total_ms:.1f}', f'db;dur={db_ms:.1f};desc="{metrics.db_count} queries"']
+            parts += [f'{name};dur={duration:.1f}' for name, (_, duration) in external.items()]
+            if metrics.template_time:
+                parts.append(f'tpl;dur={template_ms:.1f}')
+            response['Server-Timing'] = ', '.join(parts)
+
+        match = getattr(request, 'resolver_match', None)
+        observe_request(match.view_name if match else 'unmatched', request.method, response.status_code, metrics.elapsed)
+
+        slow = total_ms >= self.slow_request_ms or metrics.db_count >= self.slow_query_count
+        data = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_queries': metrics.db_count,
+            'db_ms': round(db_ms, 2),
+            'external_ms': {name: round(duration, 2) for name, (_, duration) in external.items()},
+            'template_ms': round(template_ms, 2),
+            'response_bytes': size,
+        }
+        external_text = ''.join(f' {name}={duration:.1f}ms' for name, (_, duration) in external.items())
+        message = (
+            f'{request.method} {request.path} {response.status_code} {total_ms:.1f}ms '
+            f'db={metrics.db_count}/{db_ms:.1f}ms{external_text} tpl={template_ms:.1f}ms '
+            f'size={size if size is not None else "-"}'
+        )
+        if slow:
+            data['slow_queries'] = metrics.slowest_queries()
+            message = '慢请求 ' + message + ''.join(
+                f'\n  {query["ms"]}ms {query["sql"]}' for query in data['slow_queries']
+            )
+        logger.log(logging.WARNING if slow else logging.INFO, message, extra={'data': data})
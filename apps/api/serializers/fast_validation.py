@@ -0,0 +1,227 @@
+"""
+Webhook 数据快速校验
+行程数据按与 ItineraryWebhookSerializer 相同的规则预编译为一组校验函数，
+合法数据直接返回 validated_data；遇到任何不确定或不合法的值时放弃快速路径，
+交回 DRF 序列化器逐字段校验，保证错误信息与原有实现完全一致
+"""
+import re
+from datetime import date, datetime, time
+from typing import Any, Callable, Dict, Optional
+
+ACTIVITY_TYPES = (
+    'FLIGHT', 'TRAIN', 'ATTRACTION', 'MEAL',
+    'TRANSPORT', 'SHOPPING', 'FREE',
+    'CHECK_IN', 'CHECK_OUT', 'OTHER'
+)
+
+# 日期解析分派表：ISO格式优先，其余与 FlexibleDateField 的 strptime 格式顺序一致
+# 每项为 (正则, 年月日在分组中的位置列表)，日/月/年 与 月/日/年 共用一个正则，按顺序尝试
+_DATE_PATTERNS = (
+    (re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})'), ((0, 1, 2),)),
+    (re.compile(r'(\d{4})/(\d{1,2})/(\d{1,2})'), ((0, 1, 2),)),
+    (re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})'), ((2, 1, 0), (2, 0, 1))),
+    (re.compile(r'(\d{4})(\d{2})(\d{2})'), ((0, 1, 2),)),
+)
+
+_DATETIME_PATTERNS = (
+    re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})[T ](\d{1,2}):(\d{1,2}):(\d{1,2})'),
+    re.compile(r'(\d{4})/(\d{1,2})/(\d{1,2}) (\d{1,2}):(\d{1,2}):(\d{1,2})'),
+    re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})T(\d{1,2}):(\d{1,2}):(\d{1,2})\.(\d{1,6})'),
+)
+
+# DRF DateField/TimeField 的 ISO 8601 解析结果与 fromisoformat 一致的输入
+_ISO_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_ISO_TIME_RE = re.compile(r'\d{2}:\d{2}(?::\d{2})?')
+
+
+def parse_flexible_date(value: str) -> Optional[date]:
+    """
+    按分派表解析日期字符串
+
+    Returns:
+        解析结果，格式不匹配或日期无效时返回 None
+    """
+    for pattern, orders in _DATE_PATTERNS:
+        match = pattern.fullmatch(value)
+        if match is None:
+            continue
+        parts = [int(part) for part in match.groups()]
+        for year, month, day in orders:
+            try:
+                return date(parts[year], parts[month], parts[day])
+            except ValueError:
+                pass
+        return None
+    return None
+
+
+def parse_flexible_datetime(value: str) -> Optional[datetime]:
+    """
+    按分派表解析日期时间字符串，结果与 strptime 一致（不带时区）
+
+    Returns:
+        解析结果，格式不匹配或时间无效时返回 None
+    """
+    for pattern in _DATETIME_PATTERNS:
+        match = pattern.fullmatch(value)
+        if match is None:
+            continue
+        parts = match.groups()
+        microsecond = int(parts[6].ljust(6, '0')) if len(parts) > 6 else 0
+        try:
+            return datetime(*(int(part) for part in parts[:6]), microsecond)
+        except ValueError:
+            return None
+    return None
+
+
+class _Fallback(Exception):
+    """快速路径无法确定结果，交给 DRF 序列化器处理"""
+
+
+# 字段缺失时的处理方式
+REQUIRED = object()
+OPTIONAL = object()
+_MISSING = object()
+
+
+def _char(max_length: Optional[int] = None, allow_blank: bool = False, allow_null: bool = False) -> Callable:
+    """对应 CharField：去除首尾空白、长度限制、禁止空字符和代理字符"""
+    def parse(value):
+        if value is None and allow_null:
+            return None
+        if type(value) is not str or '\x00' in value:
+            raise _Fallback
+        value = value.strip()
+        if (not value and not allow_blank) or (max_length is not None and len(value) > max_length):
+            raise _Fallback
+        try:
+            value.encode('utf-8')
+        except UnicodeEncodeError:
+            raise _Fallback
+        return value
+    return parse
+
+
+def _int(min_value: int) -> Callable:
+    """对应 IntegerField，只接受真正的整数，字符串数字等交给 DRF"""
+    def parse(value):
+        if type(value) is not int or value < min_value:
+            raise _Fallback
+        return value
+    return parse
+
+
+def _iso_date(value):
+    """对应 DateField 的 ISO 8601 输入"""
+    if type(value) is not str or not _ISO_DATE_RE.fullmatch(value):
+        raise _Fallback
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise _Fallback
+
+
+def _iso_time(value):
+    """对应 TimeField 的 ISO 8601 输入"""
+    if type(value) is not str or not _ISO_TIME_RE.fullmatch(value):
+        raise _Fallback
+    try:
+        return time.fromisoformat(value)
+    except ValueError:
+        raise _Fallback
+
+
+def _list(item: Callable) -> Callable:
+    """对应 many=True 的嵌套序列化器"""
+    def parse(value):
+        if type(value) is not list:
+            raise _Fallback
+        return [item(entry) for entry in value]
+    return parse
+
+
+def _object(*fields, check: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Callable:
+    """
+    对应嵌套序列化器
+
+    Args:
+        fields: (字段名, 解析函数, 缺失处理) 元组，缺失处理为 REQUIRED、OPTIONAL 或默认值工厂
+        check: 对应 validate() 的整体校验，返回 False 时交给 DRF
+    """
+    def parse(value):
+        if not isinstance(value, dict):
+            raise _Fallback
+        ret = {}
+        for name, field, missing in fields:
+            item = value.get(name, _MISSING)
+            if item is _MISSING:
+                if missing is REQUIRED:
+                    raise _Fallback
+                if missing is not OPTIONAL:
+                    ret[name] = missing()
+                continue
+            ret[name] = field(item)
+        if check is not None and not check(ret):
+            raise _Fallback
+        return ret
+    return parse
+
+
+_activity = _object(
+    ('activity_title', _char(200), REQUIRED),
+    ('activity_type', _char(50), REQUIRED),
+    ('start_time', _iso_time, REQUIRED),
+    ('end_time', _iso_time, REQUIRED),
+    ('activity_description', _char(allow_blank=True, allow_null=True), OPTIONAL),
+    ('id_reference', _char(allow_blank=True, allow_null=True), OPTIONAL),
+    check=lambda data: data['activity_type'] in ACTIVITY_TYPES and data['start_time'] < data['end_time'],
+)
+
+_destination = _object(
+    ('destination_order', _int(1), REQUIRED),
+    ('city_name', _char(100), REQUIRED),
+    ('country_code', _char(10, allow_blank=True), OPTIONAL),
+    ('arrival_date', _iso_date, REQUIRED),
+    ('departure_date', _iso_date, REQUIRED),
+    check=lambda data: data['arrival_date'] <= data['departure_date'],
+)
+
+_traveler_stats = _object(
+    ('adults', _int(0), lambda: 0),
+    ('children', _int(0), lambda: 0),
+    ('infants', _int(0), lambda: 0),
+    ('seniors', _int(0), lambda: 0),
+    check=lambda data: sum(data.values()) > 0,
+)
+
+_daily_schedule = _object(
+    ('day', _int(1), REQUIRED),
+    ('date', _iso_date, REQUIRED),
+    ('city', _char(100), REQUIRED),
+    ('activities', _list(_activity), list),
+)
+
+_itinerary = _object(
+    ('requirement_id', _char(50), REQUIRED),
+    ('itinerary_name', _char(200), REQUIRED),
+    ('start_date', _iso_date, REQUIRED),
+    ('end_date', _iso_date, REQUIRED),
+    ('destinations', _list(_destination), list),
+    ('traveler_stats', _traveler_stats, dict),
+    ('daily_schedules', _list(_daily_schedule), list),
+    check=lambda data: data['start_date'] <= data['end_date'],
+)
+
+
+def validate_itinerary(data: Any) -> Optional[Dict[str, Any]]:
+    """
+    快速校验行程数据
+
+    Returns:
+        与 ItineraryWebhookSerializer.validated_data 相同的结果，无法在快速路径确定时返回 None
+    """
+    try:
+        return _itinerary(data)
+    except _Fallback:
+        return None
@@ -6,45 +6,64 @@ from rest_framework import serializers
 from datetime import date, datetime, time
 from typing import List, Dict, Any, Optional
 
+from apps.api.serializers.fast_validation import (
+    ACTIVITY_TYPES,
+    parse_flexible_date,
+    parse_flexible_datetime,
+    validate_itinerary,
+)
+
 
 class FlexibleDateField(serializers.DateField):
     """支持多种格式的日期字段"""
+    formats = ['%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y', '%m/%d/%Y', '%Y%m%d']
+    iso_field = serializers.DateField()
+    
     def to_internal_value(self, data):
         if data is None or data == '':
             return None
         if isinstance(data, date):
             return data
-        # 尝试多种格式
-        formats = ['%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y', '%m/%d/%Y', '%Y%m%d']
-        for fmt in formats:
+        if isinstance(data, str):
+            parsed = parse_flexible_date(data)
+            if parsed is not None:
+                return parsed
+        # 分派表未命中时按原有顺序逐个尝试
+        for fmt in self.formats:
             try:
                 return datetime.strptime(str(data), fmt).date()
-            except:
+            except ValueError:
                 pass
         # 尝试 ISO 格式变体
         try:
-            return serializers.DateField().to_internal_value(data)
-        except:
+            return self.iso_field.to_internal_value(data)
+        except serializers.ValidationError:
             pass
         raise serializers.ValidationError(f'无效的日期格式: {data}')
 
 
 class FlexibleDateTimeField(serializers.DateTimeField):
     """支持多种格式的日期时间字段"""
+    formats = ['%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f']
+    iso_field = serializers.DateTimeField()
+    
     def to_internal_value(self, data):
         if data is None or data == '':
             return None
         if isinstance(data, datetime):
             return data
-        formats = ['%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f']
-        for fmt in formats:
+        if isinstance(data, str):
+            parsed = parse_flexible_datetime(data)
+            if parsed is not None:
+                return parsed
+        for fmt in self.formats:
             try:
                 return datetime.strptime(str(data), fmt)
-            except:
+            except ValueError:
                 pass
         try:
-            return serializers.DateTimeField().to_internal_value(data)
-        except:
+            return self.iso_field.to_internal_value(data)
+        except serializers.ValidationError:
             pass
         raise serializers.ValidationError(f'无效的日期时间格式: {data}')
 
@@ -60,14 +79,9 @@ class ActivitySerializer(serializers.Serializer):
     
     def validate_activity_type(self, value):
         """验证活动类型"""
-        valid_types = [
-            'FLIGHT', 'TRAIN', 'ATTRACTION', 'MEAL', 
-            'TRANSPORT', 'SHOPPING', 'FREE', 
-            'CHECK_IN', 'CHECK_OUT', 'OTHER'
-        ]
-        if value not in valid_types:
+        if value not in ACTIVITY_TYPES:
             raise serializers.ValidationError(
-                f'无效的活动类型: {value}。必须是以下之一: {", ".join(valid_types)}'
+                f'无效的活动类型: {value}。必须是以下之一: {", ".join(ACTIVITY_TYPES)}'
             )
         return value
     
@@ -158,6 +172,17 @@ class ItineraryWebhookSerializer(serializers.Serializer):
     traveler_stats = TravelerStatsSerializer(required=False, default=dict)
     daily_schedules = DailyScheduleSerializer(many=True, required=False, default=list)
     
+    # 是否先走预编译的快速校验路径
+    fast_path = True
+    
+    def run_validation(self, data=serializers.empty):
+        """合法数据由快速路径直接返回，其余情况（包括所有校验失败）仍由逐字段校验处理"""
+        if self.fast_path:
+            validated = validate_itinerary(data)
+            if validated is not None:
+                return validated
+        return super().run_validation(data)
+    
     def validate_requirement_id(self, value):
         """验证 requirement_id 格式"""
         if not value or not value.strip():
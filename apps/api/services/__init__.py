@@ -3,9 +3,29 @@ from .webhook_services import (
     RequirementService,
     ItineraryOptimizationService,
 )
+from .distance_services import DistanceMatrixService
+from .route_services import RouteOptimizerService
+from .currency_services import CurrencyService
+from .quote_services import QuoteEngineService
+from .candidate_services import CandidateSelectionService
+from .prompt_context_services import PromptContextService
+from .schema_services import SchemaDescriptionService
+from .query_gateway_services import QueryGatewayService
+from .idempotency_services import IdempotencyService
+from .ingest_services import ItineraryIngestService
 
 __all__ = [
     'ItineraryService',
     'RequirementService',
     'ItineraryOptimizationService',
+    'DistanceMatrixService',
+    'RouteOptimizerService',
+    'CurrencyService',
+    'QuoteEngineService',
+    'CandidateSelectionService',
+    'PromptContextService',
+    'SchemaDescriptionService',
+    'QueryGatewayService',
+    'IdempotencyService',
+    'ItineraryIngestService',
 ]
\ No newline at end of file
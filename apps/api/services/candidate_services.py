@@ -0,0 +1,362 @@
+"""
+候选资源筛选服务
+根据需求的预算、酒店等级、人数和偏好标签，对目的地城市的景点、酒店、餐厅打分，
+按类别返回 Top-K 精简候选列表，替代 n8n 规划工作流中整城查询数据库的做法
+"""
+import json
+import ast
+import logging
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from django.conf import settings
+
+from apps.models.requirement import Requirement
+from apps.models.attraction import Attraction
+from apps.models.hotel import Hotel
+from apps.models.restaurant import Restaurant
+from apps.api.utils.tiered_cache import get_tiered_cache, invalidate_on_change
+from .currency_services import CurrencyService
+
+logger = logging.getLogger(__name__)
+
+# 按城市缓存的目录记录，景点、酒店、餐厅保存或删除时整体失效
+catalog_cache = get_tiered_cache('catalog', timeout=getattr(settings, 'CATALOG_CACHE_TTL', 600))
+invalidate_on_change(catalog_cache, Attraction, Hotel, Restaurant)
+
+
+def _flatten_tags(tags: Any) -> set:
+    """将列表或字典形式的标签展开为字符串集合"""
+    if not tags:
+        return set()
+    if isinstance(tags, str):
+        return {t.strip() for t in tags.replace('，', ',').split(',') if t.strip()}
+    if isinstance(tags, dict):
+        values = set()
+        for key, value in tags.items():
+            if isinstance(value, bool):
+                if value:
+                    values.add(str(key))
+            elif isinstance(value, (list, tuple, set)):
+                values.update(str(v) for v in value)
+            elif value:
+                values.add(str(value))
+            else:
+                values.add(str(key))
+        return values
+    if isinstance(tags, (list, tuple, set)):
+        return {str(t) for t in tags if t}
+    return {str(tags)}
+
+
+def _score(value, scale: float) -> float:
+    """将评分类字段归一化到 0-1，缺失为 0"""
+    return float(value) / scale if value is not None else 0.0
+
+
+class CandidateSelectionService:
+    """
+    候选资源筛选服务类
+    处理按需求对景点、酒店、餐厅打分和截取 Top-K
+    """
+
+    DEFAULT_TOP_K = {'attractions': 30, 'hotels': 10, 'restaurants': 20}
+
+    # 人均每日预算在住宿、门票、餐饮上的分配比例
+    BUDGET_SHARES = {'hotel': 0.4, 'attraction': 0.15, 'meal': 0.25}
+    MEALS_PER_DAY = 2
+
+    # 预算等级对应的目标酒店星级与餐厅价格档位（$ 的个数）
+    BUDGET_LEVEL_PROFILES = {
+        Requirement.BudgetLevel.ECONOMY: {'star': 3, 'price_tier': 1},
+        Requirement.BudgetLevel.COMFORT: {'star': 4, 'price_tier': 2},
+        Requirement.BudgetLevel.HIGH_END: {'star': 5, 'price_tier': 3},
+        Requirement.BudgetLevel.LUXURY: {'star': 5, 'price_tier': 4},
+    }
+    HOTEL_LEVEL_STARS = {
+        Requirement.HotelLevel.ECONOMY: 2,
+        Requirement.HotelLevel.COMFORT: 3,
+        Requirement.HotelLevel.PREMIUM: 4,
+        Requirement.HotelLevel.LUXURY: 5,
+    }
+
+    # 各维度权重
+    WEIGHTS = {
+        'attraction': {'budget': 0.25, 'popularity': 0.25, 'rating': 0.25, 'tags': 0.25},
+        'hotel': {'budget': 0.35, 'star': 0.25, 'popularity': 0.1, 'rating': 0.15, 'tags': 0.15},
+        'restaurant': {'budget': 0.35, 'popularity': 0.2, 'rating': 0.25, 'tags': 0.2},
+    }
+
+    @classmethod
+    def top_k(cls, category: str, override: Optional[int] = None) -> int:
+        """各类别返回的候选数量"""
+        if override:
+            return override
+        configured = getattr(settings, 'CANDIDATE_TOP_K', cls.DEFAULT_TOP_K)
+        return int(configured.get(category, cls.DEFAULT_TOP_K[category]))
+
+    @classmethod
+    def destination_cities(cls, requirement: Requirement) -> List[str]:
+        """解析需求的目的地城市，兼容逗号分隔字符串和 JSON 列表"""
+        cities = requirement.destination_cities
+        if isinstance(cities, str):
+            text = cities.strip()
+            if text.startswith('['):
+                try:
+                    cities = json.loads(text)
+                except json.JSONDecodeError:
+                    try:
+                        cities = ast.literal_eval(text)
+                    except (ValueError, SyntaxError):
+                        cities = []
+            else:
+                cities = text.split(',')
+        names = []
+        for city in cities or []:
+            name = city.get('name', '') if isinstance(city, dict) else str(city)
+            if name.strip():
+                names.append(name.strip())
+        return names
+
+    @classmethod
+    def daily_budget_per_person(cls, requirement: Requirement) -> Optional[float]:
+        """
+        人均每日预算（基准货币）
+
+        优先使用最高预算，其次最低预算，均为空时返回 None
+        """
+        budget = requirement.budget_max or requirement.budget_min
+        if not budget:
+            return None
+        people = max(requirement.group_total or 1, 1)
+        days = max(requirement.trip_days or 1, 1)
+        converted = CurrencyService.convert(budget, requirement.budget_currency)
+        if converted is None:
+            logger.warning(f"需求 {requirement.requirement_id} 预算货币 {requirement.budget_currency} 缺少汇率，忽略预算金额")
+            return None
+        return float(converted) / people / days
+
+    @classmethod
+    def select(cls, requirement: Requirement, top_k: Optional[int] = None) -> Dict[str, Any]:
+        """
+        为需求筛选候选景点、酒店、餐厅
+
+        Args:
+            requirement: 需求对象
+            top_k: 覆盖各类别的候选数量
+
+        Returns:
+            {'requirement_id', 'cities', 'budget', 'attractions', 'hotels', 'restaurants'}
+        """
+        cities = cls.destination_cities(requirement)
+        daily_budget = cls.daily_budget_per_person(requirement)
+        profile = cls.BUDGET_LEVEL_PROFILES.get(requirement.budget_level, {})
+        target_star = cls.HOTEL_LEVEL_STARS.get(requirement.hotel_level) or profile.get('star')
+        preferences = _flatten_tags(requirement.preference_tags)
+        must_visit = _flatten_tags(requirement.must_visit_spots)
+
+        context = {
+            'daily_budget': daily_budget,
+            'price_tier': profile.get('price_tier'),
+            'target_star': target_star,
+            'preferences': preferences,
+            'must_visit': must_visit,
+        }
+
+        return {
+            'requirement_id': requirement.requirement_id,
+            'cities': cities,
+            'budget': {
+                'level': requirement.budget_level or None,
+                'currency': CurrencyService.base_currency(),
+                'daily_per_person': round(daily_budget, 2) if daily_budget is not None else None,
+                'hotel_star': target_star,
+            },
+            'attractions': cls._select_attractions(cities, context, cls.top_k('attractions', top_k)),
+            'hotels': cls._select_hotels(cities, context, cls.top_k('hotels', top_k)),
+            'restaurants': cls._select_restaurants(cities, context, cls.top_k('restaurants', top_k)),
+        }
+
+    @classmethod
+    def _price_fit(cls, prices: List[Optional[float]], currencies: List[str], allowance: Optional[float]) -> np.ndarray:
+        """
+        价格与预算的匹配度：不超预算为 1，超出时按 预算/价格 衰减；价格或预算缺失时为 0.5
+        """
+        if allowance is None or not prices:
+            return np.full(len(prices), 0.5)
+        converted = CurrencyService.convert_many(prices, currencies)
+        fit = np.where(converted <= allowance, 1.0, allowance / np.where(converted > 0, converted, 1.0))
+        return np.where(np.isnan(converted), 0.5, fit)
+
+    @classmethod
+    def _tag_fit(cls, rows: List[set], preferences: set) -> np.ndarray:
+        """偏好标签命中比例"""
+        if not preferences:
+            return np.zeros(len(rows))
+        return np.array([len(tags & preferences) / len(preferences) for tags in rows], dtype=float)
+
+    @classmethod
+    def _rank(cls, rows: List[Dict[str, Any]], components: Dict[str, np.ndarray], weights: Dict[str, float],
+              k: int, pinned: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """按加权得分排序并截取 Top-K，pinned 为 True 的记录（如必游景点）始终排在前面"""
+        if not rows:
+            return []
+        score = sum(weights[name] * components[name] for name in weights)
+        if pinned is not None:
+            score = score + pinned.astype(float)
+        order = np.argsort(-score, kind='stable')[:k]
+        ranked = []
+        for index in order:
+            row = rows[index]
+            row['score'] = round(float(min(score[index], 1.0)), 3)
+            ranked.append(row)
+        return ranked
+
+    @classmethod
+    def _city_records(cls, name: str, queryset, cities: List[str], fields: tuple) -> List[Dict[str, Any]]:
+        """
+        按城市读取目录记录，优先读取缓存，未缓存的城市合并为一条查询
+
+        Args:
+            name: 缓存键前缀
+            queryset: 已按状态过滤的查询集
+            cities: 城市名列表
+            fields: values() 字段，需包含 city_name
+        """
+        keys = {city: f'{name}:{city}' for city in dict.fromkeys(cities)}
+        cached = catalog_cache.get_many(keys.values())
+        missing = [city for city, key in keys.items() if key not in cached]
+        if missing:
+            loaded = {city: [] for city in missing}
+            # MariaDB 的排序规则比较城市名时忽略大小写和尾部空格，按同样规则归入请求的城市
+            lookup = {city.strip().casefold(): city for city in missing}
+            for record in queryset.filter(city_name__in=missing).values(*fields):
+                city = lookup.get((record['city_name'] or '').strip().casefold())
+                if city is not None:
+                    loaded[city].append(record)
+            catalog_cache.set_many({keys[city]: records for city, records in loaded.items()})
+            cached.update((keys[city], records) for city, records in loaded.items())
+        return [record for key in keys.values() for record in cached[key]]
+
+    @classmethod
+    def _select_attractions(cls, cities: List[str], context: Dict[str, Any], k: int) -> List[Dict[str, Any]]:
+        records = cls._city_records('attractions', Attraction.objects.filter(status='ACTIVE'), cities, (
+            'attraction_id', 'attraction_name', 'city_name', 'category', 'tags', 'recommended_duration',
+            'ticket_price', 'currency', 'popularity_score', 'visitor_rating'
+        ))
+        allowance = cls._allowance(context, 'attraction')
+        tags = [_flatten_tags(r['tags']) for r in records]
+        components = {
+            'budget': cls._price_fit([r['ticket_price'] for r in records], [r['currency'] for r in records], allowance),
+            'popularity': np.array([_score(r['popularity_score'], 5) for r in records]),
+            'rating': np.array([_score(r['visitor_rating'], 5) for r in records]),
+            'tags': cls._tag_fit(tags, context['preferences']),
+        }
+        must_visit = context['must_visit']
+        pinned = np.array([r['attraction_name'] in must_visit for r in records], dtype=bool)
+        rows = [
+            {
+                'id': str(r['attraction_id']),
+                'name': r['attraction_name'],
+                'city': r['city_name'],
+                'category': r['category'],
+                'tags': sorted(t)[:5],
+                'duration': r['recommended_duration'],
+                'price': float(r['ticket_price']) if r['ticket_price'] is not None else None,
+                'currency': r['currency'],
+            }
+            for r, t in zip(records, tags)
+        ]
+        return cls._rank(rows, components, cls.WEIGHTS['attraction'], k, pinned)
+
+    @classmethod
+    def _select_hotels(cls, cities: List[str], context: Dict[str, Any], k: int) -> List[Dict[str, Any]]:
+        records = cls._city_records('hotels', Hotel.objects.filter(status=Hotel.Status.ACTIVE), cities, (
+            'hotel_id', 'hotel_name', 'city_name', 'hotel_star', 'tags', 'min_price', 'max_price',
+            'currency', 'popularity_score', 'guest_rating'
+        ))
+        allowance = cls._allowance(context, 'hotel')
+        if allowance is not None:
+            # 按两人一间折算为每间夜预算
+            allowance *= 2
+        tags = [_flatten_tags(r['tags']) for r in records]
+        target_star = context['target_star']
+        if target_star:
+            # 星级缺失按 0.5 计
+            star_fit = np.array([
+                1 - abs(r['hotel_star'] - target_star) / 4 if r['hotel_star'] else 0.5 for r in records
+            ], dtype=float)
+        else:
+            star_fit = np.full(len(records), 0.5)
+        components = {
+            'budget': cls._price_fit([r['min_price'] for r in records], [r['currency'] for r in records], allowance),
+            'star': star_fit,
+            'popularity': np.array([_score(r['popularity_score'], 5) for r in records]),
+            'rating': np.array([_score(r['guest_rating'], 5) for r in records]),
+            'tags': cls._tag_fit(tags, context['preferences']),
+        }
+        rows = [
+            {
+                'id': str(r['hotel_id']),
+                'name': r['hotel_name'],
+                'city': r['city_name'],
+                'star': r['hotel_star'],
+                'tags': sorted(t)[:5],
+                'price_min': float(r['min_price']) if r['min_price'] is not None else None,
+                'price_max': float(r['max_price']) if r['max_price'] is not None else None,
+                'currency': r['currency'],
+            }
+            for r, t in zip(records, tags)
+        ]
+        return cls._rank(rows, components, cls.WEIGHTS['hotel'], k)
+
+    @classmethod
+    def _select_restaurants(cls, cities: List[str], context: Dict[str, Any], k: int) -> List[Dict[str, Any]]:
+        records = cls._city_records('restaurants', Restaurant.objects.filter(status=Restaurant.Status.ACTIVE), cities, (
+            'restaurant_id', 'restaurant_name', 'city_name', 'cuisine_type', 'tags', 'price_range',
+            'avg_price_per_person', 'popularity_score', 'food_rating'
+        ))
+        allowance = cls._allowance(context, 'meal')
+        if allowance is not None:
+            allowance /= cls.MEALS_PER_DAY
+        tags = [_flatten_tags(r['tags']) for r in records]
+
+        budget_fit = cls._price_fit(
+            [r['avg_price_per_person'] for r in records], [CurrencyService.base_currency()] * len(records), allowance
+        )
+        price_tier = context['price_tier']
+        if price_tier:
+            # 人均价格缺失时按价格档位与预算等级的差距估算
+            tier_fit = np.array([
+                1 - abs(len(r['price_range'] or '') - price_tier) / 3 if r['price_range'] else 0.5
+                for r in records
+            ], dtype=float)
+            missing = np.array([r['avg_price_per_person'] is None for r in records], dtype=bool)
+            budget_fit = np.where(missing | (allowance is None), tier_fit, budget_fit)
+
+        components = {
+            'budget': budget_fit,
+            'popularity': np.array([_score(r['popularity_score'], 5) for r in records]),
+            'rating': np.array([_score(r['food_rating'], 5) for r in records]),
+            'tags': cls._tag_fit(tags, context['preferences']),
+        }
+        rows = [
+            {
+                'id': str(r['restaurant_id']),
+                'name': r['restaurant_name'],
+                'city': r['city_name'],
+                'cuisine': r['cuisine_type'],
+                'tags': sorted(t)[:5],
+                'price_range': r['price_range'],
+                'avg_price': float(r['avg_price_per_person']) if r['avg_price_per_person'] is not None else None,
+            }
+            for r, t in zip(records, tags)
+        ]
+        return cls._rank(rows, components, cls.WEIGHTS['restaurant'], k)
+
+    @classmethod
+    def _allowance(cls, context: Dict[str, Any], share: str) -> Optional[float]:
+        """人均每日预算中分配给某类消费的金额"""
+        if context['daily_budget'] is None:
+            return None
+        return context['daily_budget'] * cls.BUDGET_SHARES[share]
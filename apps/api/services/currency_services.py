@@ -0,0 +1,250 @@
+"""
+货币换算服务
+从汇率表（或内置测试汇率）加载各货币兑基准货币的汇率，在进程内按 TTL 和版本号缓存，
+提供向量化的批量换算接口，供报价汇总和预算检查使用
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+
+from apps.models.currency_rate import CurrencyRate
+
+logger = logging.getLogger(__name__)
+
+
+class CurrencyService:
+    """
+    货币换算服务类
+    处理汇率表加载、进程内缓存和批量换算
+    """
+
+    DEFAULT_BASE_CURRENCY = 'CNY'
+    DEFAULT_PROVIDER = 'database'
+    DEFAULT_CACHE_TTL = 300
+    RATE_PRECISION = Decimal('0.00000001')
+
+    # 内置测试汇率（1单位货币折合人民币），仅在 provider 为 stub 时使用
+    STUB_RATES = {
+        'CNY': 1.0,
+        'USD': 7.2,
+        'EUR': 7.8,
+        'GBP': 9.1,
+        'JPY': 0.048,
+        'HKD': 0.92,
+        'KRW': 0.0053,
+        'THB': 0.2,
+        'SGD': 5.35,
+        'AUD': 4.7,
+    }
+
+    _lock = threading.Lock()
+    _rates: Optional[Dict[str, float]] = None
+    _version: Optional[Tuple] = None
+    _loaded_at = 0.0
+
+    @classmethod
+    def base_currency(cls) -> str:
+        """基准货币"""
+        return getattr(settings, 'CURRENCY_BASE', cls.DEFAULT_BASE_CURRENCY).upper()
+
+    @classmethod
+    def provider(cls) -> str:
+        """汇率来源：database 或 stub"""
+        return getattr(settings, 'CURRENCY_RATE_PROVIDER', cls.DEFAULT_PROVIDER)
+
+    @classmethod
+    def cache_ttl(cls) -> int:
+        """进程内汇率缓存有效期（秒）"""
+        return int(getattr(settings, 'CURRENCY_RATE_CACHE_TTL', cls.DEFAULT_CACHE_TTL))
+
+    @classmethod
+    def get_rates(cls) -> Dict[str, float]:
+        """
+        获取当前汇率表（货币 -> 兑基准货币汇率）
+
+        缓存过期后先比较汇率表版本（行数和最后更新时间），未变化时仅续期不重新加载
+        """
+        now = time.monotonic()
+        rates = cls._rates
+        if rates is not None and now - cls._loaded_at < cls.cache_ttl():
+            return rates
+
+        with cls._lock:
+            if cls._rates is not None and now - cls._loaded_at < cls.cache_ttl():
+                return cls._rates
+
+            if cls.provider() == 'stub':
+                version = ('stub', cls.base_currency())
+            else:
+                version = cls._table_version()
+
+            if cls._rates is None or version != cls._version:
+                cls._rates = cls._load_rates()
+                cls._version = version
+                logger.info(f"汇率表已加载: {len(cls._rates)} 种货币, 版本: {version}")
+            cls._loaded_at = now
+            return cls._rates
+
+    @classmethod
+    def invalidate(cls):
+        """清空进程内汇率缓存，下次访问时重新加载"""
+        with cls._lock:
+            cls._rates = None
+            cls._version = None
+            cls._loaded_at = 0.0
+
+    @classmethod
+    def _table_version(cls) -> Tuple:
+        """汇率表版本号"""
+        stats = CurrencyRate.objects.filter(base_currency=cls.base_currency()).aggregate(
+            count=Count('id'), updated=Max('updated_at')
+        )
+        return stats['count'], stats['updated']
+
+    @classmethod
+    def _load_rates(cls) -> Dict[str, float]:
+        """从汇率来源加载汇率"""
+        base = cls.base_currency()
+        if cls.provider() == 'stub':
+            stub_base = cls.STUB_RATES.get(base)
+            if not stub_base:
+                return {base: 1.0}
+            return {currency: rate / stub_base for currency, rate in cls.STUB_RATES.items()}
+
+        # 汇率为0的历史数据按缺少汇率处理，避免换算时除以0
+        rates = {
+            currency.upper(): float(rate)
+            for currency, rate in CurrencyRate.objects.filter(
+                base_currency=base, rate_to_base__gt=0
+            ).values_list('currency', 'rate_to_base')
+        }
+        rates[base] = 1.0
+        return rates
+
+    @classmethod
+    def convert_many(cls, amounts: Iterable, currencies: Iterable[str], to_currency: Optional[str] = None) -> np.ndarray:
+        """
+        批量换算金额
+
+        Args:
+            amounts: 金额序列
+            currencies: 与金额一一对应的货币代码序列
+            to_currency: 目标货币，默认基准货币
+
+        Returns:
+            换算后的金额数组，未知货币对应位置为 NaN
+        """
+        amounts = np.asarray([float(a) if a is not None else np.nan for a in amounts], dtype=float)
+        currencies = np.asarray([(c or cls.base_currency()).upper() for c in currencies], dtype=object)
+        if amounts.shape != currencies.shape:
+            raise ValueError('金额与货币数量不一致')
+        if amounts.size == 0:
+            return amounts
+
+        rates = cls.get_rates()
+        target = (to_currency or cls.base_currency()).upper()
+        target_rate = rates.get(target, np.nan)
+
+        unique, inverse = np.unique(currencies.astype(str), return_inverse=True)
+        factors = np.array([rates.get(code, np.nan) for code in unique], dtype=float) / target_rate
+        return amounts * factors[inverse]
+
+    @classmethod
+    def convert(cls, amount, from_currency: str, to_currency: Optional[str] = None) -> Optional[Decimal]:
+        """
+        换算单个金额
+
+        Returns:
+            换算后的金额（保留两位小数），汇率缺失时返回 None
+        """
+        result = cls.convert_many([amount], [from_currency], to_currency)[0]
+        if np.isnan(result):
+            return None
+        return Decimal(str(round(float(result), 2)))
+
+    @classmethod
+    def missing_currencies(cls, currencies: Iterable[str]) -> List[str]:
+        """返回汇率表中不存在的货币代码"""
+        rates = cls.get_rates()
+        return sorted({(c or cls.base_currency()).upper() for c in currencies} - set(rates))
+
+    @classmethod
+    def load_from_file(cls, file_path: str, source: str = 'file') -> Tuple[bool, int, Optional[str]]:
+        """
+        从 JSON 文件加载汇率到汇率表
+
+        文件格式：
+            {"base": "CNY", "effective_date": "2026-01-01", "rates": {"USD": 7.2, "JPY": 0.048}}
+
+        文件基准货币与系统基准货币不同时，按文件中系统基准货币的汇率折算。
+        汇率（按8位小数取整后）必须大于0，否则整个文件不导入
+
+        Returns:
+            (success, count, error_msg)
+        """
+        if not os.path.exists(file_path):
+            return False, 0, f'汇率文件不存在: {file_path}'
+
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            rates = {str(k).upper(): Decimal(str(v)) for k, v in data.get('rates', {}).items()}
+            file_base = str(data.get('base', cls.base_currency())).upper()
+            effective_date = date.fromisoformat(data['effective_date']) if data.get('effective_date') else None
+        except (OSError, ValueError, InvalidOperation, AttributeError) as e:
+            return False, 0, f'汇率文件格式错误: {str(e)}'
+
+        base = cls.base_currency()
+        rates[file_base] = Decimal('1')
+        if base != file_base:
+            if not rates.get(base):
+                return False, 0, f'汇率文件缺少基准货币 {base} 的汇率'
+            base_rate = rates[base]
+            rates = {currency: rate / base_rate for currency, rate in rates.items()}
+
+        rates = {currency: rate.quantize(cls.RATE_PRECISION) if rate.is_finite() else rate for currency, rate in rates.items()}
+        invalid = sorted(currency for currency, rate in rates.items() if not rate.is_finite() or rate <= 0)
+        if invalid:
+            return False, 0, f'汇率必须大于0: {", ".join(invalid)}'
+
+        with transaction.atomic():
+            for currency, rate in rates.items():
+                CurrencyRate.objects.update_or_create(
+                    currency=currency,
+                    defaults={
+                        'base_currency': base,
+                        'rate_to_base': rate,
+                        'source': source,
+                        'effective_date': effective_date,
+                    }
+                )
+        cls.invalidate()
+        logger.info(f"汇率文件加载完成: {file_path}, 共 {len(rates)} 种货币")
+        return True, len(rates), None
+
+    @classmethod
+    def summarize(cls, amounts: Iterable, currencies: Iterable[str], to_currency: Optional[str] = None) -> Dict[str, Any]:
+        """
+        将多币种金额汇总为目标货币总额
+
+        Returns:
+            {'currency', 'total', 'missing_currencies'}，缺少汇率的金额不计入总额
+        """
+        currencies = list(currencies)
+        target = (to_currency or cls.base_currency()).upper()
+        converted = cls.convert_many(amounts, currencies, target)
+        return {
+            'currency': target,
+            'total': round(float(np.nansum(converted)), 2),
+            'missing_currencies': cls.missing_currencies(currencies + [target]),
+        }
@@ -0,0 +1,265 @@
+"""
+距离矩阵与交通时间估算服务
+基于景点、酒店、餐厅及目的地坐标，在进程内计算行程活动之间的距离，
+估算交通耗时并检查每日行程时间窗口的可行性，无需调用 n8n 工作流
+"""
+import logging
+from datetime import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from apps.models.itinerary import Itinerary
+from apps.models.daily_schedule import DailySchedule
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """
+    向量化计算两组坐标之间的球面距离（公里）
+
+    参数支持标量或可广播的 ndarray，缺失坐标以 NaN 表示，结果对应位置为 NaN
+    """
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lng1, lat2, lng2))
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distance_matrix_km(coordinates: np.ndarray) -> np.ndarray:
+    """
+    计算 N 个坐标点的两两距离矩阵（公里）
+
+    Args:
+        coordinates: 形如 (N, 2) 的 [纬度, 经度] 数组，缺失值为 NaN
+
+    Returns:
+        (N, N) 距离矩阵
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    lats = coordinates[:, 0]
+    lngs = coordinates[:, 1]
+    return haversine_km(lats[:, None], lngs[:, None], lats[None, :], lngs[None, :])
+
+
+def _minutes_of(value: Optional[time]) -> Optional[int]:
+    """将 time 转换为当日分钟数"""
+    if value is None:
+        return None
+    return value.hour * 60 + value.minute
+
+
+class DistanceMatrixService:
+    """
+    距离矩阵服务类
+    处理行程活动坐标解析、距离矩阵计算和交通时间估算
+    """
+
+    DEFAULT_TRAVEL_SPEED_KMH = 25.0
+    DEFAULT_TRANSFER_BUFFER_MINUTES = 10
+
+    @classmethod
+    def travel_speed_kmh(cls) -> float:
+        """城市内平均交通速度（公里/小时）"""
+        return float(getattr(settings, 'ITINERARY_TRAVEL_SPEED_KMH', cls.DEFAULT_TRAVEL_SPEED_KMH))
+
+    @classmethod
+    def transfer_buffer_minutes(cls) -> int:
+        """每次交通换乘的固定缓冲时间（分钟）"""
+        return int(getattr(settings, 'ITINERARY_TRANSFER_BUFFER_MINUTES', cls.DEFAULT_TRANSFER_BUFFER_MINUTES))
+
+    @classmethod
+    def get_schedules(cls, itinerary: Itinerary) -> List[DailySchedule]:
+        """一次性加载行程的全部活动及其关联资源"""
+        return list(
+            DailySchedule.objects.filter(itinerary_id=itinerary)
+            .select_related('attraction_id', 'hotel_id', 'restaurant_id', 'destination_id')
+            .order_by('day_number', 'start_time')
+        )
+
+    @classmethod
+    def resolve_coordinates(cls, schedule: DailySchedule) -> Tuple[float, float]:
+        """
+        解析活动坐标
+
+        优先使用关联的景点、酒店、餐厅坐标，缺失时回退到目的地坐标
+
+        Returns:
+            (纬度, 经度)，无法解析时为 (nan, nan)
+        """
+        for related in (schedule.attraction_id, schedule.hotel_id, schedule.restaurant_id, schedule.destination_id):
+            if related is None:
+                continue
+            latitude = getattr(related, 'latitude', None)
+            longitude = getattr(related, 'longitude', None)
+            if latitude is not None and longitude is not None:
+                return float(latitude), float(longitude)
+        return float('nan'), float('nan')
+
+    @classmethod
+    def coordinates_for(cls, schedules: List[DailySchedule]) -> np.ndarray:
+        """返回活动列表对应的 (N, 2) 坐标数组"""
+        if not schedules:
+            return np.empty((0, 2), dtype=float)
+        return np.array([cls.resolve_coordinates(s) for s in schedules], dtype=float)
+
+    @classmethod
+    def estimate_transfer_minutes(cls, distance_km) -> np.ndarray:
+        """
+        根据距离估算交通耗时（分钟）
+
+        耗时 = 距离 / 平均速度 + 固定缓冲，距离为 0 时为 0，距离为 NaN 时结果为 NaN
+        """
+        distance_km = np.asarray(distance_km, dtype=float)
+        minutes = distance_km / cls.travel_speed_kmh() * 60.0 + cls.transfer_buffer_minutes()
+        # 同一地点（如酒店入住后在酒店用餐）无需交通
+        return np.where(distance_km == 0, 0.0, minutes)
+
+    @classmethod
+    def build_distance_matrix(cls, itinerary: Itinerary) -> Dict[str, Any]:
+        """
+        构建行程全部活动的距离矩阵和交通耗时矩阵
+
+        Returns:
+            包含 schedule_ids、距离矩阵（公里）和耗时矩阵（分钟）的字典，
+            缺失坐标的位置以 None 表示
+        """
+        schedules = cls.get_schedules(itinerary)
+        distances = distance_matrix_km(cls.coordinates_for(schedules))
+        minutes = cls.estimate_transfer_minutes(distances)
+        return {
+            'itinerary_id': itinerary.itinerary_id,
+            'schedule_ids': [str(s.schedule_id) for s in schedules],
+            'distance_km': _to_json_matrix(distances, 3),
+            'transfer_minutes': _to_json_matrix(minutes, 1),
+        }
+
+    @classmethod
+    def check_feasibility(cls, itinerary: Itinerary) -> Dict[str, Any]:
+        """
+        检查每日行程时间窗口的可行性
+
+        检查项：
+            - invalid_window: 结束时间不晚于开始时间
+            - too_short: 景点停留时间短于建议游玩时长
+            - overlap: 相邻活动时间重叠
+            - insufficient_transfer: 相邻活动间隔不足以完成交通
+
+        Returns:
+            {'itinerary_id', 'feasible', 'issues': [...], 'days': {...}}
+        """
+        schedules = cls.get_schedules(itinerary)
+        coordinates = cls.coordinates_for(schedules)
+
+        issues = []
+        days = {}
+        by_day: Dict[int, List[int]] = {}
+        for index, schedule in enumerate(schedules):
+            by_day.setdefault(schedule.day_number, []).append(index)
+
+        for day_number, indexes in by_day.items():
+            day_issues = cls._check_windows([schedules[i] for i in indexes])
+
+            if len(indexes) > 1:
+                current = np.array(indexes[:-1])
+                following = np.array(indexes[1:])
+                legs_km = haversine_km(
+                    coordinates[current, 0], coordinates[current, 1],
+                    coordinates[following, 0], coordinates[following, 1],
+                )
+                legs_minutes = cls.estimate_transfer_minutes(legs_km)
+                day_issues.extend(cls._check_legs(
+                    [schedules[i] for i in indexes], legs_km, legs_minutes
+                ))
+                total_km = float(np.nansum(legs_km))
+                total_minutes = float(np.nansum(legs_minutes))
+            else:
+                total_km = 0.0
+                total_minutes = 0.0
+
+            days[day_number] = {
+                'activity_count': len(indexes),
+                'total_distance_km': round(total_km, 3),
+                'total_transfer_minutes': round(total_minutes, 1),
+                'issue_count': len(day_issues),
+            }
+            issues.extend(day_issues)
+
+        return {
+            'itinerary_id': itinerary.itinerary_id,
+            'feasible': not issues,
+            'issues': issues,
+            'days': days,
+        }
+
+    @classmethod
+    def _check_windows(cls, schedules: List[DailySchedule]) -> List[Dict[str, Any]]:
+        """检查单个活动自身的时间窗口"""
+        issues = []
+        for schedule in schedules:
+            start = _minutes_of(schedule.start_time)
+            end = _minutes_of(schedule.end_time)
+            if start is None or end is None:
+                continue
+            if end <= start:
+                issues.append(_issue(schedule, 'invalid_window', '结束时间必须晚于开始时间'))
+                continue
+            attraction = schedule.attraction_id
+            if attraction is not None and attraction.recommended_duration:
+                if end - start < attraction.recommended_duration:
+                    issues.append(_issue(
+                        schedule, 'too_short',
+                        f'停留{end - start}分钟，短于建议游玩时长{attraction.recommended_duration}分钟'
+                    ))
+        return issues
+
+    @classmethod
+    def _check_legs(cls, schedules: List[DailySchedule], legs_km: np.ndarray, legs_minutes: np.ndarray) -> List[Dict[str, Any]]:
+        """检查相邻活动之间的间隔与交通耗时"""
+        issues = []
+        for position in range(len(schedules) - 1):
+            current = schedules[position]
+            following = schedules[position + 1]
+            end = _minutes_of(current.end_time)
+            start = _minutes_of(following.start_time)
+            if end is None or start is None:
+                continue
+            gap = start - end
+            if gap < 0:
+                issues.append(_issue(
+                    following, 'overlap',
+                    f'与上一活动"{current.activity_title}"时间重叠{-gap}分钟'
+                ))
+                continue
+            needed = legs_minutes[position]
+            if not np.isnan(needed) and needed > gap:
+                issues.append(_issue(
+                    following, 'insufficient_transfer',
+                    f'距上一活动{legs_km[position]:.1f}公里，预计交通{needed:.0f}分钟，仅预留{gap}分钟'
+                ))
+        return issues
+
+
+def _issue(schedule: DailySchedule, code: str, message: str) -> Dict[str, Any]:
+    """构建可行性问题记录"""
+    return {
+        'schedule_id': str(schedule.schedule_id),
+        'day_number': schedule.day_number,
+        'activity_title': schedule.activity_title,
+        'code': code,
+        'message': message,
+    }
+
+
+def _to_json_matrix(matrix: np.ndarray, digits: int) -> List[List[Optional[float]]]:
+    """将矩阵转换为可 JSON 序列化的嵌套列表，NaN 转为 None"""
+    rounded = np.round(matrix, digits)
+    return [
+        [None if np.isnan(value) else float(value) for value in row]
+        for row in rounded
+    ]
@@ -0,0 +1,205 @@
+"""
+Webhook幂等服务
+按 X-Request-ID 或规范化请求体哈希识别重复提交，成功结果短期保存，
+重放时直接返回原响应，不再触达需求、行程和目录表
+"""
+import hashlib
+import logging
+from functools import wraps
+from typing import Dict, Any, Optional
+
+import orjson
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from apps.api.utils.request_utils import RequestBodyError, body_error_response, read_body
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyService:
+    """
+    Webhook幂等服务类
+    处理幂等键计算、处理中加锁和成功响应的保存与重放
+    """
+
+    HEADER = 'X-Request-ID'
+    REPLAY_HEADER = 'X-Idempotent-Replay'
+    CACHE_KEY_PREFIX = 'webhook_idempotency'
+    DEFAULT_TTL = 600
+    DEFAULT_LOCK_TTL = 120
+
+    @classmethod
+    def ttl(cls) -> int:
+        """成功结果保存时间（秒）"""
+        return int(getattr(settings, 'WEBHOOK_IDEMPOTENCY_TTL', cls.DEFAULT_TTL))
+
+    @classmethod
+    def lock_ttl(cls) -> int:
+        """处理中锁的最长持有时间，与webhook超时保持一致"""
+        return int(getattr(settings, 'WEBHOOK_TIMEOUT', cls.DEFAULT_LOCK_TTL))
+
+    @classmethod
+    def canonical_hash(cls, body: bytes) -> str:
+        """
+        计算请求体的规范化哈希，键顺序和空白不同的相同JSON得到相同结果
+
+        Args:
+            body: 原始请求体
+
+        Returns:
+            sha256 十六进制摘要
+        """
+        try:
+            canonical = orjson.dumps(orjson.loads(body), option=orjson.OPT_SORT_KEYS)
+        except (ValueError, TypeError):
+            canonical = body
+        return hashlib.sha256(canonical).hexdigest()
+
+    @classmethod
+    def build_key(cls, scope: str, request_id: Optional[str] = None, body: bytes = b'') -> str:
+        """
+        生成幂等键，优先使用请求头中的请求ID
+
+        Args:
+            scope: 业务范围，如 itinerary、requirement
+            request_id: X-Request-ID 请求头
+            body: 原始请求体
+
+        Returns:
+            缓存键
+        """
+        if request_id:
+            digest = 'rid-' + hashlib.sha256(request_id.strip().encode('utf-8')).hexdigest()[:32]
+        else:
+            digest = 'body-' + cls.canonical_hash(body)[:32]
+        return f'{cls.CACHE_KEY_PREFIX}:{scope}:{digest}'
+
+    @classmethod
+    def lookup(cls, key: str) -> Optional[Dict[str, Any]]:
+        """读取已保存的响应 {'status', 'body'}"""
+        return cache.get(key)
+
+    @classmethod
+    def save(cls, key: str, status: int, body: Any):
+        """保存成功响应"""
+        cache.set(key, {'status': status, 'body': body}, cls.ttl())
+
+    @classmethod
+    def acquire(cls, key: str) -> bool:
+        """为处理中的请求加锁，已被其他请求持有时返回 False"""
+        return cache.add(f'{key}:lock', 1, cls.lock_ttl())
+
+    @classmethod
+    def release(cls, key: str):
+        """释放处理中锁"""
+        cache.delete(f'{key}:lock')
+
+    @classmethod
+    async def alookup(cls, key: str) -> Optional[Dict[str, Any]]:
+        """lookup 的异步版本"""
+        return await cache.aget(key)
+
+    @classmethod
+    async def asave(cls, key: str, status: int, body: Any):
+        """save 的异步版本"""
+        await cache.aset(key, {'status': status, 'body': body}, cls.ttl())
+
+    @classmethod
+    async def aacquire(cls, key: str) -> bool:
+        """acquire 的异步版本"""
+        return await cache.aadd(f'{key}:lock', 1, cls.lock_ttl())
+
+    @classmethod
+    async def arelease(cls, key: str):
+        """release 的异步版本"""
+        await cache.adelete(f'{key}:lock')
+
+    @classmethod
+    def replay(cls, stored: Dict[str, Any]) -> JsonResponse:
+        """根据已保存的结果构造重放响应"""
+        response = JsonResponse(
+            stored['body'], status=stored['status'], safe=False, json_dumps_params={'ensure_ascii': False}
+        )
+        response[cls.REPLAY_HEADER] = 'true'
+        return response
+
+
+def _response_body(response) -> Any:
+    """取出响应体，DRF Response 使用未渲染的 data"""
+    if hasattr(response, 'data'):
+        return response.data
+    return orjson.loads(response.content)
+
+
+def _in_progress_response() -> JsonResponse:
+    """相同请求仍在处理中时的响应"""
+    return JsonResponse({'success': False, 'error': '相同请求正在处理中，请稍后重试'}, status=409)
+
+
+def idempotent_webhook(scope: str):
+    """
+    装饰器：为webhook视图的post方法增加幂等处理，同时支持同步和异步视图
+
+    Usage:
+        @idempotent_webhook('itinerary')
+        def post(self, request, *args, **kwargs):
+            ...
+    """
+    def decorator(func):
+        if iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(self, request, *args, **kwargs):
+                try:
+                    body = read_body(request)
+                except RequestBodyError as e:
+                    return body_error_response(e)
+                key = IdempotencyService.build_key(scope, request.headers.get(IdempotencyService.HEADER), body)
+
+                stored = await IdempotencyService.alookup(key)
+                if stored is not None:
+                    logger.info(f'重复的webhook请求，返回已保存结果: {key}')
+                    return IdempotencyService.replay(stored)
+
+                if not await IdempotencyService.aacquire(key):
+                    logger.warning(f'相同的webhook请求正在处理中: {key}')
+                    return _in_progress_response()
+
+                try:
+                    response = await func(self, request, *args, **kwargs)
+                    if 200 <= response.status_code < 300:
+                        await IdempotencyService.asave(key, response.status_code, _response_body(response))
+                finally:
+                    await IdempotencyService.arelease(key)
+                return response
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            # 超过大小上限的请求体不读入内存，也不参与哈希
+            try:
+                body = read_body(request)
+            except RequestBodyError as e:
+                return body_error_response(e)
+            key = IdempotencyService.build_key(scope, request.headers.get(IdempotencyService.HEADER), body)
+
+            stored = IdempotencyService.lookup(key)
+            if stored is not None:
+                logger.info(f'重复的webhook请求，返回已保存结果: {key}')
+                return IdempotencyService.replay(stored)
+
+            if not IdempotencyService.acquire(key):
+                logger.warning(f'相同的webhook请求正在处理中: {key}')
+                return _in_progress_response()
+
+            try:
+                response = func(self, request, *args, **kwargs)
+                if 200 <= response.status_code < 300:
+                    IdempotencyService.save(key, response.status_code, _response_body(response))
+            finally:
+                IdempotencyService.release(key)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,225 @@
+"""
+行程异步导入服务
+webhook 只做轻量校验并暂存原始数据，由 django_q worker 生成行程，支持状态查询和失败重试
+"""
+import json
+import logging
+from datetime import timedelta
+from typing import Dict, Any, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.models.itinerary_ingest_job import ItineraryIngestJob
+from apps.api.serializers.webhook_serializers import ItineraryWebhookSerializer
+from apps.api.services.webhook_services import ItineraryService
+from apps.api.services.prompt_context_services import PromptContextService
+
+logger = logging.getLogger(__name__)
+
+
+class ItineraryIngestService:
+    """
+    行程异步导入服务类
+    处理导入任务的入队、执行、重试和状态查询
+    """
+
+    TASK_FUNC = 'apps.api.tasks.materialize_itinerary_job'
+    TASK_GROUP = 'itinerary_ingest'
+    DEFAULT_MAX_ATTEMPTS = 3
+    DEFAULT_RETRY_DELAY = 60
+    DEFAULT_PROCESSING_TIMEOUT = 600
+    ENVELOPE_FIELDS = ('requirement_id', 'itinerary_name', 'start_date', 'end_date')
+
+    @classmethod
+    def max_attempts(cls) -> int:
+        """单个任务最多执行次数"""
+        return int(getattr(settings, 'ITINERARY_INGEST_MAX_ATTEMPTS', cls.DEFAULT_MAX_ATTEMPTS))
+
+    @classmethod
+    def retry_delay(cls, attempts: int) -> int:
+        """第 attempts 次失败后的重试间隔（秒），按指数退避"""
+        return int(getattr(settings, 'ITINERARY_INGEST_RETRY_DELAY', cls.DEFAULT_RETRY_DELAY)) * 2 ** max(attempts - 1, 0)
+
+    @classmethod
+    def processing_timeout(cls) -> int:
+        """处理中的任务超过该时长（秒）未结束视为worker已中断，可以重新执行"""
+        return int(getattr(settings, 'ITINERARY_INGEST_PROCESSING_TIMEOUT', cls.DEFAULT_PROCESSING_TIMEOUT))
+
+    @classmethod
+    def _stale_before(cls):
+        return timezone.now() - timedelta(seconds=cls.processing_timeout())
+
+    @classmethod
+    def validate_envelope(cls, data: Any) -> Optional[str]:
+        """
+        入队前的轻量校验，只检查必填字段和基本类型，完整校验在worker中进行
+
+        Returns:
+            错误信息，通过时返回 None
+        """
+        if not isinstance(data, dict):
+            return '行程数据必须为JSON对象'
+        missing = [field for field in cls.ENVELOPE_FIELDS if not data.get(field)]
+        if missing:
+            return f'缺少必填字段: {", ".join(missing)}'
+        if not isinstance(data['requirement_id'], str):
+            return 'requirement_id 必须为字符串'
+        for field in ('destinations', 'daily_schedules'):
+            if field in data and not isinstance(data[field], list):
+                return f'{field} 必须为数组'
+        return None
+
+    @classmethod
+    def enqueue(cls, data: Dict[str, Any], request_id: Optional[str] = None) -> ItineraryIngestJob:
+        """
+        暂存行程数据并在事务提交后投递导入任务
+
+        Args:
+            data: 已去掉 output 外层的行程数据
+            request_id: X-Request-ID 请求头
+
+        Returns:
+            导入任务
+        """
+        job = ItineraryIngestJob.objects.create(
+            request_id=request_id,
+            requirement_id=data['requirement_id'].strip(),
+            payload=json.dumps(data, ensure_ascii=False),
+        )
+        transaction.on_commit(lambda: cls._submit(job.job_id))
+        logger.info(f'行程导入任务已入队: {job.job_id}, 需求ID: {job.requirement_id}')
+        return job
+
+    @classmethod
+    def _submit(cls, job_id, delay: int = 0):
+        """投递 django_q 任务，delay 大于0时使用一次性计划任务延迟执行"""
+        from django_q.tasks import async_task, schedule
+        from django_q.models import Schedule
+
+        if delay > 0:
+            schedule(
+                cls.TASK_FUNC, str(job_id),
+                name=f'itinerary_ingest_retry_{job_id}_{timezone.now():%H%M%S}',
+                schedule_type=Schedule.ONCE,
+                next_run=timezone.now() + timedelta(seconds=delay),
+            )
+        else:
+            async_task(cls.TASK_FUNC, str(job_id), group=cls.TASK_GROUP)
+
+    @classmethod
+    def materialize(cls, job_id) -> Tuple[bool, Optional[str], Optional[str]]:
+        """
+        执行导入任务：完整校验并创建行程
+
+        Returns:
+            (是否成功, itinerary_id, 错误信息)
+        """
+        with transaction.atomic():
+            job = ItineraryIngestJob.objects.select_for_update().filter(job_id=job_id).first()
+            if job is None:
+                return False, None, f'导入任务不存在: {job_id}'
+            if job.status == ItineraryIngestJob.Status.SUCCEEDED:
+                return True, job.itinerary_id, None
+            # 行锁在创建行程前释放，django_q 重复投递时另一个worker可能仍在处理，跳过避免生成重复行程
+            if (job.status == ItineraryIngestJob.Status.PROCESSING
+                    and job.started_at and job.started_at > cls._stale_before()):
+                logger.warning(f'行程导入任务正在处理中，跳过重复执行: {job.job_id}')
+                return False, None, f'导入任务正在处理中: {job_id}'
+            job.status = ItineraryIngestJob.Status.PROCESSING
+            job.attempts += 1
+            job.started_at = timezone.now()
+            job.save(update_fields=['status', 'attempts', 'started_at', 'updated_at'])
+
+        retryable = False
+        try:
+            success, itinerary_id, error_msg, retryable = cls._create_from_payload(job.payload)
+        except Exception as e:
+            logger.error(f'行程导入任务异常: {job.job_id}, {e}', exc_info=True)
+            success, itinerary_id, error_msg, retryable = False, None, f'处理数据失败: {str(e)}', True
+
+        job.finished_at = timezone.now()
+        if success:
+            job.status = ItineraryIngestJob.Status.SUCCEEDED
+            job.itinerary_id = itinerary_id
+            job.last_error = None
+            job.save(update_fields=['status', 'itinerary_id', 'last_error', 'finished_at', 'updated_at'])
+            logger.info(f'行程导入任务完成: {job.job_id}, 行程ID: {itinerary_id}')
+            return True, itinerary_id, None
+
+        job.status = ItineraryIngestJob.Status.FAILED
+        job.last_error = error_msg
+        job.save(update_fields=['status', 'last_error', 'finished_at', 'updated_at'])
+        logger.error(f'行程导入任务失败: {job.job_id}, 第{job.attempts}次, {error_msg}')
+
+        if retryable and job.attempts < cls.max_attempts():
+            delay = cls.retry_delay(job.attempts)
+            cls._submit(job.job_id, delay=delay)
+            logger.info(f'行程导入任务将在{delay}秒后重试: {job.job_id}')
+        return False, None, error_msg
+
+    @classmethod
+    def _create_from_payload(cls, payload: str) -> Tuple[bool, Optional[str], Optional[str], bool]:
+        """
+        与同步webhook相同的校验和创建流程
+
+        Returns:
+            (是否成功, itinerary_id, 错误信息, 是否可重试)
+        """
+        data = json.loads(payload)
+        if isinstance(data.get('id_map'), dict):
+            data = PromptContextService.expand_ids(data, data.pop('id_map'))
+
+        serializer = ItineraryWebhookSerializer(data=data)
+        if not serializer.is_valid():
+            return False, None, f'数据验证失败: {json.dumps(serializer.errors, ensure_ascii=False)}', False
+
+        validated_data = serializer.validated_data
+        valid, requirement, error_msg = ItineraryService.validate_requirement_exists(validated_data.get('requirement_id'))
+        if not valid:
+            return False, None, error_msg, False
+
+        success, itinerary, error_msg = ItineraryService.create_itinerary(validated_data, requirement)
+        if not success:
+            return False, None, error_msg, True
+        return True, itinerary.itinerary_id, None, False
+
+    @classmethod
+    def retry(cls, job: ItineraryIngestJob) -> bool:
+        """
+        手动重试失败或处理超时的任务
+
+        Returns:
+            是否已重新入队
+        """
+        retryable = Q(status=ItineraryIngestJob.Status.FAILED) | Q(
+            status=ItineraryIngestJob.Status.PROCESSING, started_at__lt=cls._stale_before(),
+        )
+        now = timezone.now()
+        if not ItineraryIngestJob.objects.filter(retryable, job_id=job.job_id).update(
+            status=ItineraryIngestJob.Status.PENDING, updated_at=now,
+        ):
+            return False
+        job.status = ItineraryIngestJob.Status.PENDING
+        job.updated_at = now
+        transaction.on_commit(lambda: cls._submit(job.job_id))
+        return True
+
+    @classmethod
+    def get_status(cls, job_id) -> Optional[Dict[str, Any]]:
+        """查询任务状态，任务不存在时返回 None"""
+        job = ItineraryIngestJob.objects.filter(job_id=job_id).defer('payload').first()
+        if job is None:
+            return None
+        return {
+            'job_id': str(job.job_id),
+            'status': job.status,
+            'requirement_id': job.requirement_id,
+            'itinerary_id': job.itinerary_id,
+            'attempts': job.attempts,
+            'error': job.last_error,
+            'created_at': job.created_at.isoformat(),
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        }
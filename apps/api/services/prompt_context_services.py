@@ -0,0 +1,309 @@
+"""
+LLM 提示词目录上下文服务
+将景点、酒店、餐厅记录压缩为按 token 预算截断的紧凑表格：短 ID、缩写枚举、截断的特色描述、去重标签，
+供行程规划、优化和报价工作流复用
+"""
+import json
+import logging
+import math
+import re
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from apps.utils.entity_cache import current_entity_cache
+from apps.models.attraction import Attraction
+from apps.models.hotel import Hotel
+from apps.models.restaurant import Restaurant
+from apps.models.itinerary import Itinerary
+from apps.models.daily_schedule import DailySchedule
+from apps.models.requirement import Requirement
+from .candidate_services import CandidateSelectionService, _flatten_tags
+
+logger = logging.getLogger(__name__)
+
+CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    不依赖分词器估算文本 token 数
+
+    中日韩字符按每字 1 个 token 计，其余字符按每 4 个字符 1 个 token 计，结果向上取整，偏保守
+    """
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def _dumps(value: Any) -> str:
+    """紧凑 JSON 序列化"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _abbreviate(value: str) -> str:
+    """枚举值缩写：单词取前三个字母，多个单词取首字母，如 NATURAL -> NAT, FINE_DINING -> FD"""
+    parts = [p for p in value.split('_') if p]
+    if len(parts) > 1:
+        return ''.join(p[0] for p in parts)
+    return value[:3]
+
+
+def _enum_legend(choices: Iterable[Tuple[str, str]]) -> Dict[str, Tuple[str, str]]:
+    """构建枚举值 -> (缩写, 中文名) 映射，缩写冲突时使用原值"""
+    legend = {}
+    used = set()
+    for value, label in choices:
+        abbr = _abbreviate(value)
+        if abbr in used:
+            abbr = value
+        used.add(abbr)
+        legend[value] = (abbr, str(label))
+    return legend
+
+
+def _truncate(text: Any, limit: int) -> Optional[str]:
+    """截断文本，列表形式的特色描述先用顿号拼接"""
+    if not text:
+        return None
+    if isinstance(text, (list, tuple)):
+        text = '、'.join(str(t) for t in text if t)
+    elif isinstance(text, dict):
+        text = '、'.join(str(v) for v in text.values() if v)
+    text = re.sub(r'\s+', ' ', str(text)).strip()
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + '…'
+
+
+def _number(value) -> Optional[float]:
+    """Decimal 转为紧凑数值，整数不带小数点"""
+    if value is None:
+        return None
+    number = float(value)
+    return int(number) if number.is_integer() else round(number, 2)
+
+
+class PromptContextService:
+    """
+    提示词上下文服务类
+    处理目录记录压缩、token 估算和按类别预算截断
+    """
+
+    DEFAULT_TOKEN_BUDGET = 6000
+    DEFAULT_MAX_ITEMS = {'attractions': 40, 'hotels': 15, 'restaurants': 30}
+    DEFAULT_TEXT_LIMIT = 40
+    DEFAULT_MAX_TAGS = 4
+
+    # 各类别占总 token 预算的比例
+    CATEGORY_SHARES = {'attractions': 0.45, 'hotels': 0.25, 'restaurants': 0.3}
+    ID_PREFIXES = {'attractions': 'A', 'hotels': 'H', 'restaurants': 'R'}
+
+    ATTRACTION_CATEGORIES = _enum_legend(Attraction.ATTRACTION_CATEGORY_CHOICES)
+    HOTEL_TYPES = _enum_legend(Hotel.HotelType.choices)
+    RESTAURANT_TYPES = _enum_legend(Restaurant.RestaurantType.choices)
+
+    FIELDS = {
+        'attractions': ['id', 'name', 'city', 'cat', 'min', 'price', 'cur', 'score', 'tags', 'hl'],
+        'hotels': ['id', 'name', 'city', 'star', 'type', 'price', 'cur', 'score', 'tags'],
+        'restaurants': ['id', 'name', 'city', 'cuisine', 'type', 'price', 'score', 'tags'],
+    }
+
+    @classmethod
+    def token_budget(cls) -> int:
+        """上下文总 token 预算"""
+        return int(getattr(settings, 'PROMPT_CONTEXT_TOKEN_BUDGET', cls.DEFAULT_TOKEN_BUDGET))
+
+    @classmethod
+    def max_items(cls, category: str) -> int:
+        """每个类别的硬性条数上限"""
+        configured = getattr(settings, 'PROMPT_CONTEXT_MAX_ITEMS', cls.DEFAULT_MAX_ITEMS)
+        return int(configured.get(category, cls.DEFAULT_MAX_ITEMS[category]))
+
+    @classmethod
+    def build(cls, attractions: Iterable[Attraction] = (), hotels: Iterable[Hotel] = (),
+              restaurants: Iterable[Restaurant] = (), token_budget: Optional[int] = None) -> Dict[str, Any]:
+        """
+        构建紧凑上下文
+
+        记录按传入顺序视为优先级，每个类别在各自的 token 预算和条数上限内依次收录
+
+        Returns:
+            {'legend', 'attractions', 'hotels', 'restaurants', 'id_map', 'estimated_tokens', 'dropped'}
+            每个类别为 {'fields': [...], 'rows': [[...], ...]}，id_map 为短 ID 到原始 ID 的映射
+        """
+        budget = token_budget or cls.token_budget()
+        text_limit = int(getattr(settings, 'PROMPT_CONTEXT_TEXT_LIMIT', cls.DEFAULT_TEXT_LIMIT))
+        max_tags = int(getattr(settings, 'PROMPT_CONTEXT_MAX_TAGS', cls.DEFAULT_MAX_TAGS))
+
+        rows_by_category = {
+            'attractions': (cls._attraction_row(a, text_limit, max_tags) for a in attractions),
+            'hotels': (cls._hotel_row(h, max_tags) for h in hotels),
+            'restaurants': (cls._restaurant_row(r, max_tags) for r in restaurants),
+        }
+
+        context = {'legend': {}}
+        id_map = {}
+        dropped = {}
+        used_enums = set()
+        for category, rows in rows_by_category.items():
+            category_budget = int(budget * cls.CATEGORY_SHARES[category])
+            limit = cls.max_items(category)
+            prefix = cls.ID_PREFIXES[category]
+            kept = []
+            spent = estimate_tokens(_dumps(cls.FIELDS[category]))
+            skipped = 0
+            for original_id, row, enums in rows:
+                if len(kept) >= limit:
+                    skipped += 1
+                    continue
+                alias = f'{prefix}{len(kept) + 1}'
+                row[0] = alias
+                cost = estimate_tokens(_dumps(row)) + 1
+                if spent + cost > category_budget:
+                    skipped += 1
+                    continue
+                spent += cost
+                kept.append(row)
+                id_map[alias] = original_id
+                used_enums.update(enums)
+            context[category] = {'fields': cls.FIELDS[category], 'rows': kept}
+            if skipped:
+                dropped[category] = skipped
+
+        for legend in (cls.ATTRACTION_CATEGORIES, cls.HOTEL_TYPES, cls.RESTAURANT_TYPES):
+            for abbr, label in legend.values():
+                if abbr in used_enums:
+                    context['legend'][abbr] = label
+
+        context['id_map'] = id_map
+        context['dropped'] = dropped
+        context['estimated_tokens'] = cls.estimate(context)
+        return context
+
+    @classmethod
+    def estimate(cls, context: Dict[str, Any]) -> int:
+        """估算上下文发送给 LLM 部分（不含 id_map）的 token 数"""
+        return estimate_tokens(cls.to_prompt(context))
+
+    @classmethod
+    def to_prompt(cls, context: Dict[str, Any]) -> str:
+        """序列化为提示词中使用的紧凑 JSON 文本（不含 id_map）"""
+        payload = {key: value for key, value in context.items() if key not in ('id_map', 'estimated_tokens', 'dropped')}
+        return _dumps(payload)
+
+    @classmethod
+    def expand_ids(cls, data: Any, id_map: Dict[str, str], keys: Tuple[str, ...] = ('id_reference',)) -> Any:
+        """将 LLM 返回数据中的短 ID 还原为原始 ID，递归处理嵌套结构"""
+        if isinstance(data, dict):
+            return {
+                key: (id_map.get(value, value) if key in keys and isinstance(value, str) else cls.expand_ids(value, id_map, keys))
+                for key, value in data.items()
+            }
+        if isinstance(data, list):
+            return [cls.expand_ids(item, id_map, keys) for item in data]
+        return data
+
+    @classmethod
+    def for_requirement(cls, requirement: Requirement, token_budget: Optional[int] = None) -> Dict[str, Any]:
+        """按候选资源筛选结果的排序构建需求的规划上下文"""
+        candidates = CandidateSelectionService.select(requirement)
+        return cls.build(
+            attractions=cls._in_order(Attraction, [c['id'] for c in candidates['attractions']]),
+            hotels=cls._in_order(Hotel, [c['id'] for c in candidates['hotels']]),
+            restaurants=cls._in_order(Restaurant, [c['id'] for c in candidates['restaurants']]),
+            token_budget=token_budget,
+        )
+
+    @classmethod
+    def for_itinerary(cls, itinerary: Itinerary, token_budget: Optional[int] = None) -> Dict[str, Any]:
+        """构建行程已关联资源的上下文，供优化和报价工作流使用"""
+        schedules = DailySchedule.objects.filter(itinerary_id=itinerary).select_related(
+            'attraction_id', 'hotel_id', 'restaurant_id'
+        ).order_by('day_number', 'start_time')
+        attractions, hotels, restaurants = {}, {}, {}
+        for schedule in schedules:
+            if schedule.attraction_id is not None:
+                attractions.setdefault(schedule.attraction_id_id, schedule.attraction_id)
+            if schedule.hotel_id is not None:
+                hotels.setdefault(schedule.hotel_id_id, schedule.hotel_id)
+            if schedule.restaurant_id is not None:
+                restaurants.setdefault(schedule.restaurant_id_id, schedule.restaurant_id)
+        return cls.build(attractions.values(), hotels.values(), restaurants.values(), token_budget=token_budget)
+
+    @staticmethod
+    def _in_order(model, ids: List[str]) -> List[Any]:
+        """按给定 ID 顺序批量加载记录，同一作用域内已加载的记录不再查询"""
+        records = current_entity_cache().get_many(model, ids)
+        return [records[pk] for pk in map(model._meta.pk.to_python, ids) if pk in records]
+
+    @staticmethod
+    def _tags(value: Any, max_tags: int) -> List[str]:
+        """标签去重（忽略大小写和首尾空白）并限制数量"""
+        seen = set()
+        tags = []
+        for tag in sorted(_flatten_tags(value)):
+            normalized = tag.strip().lower()
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                tags.append(tag.strip())
+        return tags[:max_tags]
+
+    @classmethod
+    def _enum(cls, legend: Dict[str, Tuple[str, str]], value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        return legend.get(value, (value, value))[0]
+
+    @classmethod
+    def _attraction_row(cls, attraction: Attraction, text_limit: int, max_tags: int):
+        category = cls._enum(cls.ATTRACTION_CATEGORIES, attraction.category)
+        row = [
+            None,
+            attraction.attraction_name,
+            attraction.city_name,
+            category,
+            attraction.recommended_duration,
+            _number(attraction.ticket_price),
+            attraction.currency,
+            _number(attraction.popularity_score),
+            cls._tags(attraction.tags, max_tags),
+            _truncate(attraction.highlights or attraction.description, text_limit),
+        ]
+        return str(attraction.attraction_id), row, {category}
+
+    @classmethod
+    def _hotel_row(cls, hotel: Hotel, max_tags: int):
+        hotel_type = cls._enum(cls.HOTEL_TYPES, hotel.hotel_type)
+        if hotel.min_price is not None and hotel.max_price is not None and hotel.min_price != hotel.max_price:
+            price = f'{_number(hotel.min_price)}-{_number(hotel.max_price)}'
+        else:
+            price = _number(hotel.min_price if hotel.min_price is not None else hotel.max_price)
+        row = [
+            None,
+            hotel.hotel_name,
+            hotel.city_name,
+            hotel.hotel_star,
+            hotel_type,
+            price,
+            hotel.currency,
+            _number(hotel.guest_rating or hotel.popularity_score),
+            cls._tags(hotel.tags, max_tags),
+        ]
+        return str(hotel.hotel_id), row, {hotel_type}
+
+    @classmethod
+    def _restaurant_row(cls, restaurant: Restaurant, max_tags: int):
+        restaurant_type = cls._enum(cls.RESTAURANT_TYPES, restaurant.restaurant_type)
+        row = [
+            None,
+            restaurant.restaurant_name,
+            restaurant.city_name,
+            restaurant.cuisine_type,
+            restaurant_type,
+            _number(restaurant.avg_price_per_person) or restaurant.price_range,
+            _number(restaurant.food_rating or restaurant.popularity_score),
+            cls._tags(restaurant.tags, max_tags),
+        ]
+        return str(restaurant.restaurant_id), row, {restaurant_type}
@@ -0,0 +1,324 @@
+"""
+只读查询网关服务
+对大模型生成的SQL做解析和白名单校验，强制行数上限和执行超时，
+并按查询指纹缓存结果，目录表数据变化时缓存自动失效
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import sqlparse
+from sqlparse import tokens as T
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, Max
+
+logger = logging.getLogger(__name__)
+
+
+_LIMIT_TAIL = re.compile(r'\bLIMIT\s+(\d+)\s*(?:,\s*(\d+)|OFFSET\s+(\d+))?$', re.IGNORECASE)
+
+# FROM 子句在遇到这些关键字时结束
+_FROM_END_KEYWORDS = {
+    'WHERE', 'GROUP BY', 'HAVING', 'ORDER BY', 'LIMIT', 'UNION', 'UNION ALL',
+    'EXCEPT', 'INTERSECT', 'WINDOW', 'SELECT',
+}
+
+
+class QueryGatewayService:
+    """
+    只读查询网关服务类
+    处理SQL校验、LIMIT与超时注入、结果缓存和目录版本计算
+    """
+
+    DEFAULT_TABLES = ['attractions', 'hotels', 'restaurants', 'destinations', 'currency_rates']
+    DEFAULT_MAX_ROWS = 200
+    DEFAULT_MAX_STATEMENT_TIME = 5
+    DEFAULT_CACHE_TTL = 300
+    DEFAULT_DATABASE = 'default'
+    VERSION_TTL = 5
+    CACHE_KEY_PREFIX = 'query_gateway'
+
+    BLOCKED_SCHEMAS = {'INFORMATION_SCHEMA', 'MYSQL', 'PERFORMANCE_SCHEMA', 'SYS'}
+    BLOCKED_FUNCTIONS = {'SLEEP', 'BENCHMARK', 'LOAD_FILE', 'GET_LOCK', 'RELEASE_LOCK', 'IS_FREE_LOCK'}
+    BLOCKED_KEYWORDS = {'INTO', 'LOCK', 'OUTFILE', 'DUMPFILE', 'PROCEDURE', 'HANDLER'}
+    # MySQL 8 的 TABLE t / VALUES ROW(...) 语句可以出现在 UNION 和子查询中，不经过 FROM，无法校验表名
+    BLOCKED_STATEMENTS = {'TABLE', 'VALUES'}
+
+    _lock = threading.Lock()
+    _table_versions: Dict[str, Tuple[float, Tuple]] = {}
+
+    @classmethod
+    def allowed_tables(cls) -> List[str]:
+        """允许查询的目录表"""
+        return [table.lower() for table in getattr(settings, 'QUERY_GATEWAY_TABLES', cls.DEFAULT_TABLES)]
+
+    @classmethod
+    def max_rows(cls) -> int:
+        """单次查询返回行数上限"""
+        return int(getattr(settings, 'QUERY_GATEWAY_MAX_ROWS', cls.DEFAULT_MAX_ROWS))
+
+    @classmethod
+    def max_statement_time(cls) -> float:
+        """单条语句最长执行时间（秒）"""
+        return float(getattr(settings, 'QUERY_GATEWAY_MAX_STATEMENT_TIME', cls.DEFAULT_MAX_STATEMENT_TIME))
+
+    @classmethod
+    def cache_ttl(cls) -> int:
+        """查询结果缓存有效期（秒）"""
+        return int(getattr(settings, 'QUERY_GATEWAY_CACHE_TTL', cls.DEFAULT_CACHE_TTL))
+
+    @classmethod
+    def database(cls) -> str:
+        """执行查询使用的数据库别名，可指向只读账号"""
+        return getattr(settings, 'QUERY_GATEWAY_DATABASE', cls.DEFAULT_DATABASE)
+
+    @classmethod
+    def normalize(cls, sql: str) -> str:
+        """去掉注释和多余空白、关键字大写、去掉结尾分号"""
+        formatted = sqlparse.format(sql or '', strip_comments=True, keyword_case='upper')
+        return ' '.join(formatted.split()).rstrip(';').strip()
+
+    @classmethod
+    def fingerprint(cls, sql: str) -> str:
+        """查询指纹：对规范化后的SQL取哈希"""
+        return hashlib.sha1(sql.encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def prepare(cls, sql: str) -> Tuple[bool, Optional[Dict[str, Any]], Optional[str]]:
+        """
+        校验SQL并改写为实际执行的语句
+
+        Args:
+            sql: 原始SQL
+
+        Returns:
+            (是否通过, {'sql', 'tables', 'limit', 'fingerprint'}, 错误信息)
+        """
+        normalized = cls.normalize(sql)
+        if not normalized:
+            return False, None, 'SQL不能为空'
+
+        statements = [statement for statement in sqlparse.parse(normalized) if str(statement).strip(' ;')]
+        if len(statements) != 1:
+            return False, None, '只允许单条SQL语句'
+        statement = statements[0]
+
+        first = statement.token_first(skip_cm=True)
+        if first is None or first.ttype is not T.DML or first.normalized != 'SELECT':
+            return False, None, '只允许SELECT查询'
+
+        tokens = [token for token in statement.flatten() if not token.is_whitespace and token.ttype not in T.Comment]
+        error = cls._check_tokens(tokens)
+        if error:
+            return False, None, error
+
+        tables, error = cls._referenced_tables(tokens)
+        if error:
+            return False, None, error
+        if not tables:
+            return False, None, '查询必须引用目录表'
+        allowed = set(cls.allowed_tables())
+        denied = sorted(tables - allowed)
+        if denied:
+            return False, None, f'不允许查询的表: {", ".join(denied)}'
+
+        rewritten, limit, error = cls._enforce_limit(normalized, statement)
+        if error:
+            return False, None, error
+
+        return True, {
+            'sql': rewritten,
+            'tables': sorted(tables),
+            'limit': limit,
+            'fingerprint': cls.fingerprint(rewritten),
+        }, None
+
+    @classmethod
+    def _check_tokens(cls, tokens) -> Optional[str]:
+        """拒绝写操作、导出、加锁和阻塞函数"""
+        for index, token in enumerate(tokens):
+            if token.ttype in T.String:
+                continue
+            value = token.value.strip('`').upper()
+            if token.ttype is T.DML and value != 'SELECT':
+                return f'不允许的操作: {value}'
+            if token.ttype is T.DDL or token.ttype is T.Keyword.CTE:
+                return f'不允许的操作: {value}'
+            if value in cls.BLOCKED_KEYWORDS:
+                return f'不允许的子句: {value}'
+            if token.is_keyword and value in cls.BLOCKED_STATEMENTS:
+                return f'不允许的语句: {value}'
+            if value in cls.BLOCKED_SCHEMAS:
+                return f'不允许访问系统库: {value}'
+            if value in cls.BLOCKED_FUNCTIONS:
+                following = tokens[index + 1] if index + 1 < len(tokens) else None
+                if following is not None and following.match(T.Punctuation, '('):
+                    return f'不允许的函数: {value}'
+        return None
+
+    @classmethod
+    def _referenced_tables(cls, tokens) -> Tuple[set, Optional[str]]:
+        """从FROM/JOIN子句中提取表名，子查询按括号层级分别处理"""
+        tables = set()
+        depth = 0
+        in_from = {0: False}
+        expect_table = False
+        for index, token in enumerate(tokens):
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            if expect_table:
+                # 表名位置只允许表名、子查询或带括号的表/连接，其他写法（关键字形式的表名等）无法校验，直接拒绝
+                if token.match(T.Punctuation, '('):
+                    depth += 1
+                    subquery = following is not None and following.ttype is T.DML
+                    in_from[depth] = not subquery
+                    expect_table = not subquery
+                    continue
+                if token.ttype not in T.Name:
+                    return tables, f'无法识别的表名: {token.value}'
+            if token.match(T.Punctuation, '('):
+                depth += 1
+                in_from[depth] = False
+                expect_table = False
+                continue
+            if token.match(T.Punctuation, ')'):
+                in_from.pop(depth, None)
+                depth = max(depth - 1, 0)
+                continue
+            if token.match(T.Punctuation, ','):
+                expect_table = in_from.get(depth, False)
+                continue
+            if token.is_keyword:
+                keyword = ' '.join(token.normalized.split())
+                if keyword == 'FROM' or keyword.endswith('JOIN'):
+                    in_from[depth] = True
+                    expect_table = True
+                elif keyword in _FROM_END_KEYWORDS or token.ttype is T.DML:
+                    in_from[depth] = False
+                    expect_table = False
+                continue
+            if expect_table and token.ttype in T.Name:
+                if following is not None and following.match(T.Punctuation, '.'):
+                    return tables, '表名不允许带库名前缀'
+                tables.add(token.value.strip('`').lower())
+                expect_table = False
+        return tables, None
+
+    @classmethod
+    def _enforce_limit(cls, sql: str, statement) -> Tuple[str, int, Optional[str]]:
+        """补充或收紧最外层LIMIT"""
+        max_rows = cls.max_rows()
+        has_limit = any(token.is_keyword and token.normalized == 'LIMIT' for token in statement.tokens)
+        match = _LIMIT_TAIL.search(sql)
+        if not has_limit:
+            return f'{sql} LIMIT {max_rows}', max_rows, None
+        if match is None:
+            return sql, 0, 'LIMIT只支持数字常量'
+
+        if match.group(2) is not None:
+            offset, count = int(match.group(1)), int(match.group(2))
+        else:
+            count, offset = int(match.group(1)), int(match.group(3) or 0)
+        count = min(count, max_rows)
+        clause = f'LIMIT {count}' + (f' OFFSET {offset}' if offset else '')
+        return f'{sql[:match.start()]}{clause}', count, None
+
+    @classmethod
+    def _with_timeout(cls, sql: str, connection) -> str:
+        """按数据库类型注入语句级超时"""
+        seconds = cls.max_statement_time()
+        if connection.vendor != 'mysql' or seconds <= 0:
+            return sql
+        if connection.mysql_is_mariadb:
+            return f'SET STATEMENT max_statement_time={seconds:g} FOR {sql}'
+        return re.sub(r'^SELECT\b', f'SELECT /*+ MAX_EXECUTION_TIME({int(seconds * 1000)}) */', sql, count=1)
+
+    @classmethod
+    def catalog_version(cls, tables: List[str]) -> str:
+        """
+        计算所引用目录表的数据版本，短时间内复用进程内结果
+
+        Args:
+            tables: 表名列表
+
+        Returns:
+            版本哈希
+        """
+        now = time.monotonic()
+        models = {model._meta.db_table: model for model in django_apps.get_app_config('apps').get_models()}
+        parts = []
+        for table in sorted(tables):
+            with cls._lock:
+                cached = cls._table_versions.get(table)
+            if cached is None or now - cached[0] > cls.VERSION_TTL:
+                model = models.get(table)
+                if model is None:
+                    version = ('unknown',)
+                else:
+                    stats = model.objects.using(cls.database()).aggregate(count=Count('pk'), updated=Max('updated_at'))
+                    version = (stats['count'], str(stats['updated']))
+                with cls._lock:
+                    cls._table_versions[table] = (now, version)
+            else:
+                version = cached[1]
+            parts.append(f'{table}:{version}')
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+    @classmethod
+    def invalidate(cls):
+        """清空目录版本缓存，下次查询重新计算"""
+        with cls._lock:
+            cls._table_versions.clear()
+
+    @classmethod
+    def execute(cls, sql: str, use_cache: bool = True) -> Tuple[bool, Optional[Dict[str, Any]], Optional[str]]:
+        """
+        校验并执行只读查询
+
+        Args:
+            sql: 原始SQL
+            use_cache: 是否读取结果缓存
+
+        Returns:
+            (是否成功, {'columns', 'rows', 'row_count', 'truncated', 'fingerprint', 'sql', 'cached'}, 错误信息)
+        """
+        success, prepared, error = cls.prepare(sql)
+        if not success:
+            logger.warning(f"查询被拒绝: {error}, SQL: {sql[:200]}")
+            return False, None, error
+
+        version = cls.catalog_version(prepared['tables'])
+        cache_key = f"{cls.CACHE_KEY_PREFIX}:{version}:{prepared['fingerprint']}"
+        if use_cache:
+            result = cache.get(cache_key)
+            if result is not None:
+                return True, {**result, 'cached': True}, None
+
+        connection = connections[cls.database()]
+        started = time.monotonic()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(cls._with_timeout(prepared['sql'], connection))
+                columns = [column[0] for column in cursor.description]
+                rows = [list(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"查询执行失败: {prepared['fingerprint']}, {str(e)}")
+            return False, None, f'查询执行失败: {str(e)}'
+
+        result = {
+            'columns': columns,
+            'rows': rows,
+            'row_count': len(rows),
+            'truncated': len(rows) >= prepared['limit'],
+            'fingerprint': prepared['fingerprint'],
+            'sql': prepared['sql'],
+        }
+        cache.set(cache_key, result, cls.cache_ttl())
+        logger.info(f"查询完成: {prepared['fingerprint']}, {len(rows)} 行, "
+                    f"耗时 {(time.monotonic() - started) * 1000:.1f}ms")
+        return True, {**result, 'cached': False}, None
@@ -0,0 +1,274 @@
+"""
+行程报价计算服务
+基于景点门票、酒店房价、餐厅人均消费、活动预估费用和出行人员统计，
+在进程内计算结构化报价明细，n8n 报价工作流只需负责文案润色
+"""
+import logging
+import math
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Any, List, Optional
+
+from django.conf import settings
+
+from apps.models.itinerary import Itinerary
+from apps.models.daily_schedule import DailySchedule
+from .distance_services import DistanceMatrixService
+from .currency_services import CurrencyService
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+
+
+def _money(value: Decimal) -> float:
+    """金额保留两位小数并转换为可 JSON 序列化的数值"""
+    return float(value.quantize(CENT, rounding=ROUND_HALF_UP))
+
+
+class QuoteEngineService:
+    """
+    报价计算服务类
+    处理行程费用明细计算和按币种汇总
+    """
+
+    DEFAULT_AGE_BAND_MULTIPLIERS = {'adult': 1.0, 'senior': 0.8, 'child': 0.5, 'infant': 0.0}
+    DEFAULT_GUESTS_PER_ROOM = 2
+    DEFAULT_MEAL_PRICE_BY_RANGE = {'$': 50, '$$': 120, '$$$': 300, '$$$$': 600}
+    DEFAULT_CURRENCY = 'CNY'
+
+    AGE_BANDS = ('adult', 'senior', 'child', 'infant')
+
+    @classmethod
+    def age_band_multipliers(cls) -> Dict[str, Decimal]:
+        """各年龄段计价系数"""
+        configured = getattr(settings, 'QUOTE_AGE_BAND_MULTIPLIERS', cls.DEFAULT_AGE_BAND_MULTIPLIERS)
+        return {
+            band: Decimal(str(configured.get(band, cls.DEFAULT_AGE_BAND_MULTIPLIERS[band])))
+            for band in cls.AGE_BANDS
+        }
+
+    @classmethod
+    def guests_per_room(cls) -> int:
+        """每间客房入住人数"""
+        return max(1, int(getattr(settings, 'QUOTE_GUESTS_PER_ROOM', cls.DEFAULT_GUESTS_PER_ROOM)))
+
+    @classmethod
+    def meal_price_by_range(cls) -> Dict[str, Decimal]:
+        """按餐厅价格范围估算的人均消费"""
+        configured = getattr(settings, 'QUOTE_MEAL_PRICE_BY_RANGE', cls.DEFAULT_MEAL_PRICE_BY_RANGE)
+        return {key: Decimal(str(value)) for key, value in configured.items()}
+
+    @classmethod
+    def get_travelers(cls, itinerary: Itinerary) -> Dict[str, int]:
+        """汇总行程的出行人数，按年龄段统计"""
+        travelers = {band: 0 for band in cls.AGE_BANDS}
+        for stat in itinerary.traveler_stats.all():
+            travelers['adult'] += stat.adult_count or 0
+            travelers['senior'] += stat.senior_count or 0
+            travelers['child'] += stat.child_count or 0
+            travelers['infant'] += stat.infant_count or 0
+        return travelers
+
+    @classmethod
+    def weighted_heads(cls, travelers: Dict[str, int], multipliers: Optional[Dict[str, Decimal]] = None) -> Decimal:
+        """按年龄段系数折算的计价人数"""
+        multipliers = multipliers or cls.age_band_multipliers()
+        return sum((multipliers[band] * travelers[band] for band in cls.AGE_BANDS), Decimal('0'))
+
+    @classmethod
+    def room_count(cls, travelers: Dict[str, int]) -> int:
+        """所需客房数，婴儿不单独占床"""
+        guests = travelers['adult'] + travelers['senior'] + travelers['child']
+        return math.ceil(guests / cls.guests_per_room()) if guests else 0
+
+    @classmethod
+    def calculate(cls, itinerary: Itinerary, currency: Optional[str] = None) -> Dict[str, Any]:
+        """
+        计算行程报价
+
+        计价规则：
+            - 景点：门票价格 × 折算人数
+            - 酒店：最低/最高房价 × 客房数 × 目的地住宿晚数，同一目的地同一酒店只计一次
+            - 餐饮：餐厅人均价格（缺失时按价格范围估算）× 折算人数
+            - 其他活动：使用活动预估费用，视为团体总价
+          关联资源缺少价格时回退到活动预估费用
+
+        Args:
+            itinerary: 行程对象
+            currency: 换算汇总的目标货币，默认基准货币
+
+        Returns:
+            {'itinerary_id', 'travelers', 'weighted_heads', 'rooms', 'line_items', 'totals',
+             'converted_total', 'budget', 'warnings'}
+        """
+        travelers = cls.get_travelers(itinerary)
+        multipliers = cls.age_band_multipliers()
+        heads = cls.weighted_heads(travelers, multipliers)
+        rooms = cls.room_count(travelers)
+        meal_prices = cls.meal_price_by_range()
+        nights_by_destination = {
+            dest.destination_id: dest.nights for dest in itinerary.destinations.all()
+        }
+
+        line_items = []
+        warnings = []
+        seen_hotels = set()
+
+        for schedule in DistanceMatrixService.get_schedules(itinerary):
+            if schedule.hotel_id is not None:
+                destination_id = schedule.destination_id_id
+                key = (schedule.hotel_id_id, destination_id)
+                if key in seen_hotels:
+                    continue
+                seen_hotels.add(key)
+                item = cls._hotel_item(schedule, rooms, nights_by_destination.get(destination_id))
+            elif schedule.attraction_id is not None:
+                item = cls._per_head_item(
+                    schedule, 'attraction', schedule.attraction_id.attraction_name,
+                    schedule.attraction_id.ticket_price, schedule.attraction_id.currency, heads
+                )
+            elif schedule.restaurant_id is not None:
+                restaurant = schedule.restaurant_id
+                price = restaurant.avg_price_per_person
+                source = 'catalog'
+                if price is None and restaurant.price_range in meal_prices:
+                    price = meal_prices[restaurant.price_range]
+                    source = 'price_range'
+                item = cls._per_head_item(
+                    schedule, 'meal', restaurant.restaurant_name, price, schedule.currency, heads, source
+                )
+            else:
+                item = cls._estimated_item(schedule)
+
+            if item is None:
+                if schedule.activity_type in (DailySchedule.ActivityType.ATTRACTION, DailySchedule.ActivityType.MEAL,
+                                              DailySchedule.ActivityType.CHECK_IN):
+                    warnings.append(f'第{schedule.day_number}天"{schedule.activity_title}"缺少价格信息，未计入报价')
+                continue
+            line_items.append(item)
+
+        return {
+            'itinerary_id': itinerary.itinerary_id,
+            'travelers': travelers,
+            'age_band_multipliers': {band: float(value) for band, value in multipliers.items()},
+            'weighted_heads': float(heads),
+            'rooms': rooms,
+            'line_items': [cls._serialize_item(item) for item in line_items],
+            'totals': cls._totals(line_items),
+            **cls._converted_total(itinerary, line_items, currency, warnings),
+            'warnings': warnings,
+        }
+
+    @classmethod
+    def _converted_total(cls, itinerary: Itinerary, line_items: List[Dict[str, Any]], currency: Optional[str],
+                         warnings: List[str]) -> Dict[str, Any]:
+        """
+        将多币种明细换算为目标货币总额，并与行程总预算（按基准货币计）比较
+        """
+        currencies = [item['currency'] for item in line_items]
+        low = CurrencyService.summarize([item['amount_low'] for item in line_items], currencies, currency)
+        high = CurrencyService.summarize([item['amount_high'] for item in line_items], currencies, currency)
+        if low['missing_currencies']:
+            warnings.append(f"缺少汇率: {', '.join(low['missing_currencies'])}，对应费用未计入换算总额")
+
+        budget = None
+        if itinerary.total_budget is not None:
+            budget_amount = float(itinerary.total_budget)
+            if low['currency'] != CurrencyService.base_currency():
+                converted = CurrencyService.convert(itinerary.total_budget, CurrencyService.base_currency(), low['currency'])
+                budget_amount = float(converted) if converted is not None else None
+            if budget_amount is not None:
+                budget = {
+                    'total_budget': budget_amount,
+                    'within_budget': high['total'] <= budget_amount,
+                    'remaining_low': round(budget_amount - low['total'], 2),
+                    'remaining_high': round(budget_amount - high['total'], 2),
+                }
+
+        return {
+            'converted_total': {
+                'currency': low['currency'],
+                'low': low['total'],
+                'high': high['total'],
+                'missing_currencies': low['missing_currencies'],
+            },
+            'budget': budget,
+        }
+
+    @classmethod
+    def _hotel_item(cls, schedule: DailySchedule, rooms: int, nights: Optional[int]) -> Optional[Dict[str, Any]]:
+        """酒店费用，按房价区间计算"""
+        hotel = schedule.hotel_id
+        low = hotel.min_price if hotel.min_price is not None else hotel.max_price
+        high = hotel.max_price if hotel.max_price is not None else hotel.min_price
+        if low is None:
+            return cls._estimated_item(schedule)
+        quantity = Decimal(rooms * (nights or 1))
+        return cls._item(schedule, 'hotel', hotel.hotel_name, hotel.currency, low, high, quantity, 'catalog')
+
+    @classmethod
+    def _per_head_item(cls, schedule: DailySchedule, category: str, name: str, price: Optional[Decimal],
+                       currency: Optional[str], heads: Decimal, source: str = 'catalog') -> Optional[Dict[str, Any]]:
+        """按人计价的费用（门票、餐饮）"""
+        if price is None:
+            return cls._estimated_item(schedule, category)
+        return cls._item(schedule, category, name, currency, price, price, heads, source)
+
+    @classmethod
+    def _estimated_item(cls, schedule: DailySchedule, category: str = 'other') -> Optional[Dict[str, Any]]:
+        """使用活动预估费用，视为团体总价"""
+        if schedule.estimated_cost is None:
+            return None
+        cost = schedule.estimated_cost
+        return cls._item(schedule, category, schedule.activity_title, schedule.currency, cost, cost,
+                         Decimal('1'), 'estimated_cost')
+
+    @classmethod
+    def _item(cls, schedule: DailySchedule, category: str, name: str, currency: Optional[str],
+              unit_low: Decimal, unit_high: Decimal, quantity: Decimal, source: str) -> Dict[str, Any]:
+        """构建费用明细"""
+        return {
+            'category': category,
+            'schedule_id': str(schedule.schedule_id),
+            'day_number': schedule.day_number,
+            'name': name,
+            'currency': currency or cls.DEFAULT_CURRENCY,
+            'unit_price_low': Decimal(unit_low),
+            'unit_price_high': Decimal(unit_high),
+            'quantity': quantity,
+            'amount_low': Decimal(unit_low) * quantity,
+            'amount_high': Decimal(unit_high) * quantity,
+            'source': source,
+        }
+
+    @classmethod
+    def _serialize_item(cls, item: Dict[str, Any]) -> Dict[str, Any]:
+        """将明细中的 Decimal 转换为数值"""
+        serialized = dict(item)
+        for key in ('unit_price_low', 'unit_price_high', 'amount_low', 'amount_high'):
+            serialized[key] = _money(item[key])
+        serialized['quantity'] = float(item['quantity'])
+        return serialized
+
+    @classmethod
+    def _totals(cls, line_items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """按币种汇总报价区间及分类小计"""
+        totals: Dict[str, Dict[str, Any]] = {}
+        for item in line_items:
+            bucket = totals.setdefault(item['currency'], {'low': Decimal('0'), 'high': Decimal('0'), 'by_category': {}})
+            bucket['low'] += item['amount_low']
+            bucket['high'] += item['amount_high']
+            low, high = bucket['by_category'].get(item['category'], (Decimal('0'), Decimal('0')))
+            bucket['by_category'][item['category']] = (low + item['amount_low'], high + item['amount_high'])
+
+        return {
+            currency: {
+                'low': _money(bucket['low']),
+                'high': _money(bucket['high']),
+                'by_category': {
+                    category: {'low': _money(low), 'high': _money(high)}
+                    for category, (low, high) in bucket['by_category'].items()
+                },
+            }
+            for currency, bucket in totals.items()
+        }
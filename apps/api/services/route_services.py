@@ -0,0 +1,348 @@
+"""
+每日行程路线优化服务
+在固定锚点（入住/退房、航班/火车、交通、用餐）之间重新排列可调整的活动，
+使用最近邻 + 2-opt 缩短当日交通距离，并结合景点开放时间和建议游玩时长重新计算起止时间
+"""
+import logging
+import math
+import re
+from datetime import date, time
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from django.db import transaction
+
+from apps.models.itinerary import Itinerary
+from apps.models.daily_schedule import DailySchedule
+from .distance_services import DistanceMatrixService, distance_matrix_km, _minutes_of
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+WEEKDAY_CHARS = {'一': 0, '二': 1, '三': 2, '四': 3, '五': 4, '六': 5, '日': 6, '天': 6}
+TIME_RANGE_PATTERN = re.compile(r'(\d{1,2})[:：](\d{2})\s*[-~～至到]\s*(\d{1,2})[:：](\d{2})')
+WEEKDAY_RANGE_PATTERN = re.compile(r'(?:周|星期)([一二三四五六日天])(?:\s*[至到\-~～]\s*(?:周|星期)?([一二三四五六日天]))?')
+
+
+def parse_opening_hours(opening_hours: Any, weekday: int) -> Optional[Tuple[int, int]]:
+    """
+    解析景点开放时间，返回指定星期的开放时段（当日分钟数）
+
+    支持的格式：
+        - {"周一至周五": "09:00-17:00", "周六至周日": "08:30-17:30"}
+        - {"每天": "09:00-17:00"} 或 "09:00-17:00"
+
+    Args:
+        opening_hours: Attraction.opening_hours 字段值
+        weekday: 星期几，0 表示周一
+
+    Returns:
+        (开门分钟, 关门分钟)，无法解析时返回 None 表示不限制
+    """
+    if not opening_hours:
+        return None
+
+    if isinstance(opening_hours, dict):
+        fallback = None
+        for key, value in opening_hours.items():
+            window = _parse_time_range(str(value))
+            if window is None:
+                continue
+            days = _parse_weekdays(str(key))
+            if days is None:
+                fallback = fallback or window
+            elif weekday in days:
+                return window
+        return fallback
+
+    return _parse_time_range(str(opening_hours))
+
+
+def _parse_time_range(text: str) -> Optional[Tuple[int, int]]:
+    """解析 HH:MM-HH:MM 格式的时间段"""
+    match = TIME_RANGE_PATTERN.search(text)
+    if not match:
+        return None
+    open_h, open_m, close_h, close_m = (int(v) for v in match.groups())
+    opens = open_h * 60 + open_m
+    closes = close_h * 60 + close_m
+    if closes <= opens:
+        # 跨午夜营业，按当日结束处理
+        closes = MINUTES_PER_DAY
+    return opens, closes
+
+
+def _parse_weekdays(text: str) -> Optional[set]:
+    """解析星期描述，无法识别（如“每天”）时返回 None 表示适用于所有日期"""
+    days = set()
+    for first, last in WEEKDAY_RANGE_PATTERN.findall(text):
+        start = WEEKDAY_CHARS[first]
+        end = WEEKDAY_CHARS[last] if last else start
+        if end < start:
+            end += 7
+        days.update(day % 7 for day in range(start, end + 1))
+    return days or None
+
+
+def _to_time(minutes: int) -> time:
+    """将当日分钟数转换为 time"""
+    return time(minutes // 60, minutes % 60)
+
+
+def _path_length(matrix: np.ndarray, path: List[int]) -> float:
+    """计算按顺序经过各节点的路径长度"""
+    return float(sum(matrix[a, b] for a, b in zip(path, path[1:])))
+
+
+def nearest_neighbor_order(matrix: np.ndarray, nodes: List[int], start: Optional[int] = None) -> List[int]:
+    """
+    最近邻构造初始访问顺序
+
+    Args:
+        matrix: 距离矩阵
+        nodes: 需要排序的节点
+        start: 固定起点（不包含在返回结果中），为 None 时从 nodes 第一个节点出发
+    """
+    remaining = list(nodes)
+    order = []
+    current = start
+    if current is None:
+        current = remaining.pop(0)
+        order.append(current)
+    while remaining:
+        following = min(remaining, key=lambda node: matrix[current, node])
+        remaining.remove(following)
+        order.append(following)
+        current = following
+    return order
+
+
+def two_opt(matrix: np.ndarray, order: List[int], start: Optional[int] = None, end: Optional[int] = None) -> List[int]:
+    """
+    2-opt 局部优化，反转子路径直到无法继续缩短
+
+    起点和终点固定不参与反转，适用于锚点之间的开放路径
+    """
+    head = [start] if start is not None else []
+    tail = [end] if end is not None else []
+    best = list(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(best) - 1):
+            for j in range(i + 1, len(best)):
+                candidate = best[:i] + best[i:j + 1][::-1] + best[j + 1:]
+                if _path_length(matrix, head + candidate + tail) + 1e-9 < _path_length(matrix, head + best + tail):
+                    best = candidate
+                    improved = True
+    return best
+
+
+class RouteOptimizerService:
+    """
+    路线优化服务类
+    处理每日活动的顺序优化和时间重排
+    """
+
+    # 固定锚点活动类型，保持原有时间和位置不变
+    ANCHOR_TYPES = {
+        DailySchedule.ActivityType.CHECK_IN,
+        DailySchedule.ActivityType.CHECK_OUT,
+        DailySchedule.ActivityType.FLIGHT,
+        DailySchedule.ActivityType.TRAIN,
+        DailySchedule.ActivityType.TRANSPORT,
+        DailySchedule.ActivityType.MEAL,
+    }
+
+    @classmethod
+    def is_anchor(cls, schedule: DailySchedule) -> bool:
+        """判断活动是否为固定锚点"""
+        return schedule.activity_type in cls.ANCHOR_TYPES
+
+    @classmethod
+    def plan(cls, itinerary: Itinerary) -> Dict[str, Any]:
+        """
+        计算行程的路线优化方案，不修改数据库
+
+        Returns:
+            {'itinerary_id', 'days': {...}, 'changes': [(schedule, start_time, end_time), ...]}
+        """
+        schedules = DistanceMatrixService.get_schedules(itinerary)
+        coordinates = DistanceMatrixService.coordinates_for(schedules)
+        matrix = distance_matrix_km(coordinates)
+
+        by_day: Dict[int, List[int]] = {}
+        for index, schedule in enumerate(schedules):
+            by_day.setdefault(schedule.day_number, []).append(index)
+
+        days = {}
+        changes = []
+        for day_number, indexes in by_day.items():
+            day_changes, original_km, optimized_km = cls._plan_day(schedules, matrix, indexes)
+            days[day_number] = {
+                'original_distance_km': round(original_km, 3),
+                'optimized_distance_km': round(optimized_km, 3),
+                'changed_count': len(day_changes),
+            }
+            changes.extend(day_changes)
+
+        return {
+            'itinerary_id': itinerary.itinerary_id,
+            'days': days,
+            'changes': changes,
+        }
+
+    @classmethod
+    def optimize(cls, itinerary: Itinerary) -> Tuple[bool, Optional[Dict[str, Any]], Optional[str]]:
+        """
+        优化行程路线并批量写回活动起止时间
+
+        Returns:
+            (success, summary, error_msg)
+        """
+        try:
+            plan = cls.plan(itinerary)
+            changes = plan.pop('changes')
+            if changes:
+                with transaction.atomic():
+                    updated = []
+                    for schedule, start_time, end_time in changes:
+                        schedule.start_time = start_time
+                        schedule.end_time = end_time
+                        updated.append(schedule)
+                    DailySchedule.objects.bulk_update(updated, ['start_time', 'end_time'])
+                    # 刷新行程结构化 JSON 数据
+                    itinerary.save()
+            plan['updated_count'] = len(changes)
+            logger.info(f"行程路线优化完成: {itinerary.itinerary_id}, 调整活动 {len(changes)} 个")
+            return True, plan, None
+        except Exception as e:
+            logger.error(f"行程路线优化失败: {itinerary.itinerary_id}, {str(e)}")
+            return False, None, f'路线优化失败: {str(e)}'
+
+    @classmethod
+    def _plan_day(cls, schedules: List[DailySchedule], matrix: np.ndarray, indexes: List[int]) -> Tuple[list, float, float]:
+        """
+        优化单日活动顺序
+
+        锚点将当日划分为若干段，每段内的可调整活动独立优化
+
+        Returns:
+            (changes, 原始距离, 优化后距离)
+        """
+        original_km = _path_length(np.nan_to_num(matrix), indexes)
+        changes = []
+        optimized_path = []
+
+        segment: List[int] = []
+        previous_anchor = None
+        for index in indexes + [None]:
+            if index is not None and not cls.is_anchor(schedules[index]):
+                segment.append(index)
+                continue
+
+            if segment:
+                order, timings = cls._plan_segment(schedules, matrix, segment, previous_anchor, index)
+                optimized_path.extend(order)
+                for position, node in enumerate(order):
+                    schedule = schedules[node]
+                    start_time, end_time = timings[position]
+                    if (start_time, end_time) != (schedule.start_time, schedule.end_time):
+                        changes.append((schedule, start_time, end_time))
+                segment = []
+
+            if index is not None:
+                optimized_path.append(index)
+                previous_anchor = index
+
+        optimized_km = _path_length(np.nan_to_num(matrix), optimized_path)
+        return changes, original_km, optimized_km
+
+    @classmethod
+    def _plan_segment(cls, schedules: List[DailySchedule], matrix: np.ndarray, segment: List[int],
+                      start: Optional[int], end: Optional[int]) -> Tuple[List[int], List[Tuple[time, time]]]:
+        """
+        优化两个锚点之间的活动顺序并计算时间
+
+        缺少坐标、无法满足时间约束或距离未缩短时保持原顺序和原时间
+        """
+        original = (segment, [(schedules[i].start_time, schedules[i].end_time) for i in segment])
+        if len(segment) < 2:
+            return original
+
+        nodes = [n for n in [start, end] if n is not None] + segment
+        if np.isnan(matrix[np.ix_(nodes, nodes)]).any():
+            return original
+
+        order = nearest_neighbor_order(matrix, segment, start)
+        order = two_opt(matrix, order, start, end)
+
+        head = [start] if start is not None else []
+        tail = [end] if end is not None else []
+        if _path_length(matrix, head + order + tail) + 1e-9 >= _path_length(matrix, head + segment + tail):
+            return original
+
+        earliest = min(segment, key=lambda i: _minutes_of(schedules[i].start_time))
+        timings = cls._schedule_times(schedules, matrix, order, start, end, earliest)
+        if timings is None:
+            return original
+        return order, timings
+
+    @classmethod
+    def _schedule_times(cls, schedules: List[DailySchedule], matrix: np.ndarray, order: List[int],
+                        start: Optional[int], end: Optional[int], earliest: int) -> Optional[List[Tuple[time, time]]]:
+        """
+        按新顺序依次排布活动时间，没有前置锚点时从原本最早的活动开始时间起排
+
+        每个活动保留原时长（不短于景点建议游玩时长），到达时间计入交通耗时，
+        不早于景点开门时间、不晚于关门时间，且须在下一锚点开始前结束
+
+        Returns:
+            [(start_time, end_time), ...]，无法满足约束时返回 None
+        """
+        if start is not None:
+            current = _minutes_of(schedules[start].end_time)
+        else:
+            current = _minutes_of(schedules[earliest].start_time)
+        deadline = _minutes_of(schedules[end].start_time) if end is not None else MINUTES_PER_DAY - 1
+
+        timings = []
+        previous = start
+        for node in order:
+            schedule = schedules[node]
+            if previous is not None:
+                current += math.ceil(float(DistanceMatrixService.estimate_transfer_minutes(matrix[previous, node])))
+
+            duration = _minutes_of(schedule.end_time) - _minutes_of(schedule.start_time)
+            attraction = schedule.attraction_id
+            window = None
+            if attraction is not None:
+                duration = max(duration, attraction.recommended_duration or 0)
+                if not attraction.is_always_open:
+                    window = parse_opening_hours(attraction.opening_hours, cls._weekday(schedule.schedule_date))
+            if duration <= 0:
+                return None
+
+            if window is not None:
+                current = max(current, window[0])
+                if current + duration > window[1]:
+                    return None
+
+            finish = current + duration
+            if finish > deadline:
+                return None
+            timings.append((_to_time(current), _to_time(finish)))
+            current = finish
+            previous = node
+
+        if end is not None:
+            transfer = math.ceil(float(DistanceMatrixService.estimate_transfer_minutes(matrix[previous, end])))
+            if current + transfer > deadline:
+                return None
+        return timings
+
+    @staticmethod
+    def _weekday(value: Optional[date]) -> int:
+        """返回活动日期的星期几"""
+        return value.weekday() if value else 0
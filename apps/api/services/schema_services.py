@@ -0,0 +1,138 @@
+"""
+数据库结构描述服务
+基于模型字段的 db_comment / verbose_name 元数据生成数据库结构描述文档，按迁移状态生成版本号并缓存，
+替代自然语言查询工作流中每次扫描 information_schema 的做法
+"""
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.recorder import MigrationRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaDescriptionService:
+    """
+    数据库结构描述服务类
+    处理结构描述文档的生成、版本计算和缓存
+    """
+
+    APP_LABEL = 'apps'
+    CACHE_KEY_PREFIX = 'schema_description'
+    MAX_CHOICES = 12
+
+    @classmethod
+    def migration_version(cls) -> str:
+        """
+        根据已应用的迁移记录计算结构版本号
+
+        Returns:
+            12 位十六进制版本号，迁移表不可用时返回 'unmigrated'
+        """
+        try:
+            applied = sorted(MigrationRecorder(connection).applied_migrations())
+        except Exception as e:
+            logger.warning(f"读取迁移记录失败: {str(e)}")
+            return 'unmigrated'
+        digest = hashlib.sha1('\n'.join(f'{app}.{name}' for app, name in applied).encode('utf-8'))
+        return digest.hexdigest()[:12]
+
+    @classmethod
+    def get_document(cls, refresh: bool = False) -> Dict[str, Any]:
+        """
+        获取当前版本的结构描述文档，优先读取缓存
+
+        Args:
+            refresh: 为 True 时忽略缓存重新生成
+
+        Returns:
+            {'version', 'tables': [...], 'text'}
+        """
+        version = cls.migration_version()
+        cache_key = f'{cls.CACHE_KEY_PREFIX}:{version}'
+        if not refresh:
+            document = cache.get(cache_key)
+            if document is not None:
+                return document
+
+        tables = cls.describe_tables()
+        document = {
+            'version': version,
+            'tables': tables,
+            'text': cls.render_text(tables),
+        }
+        cache.set(cache_key, document, None)
+        logger.info(f"数据库结构描述已生成: 版本 {version}, 共 {len(tables)} 张表")
+        return document
+
+    @classmethod
+    def describe_tables(cls) -> List[Dict[str, Any]]:
+        """从模型元数据生成表结构描述"""
+        tables = []
+        for model in sorted(django_apps.get_app_config(cls.APP_LABEL).get_models(), key=lambda m: m._meta.db_table):
+            meta = model._meta
+            if not meta.managed or meta.proxy:
+                continue
+            tables.append({
+                'table': meta.db_table,
+                'comment': meta.db_table_comment or str(meta.verbose_name),
+                'columns': [column for column in (cls._describe_field(f) for f in meta.concrete_fields) if column],
+            })
+        return tables
+
+    @classmethod
+    def _describe_field(cls, field) -> Optional[Dict[str, Any]]:
+        """描述单个字段：列名、类型、注释、可选值和外键引用"""
+        column_type = field.db_type(connection)
+        if column_type is None:
+            return None
+        column = {
+            'column': field.column,
+            'type': column_type,
+            'comment': field.db_comment or str(field.verbose_name),
+        }
+        if field.choices:
+            values = [str(value) for value, _ in field.flatchoices][:cls.MAX_CHOICES]
+            column['choices'] = values
+        if field.is_relation and field.related_model is not None:
+            target = field.target_field
+            column['references'] = f'{field.related_model._meta.db_table}.{target.column}'
+        return column
+
+    @classmethod
+    def render_text(cls, tables: List[Dict[str, Any]]) -> str:
+        """
+        渲染为与原 n8n 工作流生成的 db.txt 相同格式的紧凑文本
+
+            # 表注释 表名
+            - 列名 类型 注释 [可选值] -> 引用表.列
+        """
+        blocks = []
+        for table in tables:
+            lines = [f"# {table['comment']} {table['table']}"]
+            for column in table['columns']:
+                line = f"- {column['column']} {column['type']} {column['comment']}"
+                if column.get('choices'):
+                    line += f" [{'|'.join(column['choices'])}]"
+                if column.get('references'):
+                    line += f" -> {column['references']}"
+                lines.append(line)
+            blocks.append('\n'.join(lines) + '\n')
+        return '\n'.join(blocks)
+
+    @classmethod
+    def write_to_file(cls, file_path: str, refresh: bool = False) -> Tuple[str, int]:
+        """
+        将结构描述文本写入文件，供 n8n 工作流读取
+
+        Returns:
+            (version, table_count)
+        """
+        document = cls.get_document(refresh=refresh)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(document['text'])
+        return document['version'], len(document['tables'])
@@ -5,8 +5,9 @@ Webhook 业务逻辑服务层
 import logging
 from datetime import date, time, datetime
 from decimal import Decimal, InvalidOperation
-from typing import Dict, Any, Optional, Tuple
-from django.db import transaction
+from typing import Dict, Any, List, Optional, Tuple
+from django.db import IntegrityError, transaction
+from django.db.models import prefetch_related_objects
 from django.conf import settings
 
 from apps.models.itinerary import Itinerary
@@ -15,10 +16,37 @@ from apps.models.traveler_stats import TravelerStats
 from apps.models.daily_schedule import DailySchedule
 from apps.models.requirement import Requirement
 from apps.models.requirement_itinerary import RequirementItinerary
+from apps.api.metrics import n8n_dispatch
+from apps.metrics import ID_ALLOCATION_COLLISIONS
+from apps.utils.id_allocation import is_id_conflict
+from apps.utils.entity_cache import current_entity_cache, entity_cache
 
 logger = logging.getLogger(__name__)
 
 
+def reserve_sequence_ids(model, field: str, prefix: str, count: int) -> List[str]:
+    """
+    一次性预留当日连续的业务ID，格式为 PREFIX_YYYYMMDD_NNN
+
+    Args:
+        model: 模型类
+        field: 主键字段名
+        prefix: 前缀，如 ITI、REQ
+        count: 需要的ID数量
+
+    Returns:
+        ID列表
+    """
+    day_prefix = f'{prefix}_{datetime.now().strftime("%Y%m%d")}_'
+    max_seq = 0
+    for value in model.objects.filter(**{f'{field}__startswith': day_prefix}).values_list(field, flat=True):
+        try:
+            max_seq = max(max_seq, int(value.split('_')[-1]))
+        except (ValueError, IndexError):
+            pass
+    return [f'{day_prefix}{max_seq + i:03d}' for i in range(1, count + 1)]
+
+
 class ItineraryService:
     """
     行程服务类
@@ -38,6 +66,9 @@ class ItineraryService:
         'OTHER': DailySchedule.ActivityType.OTHER,
     }
     
+    # 批量创建时ID冲突（并发请求预留了相同序号）的重试次数
+    BATCH_ID_ATTEMPTS = 3
+    
     @classmethod
     def validate_requirement_exists(cls, requirement_id: str) -> Tuple[bool, Optional[Requirement], Optional[str]]:
         """
@@ -69,20 +100,22 @@ class ItineraryService:
             (是否成功, Itinerary对象, 错误信息)
         """
         try:
-            itinerary = cls._create_itinerary_main(data, requirement)
-            
-            cls._create_destinations(itinerary, data)
-            
-            cls._create_traveler_stats(itinerary, data)
-            
-            cls._create_daily_schedules(itinerary, data)
-            
-            cls._create_requirement_itinerary_relation(requirement, itinerary)
-            
-            # 更新 itinerary_json_data 和 itinerary_quote_json_data
-            itinerary.update_itinerary_json_data()
-            itinerary.update_itinerary_quote_json_data()
-            itinerary.save()
+            # 解析活动引用时加载的景点/酒店/餐厅在生成报价快照时直接复用
+            with entity_cache():
+                itinerary = cls._create_itinerary_main(data, requirement)
+                
+                cls._create_destinations(itinerary, data)
+                
+                cls._create_traveler_stats(itinerary, data)
+                
+                cls._create_daily_schedules(itinerary, data)
+                
+                cls._create_requirement_itinerary_relation(requirement, itinerary)
+                
+                # 更新 itinerary_json_data 和 itinerary_quote_json_data
+                itinerary.update_itinerary_json_data()
+                itinerary.update_itinerary_quote_json_data()
+                itinerary.save()
             
             logger.info(f'行程创建成功: itinerary_id={itinerary.itinerary_id}, name={itinerary.itinerary_name}')
             
@@ -92,12 +125,86 @@ class ItineraryService:
             logger.error(f'创建行程失败: {e}', exc_info=True)
             return False, None, f'创建行程失败: {str(e)}'
     
+    @classmethod
+    def create_itineraries(cls, items: List[Tuple[Dict[str, Any], Requirement]]) -> Tuple[bool, List[Itinerary], Optional[str]]:
+        """
+        在一个事务中批量创建行程及其关联数据，任意一条失败则全部回滚
+        
+        Args:
+            items: (验证后的行程数据, 关联的需求对象) 列表
+        
+        Returns:
+            (是否成功, Itinerary对象列表（与输入顺序一致）, 错误信息)
+        """
+        for attempt in range(1, cls.BATCH_ID_ATTEMPTS + 1):
+            try:
+                with transaction.atomic(), entity_cache():
+                    itineraries = cls._bulk_create_itineraries(items)
+                logger.info(f'批量创建行程成功: {len(itineraries)}条')
+                return True, itineraries, None
+            except IntegrityError as e:
+                if not is_id_conflict(e, Itinerary):
+                    logger.error(f'批量创建行程失败: {e}', exc_info=True)
+                    return False, [], f'批量创建行程失败: {str(e)}'
+                ID_ALLOCATION_COLLISIONS.labels('itinerary').inc()
+                if attempt == cls.BATCH_ID_ATTEMPTS:
+                    logger.error(f'批量创建行程失败: {e}', exc_info=True)
+                    return False, [], f'批量创建行程失败: {str(e)}'
+                logger.warning(f'批量创建行程ID冲突，重新预留ID: 第{attempt}次, {e}')
+            except Exception as e:
+                logger.error(f'批量创建行程失败: {e}', exc_info=True)
+                return False, [], f'批量创建行程失败: {str(e)}'
+        return False, [], '批量创建行程失败'
+    
+    @classmethod
+    def _bulk_create_itineraries(cls, items: List[Tuple[Dict[str, Any], Requirement]]) -> List[Itinerary]:
+        """预留行程ID并按表批量插入，最后统一生成JSON快照"""
+        itinerary_ids = reserve_sequence_ids(Itinerary, 'itinerary_id', 'ITI', len(items))
+        
+        # 整批的活动引用合并加载，每类实体一条查询
+        cls._load_references([data for data, _ in items])
+        
+        itineraries, destinations, traveler_stats, schedules, relations = [], [], [], [], []
+        for (data, requirement), itinerary_id in zip(items, itinerary_ids):
+            itinerary = cls._build_itinerary_main(data, requirement)
+            # 批量插入不会调用 Itinerary.save，这里补齐 save 中计算的字段
+            itinerary.itinerary_id = itinerary_id
+            itinerary.total_days = (itinerary.end_date - itinerary.start_date).days + 1
+            itineraries.append(itinerary)
+            
+            item_destinations = cls._build_destinations(itinerary, data)
+            destinations.extend(item_destinations)
+            traveler_stats.append(cls._build_traveler_stats(itinerary, data))
+            schedules.extend(cls._build_daily_schedules(itinerary, data, item_destinations))
+            relations.append(RequirementItinerary(requirement=requirement, itinerary=itinerary))
+        
+        Itinerary.objects.bulk_create(itineraries)
+        Destination.objects.bulk_create(destinations)
+        TravelerStats.objects.bulk_create(traveler_stats)
+        DailySchedule.objects.bulk_create(schedules)
+        RequirementItinerary.objects.bulk_create(relations)
+        
+        # JSON快照依赖关联数据，插入完成后统一生成
+        prefetch_related_objects(itineraries, 'destinations', 'traveler_stats')
+        for itinerary in itineraries:
+            itinerary.update_itinerary_json_data()
+            itinerary.update_itinerary_quote_json_data()
+        Itinerary.objects.bulk_update(itineraries, ['itinerary_json_data', 'itinerary_quote_json_data'])
+        return itineraries
+    
     @classmethod
     def _create_itinerary_main(cls, data: Dict[str, Any], requirement: Requirement) -> Itinerary:
         """创建行程主表"""
+        itinerary = cls._build_itinerary_main(data, requirement)
+        itinerary.save()
+        return itinerary
+    
+    @classmethod
+    def _build_itinerary_main(cls, data: Dict[str, Any], requirement: Requirement) -> Itinerary:
+        """构建未保存的行程主表对象"""
         start_date_val = data.get('start_date')
         end_date_val = data.get('end_date')
-        itinerary = Itinerary(
+        return Itinerary(
             itinerary_name=data.get('itinerary_name', '未命名行程'),
             start_date=start_date_val if isinstance(start_date_val, date) else date.fromisoformat(start_date_val),
             end_date=end_date_val if isinstance(end_date_val, date) else date.fromisoformat(end_date_val),
@@ -110,15 +217,18 @@ class ItineraryService:
             current_status=Itinerary.CurrentStatus.DRAFT,
             created_by='webhook_user'
         )
-        itinerary.save()
-        return itinerary
     
     @classmethod
     def _create_destinations(cls, itinerary: Itinerary, data: Dict[str, Any]) -> None:
         """创建目的地信息"""
-        destinations = data.get('destinations', [])
-        
-        for dest_data in destinations:
+        for destination in cls._build_destinations(itinerary, data):
+            destination.save()
+    
+    @classmethod
+    def _build_destinations(cls, itinerary: Itinerary, data: Dict[str, Any]) -> List[Destination]:
+        """构建未保存的目的地对象"""
+        destinations = []
+        for dest_data in data.get('destinations', []):
             arrival_date_val = dest_data.get('arrival_date')
             departure_date_val = dest_data.get('departure_date')
             destination = Destination(
@@ -129,37 +239,49 @@ class ItineraryService:
                 arrival_date=arrival_date_val if isinstance(arrival_date_val, date) else date.fromisoformat(arrival_date_val),
                 departure_date=departure_date_val if isinstance(departure_date_val, date) else date.fromisoformat(departure_date_val)
             )
-            destination.save()
+            # 与 Destination.save 一致，批量插入时不会调用 save
+            destination.nights = (destination.departure_date - destination.arrival_date).days
+            destinations.append(destination)
+        return destinations
     
     @classmethod
     def _create_traveler_stats(cls, itinerary: Itinerary, data: Dict[str, Any]) -> None:
         """创建旅行者统计信息"""
+        cls._build_traveler_stats(itinerary, data).save()
+    
+    @classmethod
+    def _build_traveler_stats(cls, itinerary: Itinerary, data: Dict[str, Any]) -> TravelerStats:
+        """构建未保存的旅行者统计对象"""
         traveler_stats_info = data.get('traveler_stats', {})
         
-        traveler_stats = TravelerStats(
+        return TravelerStats(
             itinerary=itinerary,
             adult_count=traveler_stats_info.get('adults', 0),
             child_count=traveler_stats_info.get('children', 0),
             infant_count=traveler_stats_info.get('infants', 0),
             senior_count=traveler_stats_info.get('seniors', 0)
         )
-        traveler_stats.save()
     
     @classmethod
     def _create_daily_schedules(cls, itinerary: Itinerary, data: Dict[str, Any]) -> None:
         """创建每日行程安排"""
-        daily_schedules = data.get('daily_schedules', [])
+        for schedule in cls._build_daily_schedules(itinerary, data, list(itinerary.destinations.all())):
+            schedule.save()
+    
+    @classmethod
+    def _build_daily_schedules(cls, itinerary: Itinerary, data: Dict[str, Any], destinations: List[Destination]) -> List[DailySchedule]:
+        """构建未保存的每日行程对象，按城市名匹配该行程的目的地"""
+        destinations_by_city = {}
+        for destination in destinations:
+            destinations_by_city.setdefault(destination.city_name, destination)
         
-        for day_schedule in daily_schedules:
+        cls._load_references([data])
+        schedules = []
+        for day_schedule in data.get('daily_schedules', []):
             day_number = day_schedule.get('day')
             schedule_date_val = day_schedule.get('date')
             schedule_date = schedule_date_val if isinstance(schedule_date_val, date) else date.fromisoformat(schedule_date_val)
-            city = day_schedule.get('city')
-            
-            destination = Destination.objects.filter(
-                itinerary=itinerary,
-                city_name=city
-            ).first()
+            destination = destinations_by_city.get(day_schedule.get('city'))
             
             activities = day_schedule.get('activities', [])
             for activity in activities:
@@ -177,7 +299,7 @@ class ItineraryService:
                 hotel = cls._resolve_hotel(activity, activity_type)
                 restaurant = cls._resolve_restaurant(activity, activity_type)
                 
-                schedule = DailySchedule(
+                schedules.append(DailySchedule(
                     itinerary_id=itinerary,
                     day_number=day_number,
                     schedule_date=schedule_date,
@@ -191,62 +313,70 @@ class ItineraryService:
                     hotel_id=hotel,
                     restaurant_id=restaurant,
                     booking_status=DailySchedule.BookingStatus.NOT_BOOKED
-                )
-                schedule.save()
+                ))
+        return schedules
     
     @classmethod
-    def _resolve_attraction(cls, activity: Dict[str, Any], activity_type) -> Optional[Any]:
-        """解析景点引用"""
-        if activity_type != DailySchedule.ActivityType.ATTRACTION:
-            return None
-        
+    def _reference_models(cls) -> Dict[str, Tuple[Any, List[str], str]]:
+        """活动引用的实体：{实体名: (模型, 引用该实体的活动类型, 日志中的名称)}"""
         from apps.models.attraction import Attraction
-        attraction_id_str = activity.get('id_reference')
-        if not attraction_id_str:
-            return None
+        from apps.models.hotel import Hotel
+        from apps.models.restaurant import Restaurant
+        return {
+            'attraction': (Attraction, [DailySchedule.ActivityType.ATTRACTION], '景点'),
+            'hotel': (Hotel, [DailySchedule.ActivityType.CHECK_IN, DailySchedule.ActivityType.CHECK_OUT], '酒店'),
+            'restaurant': (Restaurant, [DailySchedule.ActivityType.MEAL], '餐厅'),
+        }
+    
+    @classmethod
+    def _load_references(cls, items: List[Dict[str, Any]]) -> None:
+        """
+        把活动引用的景点/酒店/餐厅批量加载到当前作用域的实体缓存，之后逐条解析不再查询
+
+        同一酒店的入住和退房、重复的餐厅只加载一次
+        """
+        references = {}
+        for data in items:
+            for day_schedule in data.get('daily_schedules', []):
+                for activity in day_schedule.get('activities', []):
+                    if activity.get('id_reference'):
+                        activity_type = cls.ACTIVITY_TYPE_MAP.get(activity.get('activity_type'))
+                        references.setdefault(activity_type, []).append(activity['id_reference'])
         
-        try:
-            return Attraction.objects.get(attraction_id=attraction_id_str)
-        except Attraction.DoesNotExist:
-            logger.warning(f'景点不存在: {attraction_id_str}')
-            return None
+        cache = current_entity_cache()
+        for model, activity_types, _ in cls._reference_models().values():
+            cache.load(model, [pk for activity_type in activity_types for pk in references.get(activity_type, [])])
     
     @classmethod
-    def _resolve_hotel(cls, activity: Dict[str, Any], activity_type) -> Optional[Any]:
-        """解析酒店引用"""
-        if activity_type not in [
-            DailySchedule.ActivityType.CHECK_IN, 
-            DailySchedule.ActivityType.CHECK_OUT
-        ]:
+    def _resolve_reference(cls, entity: str, activity: Dict[str, Any], activity_type) -> Optional[Any]:
+        """解析活动引用的实体，活动类型不匹配或引用为空时返回 None"""
+        model, activity_types, label = cls._reference_models()[entity]
+        if activity_type not in activity_types:
             return None
         
-        from apps.models.hotel import Hotel
-        hotel_id_str = activity.get('id_reference')
-        if not hotel_id_str:
+        reference = activity.get('id_reference')
+        if not reference:
             return None
         
-        try:
-            return Hotel.objects.get(hotel_id=hotel_id_str)
-        except Hotel.DoesNotExist:
-            logger.warning(f'酒店不存在: {hotel_id_str}')
-            return None
+        instance = current_entity_cache().get(model, reference)
+        if instance is None:
+            logger.warning(f'{label}不存在: {reference}')
+        return instance
+    
+    @classmethod
+    def _resolve_attraction(cls, activity: Dict[str, Any], activity_type) -> Optional[Any]:
+        """解析景点引用"""
+        return cls._resolve_reference('attraction', activity, activity_type)
+    
+    @classmethod
+    def _resolve_hotel(cls, activity: Dict[str, Any], activity_type) -> Optional[Any]:
+        """解析酒店引用"""
+        return cls._resolve_reference('hotel', activity, activity_type)
     
     @classmethod
     def _resolve_restaurant(cls, activity: Dict[str, Any], activity_type) -> Optional[Any]:
         """解析餐厅引用"""
-        if activity_type != DailySchedule.ActivityType.MEAL:
-            return None
-        
-        from apps.models.restaurant import Restaurant
-        restaurant_id_str = activity.get('id_reference')
-        if not restaurant_id_str:
-            return None
-        
-        try:
-            return Restaurant.objects.get(restaurant_id=restaurant_id_str)
-        except Restaurant.DoesNotExist:
-            logger.warning(f'餐厅不存在: {restaurant_id_str}')
-            return None
+        return cls._resolve_reference('restaurant', activity, activity_type)
     
     @classmethod
     def _create_requirement_itinerary_relation(cls, requirement: Requirement, itinerary: Itinerary) -> None:
@@ -301,10 +431,60 @@ class RequirementService:
             if not Requirement.objects.filter(requirement_id=new_id).exists():
                 return True, new_id, None
             
+            ID_ALLOCATION_COLLISIONS.labels('requirement').inc()
             time.sleep(0.01)
         
         return False, None, '生成requirement_id失败: 达到最大重试次数'
     
+    @classmethod
+    def create_requirements(cls, items: List[Dict[str, Any]]) -> Tuple[bool, List[Requirement], Optional[str]]:
+        """
+        在一个事务中批量创建需求记录，ID一次性预留
+        
+        Args:
+            items: 验证后的需求数据列表
+        
+        Returns:
+            (是否成功, Requirement对象列表（与输入顺序一致）, 错误信息)
+        """
+        for attempt in range(1, ItineraryService.BATCH_ID_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    requirement_ids = reserve_sequence_ids(Requirement, 'requirement_id', 'REQ', len(items))
+                    requirements = []
+                    for requirement_id, data in zip(requirement_ids, items):
+                        requirement = Requirement(**cls._extract_requirement_fields(requirement_id, data))
+                        # 与 Requirement.save 一致，重新计算总人数
+                        requirement.group_total = requirement.group_adults + requirement.group_children + requirement.group_seniors
+                        requirements.append(requirement)
+                    Requirement.objects.bulk_create(requirements)
+                logger.info(f'批量创建需求成功: {len(requirements)}条')
+                return True, requirements, None
+            except IntegrityError as e:
+                if not is_id_conflict(e, Requirement):
+                    logger.error(f'批量创建需求失败: {e}', exc_info=True)
+                    return False, [], f'批量创建需求失败: {str(e)}'
+                ID_ALLOCATION_COLLISIONS.labels('requirement').inc()
+                if attempt == ItineraryService.BATCH_ID_ATTEMPTS:
+                    logger.error(f'批量创建需求失败: {e}', exc_info=True)
+                    return False, [], f'批量创建需求失败: {str(e)}'
+                logger.warning(f'批量创建需求ID冲突，重新预留ID: 第{attempt}次, {e}')
+            except Exception as e:
+                logger.error(f'批量创建需求失败: {e}', exc_info=True)
+                return False, [], f'批量创建需求失败: {str(e)}'
+        return False, [], '批量创建需求失败'
+    
+    @classmethod
+    def convert_dates(cls, obj: Any) -> Any:
+        """转换日期对象为字符串，避免JSON序列化错误"""
+        if isinstance(obj, dict):
+            return {k: cls.convert_dates(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [cls.convert_dates(item) for item in obj]
+        elif hasattr(obj, 'isoformat'):
+            return obj.isoformat()
+        return obj
+    
     @classmethod
     def parse_date(cls, date_str: Optional[str]) -> Optional[date]:
         """解析日期字符串"""
@@ -345,12 +525,20 @@ class RequirementService:
             requirement_data = cls._extract_requirement_fields(requirement_id, data)
             
             requirement = Requirement(**requirement_data)
-            requirement.save()
+            # ID 由 generate_requirement_id 预先分配，强制 INSERT，并发分配到同一ID时报错而不是覆盖已有需求；
+            # 保存点保证失败后外层事务仍可继续使用
+            with transaction.atomic():
+                requirement.save(force_insert=True)
             
             logger.info(f'需求保存成功: requirement_id={requirement_id}')
             
             return True, requirement, None
             
+        except IntegrityError as e:
+            if is_id_conflict(e, Requirement):
+                ID_ALLOCATION_COLLISIONS.labels('requirement').inc()
+            logger.error(f'创建需求失败: {e}', exc_info=True)
+            return False, None, f'创建需求失败: {str(e)}'
         except Exception as e:
             logger.error(f'创建需求失败: {e}', exc_info=True)
             return False, None, f'创建需求失败: {str(e)}'
@@ -448,12 +636,14 @@ class RequirementService:
         try:
             logger.info(f'发送请求到 n8n webhook: {webhook_url}')
             
-            response = requests.post(
-                webhook_url,
-                json=payload,
-                timeout=timeout,
-                headers={'Content-Type': 'application/json'}
-            )
+            with n8n_dispatch('requirement') as dispatch:
+                response = requests.post(
+                    webhook_url,
+                    json=payload,
+                    timeout=timeout,
+                    headers={'Content-Type': 'application/json'}
+                )
+                dispatch.status_code = response.status_code
             
             if response.status_code == 200:
                 result = response.json()
@@ -0,0 +1,41 @@
+"""
+django_q 后台任务
+由 qcluster worker 按函数路径调用，任务函数只做参数转换，业务逻辑在服务层
+"""
+import logging
+
+from django.conf import settings
+
+from apps.metrics import REQUIREMENT_EXPIRY_DURATION, REQUIREMENTS_EXPIRED
+from apps.api.services.ingest_services import ItineraryIngestService
+from apps.models.status_manager import RequirementStatusManager
+
+logger = logging.getLogger(__name__)
+
+
+def materialize_itinerary_job(job_id: str):
+    """执行行程导入任务"""
+    success, itinerary_id, error_msg = ItineraryIngestService.materialize(job_id)
+    return {'success': success, 'itinerary_id': itinerary_id, 'error': error_msg}
+
+
+def expire_requirements():
+    """
+    计划任务：过期到期的待审核和已确认需求
+
+    返回值保存在 django_q 的任务结果中，作为每次运行的记录
+    """
+    result = RequirementStatusManager.check_all_expired_requirements(
+        pending_hours=getattr(settings, 'REQUIREMENT_PENDING_EXPIRY_HOURS', 72),
+        confirmed_hours=getattr(settings, 'REQUIREMENT_CONFIRMED_EXPIRY_HOURS', 168),
+        batch_size=getattr(settings, 'REQUIREMENT_EXPIRY_BATCH_SIZE', 500),
+        max_batches=getattr(settings, 'REQUIREMENT_EXPIRY_MAX_BATCHES', 100),
+    )
+    for rule in ('due', 'pending', 'confirmed'):
+        REQUIREMENTS_EXPIRED.labels(rule).inc(result[f'{rule}_expired'])
+    REQUIREMENT_EXPIRY_DURATION.observe(result['duration_ms'] / 1000)
+    logger.info(
+        f"需求过期任务完成: 共 {result['total_expired']} 条, {result['batches']} 批, 耗时 {result['duration_ms']}ms",
+        extra={'data': {'requirement_expiry': result}},
+    )
+    return result
@@ -2,19 +2,40 @@ from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
 from apps.api.views.webhook_views import (
     ItineraryWebhookView,
+    ItineraryBatchWebhookView,
+    ItineraryIngestJobStatusView,
     RequirementWebhookView,
+    RequirementBatchWebhookView,
     ProcessRequirementViaN8nView,
     ItineraryOptimizationCallbackView,
     ItineraryQuoteCallbackView
 )
+from apps.api.views.async_webhook_views import (
+    AsyncItineraryWebhookView,
+    AsyncRequirementWebhookView,
+    AsyncItineraryOptimizationCallbackView,
+    AsyncItineraryQuoteCallbackView,
+)
 from apps.api.views.export_views import ItineraryPDFExportView, ItineraryWordExportView
+from apps.api.views.catalog_views import CandidateSelectionView, PromptContextView, SchemaDescriptionView, QueryGatewayView
 
 urlpatterns = [
     path('webhook/itinerary/', ItineraryWebhookView.as_view(), name='itinerary_webhook'),
+    path('webhook/itinerary/batch/', ItineraryBatchWebhookView.as_view(), name='itinerary_batch_webhook'),
+    path('webhook/itinerary/jobs/<uuid:job_id>/', ItineraryIngestJobStatusView.as_view(), name='itinerary_ingest_job_status'),
     path('webhook/itinerary/optimization/callback/', ItineraryOptimizationCallbackView.as_view(), name='itinerary_optimization_callback'),
     path('webhook/itinerary/quote/callback/', ItineraryQuoteCallbackView.as_view(), name='itinerary_quote_callback'),
     path('webhook/requirement/', csrf_exempt(ProcessRequirementViaN8nView.as_view()), name='process_requirement_via_n8n'),
     path('webhook/requirement/callback/', RequirementWebhookView.as_view(), name='requirement_webhook_callback'),
+    path('webhook/requirement/callback/batch/', RequirementBatchWebhookView.as_view(), name='requirement_batch_webhook_callback'),
+    path('webhook/async/itinerary/', AsyncItineraryWebhookView.as_view(), name='async_itinerary_webhook'),
+    path('webhook/async/itinerary/optimization/callback/', AsyncItineraryOptimizationCallbackView.as_view(), name='async_itinerary_optimization_callback'),
+    path('webhook/async/itinerary/quote/callback/', AsyncItineraryQuoteCallbackView.as_view(), name='async_itinerary_quote_callback'),
+    path('webhook/async/requirement/callback/', AsyncRequirementWebhookView.as_view(), name='async_requirement_webhook_callback'),
     path('export/pdf/<str:itinerary_id>/', ItineraryPDFExportView.as_view(), name='itinerary_pdf_export'),
     path('export/word/<str:itinerary_id>/', ItineraryWordExportView.as_view(), name='itinerary_word_export'),
+    path('catalog/candidates/<str:requirement_id>/', CandidateSelectionView.as_view(), name='catalog_candidates'),
+    path('catalog/context/<str:requirement_id>/', PromptContextView.as_view(), name='catalog_prompt_context'),
+    path('catalog/schema/', SchemaDescriptionView.as_view(), name='catalog_schema_description'),
+    path('catalog/query/', QueryGatewayView.as_view(), name='catalog_query_gateway'),
 ]
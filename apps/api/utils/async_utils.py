@@ -0,0 +1,55 @@
+"""
+异步视图工具
+将ORM操作放到有界线程池中执行，避免阻塞事件循环，也避免占满默认的单线程同步执行器
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from apps.api.utils.query_budget import track_budgets
+from apps.api.utils.request_metrics import track_queries
+
+
+DEFAULT_MAX_WORKERS = 8
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """获取进程内共享的数据库线程池，大小由 ASYNC_DB_MAX_WORKERS 控制"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(getattr(settings, 'ASYNC_DB_MAX_WORKERS', DEFAULT_MAX_WORKERS)),
+                    thread_name_prefix='async-db',
+                )
+    return _executor
+
+
+def _call_with_connection_cleanup(func: Callable, *args, **kwargs) -> Any:
+    """线程池线程不会收到请求结束信号，执行前后自行清理过期连接"""
+    close_old_connections()
+    try:
+        with track_queries(), track_budgets():
+            return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_db_thread(func: Callable, *args, **kwargs) -> Any:
+    """
+    在数据库线程池中执行同步函数
+
+    Usage:
+        success, itinerary, error_msg = await run_in_db_thread(ItineraryService.create_itinerary, data, requirement)
+    """
+    return await sync_to_async(
+        _call_with_connection_cleanup, thread_sensitive=False, executor=get_db_executor()
+    )(func, *args, **kwargs)
@@ -0,0 +1,255 @@
+"""
+非阻塞日志管道
+请求线程只把日志记录放入有界队列，由后台线程写出；队列满时丢弃并计数。
+支持 JSON Lines 格式、按 logger 限流，以及基于 X-Request-ID 的请求关联ID
+"""
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+import orjson
+
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_RATE_PER_SECOND = 100
+REQUEST_ID_MAX_LENGTH = 100
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_id', default=None)
+
+
+def get_request_id() -> Optional[str]:
+    """当前请求的关联ID，请求之外返回 None"""
+    return _request_id.get()
+
+
+def bind_request_id(request_id: Optional[str] = None) -> contextvars.Token:
+    """
+    绑定当前上下文的关联ID，未提供或格式不合法时生成新ID
+
+    Returns:
+        用于 reset_request_id 的 token
+    """
+    if request_id:
+        request_id = ''.join(ch for ch in request_id.strip() if ch.isalnum() or ch in '-_.:')[:REQUEST_ID_MAX_LENGTH]
+    return _request_id.set(request_id or uuid.uuid4().hex)
+
+
+def reset_request_id(token: contextvars.Token):
+    """恢复绑定前的关联ID"""
+    _request_id.reset(token)
+
+
+class RequestIdFilter(logging.Filter):
+    """为日志记录附加 request_id 属性，请求之外为 '-'"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'request_id'):
+            record.request_id = _request_id.get() or '-'
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    按 logger 名称的令牌桶限流，WARNING 及以上级别不限流
+
+    Args:
+        rate: 默认每秒允许的记录数，0 表示不限流
+        overrides: {logger名前缀: 每秒记录数}，按最长前缀匹配
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE_PER_SECOND, overrides: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rate = float(rate)
+        self.overrides = dict(overrides or {})
+        self.suppressed: Dict[str, int] = {}
+        self._buckets: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def _rate_for(self, name: str) -> float:
+        best, best_length = self.rate, -1
+        for prefix, rate in self.overrides.items():
+            if (name == prefix or name.startswith(prefix + '.')) and len(prefix) > best_length:
+                best, best_length = float(rate), len(prefix)
+        return best
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                rate = self._rate_for(record.name)
+                # [速率, 剩余令牌, 上次补充时间]，突发上限为一秒的配额
+                bucket = self._buckets[record.name] = [rate, rate, now]
+            rate = bucket[0]
+            if rate <= 0:
+                return True
+            bucket[1] = min(rate, bucket[1] + (now - bucket[2]) * rate)
+            bucket[2] = now
+            if bucket[1] >= 1:
+                bucket[1] -= 1
+                return True
+            self.suppressed[record.name] = self.suppressed.get(record.name, 0) + 1
+            return False
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条记录输出为一行JSON，通过 extra={'data': {...}} 传入的结构化字段放在 data 键下"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        data = getattr(record, 'data', None)
+        if data is not None:
+            entry['data'] = data
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return orjson.dumps(entry, default=str).decode('utf-8')
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    有界队列日志处理器，在 LOGGING 中替代 StreamHandler
+
+    记录在请求线程中完成消息格式化后入队，写出由后台 QueueListener 线程完成；
+    队列满时丢弃记录并计数，下次成功入队时补一条丢弃汇总。
+    dictConfig 为本处理器设置的 formatter 会转交给实际写出的 StreamHandler
+
+    Args:
+        maxsize: 队列容量
+        stream: 输出流，默认 stderr
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_QUEUE_SIZE, stream=None):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self._unreported = 0
+        self._drop_lock = threading.Lock()
+        self._listener: Optional[QueueListener] = None
+        self._pid = None
+        self._start_listener()
+        _handlers.append(self)
+
+    def _start_listener(self):
+        """启动写出线程"""
+        self._listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+        self._listener.start()
+        self._pid = os.getpid()
+
+    def _reset_after_fork(self):
+        """
+        fork 出的子进程（gunicorn / django_q worker）重建队列、丢弃计数和写出线程。
+        不能沿用父进程的队列：fork 时父进程的写出线程可能正持有队列锁，子进程写日志会死锁；
+        队列中尚未写出的记录也会被父子进程各写一次
+        """
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.dropped = 0
+        self._unreported = 0
+        self._drop_lock = threading.Lock()
+        self._start_listener()
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """合并消息参数、预先格式化异常，避免把不可跨线程的对象放入队列"""
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self._pid != os.getpid():
+            # 通常已由 fork 钩子重建，这里兜底
+            self._reset_after_fork()
+        if self._unreported:
+            self._report_dropped()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+                self._unreported += 1
+
+    def _report_dropped(self):
+        with self._drop_lock:
+            count, self._unreported = self._unreported, 0
+        summary = logging.makeLogRecord({
+            'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'msg': f'日志队列已满，丢弃了 {count} 条日志', 'request_id': '-',
+        })
+        try:
+            self.queue.put_nowait(summary)
+        except queue.Full:
+            with self._drop_lock:
+                self._unreported += count
+
+    def flush(self):
+        """等待队列中已有记录写出"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._start_listener()
+
+    def close(self):
+        """停止写出线程前会先写完队列中的记录，logging.shutdown 在进程退出时调用"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+        if self in _handlers:
+            _handlers.remove(self)
+        self.target.close()
+        super().close()
+
+
+_exception_formatter = logging.Formatter()
+_handlers: list = []
+
+
+def _reset_handlers_after_fork():
+    for handler in list(_handlers):
+        handler._reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_handlers_after_fork)
+
+
+def get_pipeline_stats() -> Dict[str, Any]:
+    """日志管道统计：队列长度、丢弃数和各 logger 被限流的记录数"""
+    suppressed: Dict[str, int] = {}
+    for handler in _handlers:
+        for log_filter in handler.filters:
+            if isinstance(log_filter, RateLimitFilter):
+                for name, count in log_filter.suppressed.items():
+                    suppressed[name] = suppressed.get(name, 0) + count
+    return {
+        'queued': sum(handler.queue.qsize() for handler in _handlers),
+        'dropped': sum(handler.dropped for handler in _handlers),
+        'suppressed': suppressed,
+    }
+
@@ -4,8 +4,8 @@
 """
 import re
 import logging
-from typing import Any, Dict, Optional
-from functools import wraps
+from typing import Any, Dict, Optional, Pattern, Tuple
+from functools import lru_cache, wraps
 
 
 # 需要脱敏的敏感字段列表
@@ -22,6 +22,44 @@ SENSITIVE_FIELDS = {
 REDACT_PATTERN = '***REDACTED***'
 
 
+@lru_cache(maxsize=16)
+def _compile_patterns(fields: frozenset) -> Tuple[Pattern, Pattern]:
+    """
+    将敏感字段编译为一个交替正则，长字段在前，保证 contact_phone 优先于 phone 匹配
+
+    Returns:
+        (消息脱敏正则, 字段名子串匹配正则)
+    """
+    alternation = '|'.join(re.escape(field) for field in sorted(fields, key=len, reverse=True))
+    message_pattern = re.compile(
+        rf'("(?:{alternation})"\s*:\s*)"[^"]+"'
+        rf'|({alternation})\s*[=:]\s*["\']?[^"\'&\s]+["\']?',
+        re.IGNORECASE,
+    )
+    return message_pattern, re.compile(alternation)
+
+
+def _redact(match) -> str:
+    if match.group(1) is not None:
+        return f'{match.group(1)}"{REDACT_PATTERN}"'
+    return f'{match.group(2)}={REDACT_PATTERN}'
+
+
+_KEY_PATTERN = _compile_patterns(frozenset(SENSITIVE_FIELDS))[1]
+
+# sanitize_string 使用的正则，按顺序依次替换
+_PHONE_PATTERN = re.compile(r'\b(\d{3})\d{4}(\d{4})\b')
+_EMAIL_PATTERN = re.compile(r'([a-zA-Z0-9._%+-]+)@([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})')
+_ID_CARD_PATTERN = re.compile(r'(\d{6})\d{8}(\d{4})')
+_BANK_CARD_PATTERN = re.compile(r'\b(\d{4})\d{8,}(\d{4})\b')
+
+
+@lru_cache(maxsize=4096)
+def is_sensitive_key(key: str) -> bool:
+    """字段名是否敏感（包含任一敏感字段），结果按字段名缓存"""
+    return _KEY_PATTERN.search(key.lower()) is not None
+
+
 class SensitiveDataFilter(logging.Filter):
     """
     日志过滤器，自动对敏感字段进行脱敏
@@ -30,6 +68,7 @@ class SensitiveDataFilter(logging.Filter):
     def __init__(self, sensitive_fields: Optional[set] = None):
         super().__init__()
         self.sensitive_fields = sensitive_fields or SENSITIVE_FIELDS
+        self._pattern = _compile_patterns(frozenset(self.sensitive_fields))[0]
     
     def filter(self, record: logging.LogRecord) -> bool:
         """过滤日志记录，对敏感信息脱敏"""
@@ -45,21 +84,11 @@ class SensitiveDataFilter(logging.Filter):
         return True
     
     def _sanitize_message(self, message: str) -> str:
-        """对消息进行脱敏处理"""
-        if not message:
+        """对消息进行脱敏处理，匹配 field=value、field: value 和 "field": "value" 模式"""
+        # 不含分隔符的消息不可能命中，跳过正则
+        if not message or ('=' not in message and ':' not in message):
             return message
-        
-        # 对已知敏感字段进行脱敏
-        for field in self.sensitive_fields:
-            # 匹配 field=value 或 field: value 模式
-            patterns = [
-                rf'(?i)({field})\s*[=:]\s*["\']?([^"\'&\s]+)["\']?',
-                rf'(?i)("({field})"\s*:\s*)"([^"]+)"',
-            ]
-            for pattern in patterns:
-                message = re.sub(pattern, rf'\1={REDACT_PATTERN}', message)
-        
-        return message
+        return self._pattern.sub(_redact, message)
 
 
 class LogSanitizer:
@@ -86,11 +115,7 @@ class LogSanitizer:
         
         result = {}
         for key, value in data.items():
-            key_lower = key.lower()
-            
-            if key_lower in SENSITIVE_FIELDS or any(
-                sf in key_lower for sf in SENSITIVE_FIELDS
-            ):
+            if is_sensitive_key(key):
                 result[key] = REDACT_PATTERN
             elif isinstance(value, dict):
                 result[key] = LogSanitizer.sanitize_dict(value, depth + 1, max_depth)
@@ -122,32 +147,16 @@ class LogSanitizer:
         result = text
         
         # 手机号脱敏 (保留前3后4位) - 添加单词边界防止误匹配
-        result = re.sub(
-            r'\b(\d{3})\d{4}(\d{4})\b',
-            r'\1****\2',
-            result
-        )
+        result = _PHONE_PATTERN.sub(r'\1****\2', result)
         
         # 邮箱脱敏
-        result = re.sub(
-            r'([a-zA-Z0-9._%+-]+)@([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})',
-            lambda m: f'{m.group(1)[:2]}***@{m.group(2)}',
-            result
-        )
+        result = _EMAIL_PATTERN.sub(lambda m: f'{m.group(1)[:2]}***@{m.group(2)}', result)
         
         # 身份证号脱敏
-        result = re.sub(
-            r'(\d{6})\d{8}(\d{4})',
-            r'\1********\2',
-            result
-        )
+        result = _ID_CARD_PATTERN.sub(r'\1********\2', result)
         
         # 银行卡号脱敏 (保留前4后4位)
-        result = re.sub(
-            r'\b(\d{4})\d{8,}(\d{4})\b',
-            r'\1****\2',
-            result
-        )
+        result = _BANK_CARD_PATTERN.sub(r'\1****\2', result)
         
         return result
     
@@ -0,0 +1,255 @@
+"""
+查询预算
+为视图或服务调用声明允许的最大数据库查询数，用于在测试和预发环境中发现N+1查询。
+超出预算时报告重复次数最多的SQL和第一条超出预算的查询的调用栈；处理方式由 QUERY_BUDGET_MODE 决定：
+raise 抛出 QueryBudgetExceeded（测试），warn 输出 WARNING 日志（DEBUG/预发），off 不记录（生产）
+"""
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.template.response import SimpleTemplateResponse
+from rest_framework.response import Response
+
+from apps.api.utils import request_metrics
+
+
+logger = logging.getLogger('apps.api.performance')
+
+MODE_RAISE = 'raise'
+MODE_WARN = 'warn'
+MODE_OFF = 'off'
+REPORT_TOP_STATEMENTS = 5
+SQL_EXCERPT_LENGTH = 300
+STACK_DEPTH = 12
+
+# execute_wrapper 回调和 ORM 内部的帧不出现在报告中
+_WRAPPER_FILES = {__file__, request_metrics.__file__}
+_ORM_PATH = os.path.join('django', 'db', '')
+
+_active: contextvars.ContextVar[Tuple['QueryBudget', ...]] = contextvars.ContextVar('query_budgets', default=())
+
+
+class QueryBudgetExceeded(Exception):
+    """查询数超出预算（QUERY_BUDGET_MODE=raise）"""
+
+
+def get_mode() -> str:
+    return getattr(settings, 'QUERY_BUDGET_MODE', MODE_OFF)
+
+
+def _is_project_frame(frame) -> bool:
+    return frame.filename.startswith(str(settings.BASE_DIR)) and 'site-packages' not in frame.filename
+
+
+def _format_frame(frame) -> str:
+    if _is_project_frame(frame):
+        filename = os.path.relpath(frame.filename, settings.BASE_DIR)
+    else:
+        filename = frame.filename.split('site-packages' + os.sep)[-1]
+    return f'{filename}:{frame.lineno} in {frame.name}'
+
+
+def _offending_stack() -> List[str]:
+    """
+    查询的调用栈：项目代码帧，以及触发查询的最内层非ORM帧。
+    查询由模板渲染、表单字段等库代码触发时（如列表页逐行访问外键），最后一帧指出触发位置
+    """
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename not in _WRAPPER_FILES and _ORM_PATH not in frame.filename
+    ]
+    kept = [frame for frame in frames[:-1] if _is_project_frame(frame)][-STACK_DEPTH:] + frames[-1:]
+    return [_format_frame(frame) for frame in kept]
+
+
+class QueryBudget:
+    """
+    一次调用的查询计数，作为 connection.execute_wrapper 回调安装
+
+    Args:
+        max_queries: 允许的最大查询数
+        name: 报告中的名称
+    """
+
+    def __init__(self, max_queries: int, name: str):
+        self.max_queries = max_queries
+        self.name = name
+        self.count = 0
+        self.statements: Counter = Counter()
+        self.offending: Optional[Tuple[str, List[str]]] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __call__(self, execute, sql, params, many, context):
+        # 同一线程的连接上重复安装时（如 track_budgets 再次进入）只计一次
+        if getattr(self._local, 'executing', False):
+            return execute(sql, params, many, context)
+        self._local.executing = True
+        try:
+            self.record(sql)
+            return execute(sql, params, many, context)
+        finally:
+            self._local.executing = False
+
+    def record(self, sql: str):
+        with self._lock:
+            self.count += 1
+            self.statements[sql] += 1
+            first_over = self.offending is None and self.count > self.max_queries
+            if first_over:
+                self.offending = (sql, [])
+        if first_over:
+            # 只在第一次超出时采集调用栈，预算内的查询没有额外开销
+            self.offending = (sql, _offending_stack())
+
+    @property
+    def exceeded(self) -> bool:
+        return self.count > self.max_queries
+
+    def report(self) -> str:
+        lines = [f'查询预算超出: {self.name} 执行了 {self.count} 条查询，预算 {self.max_queries}', '重复最多的SQL:']
+        lines += [
+            f'  x{count} {sql[:SQL_EXCERPT_LENGTH]}'
+            for sql, count in self.statements.most_common(REPORT_TOP_STATEMENTS)
+        ]
+        if self.offending:
+            sql, stack = self.offending
+            lines.append(f'第一条超出预算的查询: {sql[:SQL_EXCERPT_LENGTH]}')
+            lines += [f'  {frame}' for frame in stack]
+        return '\n'.join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'queries': self.count,
+            'budget': self.max_queries,
+            'top_statements': [
+                {'count': count, 'sql': sql[:SQL_EXCERPT_LENGTH]}
+                for sql, count in self.statements.most_common(REPORT_TOP_STATEMENTS)
+            ],
+            'stack': self.offending[1] if self.offending else [],
+        }
+
+    def check(self, mode: str):
+        if not self.exceeded:
+            return
+        if mode == MODE_RAISE:
+            raise QueryBudgetExceeded(self.report())
+        logger.warning(self.report(), extra={'data': {'query_budget': self.to_dict()}})
+
+
+@contextmanager
+def _install(budgets):
+    with ExitStack() as stack:
+        for connection in connections.all():
+            for budget in budgets:
+                stack.enter_context(connection.execute_wrapper(budget))
+        yield
+
+
+@contextmanager
+def track_budgets():
+    """
+    在当前线程的数据库连接上记录进行中的查询预算
+
+    异步视图的ORM操作在 run_in_db_thread 的工作线程中执行，需要在工作线程中再次进入
+    """
+    budgets = _active.get()
+    if not budgets:
+        yield
+        return
+    with _install(budgets):
+        yield
+
+
+def extend_query_budget(extra: int):
+    """为当前进行中的查询预算追加额度，批量接口按条数调用"""
+    for budget in _active.get():
+        budget.max_queries += extra
+
+
+@contextmanager
+def _enforce(max_queries: int, name: str):
+    mode = get_mode()
+    if mode == MODE_OFF:
+        yield None
+        return
+    budget = QueryBudget(max_queries, name)
+    token = _active.set(_active.get() + (budget,))
+    try:
+        with _install((budget,)):
+            yield budget
+    finally:
+        _active.reset(token)
+    budget.check(mode)
+
+
+def _render(response):
+    """
+    TemplateResponse 的查询多发生在渲染时（如列表页逐行访问关联对象），需要在预算内完成渲染。
+    DRF 的 Response 要等 finalize_response 设置渲染器后才能渲染，不在此处理
+    """
+    if isinstance(response, SimpleTemplateResponse) and not isinstance(response, Response) and not response.is_rendered:
+        started = time.perf_counter()
+        response.render()
+        # 提前渲染后 PerformanceMiddleware 的渲染回调不再计时，在此计入
+        metrics = request_metrics.current_metrics()
+        if metrics is not None:
+            metrics.template_time += time.perf_counter() - started
+    return response
+
+
+class query_budget:
+    """
+    声明查询预算，可作为装饰器（支持异步函数和返回 TemplateResponse 的视图）或上下文管理器
+
+    Usage:
+        class ItineraryPDFExportView(View):
+            @query_budget(15)
+            def get(self, request, itinerary_id, *args, **kwargs):
+                ...
+
+        with query_budget(40, name='quote snapshot'):
+            itinerary.update_itinerary_quote_json_data()
+    """
+
+    def __init__(self, max_queries: int, name: Optional[str] = None):
+        self.max_queries = max_queries
+        self.name = name
+        self._scopes: list = []
+
+    def __call__(self, func):
+        name = self.name or f'{func.__module__}.{func.__qualname__}'
+
+        if iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _enforce(self.max_queries, name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _enforce(self.max_queries, name) as budget:
+                response = func(*args, **kwargs)
+                return _render(response) if budget is not None else response
+        return wrapper
+
+    def __enter__(self) -> Optional[QueryBudget]:
+        scope = _enforce(self.max_queries, self.name or 'query_budget')
+        self._scopes.append(scope)
+        return scope.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._scopes.pop().__exit__(*exc_info)
@@ -0,0 +1,123 @@
+"""
+请求级性能指标
+记录一次请求内的数据库查询数与耗时、最慢的若干条SQL、调用n8n等外部服务的耗时和模板渲染耗时，
+由 PerformanceMiddleware 汇总输出到 Server-Timing 响应头和日志
+"""
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import connections
+
+
+DEFAULT_TOP_QUERIES = 5
+SQL_EXCERPT_LENGTH = 500
+
+_current: contextvars.ContextVar[Optional['RequestMetrics']] = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    一次请求的性能指标
+
+    Args:
+        top_queries: 保留最慢SQL的条数
+    """
+
+    def __init__(self, top_queries: int = DEFAULT_TOP_QUERIES):
+        self.started = time.perf_counter()
+        self.top_queries = top_queries
+        self.db_count = 0
+        self.db_time = 0.0
+        self.external: Dict[str, List[float]] = {}
+        self.template_time = 0.0
+        self._slow_queries: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+
+    def record_query(self, sql: str, duration: float):
+        self.db_count += 1
+        self.db_time += duration
+        if self.top_queries <= 0:
+            return
+        entry = (duration, next(self._sequence), sql)
+        if len(self._slow_queries) < self.top_queries:
+            heapq.heappush(self._slow_queries, entry)
+        elif duration > self._slow_queries[0][0]:
+            heapq.heapreplace(self._slow_queries, entry)
+
+    def record_external(self, name: str, duration: float):
+        self.external.setdefault(name, [0, 0.0])
+        self.external[name][0] += 1
+        self.external[name][1] += duration
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper 回调"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record_query(sql, time.perf_counter() - started)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def slowest_queries(self) -> List[Dict[str, Any]]:
+        """最慢的SQL，按耗时降序"""
+        return [
+            {'ms': round(duration * 1000, 2), 'sql': sql[:SQL_EXCERPT_LENGTH]}
+            for duration, _, sql in sorted(self._slow_queries, reverse=True)
+        ]
+
+
+def start_request_metrics(top_queries: int = DEFAULT_TOP_QUERIES) -> Tuple[RequestMetrics, contextvars.Token]:
+    """开始记录当前请求的指标，返回指标对象和用于恢复的 token"""
+    metrics = RequestMetrics(top_queries)
+    return metrics, _current.set(metrics)
+
+
+def stop_request_metrics(token: contextvars.Token):
+    _current.reset(token)
+
+
+def current_metrics() -> Optional[RequestMetrics]:
+    """当前请求的指标，请求之外（如后台任务）返回 None"""
+    return _current.get()
+
+
+@contextmanager
+def track_queries():
+    """
+    在当前线程的所有数据库连接上记录查询，请求之外不做任何事
+
+    数据库连接按线程区分，异步视图把ORM操作交给线程池执行时需要在工作线程中再次进入
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+        yield
+
+
+@contextmanager
+def track_external(name: str):
+    """
+    记录外部服务调用耗时
+
+    Usage:
+        with track_external('n8n'):
+            response = requests.post(url, json=payload, timeout=timeout)
+    """
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.record_external(name, time.perf_counter() - started)
@@ -0,0 +1,114 @@
+"""
+Webhook 请求体解析工具
+直接在原始字节上用 orjson 解析，不再生成中间字符串；限制请求体大小；
+日志只取有限长度的片段，不为打日志序列化整个文档
+"""
+import json
+from typing import Any, Iterator
+
+import orjson
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.http import JsonResponse
+
+
+DEFAULT_MAX_BODY_SIZE = 10 * 1024 * 1024
+DEFAULT_EXCERPT_LENGTH = 2000
+
+
+class RequestBodyError(Exception):
+    """请求体不可用（过大），携带应返回的状态码"""
+
+    def __init__(self, message: str, status_code: int = 413):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def max_body_size() -> int:
+    """webhook 请求体大小上限（字节）"""
+    return int(getattr(settings, 'WEBHOOK_MAX_BODY_SIZE', DEFAULT_MAX_BODY_SIZE))
+
+
+def read_body(request) -> bytes:
+    """
+    读取请求体，超过 WEBHOOK_MAX_BODY_SIZE 时抛出 RequestBodyError
+
+    先检查 Content-Length，声明过大的请求不会被读入内存
+    """
+    limit = max_body_size()
+    try:
+        declared = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        declared = 0
+    if declared > limit:
+        raise RequestBodyError(f'请求体过大: {declared} 字节，上限 {limit} 字节')
+
+    try:
+        body = request.body
+    except RequestDataTooBig:
+        raise RequestBodyError(f'请求体过大，上限 {limit} 字节')
+    if len(body) > limit:
+        raise RequestBodyError(f'请求体过大: {len(body)} 字节，上限 {limit} 字节')
+    return body
+
+
+def parse_json_body(request) -> Any:
+    """
+    解析JSON请求体
+
+    Raises:
+        RequestBodyError: 请求体过大
+        json.JSONDecodeError: JSON格式错误（orjson.JSONDecodeError 是其子类）
+    """
+    return orjson.loads(read_body(request))
+
+
+def body_error_response(error: RequestBodyError) -> JsonResponse:
+    """请求体不可用时的响应"""
+    return JsonResponse({'success': False, 'error': error.message}, status=error.status_code)
+
+
+def _encode_scalar(value: Any, limit: int) -> str:
+    if isinstance(value, str) and len(value) > limit:
+        value = value[:limit]
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _iter_json(value: Any, limit: int) -> Iterator[str]:
+    """逐段生成JSON文本，长字符串先截断再编码"""
+    if isinstance(value, dict):
+        yield '{'
+        for index, (key, item) in enumerate(value.items()):
+            if index:
+                yield ', '
+            yield _encode_scalar(str(key), limit)
+            yield ': '
+            yield from _iter_json(item, limit)
+        yield '}'
+    elif isinstance(value, (list, tuple)):
+        yield '['
+        for index, item in enumerate(value):
+            if index:
+                yield ', '
+            yield from _iter_json(item, limit)
+        yield ']'
+    else:
+        yield _encode_scalar(value, limit)
+
+
+def log_excerpt(value: Any, limit: int = DEFAULT_EXCERPT_LENGTH) -> str:
+    """
+    生成用于日志的JSON片段，达到长度上限后停止编码
+
+    Usage:
+        logger.info(f'接收到的原始数据: {log_excerpt(data)}')
+    """
+    pieces = []
+    size = 0
+    for piece in _iter_json(value, limit):
+        pieces.append(piece)
+        size += len(piece)
+        if size > limit:
+            return ''.join(pieces)[:limit] + '...'
+    return ''.join(pieces)
@@ -0,0 +1,237 @@
+"""
+分层缓存
+一级缓存（L1）在进程内，按 LRU 和有效期淘汰；二级缓存（L2）是 Django 缓存（settings.CACHES，文件缓存或 Redis），
+由同一部署的 gunicorn worker 和 qcluster 进程共享。
+每个命名空间在 L2 中保存一个版本号，键名带版本号；invalidate() 递增版本号即让所有进程的该命名空间失效：
+其他进程最迟在 TIERED_CACHE_VERSION_CHECK_INTERVAL 秒后读到新版本并清空自己的 L1，旧版本的 L2 条目不再被读取，按有效期过期。
+缓存的值在进程内被多个调用方共享，调用方不应修改
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'tiered'
+DEFAULT_TIMEOUT = 300
+DEFAULT_L1_MAX_ENTRIES = 1024
+DEFAULT_L1_TTL = 60
+DEFAULT_VERSION_CHECK_INTERVAL = 1
+
+_MISSING = object()
+_registry: Dict[str, 'TieredCache'] = {}
+_registry_lock = threading.Lock()
+
+
+class TieredCache:
+    """
+    一个命名空间的分层缓存，通过 get_tiered_cache() 获取，同一进程内每个命名空间只有一个实例
+
+    Args:
+        namespace: 命名空间，决定键前缀和失效范围
+        timeout: L2 条目有效期（秒）
+        l1_max_entries: L1 条目上限，0 表示不使用 L1（体积大的值，如导出文件）
+        l1_ttl: L1 条目有效期（秒），不超过 timeout
+    """
+
+    def __init__(self, namespace: str, timeout: int = DEFAULT_TIMEOUT, l1_max_entries: Optional[int] = None,
+                 l1_ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.timeout = timeout
+        if l1_max_entries is None:
+            l1_max_entries = getattr(settings, 'TIERED_CACHE_L1_MAX_ENTRIES', DEFAULT_L1_MAX_ENTRIES)
+        if l1_ttl is None:
+            l1_ttl = getattr(settings, 'TIERED_CACHE_L1_TTL', DEFAULT_L1_TTL)
+        self.l1_max_entries = l1_max_entries
+        self.l1_ttl = min(l1_ttl, timeout)
+        self._l1: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+
+    @property
+    def l2(self):
+        return caches[getattr(settings, 'TIERED_CACHE_ALIAS', 'default')]
+
+    @property
+    def _version_key(self) -> str:
+        return f'{KEY_PREFIX}:{self.namespace}:version'
+
+    def _l2_key(self, key: str, version: int) -> str:
+        return f'{KEY_PREFIX}:{self.namespace}:{version}:{key}'
+
+    def version(self) -> int:
+        """当前命名空间版本，距上次读取超过检查间隔时从 L2 重新读取，版本变化时清空 L1"""
+        now = time.monotonic()
+        interval = getattr(settings, 'TIERED_CACHE_VERSION_CHECK_INTERVAL', DEFAULT_VERSION_CHECK_INTERVAL)
+        if self._version is not None and now - self._checked_at < interval:
+            return self._version
+        try:
+            version = self.l2.get(self._version_key)
+            if version is None:
+                # 初始版本取当前毫秒时间戳：版本号被 L2 淘汰后重新初始化，也不会与之前的版本重合而读到旧条目
+                self.l2.add(self._version_key, int(time.time() * 1000), None)
+                version = self.l2.get(self._version_key)
+        except Exception as e:
+            logger.warning(f"读取缓存版本失败: {self.namespace}, {str(e)}")
+            version = None
+        if version is None:
+            # L2 不可用时沿用进程内版本，只使用 L1
+            version = self._version or 0
+        with self._lock:
+            if version != self._version:
+                self._l1.clear()
+            self._version = version
+            self._checked_at = now
+        return version
+
+    def _l1_get(self, key: str):
+        if not self.l1_max_entries:
+            return _MISSING
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._l1[key]
+                return _MISSING
+            self._l1.move_to_end(key)
+            return value
+
+    def _l1_set(self, key: str, value):
+        if not self.l1_max_entries:
+            return
+        with self._lock:
+            self._l1[key] = (time.monotonic() + self.l1_ttl, value)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def get(self, key: str, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """返回 {键: 值}，只包含命中的键；L1 未命中的键合并为一次 L2 读取"""
+        version = self.version()
+        found, missing = {}, []
+        for key in keys:
+            value = self._l1_get(key)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if not missing:
+            return found
+        try:
+            stored = self.l2.get_many([self._l2_key(key, version) for key in missing])
+        except Exception as e:
+            logger.warning(f"读取缓存失败: {self.namespace}, {str(e)}")
+            return found
+        for key in missing:
+            value = stored.get(self._l2_key(key, version), _MISSING)
+            if value is not _MISSING:
+                self._l1_set(key, value)
+                found[key] = value
+        return found
+
+    def set(self, key: str, value, timeout: Optional[int] = None):
+        self.set_many({key: value}, timeout)
+
+    def set_many(self, mapping: Dict[str, Any], timeout: Optional[int] = None):
+        version = self.version()
+        for key, value in mapping.items():
+            self._l1_set(key, value)
+        try:
+            self.l2.set_many(
+                {self._l2_key(key, version): value for key, value in mapping.items()},
+                timeout or self.timeout,
+            )
+        except Exception as e:
+            logger.warning(f"写入缓存失败: {self.namespace}, {str(e)}")
+
+    def get_or_set(self, key: str, default: Callable[[], Any], timeout: Optional[int] = None):
+        """读取缓存，未命中时调用 default() 计算并写入；default() 返回 None 时不缓存"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = default()
+            if value is not None:
+                self.set(key, value, timeout)
+        return value
+
+    def delete(self, key: str):
+        """删除单个键；其他进程 L1 中的副本在 L1 有效期内仍可能被读到，需要立即一致时用 invalidate()"""
+        with self._lock:
+            self._l1.pop(key, None)
+        try:
+            self.l2.delete(self._l2_key(key, self.version()))
+        except Exception as e:
+            logger.warning(f"删除缓存失败: {self.namespace}, {str(e)}")
+
+    def invalidate(self):
+        """递增命名空间版本，所有进程的该命名空间失效"""
+        try:
+            version = self.l2.incr(self._version_key)
+        except ValueError:
+            # 版本号不存在（尚未初始化或已被淘汰）
+            self._version = None
+            version = self.version()
+        except Exception as e:
+            logger.warning(f"递增缓存版本失败: {self.namespace}, {str(e)}")
+            version = (self._version or 0) + 1
+        with self._lock:
+            self._l1.clear()
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def clear_local(self):
+        """清空本进程的 L1，并在下次访问时重新读取版本"""
+        with self._lock:
+            self._l1.clear()
+            self._version = None
+
+
+def get_tiered_cache(namespace: str, **options) -> TieredCache:
+    """
+    获取命名空间的分层缓存，首次获取时按 options 创建
+
+    Usage:
+        catalog_cache = get_tiered_cache('catalog', timeout=600)
+        records = catalog_cache.get_or_set(f'attractions:{city}', lambda: load(city))
+    """
+    with _registry_lock:
+        cache = _registry.get(namespace)
+        if cache is None:
+            cache = _registry[namespace] = TieredCache(namespace, **options)
+        return cache
+
+
+def invalidate_on_change(cache: TieredCache, *models):
+    """
+    模型保存或删除时让整个命名空间失效。
+    立即失效一次，让当前进程在事务内读到新数据；提交后再失效一次，避免其他进程在提交前读到并缓存旧数据
+    """
+    def handler(sender, using=None, **kwargs):
+        cache.invalidate()
+        if transaction.get_connection(using).in_atomic_block:
+            transaction.on_commit(cache.invalidate, using=using)
+
+    for model in models:
+        post_save.connect(handler, sender=model, weak=False, dispatch_uid=f'tiered_cache_{cache.namespace}_save')
+        post_delete.connect(handler, sender=model, weak=False, dispatch_uid=f'tiered_cache_{cache.namespace}_delete')
+
+
+def clear_local_caches():
+    """清空本进程所有命名空间的 L1（测试在每个用例前调用）"""
+    with _registry_lock:
+        caches_ = list(_registry.values())
+    for cache in caches_:
+        cache.clear_local()
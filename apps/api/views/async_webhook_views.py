@@ -0,0 +1,265 @@
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+import json
+import logging
+
+from apps.api.serializers.webhook_serializers import (
+    ItineraryWebhookSerializer,
+    RequirementWebhookSerializer,
+    ItineraryOptimizationCallbackSerializer,
+    ItineraryQuoteCallbackSerializer,
+)
+from apps.api.services.webhook_services import (
+    ItineraryService,
+    RequirementService,
+    ItineraryOptimizationService,
+)
+from apps.api.services.prompt_context_services import PromptContextService
+from apps.api.services.idempotency_services import idempotent_webhook
+from apps.api.utils.async_utils import run_in_db_thread
+from apps.api.utils.query_budget import query_budget
+from apps.api.utils.request_utils import RequestBodyError, body_error_response, parse_json_body
+from apps.api.views.webhook_views import ITINERARY_CREATE_QUERY_BUDGET, QUOTE_SNAPSHOT_QUERY_BUDGET
+
+logger = logging.getLogger(__name__)
+
+
+def _ingest_itinerary(validated_data):
+    """校验关联需求并创建行程，返回 (状态码, 响应体)"""
+    valid, requirement, error_msg = ItineraryService.validate_requirement_exists(validated_data.get('requirement_id'))
+    if not valid:
+        return 404, {'error': error_msg}
+
+    success, itinerary, error_msg = ItineraryService.create_itinerary(validated_data, requirement)
+    if not success:
+        return 500, {'success': False, 'error': error_msg}
+
+    return 200, {
+        'success': True,
+        'itinerary_id': itinerary.itinerary_id,
+        'itinerary_name': itinerary.itinerary_name
+    }
+
+
+def _ingest_requirement(requirement_data):
+    """分配需求ID并创建需求，返回 (是否成功, requirement_id, 错误信息)"""
+    success, requirement_id, error_msg = RequirementService.generate_requirement_id()
+    if not success:
+        return False, None, error_msg
+
+    success, _, error_msg = RequirementService.create_requirement(requirement_id, requirement_data)
+    if not success:
+        return False, None, error_msg
+    return True, requirement_id, None
+
+
+def _update_description(itinerary_id, description):
+    """更新行程描述，返回 (状态码, 错误信息)"""
+    valid, itinerary, error_msg = ItineraryOptimizationService.validate_itinerary_exists(itinerary_id)
+    if not valid:
+        return 404, error_msg
+
+    success, error_msg = ItineraryOptimizationService.update_description(itinerary, description)
+    return (200, None) if success else (500, error_msg)
+
+
+def _update_quote(itinerary_id, itinerary_quote):
+    """保存行程报价，返回 (状态码, 错误信息)"""
+    valid, itinerary, error_msg = ItineraryOptimizationService.validate_itinerary_exists(itinerary_id)
+    if not valid:
+        return 404, error_msg
+
+    itinerary.itinerary_quote = itinerary_quote
+    itinerary.save(update_fields=['itinerary_quote', 'updated_at'])
+    return 200, None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncItineraryWebhookView(View):
+    """ItineraryWebhookView 的异步版本：在事件循环上解析校验，ORM操作交给数据库线程池"""
+
+    @query_budget(ITINERARY_CREATE_QUERY_BUDGET)
+    @idempotent_webhook('itinerary')
+    async def post(self, request, *args, **kwargs):
+        """接收并处理webhook数据"""
+        try:
+            data = parse_json_body(request)
+            logger.info(f'接收到来自n8n的异步webhook请求, 长度: {len(request.body)}')
+            if 'output' in data:
+                data = data['output']
+
+            # 规划上下文使用短ID时，将活动引用还原为原始资源ID
+            if isinstance(data, dict) and isinstance(data.get('id_map'), dict):
+                data = PromptContextService.expand_ids(data, data.pop('id_map'))
+
+            serializer = ItineraryWebhookSerializer(data=data)
+            if not serializer.is_valid():
+                errors = serializer.errors
+                logger.error(f'数据验证失败: {errors}')
+                return JsonResponse({
+                    'success': False,
+                    'error': '数据验证失败',
+                    'validation_errors': errors
+                }, status=400)
+
+            status_code, body = await run_in_db_thread(_ingest_itinerary, serializer.validated_data)
+            if status_code == 200:
+                logger.info(f'行程数据解析并保存成功: {body["itinerary_id"]}')
+            else:
+                logger.error(f'创建行程失败: {body["error"]}')
+            return JsonResponse(body, status=status_code)
+
+        except RequestBodyError as e:
+            return body_error_response(e)
+        except json.JSONDecodeError as e:
+            logger.error(f'JSON格式错误: {e}', exc_info=True)
+            return JsonResponse({'error': f'JSON格式错误: {str(e)}'}, status=400)
+        except Exception as e:
+            logger.error(f'处理数据失败: {e}', exc_info=True)
+            return JsonResponse({'error': f'处理数据失败: {str(e)}'}, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncRequirementWebhookView(View):
+    """RequirementWebhookView 的异步版本，响应格式与同步版本一致"""
+
+    @query_budget(20)
+    @idempotent_webhook('requirement')
+    async def post(self, request, *args, **kwargs):
+        """接收并处理webhook数据"""
+        try:
+            logger.info('接收到来自n8n的异步需求解析webhook请求')
+
+            data = parse_json_body(request)
+            if isinstance(data, list) and len(data) > 0:
+                if len(data) > 1:
+                    logger.warning(f'请求数据包含{len(data)}条需求，仅处理第一条，批量提交请使用批量接口')
+                data = data[0]
+            if 'output' in data:
+                data = data['output']
+
+            serializer = RequirementWebhookSerializer(data=data)
+            if not serializer.is_valid():
+                errors = serializer.errors
+                logger.error(f'数据验证失败: {errors}')
+                return JsonResponse({
+                    'success': False,
+                    'error': '数据验证失败',
+                    'validation_errors': errors
+                }, status=400)
+
+            validated_data = serializer.validated_data
+            requirement_data = RequirementService.convert_dates(validated_data.get('structured_data', validated_data))
+
+            success, requirement_id, error_msg = await run_in_db_thread(_ingest_requirement, requirement_data)
+            if not success:
+                logger.error(error_msg)
+                return JsonResponse({'success': False, 'error': error_msg}, status=500)
+
+            logger.info(f'需求解析数据处理成功: {requirement_id}')
+            return JsonResponse({
+                'success': True,
+                'requirement_id': requirement_id,
+                'structured_data': requirement_data,
+                'message': f'需求解析数据处理成功，请在需求列表页面查看{requirement_id}',
+                'validation_errors': None,
+                'warnings': [],
+                'error': None
+            }, json_dumps_params={'ensure_ascii': False})
+
+        except RequestBodyError as e:
+            return body_error_response(e)
+        except json.JSONDecodeError as e:
+            logger.error(f'JSON格式错误: {e}')
+            return JsonResponse({'success': False, 'error': f'JSON格式错误: {str(e)}'}, status=400)
+        except Exception as e:
+            logger.error(f'处理需求解析数据失败: {e}', exc_info=True)
+            return JsonResponse({'success': False, 'error': f'处理数据失败: {str(e)}'}, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncItineraryOptimizationCallbackView(View):
+    """ItineraryOptimizationCallbackView 的异步版本"""
+
+    @query_budget(QUOTE_SNAPSHOT_QUERY_BUDGET)
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = parse_json_body(request)
+
+            serializer = ItineraryOptimizationCallbackSerializer(data=data)
+            if not serializer.is_valid():
+                errors = serializer.errors
+                logger.error(f'数据验证失败: {errors}')
+                return JsonResponse({
+                    'success': False,
+                    'error': '数据验证失败',
+                    'validation_errors': errors
+                }, status=400)
+
+            itinerary_id = serializer.validated_data.get('itinerary_id')
+            description = serializer.validated_data.get('description', '')
+
+            status_code, error_msg = await run_in_db_thread(_update_description, itinerary_id, description)
+            if status_code != 200:
+                logger.error(error_msg)
+                return JsonResponse({'success': False, 'error': error_msg}, status=status_code)
+
+            logger.info(f"行程优化成功: {itinerary_id}, description已更新")
+            return JsonResponse({
+                'success': True,
+                'message': f'行程 {itinerary_id} 的description已更新'
+            })
+
+        except RequestBodyError as e:
+            return body_error_response(e)
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON解析失败: {e}")
+            return JsonResponse({'success': False, 'error': f'JSON解析失败: {str(e)}'}, status=400)
+        except Exception as e:
+            logger.error(f"处理行程优化callback失败: {e}", exc_info=True)
+            return JsonResponse({'success': False, 'error': f'处理失败: {str(e)}'}, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncItineraryQuoteCallbackView(View):
+    """ItineraryQuoteCallbackView 的异步版本"""
+
+    @query_budget(QUOTE_SNAPSHOT_QUERY_BUDGET)
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = parse_json_body(request)
+
+            serializer = ItineraryQuoteCallbackSerializer(data=data)
+            if not serializer.is_valid():
+                errors = serializer.errors
+                logger.error(f'数据验证失败: {errors}')
+                return JsonResponse({
+                    'success': False,
+                    'error': '数据验证失败',
+                    'validation_errors': errors
+                }, status=400)
+
+            itinerary_id = serializer.validated_data.get('itinerary_id')
+            itinerary_quote = serializer.validated_data.get('itinerary_quote', '')
+
+            status_code, error_msg = await run_in_db_thread(_update_quote, itinerary_id, itinerary_quote)
+            if status_code != 200:
+                logger.error(error_msg)
+                return JsonResponse({'success': False, 'error': error_msg}, status=status_code)
+
+            logger.info(f"行程报价更新成功: {itinerary_id}")
+            return JsonResponse({
+                'success': True,
+                'message': f'行程 {itinerary_id} 的报价已更新'
+            })
+
+        except RequestBodyError as e:
+            return body_error_response(e)
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON解析失败: {e}")
+            return JsonResponse({'success': False, 'error': f'JSON解析失败: {str(e)}'}, status=400)
+        except Exception as e:
+            logger.error(f"处理行程报价callback失败: {e}", exc_info=True)
+            return JsonResponse({'success': False, 'error': f'处理失败: {str(e)}'}, status=500)
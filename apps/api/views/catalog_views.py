@@ -0,0 +1,129 @@
+from django.http import JsonResponse, HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+import json
+import logging
+
+from apps.models.requirement import Requirement
+from apps.api.services.candidate_services import CandidateSelectionService
+from apps.api.services.prompt_context_services import PromptContextService
+from apps.api.services.schema_services import SchemaDescriptionService
+from apps.api.services.query_gateway_services import QueryGatewayService
+from apps.api.utils.query_budget import query_budget
+
+logger = logging.getLogger(__name__)
+
+
+def _positive_int(value):
+    """解析可选的正整数查询参数，非法时抛出ValueError"""
+    if value is None:
+        return None
+    number = int(value)
+    if number < 1:
+        raise ValueError
+    return number
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class CandidateSelectionView(View):
+    """按需求预算和偏好筛选候选景点、酒店、餐厅，供n8n行程规划工作流调用"""
+    
+    @query_budget(10)
+    def get(self, request, requirement_id, *args, **kwargs):
+        """返回各类别Top-K候选资源"""
+        try:
+            requirement = Requirement.objects.get(requirement_id=requirement_id)
+        except Requirement.DoesNotExist:
+            return JsonResponse({'success': False, 'error': f'需求不存在: {requirement_id}'}, status=404)
+        
+        try:
+            top_k = _positive_int(request.GET.get('top_k'))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'top_k必须为正整数'}, status=400)
+        
+        try:
+            result = CandidateSelectionService.select(requirement, top_k=top_k)
+        except Exception as e:
+            logger.error(f'候选资源筛选失败: {requirement_id}, {e}', exc_info=True)
+            return JsonResponse({'success': False, 'error': f'候选资源筛选失败: {str(e)}'}, status=500)
+        
+        logger.info(f'候选资源筛选完成: {requirement_id}, '
+                    f'景点 {len(result["attractions"])}, 酒店 {len(result["hotels"])}, 餐厅 {len(result["restaurants"])}')
+        return JsonResponse({'success': True, **result}, json_dumps_params={'ensure_ascii': False})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class PromptContextView(View):
+    """返回需求候选资源的紧凑提示词上下文，控制在token预算内"""
+    
+    @query_budget(15)
+    def get(self, request, requirement_id, *args, **kwargs):
+        """返回按token预算截断的目录上下文"""
+        try:
+            requirement = Requirement.objects.get(requirement_id=requirement_id)
+        except Requirement.DoesNotExist:
+            return JsonResponse({'success': False, 'error': f'需求不存在: {requirement_id}'}, status=404)
+        
+        try:
+            token_budget = _positive_int(request.GET.get('token_budget'))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'token_budget必须为正整数'}, status=400)
+        
+        try:
+            context = PromptContextService.for_requirement(requirement, token_budget=token_budget)
+        except Exception as e:
+            logger.error(f'构建提示词上下文失败: {requirement_id}, {e}', exc_info=True)
+            return JsonResponse({'success': False, 'error': f'构建提示词上下文失败: {str(e)}'}, status=500)
+        
+        logger.info(f'提示词上下文构建完成: {requirement_id}, 预估token {context["estimated_tokens"]}')
+        return JsonResponse({'success': True, **context}, json_dumps_params={'ensure_ascii': False})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class SchemaDescriptionView(View):
+    """返回缓存的数据库结构描述，供自然语言查询工作流使用"""
+    
+    @query_budget(5)
+    def get(self, request, *args, **kwargs):
+        """默认返回紧凑文本，format=json 时返回结构化数据，支持 If-None-Match 协商缓存"""
+        document = SchemaDescriptionService.get_document()
+        etag = f'"{document["version"]}"'
+        
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=304)
+        elif request.GET.get('format') == 'json':
+            response = JsonResponse({
+                'success': True,
+                'version': document['version'],
+                'tables': document['tables'],
+            }, json_dumps_params={'ensure_ascii': False})
+        else:
+            response = HttpResponse(document['text'], content_type='text/plain; charset=utf-8')
+        
+        response['ETag'] = etag
+        response['X-Schema-Version'] = document['version']
+        return response
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class QueryGatewayView(View):
+    """只读查询网关，替代n8n工作流直接执行大模型生成的SQL"""
+    
+    @query_budget(10)
+    def post(self, request, *args, **kwargs):
+        """校验并执行SELECT查询，返回列名和行数据"""
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': '无效的JSON格式'}, status=400)
+        
+        sql = data.get('sql') if isinstance(data, dict) else None
+        if not isinstance(sql, str) or not sql.strip():
+            return JsonResponse({'success': False, 'error': '缺少sql字段'}, status=400)
+        
+        success, result, error = QueryGatewayService.execute(sql, use_cache=not data.get('no_cache'))
+        if not success:
+            return JsonResponse({'success': False, 'error': error}, status=400)
+        
+        return JsonResponse({'success': True, **result}, json_dumps_params={'ensure_ascii': False})
@@ -1,3 +1,8 @@
+import io
+import os
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
 from django.http import HttpResponse, Http404
 from django.template.loader import render_to_string
 from django.utils.decorators import method_decorator
@@ -5,6 +10,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views import View
 from django.template.loader import get_template
 import logging
+import time
 import markdown
 # WeasyPrint 延迟导入，避免启动时依赖问题
 # from weasyprint import HTML
@@ -14,8 +20,49 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_TABLE_ALIGNMENT
 from docx.oxml.ns import qn
 
+from apps.metrics import EXPORT_RENDER_LATENCY
+from apps.api.utils.query_budget import query_budget
+from apps.api.utils.tiered_cache import get_tiered_cache
+from apps.models import DailySchedule, Destination, TravelerStats
 from apps.models.itinerary import Itinerary
 
+WORD_TEMPLATE_PATH = 'templates/export/itinerary_template.docx'
+EXPORT_FORMATS = ('pdf', 'docx')
+
+# 导出文件体积较大，只存放在共享缓存中，不占用进程内存；行程更新时间变化或活动、目的地、人数修改后重新生成
+export_cache = get_tiered_cache('export', timeout=getattr(settings, 'EXPORT_CACHE_TTL', 3600), l1_max_entries=0)
+
+
+def get_cached_export(export_format, itinerary, *variant):
+    """读取缓存的导出文件，行程更新时间或 variant（如模板版本）不一致时返回 None"""
+    entry = export_cache.get(f'{export_format}:{itinerary.itinerary_id}')
+    if entry and entry['stamp'] == (itinerary.updated_at, *variant):
+        return entry['content']
+    return None
+
+
+def set_cached_export(export_format, itinerary, content, *variant):
+    export_cache.set(
+        f'{export_format}:{itinerary.itinerary_id}',
+        {'stamp': (itinerary.updated_at, *variant), 'content': content},
+    )
+
+
+def discard_cached_exports(itinerary_id):
+    """删除行程所有格式的导出缓存"""
+    for export_format in EXPORT_FORMATS:
+        export_cache.delete(f'{export_format}:{itinerary_id}')
+
+
+def _discard_exports(sender, instance, **kwargs):
+    # DailySchedule 的外键字段名为 itinerary_id，对应的列属性为 itinerary_id_id
+    discard_cached_exports(instance.itinerary_id_id if sender is DailySchedule else instance.itinerary_id)
+
+
+for _model in (DailySchedule, Destination, TravelerStats):
+    post_save.connect(_discard_exports, sender=_model, dispatch_uid='export_cache_post_save')
+    post_delete.connect(_discard_exports, sender=_model, dispatch_uid='export_cache_post_delete')
+
 
 class ItineraryPDFExportView(View):
     """
@@ -28,6 +75,7 @@ class ItineraryPDFExportView(View):
     def dispatch(self, request, *args, **kwargs):
         return super().dispatch(request, *args, **kwargs)
 
+    @query_budget(10)
     def get(self, request, itinerary_id, *args, **kwargs):
         # 延迟导入 WeasyPrint
         try:
@@ -46,10 +94,19 @@ class ItineraryPDFExportView(View):
             self.logger.exception("Error loading itinerary: id=%s", itinerary_id)
             raise Http404("Error loading itinerary.")
 
+        filename = f"itinerary_{itinerary_id}.pdf"
+        # 图片等资源按请求的域名解析，不同域名分别缓存
+        base_url = request.build_absolute_uri('/')
+        pdf_bytes = get_cached_export('pdf', itinerary, base_url)
+        if pdf_bytes is not None:
+            response = HttpResponse(pdf_bytes, content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+
         # Prepare context using the same data as preview_itinerary view
         try:
             destinations = list(itinerary.destinations.all())
-            schedules = itinerary.dailyschedule_set.all().order_by('schedule_date', 'start_time')
+            schedules = itinerary.dailyschedule_set.select_related('destination_id').order_by('schedule_date', 'start_time')
 
             grouped_schedules = {}
             for ds in schedules:
@@ -72,13 +129,14 @@ class ItineraryPDFExportView(View):
                 'quote_html': quote_html,
             }
 
-            # Render template to string
-            rendered = render_to_string('admin/preview_itinerary.html', context=context, request=request)
+            with EXPORT_RENDER_LATENCY.labels('pdf').time():
+                # Render template to string
+                rendered = render_to_string('admin/preview_itinerary.html', context=context, request=request)
 
-            # Generate PDF using WeasyPrint
-            pdf_bytes = HTML(string=rendered, base_url=request.build_absolute_uri('/')).write_pdf()
+                # Generate PDF using WeasyPrint
+                pdf_bytes = HTML(string=rendered, base_url=base_url).write_pdf()
+            set_cached_export('pdf', itinerary, pdf_bytes, base_url)
 
-            filename = f"itinerary_{itinerary_id}.pdf"
             response = HttpResponse(pdf_bytes, content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="{filename}"'
             return response
@@ -98,15 +156,28 @@ class ItineraryWordExportView(View):
     def dispatch(self, request, *args, **kwargs):
         return super().dispatch(request, *args, **kwargs)
 
+    @query_budget(10)
     def get(self, request, itinerary_id, *args, **kwargs):
         try:
             itinerary = Itinerary.objects.get(itinerary_id=itinerary_id)
         except Itinerary.DoesNotExist:
             raise Http404(f"Itinerary not found: {itinerary_id}")
 
+        filename = f"itinerary_{itinerary_id}.docx"
+        try:
+            # 模板修改后缓存的文件失效
+            template_version = os.path.getmtime(WORD_TEMPLATE_PATH)
+        except OSError:
+            raise Http404("Word template not found")
+        content = get_cached_export('docx', itinerary, template_version)
+        if content is not None:
+            return self._response(content, filename)
+
+        render_started = time.perf_counter()
+
         # 加载模板
         try:
-            doc = Document('templates/export/itinerary_template.docx')
+            doc = Document(WORD_TEMPLATE_PATH)
         except Exception:
             raise Http404("Word template not found")
 
@@ -139,7 +210,7 @@ class ItineraryWordExportView(View):
             destinations_text += f"{dest.city_name} - {dest.arrival_date} 至 {dest.departure_date} ({dest.nights} 晚)\n"
 
         # 每日行程
-        schedules = itinerary.dailyschedule_set.all().order_by('schedule_date', 'start_time')
+        schedules = itinerary.dailyschedule_set.select_related('destination_id').order_by('schedule_date', 'start_time')
         schedules_text = ''
         current_date = None
         for schedule in schedules:
@@ -223,10 +294,16 @@ class ItineraryWordExportView(View):
                                         run.text = run.text.replace(old_text, new_text)
 
         # 保存到响应
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        content = buffer.getvalue()
+        set_cached_export('docx', itinerary, content, template_version)
+        EXPORT_RENDER_LATENCY.labels('docx').observe(time.perf_counter() - render_started)
+        return self._response(content, filename)
+
+    def _response(self, content, filename):
         response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            content, content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
         )
-        filename = f"itinerary_{itinerary_id}.docx"
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        doc.save(response)
         return response
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.http import JsonResponse
+from django.urls import reverse
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
@@ -13,6 +15,7 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 from apps.models.itinerary import Itinerary
+from apps.models.requirement import Requirement
 
 from apps.api.serializers.webhook_serializers import (
     ItineraryWebhookSerializer,
@@ -26,30 +29,106 @@ from apps.api.services.webhook_services import (
     RequirementService,
     ItineraryOptimizationService,
 )
+from apps.api.services.prompt_context_services import PromptContextService
+from apps.api.services.idempotency_services import idempotent_webhook
+from apps.api.services.ingest_services import ItineraryIngestService
 from apps.api.utils.logging_utils import LogSanitizer, sanitize_request_log
+from apps.api.utils.query_budget import extend_query_budget, query_budget
+from apps.api.utils.request_utils import RequestBodyError, body_error_response, log_excerpt, parse_json_body
 
 logger = logging.getLogger(__name__)
 
+# 查询预算：创建行程时逐条插入日程，查询数随活动数增长，20天每天6个活动约150条；
+# 活动引用的景点/酒店/餐厅和回调后重建报价快照按类批量加载，不随天数增长
+ITINERARY_CREATE_QUERY_BUDGET = 200
+QUOTE_SNAPSHOT_QUERY_BUDGET = 20
+BATCH_BASE_QUERY_BUDGET = 20
+ITINERARY_BATCH_QUERIES_PER_ITEM = 10
+
+
+def _enqueue_requested(request):
+    """是否使用暂存入队模式，可通过 ?mode=enqueue 或 ITINERARY_WEBHOOK_MODE 开启"""
+    return request.GET.get('mode', getattr(settings, 'ITINERARY_WEBHOOK_MODE', 'sync')) == 'enqueue'
+
+
+def _parse_batch(request):
+    """
+    解析批量请求体，返回 (条目列表, 错误响应)
+
+    请求体必须为JSON数组，每条可带 output 外层，条数不超过 WEBHOOK_BATCH_MAX_ITEMS
+    """
+    try:
+        data = parse_json_body(request)
+    except RequestBodyError as e:
+        return None, body_error_response(e)
+    if not isinstance(data, list) or not data:
+        return None, JsonResponse({'success': False, 'error': '批量请求体必须为非空JSON数组'}, status=400)
+
+    max_items = int(getattr(settings, 'WEBHOOK_BATCH_MAX_ITEMS', 100))
+    if len(data) > max_items:
+        return None, JsonResponse(
+            {'success': False, 'error': f'批量条数超过上限: {len(data)} > {max_items}'}, status=400
+        )
+
+    return [item['output'] if isinstance(item, dict) and 'output' in item else item for item in data], None
+
+
+def _batch_response(results, status_code=200):
+    """汇总逐条结果，results 按请求顺序排列"""
+    created = sum(1 for result in results if result['success'])
+    return JsonResponse({
+        'success': created == len(results),
+        'total': len(results),
+        'created': created,
+        'failed': len(results) - created,
+        'results': results,
+    }, status=status_code, json_dumps_params={'ensure_ascii': False})
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ItineraryWebhookView(View):
     """处理n8n webhook返回的行程数据"""
     
+    @query_budget(ITINERARY_CREATE_QUERY_BUDGET)
+    @idempotent_webhook('itinerary')
     def post(self, request, *args, **kwargs):
         """接收并处理webhook数据"""
         try:
             logger.info('接收到来自n8n的webhook请求')
             
-            content = request.body.decode('utf-8')
-            logger.info(f'请求内容长度: {len(content)}')
-            
-            data = json.loads(content)
+            data = parse_json_body(request)
+            logger.info(f'请求内容长度: {len(request.body)}')
             logger.info(f'解析后的数据类型: {type(data)}')
             
             if 'output' in data:
                 logger.info('发现output字段，使用其内部数据')
                 data = data['output']
             
+            # 入队模式：只做轻量校验并暂存原始数据，行程由后台任务生成
+            if _enqueue_requested(request):
+                error_msg = ItineraryIngestService.validate_envelope(data)
+                if error_msg:
+                    logger.error(f'数据验证失败: {error_msg}')
+                    return JsonResponse({
+                        'success': False,
+                        'error': '数据验证失败',
+                        'validation_errors': {'non_field_errors': [error_msg]}
+                    }, status=400)
+                
+                job = ItineraryIngestService.enqueue(data, request.headers.get('X-Request-ID'))
+                return JsonResponse({
+                    'success': True,
+                    'job_id': str(job.job_id),
+                    'status': job.status,
+                    'status_url': request.build_absolute_uri(
+                        reverse('itinerary_ingest_job_status', kwargs={'job_id': job.job_id})
+                    )
+                }, status=202)
+            
+            # 规划上下文使用短ID时，将活动引用还原为原始资源ID
+            if isinstance(data, dict) and isinstance(data.get('id_map'), dict):
+                data = PromptContextService.expand_ids(data, data.pop('id_map'))
+            
             serializer = ItineraryWebhookSerializer(data=data)
             if not serializer.is_valid():
                 errors = serializer.errors
@@ -105,6 +184,8 @@ class ItineraryWebhookView(View):
                 'itinerary_name': itinerary.itinerary_name
             }, status=200)
             
+        except RequestBodyError as e:
+            return body_error_response(e)
         except json.JSONDecodeError as e:
             logger.error(f'JSON格式错误: {e}', exc_info=True)
             return JsonResponse({'error': f'JSON格式错误: {str(e)}'}, status=400)
@@ -113,6 +194,86 @@ class ItineraryWebhookView(View):
             return JsonResponse({'error': f'处理数据失败: {str(e)}'}, status=500)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class ItineraryBatchWebhookView(View):
+    """
+    批量接收n8n返回的行程数据
+    逐条校验后，校验通过的行程在一个事务中批量写入，返回逐条结果
+    """
+    
+    @query_budget(BATCH_BASE_QUERY_BUDGET)
+    @idempotent_webhook('itinerary_batch')
+    def post(self, request, *args, **kwargs):
+        try:
+            items, error_response = _parse_batch(request)
+            if error_response is not None:
+                return error_response
+            logger.info(f'接收到来自n8n的批量行程请求: {len(items)}条')
+            extend_query_budget(len(items) * ITINERARY_BATCH_QUERIES_PER_ITEM)
+            
+            results = [{'index': index, 'success': False} for index in range(len(items))]
+            validated = []
+            for index, data in enumerate(items):
+                if isinstance(data, dict) and isinstance(data.get('id_map'), dict):
+                    data = PromptContextService.expand_ids(data, data.pop('id_map'))
+                
+                serializer = ItineraryWebhookSerializer(data=data)
+                if not serializer.is_valid():
+                    results[index].update({'error': '数据验证失败', 'validation_errors': serializer.errors})
+                    continue
+                validated.append((index, serializer.validated_data))
+            
+            # 关联需求一次查询
+            requirements = Requirement.objects.in_bulk({data['requirement_id'] for _, data in validated})
+            to_create = []
+            for index, data in validated:
+                requirement = requirements.get(data['requirement_id'])
+                if requirement is None:
+                    results[index]['error'] = f'需求不存在: {data["requirement_id"]}'
+                    continue
+                to_create.append((index, data, requirement))
+            
+            if not to_create:
+                logger.error('批量行程数据全部校验失败')
+                return _batch_response(results, status_code=400)
+            
+            success, itineraries, error_msg = ItineraryService.create_itineraries(
+                [(data, requirement) for _, data, requirement in to_create]
+            )
+            if not success:
+                logger.error(error_msg)
+                for index, _, _ in to_create:
+                    results[index]['error'] = error_msg
+                return _batch_response(results, status_code=500)
+            
+            for (index, _, _), itinerary in zip(to_create, itineraries):
+                results[index].update({
+                    'success': True,
+                    'itinerary_id': itinerary.itinerary_id,
+                    'itinerary_name': itinerary.itinerary_name,
+                })
+            logger.info(f'批量行程保存完成: 成功{len(itineraries)}条, 失败{len(items) - len(itineraries)}条')
+            return _batch_response(results)
+            
+        except json.JSONDecodeError as e:
+            logger.error(f'JSON格式错误: {e}', exc_info=True)
+            return JsonResponse({'error': f'JSON格式错误: {str(e)}'}, status=400)
+        except Exception as e:
+            logger.error(f'处理批量数据失败: {e}', exc_info=True)
+            return JsonResponse({'error': f'处理数据失败: {str(e)}'}, status=500)
+
+
+class ItineraryIngestJobStatusView(View):
+    """查询入队模式下行程导入任务的状态"""
+    
+    @query_budget(5)
+    def get(self, request, job_id, *args, **kwargs):
+        job_status = ItineraryIngestService.get_status(job_id)
+        if job_status is None:
+            return JsonResponse({'success': False, 'error': f'导入任务不存在: {job_id}'}, status=404)
+        return JsonResponse({'success': True, **job_status}, json_dumps_params={'ensure_ascii': False})
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class RequirementWebhookView(APIView):
     """处理n8n webhook返回的旅游需求数据"""
@@ -144,14 +305,18 @@ class RequirementWebhookView(APIView):
         },
         tags=['Webhook服务']
     )
+    @query_budget(20)
+    @idempotent_webhook('requirement')
     def post(self, request, *args, **kwargs):
         """接收并处理webhook数据"""
         try:
             logger.info('接收到来自n8n的需求解析webhook请求')
             
-            data = request.data
+            data = parse_json_body(request)
             
             if isinstance(data, list) and len(data) > 0:
+                if len(data) > 1:
+                    logger.warning(f'请求数据包含{len(data)}条需求，仅处理第一条，批量提交请使用批量接口')
                 logger.info('请求数据为列表结构，使用第一个元素')
                 data = data[0]
             
@@ -160,7 +325,7 @@ class RequirementWebhookView(APIView):
                 data = data['output']
             
             # 打印接收到的原始数据，查看n8n返回的日期格式
-            logger.info(f'接收到的原始数据: {json.dumps(data, indent=2, ensure_ascii=False)[:2000]}')
+            logger.info(f'接收到的原始数据: {log_excerpt(data)}')
             
             serializer = RequirementWebhookSerializer(data=data)
             if not serializer.is_valid():
@@ -175,20 +340,10 @@ class RequirementWebhookView(APIView):
             validated_data = serializer.validated_data
             requirement_data = validated_data.get('structured_data', validated_data)
             
-
             # 转换日期对象为字符串，避免JSON序列化错误
-            def convert_dates(obj):
-                if isinstance(obj, dict):
-                    return {k: convert_dates(v) for k, v in obj.items()}
-                elif isinstance(obj, list):
-                    return [convert_dates(item) for item in obj]
-                elif hasattr(obj, 'isoformat'):
-                    return obj.isoformat()
-                return obj
-            
-            requirement_data = convert_dates(requirement_data)
+            requirement_data = RequirementService.convert_dates(requirement_data)
             
-            logger.info(f'处理需求数据: {json.dumps(LogSanitizer.sanitize_dict(requirement_data), ensure_ascii=False)[:300]}...')
+            logger.info(f'处理需求数据: {log_excerpt(LogSanitizer.sanitize_dict(requirement_data), 300)}')
             
             success, requirement_id, error_msg = RequirementService.generate_requirement_id()
             if not success:
@@ -223,6 +378,14 @@ class RequirementWebhookView(APIView):
             
             return Response(response_data, status=status.HTTP_200_OK)
             
+        except RequestBodyError as e:
+            return body_error_response(e)
+        except json.JSONDecodeError as e:
+            logger.error(f'JSON格式错误: {e}')
+            return Response(
+                {'success': False, 'error': f'JSON格式错误: {str(e)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             logger.error(f'处理需求解析数据失败: {e}', exc_info=True)
             return Response(
@@ -231,6 +394,60 @@ class RequirementWebhookView(APIView):
             )
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class RequirementBatchWebhookView(View):
+    """
+    批量接收n8n返回的旅游需求数据
+    逐条校验后，校验通过的需求一次性预留ID并在一个事务中批量写入
+    """
+    
+    @query_budget(20)
+    @idempotent_webhook('requirement_batch')
+    def post(self, request, *args, **kwargs):
+        try:
+            items, error_response = _parse_batch(request)
+            if error_response is not None:
+                return error_response
+            logger.info(f'接收到来自n8n的批量需求请求: {len(items)}条')
+            
+            results = [{'index': index, 'success': False} for index in range(len(items))]
+            validated = []
+            for index, data in enumerate(items):
+                serializer = RequirementWebhookSerializer(data=data)
+                if not serializer.is_valid():
+                    results[index].update({'error': '数据验证失败', 'validation_errors': serializer.errors})
+                    continue
+                validated_data = serializer.validated_data
+                validated.append((index, RequirementService.convert_dates(
+                    validated_data.get('structured_data', validated_data)
+                )))
+            
+            if not validated:
+                logger.error('批量需求数据全部校验失败')
+                return _batch_response(results, status_code=400)
+            
+            success, requirements, error_msg = RequirementService.create_requirements(
+                [data for _, data in validated]
+            )
+            if not success:
+                logger.error(error_msg)
+                for index, _ in validated:
+                    results[index]['error'] = error_msg
+                return _batch_response(results, status_code=500)
+            
+            for (index, _), requirement in zip(validated, requirements):
+                results[index].update({'success': True, 'requirement_id': requirement.requirement_id})
+            logger.info(f'批量需求保存完成: 成功{len(requirements)}条, 失败{len(items) - len(requirements)}条')
+            return _batch_response(results)
+            
+        except json.JSONDecodeError as e:
+            logger.error(f'JSON格式错误: {e}', exc_info=True)
+            return JsonResponse({'success': False, 'error': f'JSON格式错误: {str(e)}'}, status=400)
+        except Exception as e:
+            logger.error(f'处理批量需求数据失败: {e}', exc_info=True)
+            return JsonResponse({'success': False, 'error': f'处理数据失败: {str(e)}'}, status=500)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ProcessRequirementViaN8nView(APIView):
     """通过n8n webhook处理旅游需求"""
@@ -261,6 +478,7 @@ class ProcessRequirementViaN8nView(APIView):
         },
         tags=['LLM服务']
     )
+    @query_budget(20)
     def post(self, request):
         """通过n8n webhook处理需求"""
         from django.conf import settings
@@ -323,14 +541,13 @@ class ProcessRequirementViaN8nView(APIView):
 class ItineraryOptimizationCallbackView(View):
     """处理n8n webhook返回的行程优化结果"""
     
+    @query_budget(QUOTE_SNAPSHOT_QUERY_BUDGET)
     def post(self, request, *args, **kwargs):
         try:
             logger.info("接收到行程优化callback请求")
             
-            content = request.body.decode('utf-8')
-            logger.info(f"请求内容长度: {len(content)}")
-            
-            data = json.loads(content)
+            data = parse_json_body(request)
+            logger.info(f"请求内容长度: {len(request.body)}")
             
             serializer = ItineraryOptimizationCallbackSerializer(data=data)
             if not serializer.is_valid():
@@ -372,6 +589,8 @@ class ItineraryOptimizationCallbackView(View):
                 'message': f'行程 {itinerary_id} 的description已更新'
             })
             
+        except RequestBodyError as e:
+            return body_error_response(e)
         except json.JSONDecodeError as e:
             logger.error(f"JSON解析失败: {e}")
             return JsonResponse({'success': False, 'error': f'JSON解析失败: {str(e)}'}, status=400)
@@ -384,14 +603,13 @@ class ItineraryOptimizationCallbackView(View):
 class ItineraryQuoteCallbackView(View):
     """处理n8n webhook返回的行程报价结果"""
     
+    @query_budget(QUOTE_SNAPSHOT_QUERY_BUDGET)
     def post(self, request, *args, **kwargs):
         try:
             logger.info("接收到行程报价callback请求")
             
-            content = request.body.decode('utf-8')
-            logger.info(f"请求内容长度: {len(content)}")
-            
-            data = json.loads(content)
+            data = parse_json_body(request)
+            logger.info(f"请求内容长度: {len(request.body)}")
             
             serializer = ItineraryQuoteCallbackSerializer(data=data)
             if not serializer.is_valid():
@@ -425,6 +643,8 @@ class ItineraryQuoteCallbackView(View):
                 'message': f'行程 {itinerary_id} 的报价已更新'
             })
             
+        except RequestBodyError as e:
+            return body_error_response(e)
         except json.JSONDecodeError as e:
             logger.error(f"JSON解析失败: {e}")
             return JsonResponse({'success': False, 'error': f'JSON解析失败: {str(e)}'}, status=400)
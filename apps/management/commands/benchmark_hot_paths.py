@@ -0,0 +1,295 @@
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from io import StringIO
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection
+from django.http import Http404
+from django.test import RequestFactory
+from django.test.utils import setup_databases, teardown_databases
+
+from apps.admin.views import get_filtered_resources
+from apps.api.serializers.webhook_serializers import ItineraryWebhookSerializer
+from apps.api.services.webhook_services import ItineraryService
+from apps.api.utils.request_metrics import RequestMetrics
+from apps.api.views.export_views import ItineraryPDFExportView, ItineraryWordExportView, discard_cached_exports
+from apps.management.commands.benchmark_webhook_validation import build_sample_itinerary
+from apps.models import Attraction, Requirement, Restaurant
+
+BENCHMARK_CITIES = ('北京', '上海', '杭州')
+
+
+def summarize(timings, queries, db_timings):
+    """汇总单个路径的耗时（毫秒）、查询数和数据库耗时"""
+    ordered = sorted(timings)
+    return {
+        'iterations': len(timings),
+        'median_ms': round(statistics.median(ordered), 3),
+        'mean_ms': round(statistics.mean(ordered), 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'min_ms': round(ordered[0], 3),
+        'max_ms': round(ordered[-1], 3),
+        'queries': statistics.median(queries),
+        'max_queries': max(queries),
+        'db_median_ms': round(statistics.median(db_timings), 3),
+    }
+
+
+def measure(func, iterations, setup=None):
+    """执行 iterations 次并记录每次的耗时，以及主线程的数据库查询数和耗时，setup 在每次计时前调用"""
+    timings, queries, db_timings = [], [], []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        metrics = RequestMetrics(top_queries=0)
+        with connection.execute_wrapper(metrics):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(metrics.db_count)
+        db_timings.append(metrics.db_time * 1000)
+    return summarize(timings, queries, db_timings)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        '在独立的测试数据库中按不同目录规模（景点/酒店/餐厅各N条）测量核心路径的耗时和查询数，结果输出为JSON。'
+        '使用当前 DATABASES 配置（SQLite 或本地 MariaDB）创建 test_ 数据库，结束后删除'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='目录规模，逗号分隔，按从小到大追加数据')
+        parser.add_argument('--iterations', type=int, default=5, help='每个路径的执行次数')
+        parser.add_argument('--days', type=int, default=10, help='样例行程天数')
+        parser.add_argument('--activities', type=int, default=6, help='样例行程每天活动数')
+        parser.add_argument('--concurrency', type=int, default=8, help='并发生成ID的线程数')
+        parser.add_argument('--ids-per-thread', type=int, default=10, help='每个线程创建的需求数')
+        parser.add_argument('--import-rows', type=int, default=500, help='Excel导入的行数')
+        parser.add_argument('--seed', type=int, default=20260401, help='生成目录数据的随机种子')
+        parser.add_argument('--output', default='benchmark_results.json', help='结果JSON文件路径')
+        parser.add_argument('--keepdb', action='store_true', help='保留测试数据库，下次运行复用已生成的数据')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options['sizes'].split(','))
+        except ValueError:
+            raise CommandError('--sizes 必须是逗号分隔的整数')
+
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        # 业务代码每次保存都会输出INFO日志，测量期间关闭以免干扰耗时和输出
+        logging.disable(logging.INFO)
+        try:
+            results = {
+                'meta': {
+                    'timestamp': datetime.now().isoformat(timespec='seconds'),
+                    'revision': git_revision(),
+                    'database': connection.vendor,
+                    'database_version': '.'.join(str(part) for part in connection.get_database_version()),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'options': {key: options[key] for key in (
+                        'iterations', 'days', 'activities', 'concurrency', 'ids_per_thread', 'import_rows', 'seed'
+                    )},
+                },
+                'runs': [],
+            }
+            for size in sizes:
+                self._seed_catalog(size, options['seed'])
+                self.stdout.write(self.style.NOTICE(f'目录规模 {size}'))
+                paths = self._run_paths(options)
+                results['runs'].append({'catalog_rows': size, 'paths': paths})
+                for name, result in paths.items():
+                    self.stdout.write(f'  {name}: {self._format(result)}')
+        finally:
+            logging.disable(logging.NOTSET)
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'结果已写入 {options["output"]}'))
+
+    def _format(self, result):
+        if 'skipped' in result:
+            return f'跳过（{result["skipped"]}）'
+        if 'median_ms' in result:
+            text = f'中位数 {result["median_ms"]:.2f}ms, p95 {result["p95_ms"]:.2f}ms, 查询 {result["queries"]}'
+        else:
+            text = f'总耗时 {result["elapsed_ms"]:.2f}ms'
+        for key in ('ids_per_second', 'collisions', 'errors', 'failed', 'rows_per_second'):
+            if key in result:
+                text += f', {key}={result[key]}'
+        return text
+
+    def _seed_catalog(self, size, seed):
+        """景点/酒店/餐厅各补足到 size 条，复用 generate_test_data"""
+        existing = Attraction.objects.count()
+        if existing >= size:
+            return
+        started = time.perf_counter()
+        call_command(
+            'generate_test_data', count=size - existing, start=existing, seed=seed + existing, stdout=StringIO()
+        )
+        self.stdout.write(f'生成目录数据 {size - existing} 条/类，耗时 {time.perf_counter() - started:.1f}s')
+
+    def _build_payload(self, requirement, days, activities):
+        """样例行程，景点和餐饮活动引用目录中同城市的记录，使解析和报价快照走真实查询"""
+        payload = build_sample_itinerary(days, activities, cities=BENCHMARK_CITIES, country_code='CN')
+        payload['requirement_id'] = requirement.requirement_id
+        catalog = {
+            'ATTRACTION': {city: list(Attraction.objects.filter(city_name=city).values_list('attraction_id', flat=True)[:50])
+                           for city in BENCHMARK_CITIES},
+            'MEAL': {city: list(Restaurant.objects.filter(city_name=city).values_list('restaurant_id', flat=True)[:50])
+                     for city in BENCHMARK_CITIES},
+        }
+        for schedule in payload['daily_schedules']:
+            for index, activity in enumerate(schedule['activities']):
+                candidates = catalog.get(activity['activity_type'], {}).get(schedule['city'])
+                activity['id_reference'] = str(candidates[index % len(candidates)]) if candidates else None
+        serializer = ItineraryWebhookSerializer(data=payload)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def _run_paths(self, options):
+        iterations = options['iterations']
+        requirement = Requirement.objects.create(
+            origin_name='上海', destination_cities='北京,上海,杭州', trip_days=options['days'],
+            group_adults=2, group_total=2,
+        )
+        data = self._build_payload(requirement, options['days'], options['activities'])
+        created = []
+
+        def create_itinerary():
+            success, itinerary, error = ItineraryService.create_itinerary(data, requirement)
+            if not success:
+                raise CommandError(f'创建行程失败: {error}')
+            created.append(itinerary)
+
+        paths = {'create_itinerary': measure(create_itinerary, iterations)}
+        itinerary = created[-1]
+        paths['update_itinerary_json_data'] = measure(itinerary.update_itinerary_json_data, iterations)
+        paths['update_itinerary_quote_json_data'] = measure(itinerary.update_itinerary_quote_json_data, iterations)
+        paths['concurrent_id_generation'] = self._concurrent_ids(options['concurrency'], options['ids_per_thread'])
+
+        factory = RequestFactory()
+        user, _ = get_user_model().objects.get_or_create(
+            username='benchmark', defaults={'is_staff': True, 'is_superuser': True}
+        )
+        destination = itinerary.destinations.order_by('destination_order').first()
+
+        def filtered_resources():
+            request = factory.get('/admin/get_filtered_resources/', {'destination_id': str(destination.destination_id)})
+            request.user = user
+            get_filtered_resources(request)
+
+        paths['get_filtered_resources'] = measure(filtered_resources, iterations)
+        paths['export_pdf'] = self._export(ItineraryPDFExportView, factory, itinerary, iterations)
+        paths['export_word'] = self._export(ItineraryWordExportView, factory, itinerary, iterations)
+        paths['import_excel_data'] = self._import_excel(options['import_rows'])
+        return paths
+
+    def _export(self, view_class, factory, itinerary, iterations):
+        view = view_class.as_view()
+
+        def export():
+            view(factory.get('/api/export/'), itinerary_id=itinerary.itinerary_id)
+
+        def discard():
+            # 测量生成文件的耗时，每次计时前删除上一次写入的导出缓存
+            discard_cached_exports(itinerary.itinerary_id)
+
+        try:
+            return measure(export, iterations, setup=discard)
+        except (Http404, ImportError) as e:
+            # 未安装 WeasyPrint、缺少系统库或 Word 模板不存在
+            return {'skipped': str(e)}
+
+    def _concurrent_ids(self, threads, per_thread):
+        """多个线程同时创建需求，测量 Requirement.save 按日期序号生成ID的吞吐和冲突"""
+        collisions = []
+        errors = []
+        barrier = threading.Barrier(threads)
+
+        def worker():
+            barrier.wait()
+            try:
+                for _ in range(per_thread):
+                    try:
+                        Requirement.objects.create(
+                            origin_name='上海', destination_cities='北京', trip_days=3, group_adults=2, group_total=2,
+                        )
+                    except IntegrityError:
+                        collisions.append(1)
+                    except Exception as e:
+                        errors.append(type(e).__name__)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        attempted = threads * per_thread
+        succeeded = attempted - len(collisions) - len(errors)
+        return {
+            'threads': threads,
+            'attempted': attempted,
+            'succeeded': succeeded,
+            'collisions': len(collisions),
+            'errors': len(errors),
+            'error_types': sorted(set(errors)),
+            'elapsed_ms': round(elapsed * 1000, 3),
+            'ids_per_second': round(succeeded / elapsed, 1) if elapsed else None,
+        }
+
+    def _import_excel(self, rows):
+        """
+        生成标准结构（首行为字段名）的景点Excel并通过 import_excel_data 导入
+
+        read_excel 对超过4列、10行的表格会按转置结构解析，因此只生成4列
+        """
+        import pandas as pd
+
+        records = [{
+            'attraction_name': f'导入景点{index}',
+            'country_code': 'CN',
+            'city_name': BENCHMARK_CITIES[index % len(BENCHMARK_CITIES)],
+            'category': '自然风光',
+        } for index in range(rows)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'attractions.xlsx')
+            pd.DataFrame(records).to_excel(path, index=False)
+            report_path = os.path.join(directory, 'report.json')
+
+            result = measure(
+                lambda: call_command('import_excel_data', attractions=path, output=report_path, stdout=StringIO()), 1
+            )
+            with open(report_path, encoding='utf-8') as f:
+                report = json.load(f)['attractions']
+        result['rows'] = rows
+        result['succeeded'] = report['records_success']
+        result['failed'] = report['records_failed']
+        result['rows_per_second'] = round(rows * 1000 / result['median_ms'], 1)
+        return result
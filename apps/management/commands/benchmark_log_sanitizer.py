@@ -0,0 +1,106 @@
+import logging
+import re
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.api.utils.logging_utils import (
+    REDACT_PATTERN,
+    SENSITIVE_FIELDS,
+    LogSanitizer,
+    SensitiveDataFilter,
+)
+
+SAMPLE_MESSAGES = [
+    '接收到来自n8n的webhook请求',
+    '行程数据解析并保存成功: ITI_20260401_001',
+    'contact_phone=13812345678 contact_email=test@example.com itinerary_name=北京三日游',
+    '处理需求数据: {"contact_name": "张三", "base_info": {"origin": {"name": "上海"}}, "budget": {"level": "中等"}}',
+    'Authorization: Bearer abc.def.ghi, request_id=n8n-exec-1',
+]
+
+SAMPLE_DICT = {
+    'user_input': '两个大人一个小孩五月去东京玩五天',
+    'contact_name': '张三',
+    'contact_phone': '13812345678',
+    'base_info': {
+        'origin': {'name': '上海', 'code': 'SHA', 'type': 'city'},
+        'destination_cities': [{'name': '东京'}, {'name': '大阪'}],
+        'group_size': {'adults': 2, 'children': 1, 'total': 3},
+        'travel_date': {'start_date': '2026-05-01', 'end_date': '2026-05-05'},
+    },
+    'budget': {'level': 'mid', 'currency': 'CNY', 'range': {'min': 10000, 'max': 20000}},
+    'metadata': {'source_type': 'NaturalLanguage', 'status': 'Confirmed', 'assumptions': []},
+}
+
+
+def legacy_sanitize_message(message, fields=SENSITIVE_FIELDS):
+    """原有实现：逐字段、逐模式调用 re.sub，仅用于对比"""
+    for field in fields:
+        patterns = [
+            rf'(?i)({field})\s*[=:]\s*["\']?([^"\'&\s]+)["\']?',
+            rf'(?i)("({field})"\s*:\s*)"([^"]+)"',
+        ]
+        for pattern in patterns:
+            message = re.sub(pattern, rf'\1={REDACT_PATTERN}', message)
+    return message
+
+
+def legacy_sanitize_dict(data, depth=0, max_depth=10):
+    """原有实现：每个键做一次子串扫描，仅用于对比"""
+    if depth > max_depth or not isinstance(data, dict):
+        return data
+    result = {}
+    for key, value in data.items():
+        key_lower = key.lower()
+        if key_lower in SENSITIVE_FIELDS or any(sf in key_lower for sf in SENSITIVE_FIELDS):
+            result[key] = REDACT_PATTERN
+        elif isinstance(value, dict):
+            result[key] = legacy_sanitize_dict(value, depth + 1, max_depth)
+        elif isinstance(value, list):
+            result[key] = [
+                legacy_sanitize_dict(item, depth + 1, max_depth) if isinstance(item, dict) else item
+                for item in value
+            ]
+        else:
+            result[key] = value
+    return result
+
+
+class Command(BaseCommand):
+    help = '测量日志脱敏过滤器和字典脱敏的单次耗时，并与原有逐字段实现对比'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000, help='每项执行次数')
+
+    def _per_call_us(self, func, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - started) * 1_000_000 / iterations
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        log_filter = SensitiveDataFilter()
+
+        def filter_records():
+            for message in SAMPLE_MESSAGES:
+                log_filter.filter(logging.LogRecord('bench', logging.INFO, '', 0, message, (), None))
+
+        def legacy_records():
+            for message in SAMPLE_MESSAGES:
+                legacy_sanitize_message(message)
+
+        rows = [
+            ('日志过滤（每条）', filter_records, legacy_records, len(SAMPLE_MESSAGES)),
+            ('字典脱敏（每次）', lambda: LogSanitizer.sanitize_dict(SAMPLE_DICT),
+             lambda: legacy_sanitize_dict(SAMPLE_DICT), 1),
+        ]
+        self.stdout.write(f'每项执行 {iterations} 次')
+        for label, current, legacy, per_call in rows:
+            current_us = self._per_call_us(current, iterations) / per_call
+            legacy_us = self._per_call_us(legacy, iterations) / per_call
+            self.stdout.write(
+                f'{label}: 当前 {current_us:.2f}µs, 原实现 {legacy_us:.2f}µs, 加速比 {legacy_us / current_us:.1f}x'
+            )
+        self.stdout.write(self.style.SUCCESS('完成'))
@@ -0,0 +1,100 @@
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.api.serializers.webhook_serializers import ItineraryWebhookSerializer
+
+
+class FieldByFieldItinerarySerializer(ItineraryWebhookSerializer):
+    """关闭快速路径，仅用于对比"""
+    fast_path = False
+
+
+def build_sample_itinerary(days=30, activities_per_day=10, start=date(2026, 4, 1),
+                           cities=('东京', '京都', '大阪'), country_code='JP'):
+    """生成用于压测的行程数据，结构与n8n返回的数据一致"""
+    activity_types = ['ATTRACTION', 'MEAL', 'TRANSPORT', 'SHOPPING', 'FREE']
+    daily_schedules = []
+    for day in range(days):
+        activities = []
+        for index in range(activities_per_day):
+            minute = 8 * 60 + index * 60
+            activities.append({
+                'activity_title': f'第{day + 1}天活动{index + 1}',
+                'activity_type': activity_types[index % len(activity_types)],
+                'start_time': f'{minute // 60:02d}:{minute % 60:02d}',
+                'end_time': f'{minute // 60:02d}:{minute % 60 + 45:02d}',
+                'activity_description': '自由安排',
+                'id_reference': f'A{index + 1}',
+            })
+        daily_schedules.append({
+            'day': day + 1,
+            'date': (start + timedelta(days=day)).isoformat(),
+            'city': cities[day * len(cities) // days],
+            'activities': activities,
+        })
+
+    destinations = []
+    for order, city in enumerate(cities, 1):
+        first_day = (order - 1) * days // len(cities)
+        last_day = order * days // len(cities) - 1
+        destinations.append({
+            'destination_order': order,
+            'city_name': city,
+            'country_code': country_code,
+            'arrival_date': (start + timedelta(days=first_day)).isoformat(),
+            'departure_date': (start + timedelta(days=last_day)).isoformat(),
+        })
+
+    return {
+        'requirement_id': 'REQ_20260401_001',
+        'itinerary_name': f'日本{days}日游',
+        'start_date': start.isoformat(),
+        'end_date': (start + timedelta(days=days - 1)).isoformat(),
+        'destinations': destinations,
+        'traveler_stats': {'adults': 2, 'children': 1},
+        'daily_schedules': daily_schedules,
+    }
+
+
+class Command(BaseCommand):
+    help = '对比行程webhook数据逐字段校验与快速校验的单次耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='行程天数')
+        parser.add_argument('--activities', type=int, default=10, help='每天活动数')
+        parser.add_argument('--iterations', type=int, default=50, help='每种方式的执行次数')
+
+    def _measure(self, serializer_class, payload, iterations):
+        timings = []
+        validated = None
+        for _ in range(iterations):
+            started = time.perf_counter()
+            serializer = serializer_class(data=payload)
+            serializer.is_valid(raise_exception=True)
+            timings.append((time.perf_counter() - started) * 1000)
+            validated = serializer.validated_data
+        return timings, validated
+
+    def handle(self, *args, **options):
+        payload = build_sample_itinerary(options['days'], options['activities'])
+        iterations = options['iterations']
+        self.stdout.write(
+            f'行程: {options["days"]}天, {options["days"] * options["activities"]}个活动, 每种方式执行{iterations}次'
+        )
+
+        drf_timings, drf_data = self._measure(FieldByFieldItinerarySerializer, payload, iterations)
+        fast_timings, fast_data = self._measure(ItineraryWebhookSerializer, payload, iterations)
+        if drf_data != fast_data:
+            raise CommandError('快速校验结果与逐字段校验结果不一致')
+
+        for label, timings in (('逐字段校验', drf_timings), ('快速校验', fast_timings)):
+            self.stdout.write(
+                f'{label}: 平均 {statistics.mean(timings):.2f}ms, '
+                f'中位数 {statistics.median(timings):.2f}ms, 最大 {max(timings):.2f}ms'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'加速比 {statistics.median(drf_timings) / statistics.median(fast_timings):.1f}x，校验结果一致'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from apps.api.services.schema_services import SchemaDescriptionService
+
+
+class Command(BaseCommand):
+    help = '根据模型注释生成数据库结构描述并写入缓存，可选输出到文件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', type=str, default='', help='结构描述文本输出文件路径，如 /home/node/.n8n-files/db.txt')
+        parser.add_argument('--refresh', action='store_true', help='忽略缓存重新生成')
+
+    def handle(self, *args, **options):
+        if options['output']:
+            version, table_count = SchemaDescriptionService.write_to_file(options['output'], refresh=options['refresh'])
+            self.stdout.write(self.style.SUCCESS(
+                f'结构描述已写入 {options["output"]}，版本 {version}，共 {table_count} 张表'
+            ))
+            return
+
+        document = SchemaDescriptionService.get_document(refresh=options['refresh'])
+        self.stdout.write(document['text'])
+        self.stdout.write(self.style.SUCCESS(f'版本 {document["version"]}，共 {len(document["tables"])} 张表'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.api.services.currency_services import CurrencyService
+
+
+class Command(BaseCommand):
+    help = '从JSON文件加载货币汇率到汇率表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_path', type=str, help='汇率JSON文件路径')
+        parser.add_argument('--source', type=str, default='file', help='汇率数据来源标识')
+
+    def handle(self, *args, **options):
+        success, count, error_msg = CurrencyService.load_from_file(options['file_path'], source=options['source'])
+        if not success:
+            raise CommandError(error_msg)
+        self.stdout.write(self.style.SUCCESS(f'成功加载 {count} 种货币汇率'))
@@ -0,0 +1,519 @@
+import itertools
+import json
+import os
+import random
+import re
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from apps.management.commands.benchmark_hot_paths import git_revision
+from apps.management.commands.benchmark_webhook_validation import build_sample_itinerary
+from apps.management.commands.import_excel_data import ExcelDataReader
+
+FIXTURES_DIR = os.path.join(settings.BASE_DIR, 'tests', 'fixtures')
+FIXTURE_FILES = {'ATTRACTION': '景点集合信息.xlsx', 'MEAL': '餐厅集合信息.xlsx'}
+SCENARIOS = ('requirement', 'itinerary', 'n8n')
+
+# 各模式下被压测的接口；n8n 场景经 ProcessRequirementViaN8nView 调用替身，替身再回调需求接口
+ENDPOINTS = {
+    'sync': {'requirement': '/api/webhook/requirement/callback/', 'itinerary': '/api/webhook/itinerary/'},
+    'async': {'requirement': '/api/webhook/async/requirement/callback/', 'itinerary': '/api/webhook/async/itinerary/'},
+    'enqueue': {'requirement': '/api/webhook/requirement/callback/', 'itinerary': '/api/webhook/itinerary/?mode=enqueue'},
+}
+N8N_ENDPOINT = '/api/webhook/requirement/'
+
+# 替身提供的工作流路径及对应的 settings 配置项
+STUB_WORKFLOWS = {
+    'requirement': 'N8N_REQUIREMENT_WEBHOOK_URL',
+    'planning': 'N8N_WEBHOOK_URL',
+    'optimization': 'N8N_ITINERARY_OPTIMIZATION_WEBHOOK_URL',
+    'quote': 'N8N_ITINERARY_QUOTE_WEBHOOK_URL',
+}
+
+SERVER_TIMING_TOTAL = re.compile(r'(?:^|,)\s*total;dur=([\d.]+)')
+
+
+def load_fixture_catalog(directory=FIXTURES_DIR):
+    """
+    读取 tests/fixtures 中的景点和餐厅，按活动类型和城市分组，用于生成活动标题和描述
+
+    Returns:
+        {'ATTRACTION': {城市: [记录, ...]}, 'MEAL': {...}}
+    """
+    catalog = {}
+    for activity_type, filename in FIXTURE_FILES.items():
+        grouped = defaultdict(list)
+        for record in ExcelDataReader.read_excel(os.path.join(directory, filename)):
+            name = record.get('attraction_name') or record.get('restaurant_name')
+            city = record.get('city_name')
+            if isinstance(name, str) and isinstance(city, str):
+                description = record.get('description')
+                grouped[city.strip()].append({
+                    'name': name.strip(),
+                    'description': description.strip()[:200] if isinstance(description, str) else '',
+                })
+        catalog[activity_type] = dict(grouped)
+    return catalog
+
+
+def resolve_catalog_ids(catalog):
+    """在当前数据库中按名称查找fixture景点/餐厅的ID，写入记录的 id_reference，返回找到的条数"""
+    from apps.models import Attraction, Restaurant
+
+    lookups = {
+        'ATTRACTION': (Attraction, 'attraction_name', 'attraction_id'),
+        'MEAL': (Restaurant, 'restaurant_name', 'restaurant_id'),
+    }
+    resolved = 0
+    for activity_type, (model, name_field, id_field) in lookups.items():
+        records = [record for records in catalog.get(activity_type, {}).values() for record in records]
+        ids = dict(
+            model.objects.filter(**{f'{name_field}__in': [record['name'] for record in records]})
+            .values_list(name_field, id_field)
+        )
+        for record in records:
+            if record['name'] in ids:
+                record['id_reference'] = str(ids[record['name']])
+                resolved += 1
+    return resolved
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize_samples(samples, elapsed):
+    """
+    汇总一组请求的吞吐、延迟分位数（毫秒）和错误率
+
+    samples 中每项为 {'ms', 'status', 'error', 'server_ms'}，error 非空即计为失败
+    """
+    if not samples:
+        return {'requests': 0}
+    ordered = sorted(sample['ms'] for sample in samples)
+    errors = Counter(sample['error'] for sample in samples if sample['error'])
+    failed = sum(errors.values())
+    result = {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(ordered, 50), 2),
+        'p95_ms': round(percentile(ordered, 95), 2),
+        'p99_ms': round(percentile(ordered, 99), 2),
+        'mean_ms': round(statistics.mean(ordered), 2),
+        'max_ms': round(ordered[-1], 2),
+        'errors': failed,
+        'error_rate': round(failed / len(samples), 4),
+        'error_types': dict(errors.most_common()),
+        'status_codes': dict(Counter(str(sample['status']) for sample in samples if sample['status'])),
+    }
+    # Server-Timing 的 total 是服务端处理耗时，与客户端延迟之差主要是排队等待 worker 的时间
+    server = sorted(sample['server_ms'] for sample in samples if sample['server_ms'] is not None)
+    if server:
+        result['server_p50_ms'] = round(percentile(server, 50), 2)
+        result['server_p95_ms'] = round(percentile(server, 95), 2)
+    return result
+
+
+class PayloadFactory:
+    """
+    生成与n8n回调结构一致的需求和行程数据
+
+    每条数据带本次压测的唯一标记，避免被幂等缓存当作重复请求直接重放
+    """
+
+    def __init__(self, catalog, days=5, activities=6, seed=20260401, run_id=None):
+        self.catalog = catalog
+        self.days = days
+        self.activities = activities
+        self.run_id = run_id or uuid.uuid4().hex[:8]
+        self.cities = sorted({city for cities in catalog.values() for city in cities}) or ['上海']
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+
+    def next_id(self):
+        return f'load-{self.run_id}-{next(self._sequence)}'
+
+    def _choice(self, items):
+        with self._lock:
+            return self._random.choice(items)
+
+    def user_input(self, marker):
+        city = self._choice(self.cities)
+        return f'[{marker}] 两位成人从北京出发去{city}玩{self.days}天，预算中等，希望安排当地特色餐厅'
+
+    def requirement(self, marker, user_input=None):
+        start = date(2026, 5, 1) + timedelta(days=self._choice(range(60)))
+        destinations = self.cities[:3]
+        return {
+            'user_input': user_input or self.user_input(marker),
+            'structured_data': {
+                'base_info': {
+                    'origin': {'name': '北京', 'code': 'BJS', 'type': 'city'},
+                    'destination_cities': [{'name': city, 'type': 'city'} for city in destinations],
+                    'trip_days': self.days,
+                    'group_size': {'adults': 2, 'children': 0, 'seniors': 0, 'total': 2},
+                    'travel_date': {
+                        'start_date': start.isoformat(),
+                        'end_date': (start + timedelta(days=self.days - 1)).isoformat(),
+                        'is_flexible': False,
+                    },
+                },
+                'preferences': {'itinerary': {'rhythm': 'Moderate', 'tags': ['美食', '文化']}},
+                'budget': {'level': 'Medium', 'currency': 'CNY'},
+                'metadata': {'source_type': 'NaturalLanguage', 'status': 'Confirmed'},
+            },
+            'llm_info': {'provider': 'load-test', 'request_marker': marker},
+        }
+
+    def itinerary(self, requirement_id, marker):
+        cities = tuple(self.cities[:3])
+        payload = build_sample_itinerary(
+            max(self.days, len(cities)), self.activities, cities=cities, country_code='CN'
+        )
+        payload['requirement_id'] = requirement_id
+        payload['itinerary_name'] = f'{"".join(cities)}{len(payload["daily_schedules"])}日游 {marker}'
+        for schedule in payload['daily_schedules']:
+            for activity in schedule['activities']:
+                candidates = self.catalog.get(activity['activity_type'], {}).get(schedule['city'])
+                if candidates:
+                    record = self._choice(candidates)
+                    activity['activity_title'] = record['name']
+                    activity['activity_description'] = record['description'] or activity['activity_description']
+                    activity['id_reference'] = record.get('id_reference')
+                else:
+                    activity['id_reference'] = None
+        return payload
+
+
+class N8nStub:
+    """
+    本地n8n替身，按配置的延迟和错误率应答 send_to_n8n / generate_itinerary 的调用
+
+    与真实工作流一样，需求工作流把解析结果回调需求接口后返回回调结果，
+    规划工作流把生成的行程回调行程接口后返回 itinerary_id；优化和报价工作流只返回成功
+    """
+
+    def __init__(self, payloads, base_url, host='127.0.0.1', port=8765, latency_ms=2000, jitter_ms=0,
+                 error_rate=0.0, api_mode='sync', timeout=120, seed=20260401):
+        self.payloads = payloads
+        self.base_url = base_url.rstrip('/')
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.endpoints = ENDPOINTS[api_mode]
+        self.timeout = timeout
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url(self, workflow):
+        return f'{self.address}/{workflow}'
+
+    def settings_env(self):
+        """被压测服务需要配置的环境变量"""
+        return {setting: self.url(workflow) for workflow, setting in STUB_WORKFLOWS.items()}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='n8n-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _delay(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+            failed = self._random.random() < self.error_rate
+        time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+        return failed
+
+    def _callback(self, endpoint, payload, marker):
+        response = requests.post(
+            self.base_url + endpoint, json=payload, timeout=self.timeout, headers={'X-Request-ID': marker}
+        )
+        self._count(f'callback_{response.status_code}')
+        return response
+
+    def handle(self, workflow, body):
+        """处理一次工作流调用，返回 (状态码, 响应数据)"""
+        if workflow not in STUB_WORKFLOWS:
+            return 404, {'success': False, 'error': f'未知工作流: {workflow}'}
+        self._count(workflow)
+        if self._delay():
+            self._count('injected_errors')
+            return 500, {'success': False, 'error': '替身注入的错误'}
+
+        marker = self.payloads.next_id()
+        try:
+            if workflow == 'requirement':
+                payload = self.payloads.requirement(marker, user_input=body.get('user_input'))
+                response = self._callback(self.endpoints['requirement'], payload, marker)
+                return response.status_code, response.json()
+            if workflow == 'planning':
+                payload = self.payloads.itinerary(body.get('requirement_id'), marker)
+                response = self._callback(self.endpoints['itinerary'], payload, marker)
+                data = response.json()
+                return response.status_code, {'success': response.ok, 'itinerary_id': data.get('itinerary_id', '')}
+        except (requests.RequestException, ValueError) as e:
+            self._count('callback_errors')
+            return 502, {'success': False, 'error': f'回调失败: {type(e).__name__}'}
+        return 200, {'success': True}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    body = {}
+                status, data = stub.handle(self.path.strip('/').split('?')[0], body if isinstance(body, dict) else {})
+                content = json.dumps(data, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class LoadRunner:
+    """按场景并发发送请求并记录每个接口的延迟和结果"""
+
+    def __init__(self, base_url, payloads, scenarios, api_mode='sync', timeout=120):
+        self.base_url = base_url.rstrip('/')
+        self.payloads = payloads
+        self.scenarios = scenarios
+        self.endpoints = ENDPOINTS[api_mode]
+        self.timeout = timeout
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._scenario_cycle = itertools.cycle(scenarios)
+
+    def _session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def post(self, name, endpoint, payload, marker):
+        """发送一次请求并记录样本，返回响应数据（失败时为 None）"""
+        sample = {'ms': 0.0, 'status': None, 'error': None, 'server_ms': None}
+        data = None
+        started = time.perf_counter()
+        try:
+            response = self._session().post(
+                self.base_url + endpoint, json=payload, timeout=self.timeout, headers={'X-Request-ID': marker}
+            )
+            sample['status'] = response.status_code
+            match = SERVER_TIMING_TOTAL.search(response.headers.get('Server-Timing', ''))
+            if match:
+                sample['server_ms'] = float(match.group(1))
+            if response.status_code >= 400:
+                sample['error'] = f'HTTP {response.status_code}'
+            else:
+                data = response.json()
+        except requests.RequestException as e:
+            sample['error'] = type(e).__name__
+        except ValueError:
+            sample['error'] = 'InvalidJSON'
+        sample['ms'] = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.samples[name].append(sample)
+        return data
+
+    def run_once(self):
+        with self._lock:
+            scenario = next(self._scenario_cycle)
+        marker = self.payloads.next_id()
+        if scenario == 'n8n':
+            self.post('n8n', N8N_ENDPOINT, {'user_input': self.payloads.user_input(marker)}, marker)
+            return
+        data = self.post('requirement', self.endpoints['requirement'], self.payloads.requirement(marker), marker)
+        if scenario == 'itinerary' and data and data.get('requirement_id'):
+            marker = self.payloads.next_id()
+            self.post('itinerary', self.endpoints['itinerary'], self.payloads.itinerary(data['requirement_id'], marker),
+                      marker)
+
+    def run(self, concurrency, total=None, duration=None):
+        """total 为场景执行次数；指定 duration（秒）时在时长内持续发送"""
+        deadline = time.monotonic() + duration if duration else None
+        remaining = itertools.count() if total is None else iter(range(total))
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                self.run_once()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(worker) for _ in range(concurrency)]:
+                future.result()
+        return time.perf_counter() - started
+
+    def report(self, elapsed):
+        endpoints = {name: summarize_samples(samples, elapsed) for name, samples in sorted(self.samples.items())}
+        all_samples = [sample for samples in self.samples.values() for sample in samples]
+        return {'elapsed_s': round(elapsed, 3), 'overall': summarize_samples(all_samples, elapsed), 'endpoints': endpoints}
+
+
+class Command(BaseCommand):
+    help = (
+        '对n8n → Django的webhook链路做本地压测：启动n8n替身，按场景并发回放需求/行程webhook，'
+        '输出吞吐、p50/p95/p99延迟和错误率。n8n 场景需要被压测服务的 N8N_*_WEBHOOK_URL 指向替身'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='被压测的Django服务地址')
+        parser.add_argument('--scenarios', default='requirement,itinerary',
+                            help=f'场景，逗号分隔，按顺序轮流执行: {",".join(SCENARIOS)}')
+        parser.add_argument('--mode', choices=sorted(ENDPOINTS), default='sync',
+                            help='webhook接口：同步视图、异步视图或行程暂存入队（?mode=enqueue）')
+        parser.add_argument('--concurrency', type=int, default=8, help='并发数')
+        parser.add_argument('--requests', type=int, default=100, help='场景执行总次数')
+        parser.add_argument('--duration', type=float, help='持续发送的秒数，指定后忽略 --requests')
+        parser.add_argument('--days', type=int, default=5, help='行程天数')
+        parser.add_argument('--activities', type=int, default=6, help='每天活动数')
+        parser.add_argument('--timeout', type=float, default=getattr(settings, 'WEBHOOK_TIMEOUT', 120) + 10,
+                            help='单个请求超时（秒）')
+        parser.add_argument('--fixtures', default=FIXTURES_DIR, help='景点/餐厅Excel所在目录')
+        parser.add_argument('--resolve-references', action='store_true',
+                            help='在当前 DATABASES 中按名称查找fixture景点/餐厅ID作为 id_reference，'
+                                 '被压测服务与本命令使用同一数据库且已导入fixtures时使用')
+        parser.add_argument('--stub-host', default='127.0.0.1', help='n8n替身监听地址')
+        parser.add_argument('--stub-port', type=int, default=8765, help='n8n替身端口')
+        parser.add_argument('--stub-latency-ms', type=float, default=2000, help='n8n替身应答延迟（毫秒）')
+        parser.add_argument('--stub-jitter-ms', type=float, default=0, help='延迟随机波动范围（毫秒）')
+        parser.add_argument('--stub-error-rate', type=float, default=0.0, help='n8n替身返回500的比例')
+        parser.add_argument('--stub-only', action='store_true', help='只运行n8n替身，Ctrl+C 退出')
+        parser.add_argument('--seed', type=int, default=20260401, help='随机种子')
+        parser.add_argument('--output', help='结果JSON文件路径')
+
+    def handle(self, *args, **options):
+        scenarios = [scenario.strip() for scenario in options['scenarios'].split(',') if scenario.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if not scenarios or unknown:
+            raise CommandError(f'未知场景: {",".join(sorted(unknown))}，可选: {",".join(SCENARIOS)}')
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency 必须大于0')
+
+        catalog = load_fixture_catalog(options['fixtures'])
+        if options['resolve_references']:
+            try:
+                self.stdout.write(f'fixture 景点/餐厅在数据库中找到 {resolve_catalog_ids(catalog)} 条')
+            except DatabaseError as e:
+                raise CommandError(f'查询景点/餐厅ID失败: {e}')
+        payloads = PayloadFactory(catalog, options['days'], options['activities'], options['seed'])
+
+        try:
+            stub = N8nStub(
+                payloads, options['base_url'], options['stub_host'], options['stub_port'],
+                options['stub_latency_ms'], options['stub_jitter_ms'], options['stub_error_rate'],
+                options['mode'], options['timeout'], options['seed'],
+            ).start()
+        except OSError as e:
+            raise CommandError(f'n8n替身无法监听 {options["stub_host"]}:{options["stub_port"]}: {e}')
+
+        self.stdout.write(self.style.NOTICE('n8n替身已启动，被压测服务需配置:'))
+        for setting, url in stub.settings_env().items():
+            self.stdout.write(f'  {setting}={url}')
+
+        try:
+            if options['stub_only']:
+                self._serve_forever()
+                return
+            runner = LoadRunner(options['base_url'], payloads, scenarios, options['mode'], options['timeout'])
+            self.stdout.write(
+                f'压测 {options["base_url"]}: 场景 {",".join(scenarios)}, 模式 {options["mode"]}, '
+                f'并发 {options["concurrency"]}, '
+                + (f'持续 {options["duration"]}s' if options['duration'] else f'{options["requests"]} 次')
+            )
+            elapsed = runner.run(
+                options['concurrency'],
+                total=None if options['duration'] else options['requests'],
+                duration=options['duration'],
+            )
+        finally:
+            stub.stop()
+
+        results = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'revision': git_revision(),
+                'base_url': options['base_url'],
+                'run_id': payloads.run_id,
+                'options': {key: options[key] for key in (
+                    'scenarios', 'mode', 'concurrency', 'requests', 'duration', 'days', 'activities',
+                    'stub_latency_ms', 'stub_jitter_ms', 'stub_error_rate', 'seed'
+                )},
+            },
+            **runner.report(elapsed),
+            'stub': dict(stub.stats),
+        }
+        for name, result in [('overall', results['overall']), *results['endpoints'].items()]:
+            self.stdout.write(f'  {name}: {self._format(result)}')
+        if stub.stats:
+            self.stdout.write(f'  n8n替身: {dict(stub.stats)}')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'结果已写入 {options["output"]}'))
+
+    def _format(self, result):
+        if not result['requests']:
+            return '无请求'
+        text = (
+            f'{result["requests"]} 次, {result["throughput_rps"]} req/s, '
+            f'p50 {result["p50_ms"]:.1f}ms, p95 {result["p95_ms"]:.1f}ms, p99 {result["p99_ms"]:.1f}ms, '
+            f'错误率 {result["error_rate"]:.2%}'
+        )
+        if 'server_p50_ms' in result:
+            text += f', 服务端 p50 {result["server_p50_ms"]:.1f}ms'
+        if result['error_types']:
+            text += f' {result["error_types"]}'
+        return text
+
+    def _serve_forever(self):
+        self.stdout.write('只运行n8n替身，Ctrl+C 退出')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
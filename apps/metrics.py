@@ -0,0 +1,69 @@
+"""
+Prometheus 指标定义
+模型、服务和后台任务都会记录指标，定义放在不依赖其他层的模块中；/metrics 输出、
+多进程汇总和 n8n 调用计时见 apps/api/metrics.py
+"""
+from prometheus_client import Counter, Histogram
+
+
+# 调用n8n和生成行程动辄数十秒，桶的上限需要覆盖 WEBHOOK_TIMEOUT
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, float('inf'))
+
+REQUEST_LATENCY = Histogram(
+    'tripquote_request_duration_seconds',
+    '请求处理耗时，endpoint 为URL名称（如 api:itinerary_webhook）',
+    ['endpoint', 'method', 'status'],
+    buckets=LATENCY_BUCKETS,
+)
+N8N_DISPATCH_LATENCY = Histogram(
+    'tripquote_n8n_dispatch_duration_seconds',
+    '调用n8n工作流的耗时',
+    ['workflow'],
+    buckets=LATENCY_BUCKETS,
+)
+N8N_DISPATCH_ERRORS = Counter(
+    'tripquote_n8n_dispatch_errors_total',
+    '调用n8n工作流失败次数，reason 为HTTP状态码或异常类型',
+    ['workflow', 'reason'],
+)
+EXPORT_RENDER_LATENCY = Histogram(
+    'tripquote_export_render_duration_seconds',
+    '行程导出文件生成耗时',
+    ['format'],
+    buckets=LATENCY_BUCKETS,
+)
+IMPORT_ROWS = Counter(
+    'tripquote_import_rows_total',
+    '数据导入处理的行数，rate() 即每秒导入行数',
+    ['entity', 'result'],
+)
+IMPORT_DURATION = Counter(
+    'tripquote_import_duration_seconds_total',
+    '数据导入累计耗时，与 tripquote_import_rows_total 相除得到整体吞吐',
+    ['entity'],
+)
+ID_ALLOCATION_COLLISIONS = Counter(
+    'tripquote_id_allocation_collisions_total',
+    '按日期序号分配业务ID时发生唯一约束冲突的次数',
+    ['model'],
+)
+SNAPSHOT_REBUILDS = Counter(
+    'tripquote_snapshot_rebuilds_total',
+    '行程JSON快照重建次数',
+    ['kind'],
+)
+REQUIREMENTS_EXPIRED = Counter(
+    'tripquote_requirements_expired_total',
+    '过期任务更新为已过期的需求数，rule 为 due（expires_at 已到）/ pending / confirmed（超过有效时长）',
+    ['rule'],
+)
+REQUIREMENT_EXPIRY_DURATION = Histogram(
+    'tripquote_requirement_expiry_duration_seconds',
+    '过期任务单次运行耗时',
+    buckets=LATENCY_BUCKETS,
+)
+
+N8N_WORKFLOWS = ('requirement', 'planning', 'optimization', 'quote')
+for _workflow in N8N_WORKFLOWS:
+    # 预先创建标签，没有调用过的工作流也输出0，便于告警规则计算比率
+    N8N_DISPATCH_LATENCY.labels(_workflow)
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:20
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0028_itinerary_contact_email_requirement_contact_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attraction',
+            name='latitude',
+            field=models.DecimalField(blank=True, db_comment='地理纬度坐标,范围-90到90', decimal_places=6, max_digits=9, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)], verbose_name='纬度'),
+        ),
+        migrations.AddField(
+            model_name='attraction',
+            name='longitude',
+            field=models.DecimalField(blank=True, db_comment='地理经度坐标,范围-180到180', decimal_places=6, max_digits=9, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)], verbose_name='经度'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='latitude',
+            field=models.DecimalField(blank=True, db_comment='地理纬度坐标,范围-90到90', decimal_places=6, max_digits=9, null=True, verbose_name='纬度'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='longitude',
+            field=models.DecimalField(blank=True, db_comment='地理经度坐标,范围-180到180', decimal_places=6, max_digits=9, null=True, verbose_name='经度'),
+        ),
+    ]
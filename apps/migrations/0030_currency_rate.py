@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:30
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0029_attraction_restaurant_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrencyRate',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('id', models.AutoField(db_comment='自增主键ID', primary_key=True, serialize=False, verbose_name='自增主键')),
+                ('currency', models.CharField(db_comment='货币代码,如USD、JPY等', max_length=10, unique=True, verbose_name='货币')),
+                ('base_currency', models.CharField(db_comment='汇率对应的基准货币代码', default='CNY', max_length=10, verbose_name='基准货币')),
+                ('rate_to_base', models.DecimalField(db_comment='1单位该货币折合基准货币的数额', decimal_places=8, max_digits=18, validators=[django.core.validators.MinValueValidator(0)], verbose_name='兑基准货币汇率')),
+                ('source', models.CharField(db_comment='汇率数据来源,如file、stub等', default='file', max_length=50, verbose_name='数据来源')),
+                ('effective_date', models.DateField(blank=True, db_comment='汇率生效日期', null=True, verbose_name='生效日期')),
+            ],
+            options={
+                'verbose_name': '货币汇率表',
+                'verbose_name_plural': '货币汇率表',
+                'db_table': 'currency_rates',
+                'db_table_comment': '货币汇率表,存储各货币兑基准货币的汇率,用于报价和预算的币种换算',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:53
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0030_currency_rate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItineraryIngestJob',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('job_id', models.UUIDField(db_comment='导入任务唯一标识符,使用UUID格式', default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='任务ID')),
+                ('status', models.CharField(choices=[('PENDING', '排队中'), ('PROCESSING', '处理中'), ('SUCCEEDED', '已完成'), ('FAILED', '失败')], db_comment='导入任务状态,如排队中、处理中、已完成、失败', default='PENDING', max_length=20, verbose_name='任务状态')),
+                ('request_id', models.CharField(blank=True, db_comment='n8n请求头X-Request-ID,用于追踪', max_length=100, null=True, verbose_name='请求ID')),
+                ('requirement_id', models.CharField(db_comment='webhook数据中关联的需求ID', max_length=50, verbose_name='需求ID')),
+                ('payload', models.TextField(db_comment='webhook原始请求体JSON', verbose_name='原始数据')),
+                ('itinerary_id', models.CharField(blank=True, db_comment='导入成功后生成的行程ID', max_length=50, null=True, verbose_name='行程ID')),
+                ('attempts', models.PositiveIntegerField(db_comment='已执行导入的次数', default=0, verbose_name='尝试次数')),
+                ('last_error', models.TextField(blank=True, db_comment='最近一次导入失败的错误信息', null=True, verbose_name='错误信息')),
+                ('started_at', models.DateTimeField(blank=True, db_comment='最近一次开始导入的时间', null=True, verbose_name='开始时间')),
+                ('finished_at', models.DateTimeField(blank=True, db_comment='最近一次导入结束的时间', null=True, verbose_name='完成时间')),
+            ],
+            options={
+                'verbose_name': '行程导入任务',
+                'verbose_name_plural': '行程导入任务',
+                'db_table': 'itinerary_ingest_jobs',
+                'db_table_comment': '行程导入任务暂存表,保存n8n回调的原始行程数据,由后台任务异步生成行程',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='itinerary_i_status_45a4d0_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0031_itinerary_ingest_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='requirement',
+            index=models.Index(fields=['status', 'created_at'], name='requirement_status_9e7672_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requirement',
+            index=models.Index(fields=['status', 'expires_at'], name='requirement_status_4671a2_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='requirement',
+            name='requirement_status_b8bfb6_idx',
+        ),
+    ]
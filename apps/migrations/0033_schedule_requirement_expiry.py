@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.utils import timezone
+
+SCHEDULE_NAME = 'expire_requirements'
+
+
+def create_schedule(apps, schema_editor):
+    # 已存在时保留在 Admin 中调整过的间隔
+    Schedule = apps.get_model('django_q', 'Schedule')
+    Schedule.objects.get_or_create(
+        name=SCHEDULE_NAME,
+        defaults={
+            'func': 'apps.api.tasks.expire_requirements',
+            'schedule_type': 'I',
+            'minutes': 15,
+            'repeats': -1,
+            'next_run': timezone.now(),
+        },
+    )
+
+
+def delete_schedule(apps, schema_editor):
+    Schedule = apps.get_model('django_q', 'Schedule')
+    Schedule.objects.filter(name=SCHEDULE_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0032_requirement_expiry_indexes'),
+        ('django_q', '0019_alter_task_options_alter_ormq_key_alter_ormq_lock_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_schedule, delete_schedule),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:41
+
+import django.core.validators
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0033_schedule_requirement_expiry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='currencyrate',
+            name='rate_to_base',
+            field=models.DecimalField(db_comment='1单位该货币折合基准货币的数额,必须大于0', decimal_places=8, max_digits=18, validators=[django.core.validators.MinValueValidator(Decimal('1E-8'))], verbose_name='兑基准货币汇率'),
+        ),
+    ]
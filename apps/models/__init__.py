@@ -11,5 +11,7 @@ from .requirement_itinerary import RequirementItinerary
 from .validators import RequirementValidator, validate_phone_number, validate_city_name
 from .status_manager import RequirementStatusManager
 from .template_manager import TemplateManager
+from .currency_rate import CurrencyRate
+from .itinerary_ingest_job import ItineraryIngestJob
 
-__all__ = ['BaseModel', 'JSONField', 'Requirement', 'Restaurant', 'Attraction', 'Hotel', 'Itinerary', 'TravelerStats', 'Destination', 'DailySchedule', 'RequirementItinerary', 'RequirementValidator', 'validate_phone_number', 'validate_city_name', 'RequirementStatusManager', 'TemplateManager']
\ No newline at end of file
+__all__ = ['BaseModel', 'JSONField', 'Requirement', 'Restaurant', 'Attraction', 'Hotel', 'Itinerary', 'TravelerStats', 'Destination', 'DailySchedule', 'RequirementItinerary', 'RequirementValidator', 'validate_phone_number', 'validate_city_name', 'RequirementStatusManager', 'TemplateManager', 'CurrencyRate', 'ItineraryIngestJob']
\ No newline at end of file
@@ -34,6 +34,8 @@ class Attraction(BaseModel):
     district = models.CharField(max_length=200, blank=True, null=True, verbose_name='区域和商圈', db_comment='景点所属的行政区域和商业圈信息，如"朝阳区-三里屯商圈"或"浦东新区-陆家嘴商圈"')
     region = models.CharField(max_length=100, blank=True, null=True, verbose_name='地区', db_comment='景点所在地区或省份')
     address = models.TextField(blank=True, null=True, verbose_name='地址', db_comment='景点详细地址')
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True, validators=[MinValueValidator(-90), MaxValueValidator(90)], verbose_name='纬度', db_comment='地理纬度坐标,范围-90到90')
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True, validators=[MinValueValidator(-180), MaxValueValidator(180)], verbose_name='经度', db_comment='地理经度坐标,范围-180到180')
     category = models.CharField(max_length=50, choices=ATTRACTION_CATEGORY_CHOICES, blank=True, null=True, verbose_name='分类', db_comment='景点主分类,如自然景观，历史古迹，文化景点，宗教场所，现代景点，娱乐场所，购物场所，户外景点，室内景点，其他')
     subcategory = models.CharField(max_length=50, blank=True, null=True, verbose_name='子分类', db_comment='景点子分类,用于更精细的分类')
     tags = JSONField(blank=True, null=True, verbose_name='标签数组', db_comment='景点标签数组,存储关键词如亲子、拍照、必游等')
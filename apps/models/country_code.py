@@ -1,17 +1,29 @@
-from django.core.cache import cache
 import json
+import logging
 import os
+import threading
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class CountryCodeDict:
-    """ISO 3166-1 alpha-2 国家代码数据字典"""
-    
-    # 缓存键
-    CACHE_KEY = 'country_code_dict'
-    CACHE_TIMEOUT = 86400  # 24小时
-    
+    """
+    ISO 3166-1 alpha-2 国家代码数据字典
+
+    映射在进程内只读（MappingProxyType），导入时加载一次，查询不经过缓存；
+    load_from_file / update_country_codes 构造新映射整体替换并递增 version，读取方无需加锁
+    """
+
+    # 映射版本号，每次热加载后递增
+    version = 0
+    _reload_lock = threading.Lock()
+
     # 国家代码数据
-    COUNTRY_CODES = {
+    BUILTIN_COUNTRY_CODES = {
         'AF': '阿富汗',
         'AL': '阿尔巴尼亚',
         'DZ': '阿尔及利亚',
@@ -186,6 +198,9 @@ class CountryCodeDict:
         'ZM': '赞比亚',
         'ZW': '津巴布韦'
     }
+
+    # 当前生效的只读映射
+    COUNTRY_CODES: Mapping[str, str] = MappingProxyType(dict(BUILTIN_COUNTRY_CODES))
     
     @classmethod
     def get_country_name(cls, country_code):
@@ -198,102 +213,69 @@ class CountryCodeDict:
         Returns:
             str: 国家中文名称，如果未找到则返回空字符串
         """
-        # 尝试从缓存获取
-        country_dict = cls._get_from_cache()
-        
-        # 如果缓存中没有，使用内置数据
-        if country_dict is None:
-            country_dict = cls.COUNTRY_CODES
-            # 更新缓存
-            cls._update_cache(country_dict)
-        
-        return country_dict.get(country_code.upper(), '')
-    
+        return cls.COUNTRY_CODES.get((country_code or '').upper(), '')
+
     @classmethod
-    def get_all_countries(cls):
+    def get_country_names(cls, country_codes: Iterable) -> Dict[str, str]:
         """
-        获取所有国家代码和名称的字典
+        批量获取国家中文名称，用于列表页等一次显示多条记录的场景
         
+        Args:
+            country_codes: 国家代码列表
+            
         Returns:
-            dict: 国家代码到中文名称的映射
+            dict: {国家代码: 中文名称}，未找到的代码对应空字符串
         """
-        # 尝试从缓存获取
-        country_dict = cls._get_from_cache()
-        
-        # 如果缓存中没有，使用内置数据
-        if country_dict is None:
-            country_dict = cls.COUNTRY_CODES
-            # 更新缓存
-            cls._update_cache(country_dict)
-        
-        return country_dict
+        countries = cls.COUNTRY_CODES
+        return {code: countries.get((code or '').upper(), '') for code in country_codes}
     
     @classmethod
-    def _get_from_cache(cls):
+    def get_all_countries(cls) -> Mapping[str, str]:
         """
-        从缓存获取国家代码字典
+        获取所有国家代码和名称的只读映射
         
         Returns:
-            dict or None: 国家代码字典或None
+            Mapping: 国家代码到中文名称的映射
         """
-        try:
-            cached_data = cache.get(cls.CACHE_KEY)
-            if cached_data:
-                return cached_data
-        except Exception:
-            # 缓存读取失败，返回None
-            pass
-        return None
-    
-    @classmethod
-    def _update_cache(cls, country_dict):
-        """
-        更新缓存中的国家代码字典
-        
-        Args:
-            country_dict: 国家代码字典
-        """
-        try:
-            cache.set(cls.CACHE_KEY, country_dict, cls.CACHE_TIMEOUT)
-        except Exception:
-            # 缓存更新失败，忽略错误
-            pass
-    
-    @classmethod
-    def refresh_cache(cls):
-        """
-        刷新缓存，重新加载国家代码数据
-        """
-        cls._update_cache(cls.COUNTRY_CODES)
+        return cls.COUNTRY_CODES
     
     @classmethod
     def update_country_codes(cls, new_codes):
         """
-        更新国家代码数据
+        合并新的国家代码数据，替换当前映射并递增版本号
         
         Args:
             new_codes: 新的国家代码字典
         """
-        # 更新内置数据
-        cls.COUNTRY_CODES.update(new_codes)
-        # 刷新缓存
-        cls.refresh_cache()
+        codes = {str(code).strip().upper(): str(name) for code, name in new_codes.items()}
+        with cls._reload_lock:
+            cls.COUNTRY_CODES = MappingProxyType({**cls.COUNTRY_CODES, **codes})
+            cls.version += 1
     
     @classmethod
     def load_from_file(cls, file_path):
         """
-        从文件加载国家代码数据
+        从文件热加载国家代码数据，与内置数据合并
         
         Args:
-            file_path: JSON文件路径
+            file_path: JSON文件路径，内容为 {国家代码: 中文名称}
+            
+        Returns:
+            bool: 是否加载成功
         """
         try:
             if os.path.exists(file_path):
                 with open(file_path, 'r', encoding='utf-8') as f:
                     new_codes = json.load(f)
-                    cls.update_country_codes(new_codes)
+                if not isinstance(new_codes, dict):
+                    raise ValueError('文件内容必须是 {国家代码: 中文名称} 对象')
+                cls.update_country_codes(new_codes)
                 return True
-        except Exception:
-            # 文件加载失败，忽略错误
-            pass
+        except Exception as e:
+            logger.warning(f"加载国家代码文件失败: {file_path}, {str(e)}")
         return False
+
+
+# 导入时加载 COUNTRY_CODE_FILE 指定的补充数据
+if getattr(settings, 'COUNTRY_CODE_FILE', ''):
+    CountryCodeDict.load_from_file(settings.COUNTRY_CODE_FILE)
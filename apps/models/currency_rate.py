@@ -0,0 +1,24 @@
+from decimal import Decimal
+
+from django.db import models
+from django.core.validators import MinValueValidator
+from .base import BaseModel
+
+
+class CurrencyRate(BaseModel):
+    """货币汇率表"""
+    id = models.AutoField(primary_key=True, verbose_name='自增主键', db_comment='自增主键ID')
+    currency = models.CharField(max_length=10, unique=True, verbose_name='货币', db_comment='货币代码,如USD、JPY等')
+    base_currency = models.CharField(max_length=10, default='CNY', verbose_name='基准货币', db_comment='汇率对应的基准货币代码')
+    rate_to_base = models.DecimalField(max_digits=18, decimal_places=8, validators=[MinValueValidator(Decimal('0.00000001'))], verbose_name='兑基准货币汇率', db_comment='1单位该货币折合基准货币的数额,必须大于0')
+    source = models.CharField(max_length=50, default='file', verbose_name='数据来源', db_comment='汇率数据来源,如file、stub等')
+    effective_date = models.DateField(null=True, blank=True, verbose_name='生效日期', db_comment='汇率生效日期')
+
+    def __str__(self):
+        return f'{self.currency}/{self.base_currency}: {self.rate_to_base}'
+
+    class Meta:
+        db_table = 'currency_rates'
+        verbose_name = '货币汇率表'
+        verbose_name_plural = '货币汇率表'
+        db_table_comment = '货币汇率表,存储各货币兑基准货币的汇率,用于报价和预算的币种换算'
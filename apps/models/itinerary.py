@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import IntegrityError, models
 from django.core.validators import MinValueValidator
 from django.utils import timezone
+from apps.metrics import ID_ALLOCATION_COLLISIONS, SNAPSHOT_REBUILDS
+from apps.utils.entity_cache import current_entity_cache
+from apps.utils.id_allocation import is_id_conflict
 from .base import BaseModel
 
 
@@ -71,6 +74,8 @@ class Itinerary(BaseModel):
     itinerary_quote_json_data = models.TextField(null=True, blank=True, verbose_name='行程报价JSON数据', db_comment='行程报价的JSON结构化数据')
 
     def save(self, *args, **kwargs):
+        generated_id = False
+        
         # 计算总天数
         if self.start_date and self.end_date:
             self.total_days = (self.end_date - self.start_date).days + 1
@@ -111,8 +116,10 @@ class Itinerary(BaseModel):
                     # 检查是否存在冲突
                     if not Itinerary.objects.filter(itinerary_id=new_id).exists():
                         self.itinerary_id = new_id
+                        generated_id = True
                         break
                     
+                    ID_ALLOCATION_COLLISIONS.labels('itinerary').inc()
                     # 避免无限循环，添加短暂延迟
                     time.sleep(0.01)
             
@@ -124,10 +131,19 @@ class Itinerary(BaseModel):
         self.update_itinerary_json_data()
         self.update_itinerary_quote_json_data()
         
-        super().save(*args, **kwargs)
+        if generated_id:
+            # 主键非空时 Django 先尝试 UPDATE，强制 INSERT 才能让并发分配到的同一ID报错而不是覆盖对方
+            kwargs['force_insert'] = True
+        try:
+            super().save(*args, **kwargs)
+        except IntegrityError as e:
+            if generated_id and is_id_conflict(e, Itinerary):
+                ID_ALLOCATION_COLLISIONS.labels('itinerary').inc()
+            raise
     
     def update_itinerary_json_data(self):
         """更新行程的结构化JSON数据"""
+        SNAPSHOT_REBUILDS.labels('itinerary').inc()
         # 构建基础行程数据
         itinerary_data = {
             'itinerary_id': self.itinerary_id,
@@ -242,6 +258,7 @@ class Itinerary(BaseModel):
     
     def update_itinerary_quote_json_data(self):
         """更新行程报价的JSON结构化数据"""
+        SNAPSHOT_REBUILDS.labels('quote').inc()
         from .daily_schedule import DailySchedule
         
         quote_data = {
@@ -286,58 +303,46 @@ class Itinerary(BaseModel):
         restaurants = []
         
         try:
-            # 从每日行程中提取关联的景点、酒店、餐厅
-            schedules = DailySchedule.objects.filter(itinerary_id=self)
-            for schedule in schedules:
-                # 景点
-                if schedule.attraction_id_id:
-                    from .attraction import Attraction
-                    try:
-                        attraction = Attraction.objects.get(attraction_id=schedule.attraction_id_id)
-                        attractions.append({
-                            'attraction_id': str(attraction.attraction_id),
-                            'attraction_name': attraction.attraction_name,
-                            'pricing_strategy': attraction.pricing_strategy,
-                        })
-                    except Attraction.DoesNotExist:
-                        pass
-                
-                # 酒店
-                if schedule.hotel_id_id:
-                    from .hotel import Hotel
-                    try:
-                        hotel = Hotel.objects.get(hotel_id=schedule.hotel_id_id)
-                        hotels.append({
-                            'hotel_id': str(hotel.hotel_id),
-                            'hotel_name': hotel.hotel_name,
-                            'pricing_strategy': hotel.pricing_strategy,
-                        })
-                    except Hotel.DoesNotExist:
-                        pass
-                
-                # 餐厅
-                if schedule.restaurant_id_id:
-                    from .restaurant import Restaurant
-                    try:
-                        restaurant = Restaurant.objects.get(restaurant_id=schedule.restaurant_id_id)
-                        restaurants.append({
-                            'restaurant_id': str(restaurant.restaurant_id),
-                            'restaurant_name': restaurant.restaurant_name,
-                            'pricing_strategy': restaurant.pricing_strategy,
-                        })
-                    except Restaurant.DoesNotExist:
-                        pass
+            from .attraction import Attraction
+            from .hotel import Hotel
+            from .restaurant import Restaurant
+            
+            # 从每日行程中提取关联的景点、酒店、餐厅，按首次出现的顺序去重后每类一条查询批量加载
+            attraction_ids, hotel_ids, restaurant_ids = {}, {}, {}
+            for attraction_pk, hotel_pk, restaurant_pk in DailySchedule.objects.filter(itinerary_id=self).values_list(
+                'attraction_id_id', 'hotel_id_id', 'restaurant_id_id'
+            ):
+                for ids, pk in ((attraction_ids, attraction_pk), (hotel_ids, hotel_pk), (restaurant_ids, restaurant_pk)):
+                    if pk:
+                        ids.setdefault(pk)
+            
+            cache = current_entity_cache()
+            found = cache.get_many(Attraction, attraction_ids)
+            attractions = [{
+                'attraction_id': str(attraction.attraction_id),
+                'attraction_name': attraction.attraction_name,
+                'pricing_strategy': attraction.pricing_strategy,
+            } for attraction in (found[pk] for pk in attraction_ids if pk in found)]
+            
+            found = cache.get_many(Hotel, hotel_ids)
+            hotels = [{
+                'hotel_id': str(hotel.hotel_id),
+                'hotel_name': hotel.hotel_name,
+                'pricing_strategy': hotel.pricing_strategy,
+            } for hotel in (found[pk] for pk in hotel_ids if pk in found)]
+            
+            found = cache.get_many(Restaurant, restaurant_ids)
+            restaurants = [{
+                'restaurant_id': str(restaurant.restaurant_id),
+                'restaurant_name': restaurant.restaurant_name,
+                'pricing_strategy': restaurant.pricing_strategy,
+            } for restaurant in (found[pk] for pk in restaurant_ids if pk in found)]
         except Exception as e:
             import logging
             logger = logging.getLogger('itinerary')
             logger.error(f"Error fetching quote data: {str(e)}")
             pass
         
-        # 去重
-        attractions = list({a['attraction_id']: a for a in attractions}.values())
-        hotels = list({h['hotel_id']: h for h in hotels}.values())
-        restaurants = list({r['restaurant_id']: r for r in restaurants}.values())
-        
         quote_data['attractions'] = attractions
         quote_data['hotels'] = hotels
         quote_data['restaurants'] = restaurants
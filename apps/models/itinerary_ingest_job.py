@@ -0,0 +1,36 @@
+import uuid
+from django.db import models
+from .base import BaseModel
+
+
+class ItineraryIngestJob(BaseModel):
+    """行程导入任务暂存表"""
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', '排队中'
+        PROCESSING = 'PROCESSING', '处理中'
+        SUCCEEDED = 'SUCCEEDED', '已完成'
+        FAILED = 'FAILED', '失败'
+
+    job_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name='任务ID', db_comment='导入任务唯一标识符,使用UUID格式')
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING, verbose_name='任务状态', db_comment='导入任务状态,如排队中、处理中、已完成、失败')
+    request_id = models.CharField(max_length=100, null=True, blank=True, verbose_name='请求ID', db_comment='n8n请求头X-Request-ID,用于追踪')
+    requirement_id = models.CharField(max_length=50, verbose_name='需求ID', db_comment='webhook数据中关联的需求ID')
+    payload = models.TextField(verbose_name='原始数据', db_comment='webhook原始请求体JSON')
+    itinerary_id = models.CharField(max_length=50, null=True, blank=True, verbose_name='行程ID', db_comment='导入成功后生成的行程ID')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='尝试次数', db_comment='已执行导入的次数')
+    last_error = models.TextField(null=True, blank=True, verbose_name='错误信息', db_comment='最近一次导入失败的错误信息')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='开始时间', db_comment='最近一次开始导入的时间')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='完成时间', db_comment='最近一次导入结束的时间')
+
+    def __str__(self):
+        return f'{self.job_id} ({self.get_status_display()})'
+
+    class Meta:
+        db_table = 'itinerary_ingest_jobs'
+        verbose_name = '行程导入任务'
+        verbose_name_plural = '行程导入任务'
+        db_table_comment = '行程导入任务暂存表,保存n8n回调的原始行程数据,由后台任务异步生成行程'
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import IntegrityError, models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
+from apps.metrics import ID_ALLOCATION_COLLISIONS
+from apps.utils.id_allocation import is_id_conflict
 from .base import BaseModel, JSONField
 
 
@@ -184,10 +186,12 @@ class Requirement(BaseModel):
         db_table_comment = '旅游需求管理表,存储客户的旅游需求信息,包括出发地、目的地、出行人数、日期、预算、偏好等详细需求'
         indexes = [
             models.Index(fields=['requirement_id']),
-            models.Index(fields=['status']),
             models.Index(fields=['created_by']),
             models.Index(fields=['is_template']),
             models.Index(fields=['-created_at']),
+            # 过期任务按状态分批扫描；(status, created_at) 同时覆盖只按状态的筛选
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'expires_at']),
         ]
     
     def __str__(self):
@@ -225,6 +229,8 @@ class Requirement(BaseModel):
         return f"{self.requirement_id} - {self.origin_name} 至 {destination_str}"
     
     def save(self, *args, **kwargs):
+        generated_id = False
+        
         # 重新计算总人数
         self.group_total = self.group_adults + self.group_children + self.group_seniors
         
@@ -261,12 +267,22 @@ class Requirement(BaseModel):
                     # 检查是否存在冲突
                     if not Requirement.objects.filter(requirement_id=new_id).exists():
                         self.requirement_id = new_id
+                        generated_id = True
                         break
                     
+                    ID_ALLOCATION_COLLISIONS.labels('requirement').inc()
                     # 避免无限循环，添加短暂延迟
                     time.sleep(0.01)
         
-        super().save(*args, **kwargs)
+        if generated_id:
+            # 主键非空时 Django 先尝试 UPDATE，强制 INSERT 才能让并发分配到的同一ID报错而不是覆盖对方
+            kwargs['force_insert'] = True
+        try:
+            super().save(*args, **kwargs)
+        except IntegrityError as e:
+            if generated_id and is_id_conflict(e, Requirement):
+                ID_ALLOCATION_COLLISIONS.labels('requirement').inc()
+            raise
     
     def clean(self):
         if self.travel_end_date and self.travel_start_date:
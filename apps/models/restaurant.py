@@ -36,6 +36,22 @@ class Restaurant(BaseModel):
     city_name = models.CharField(max_length=100, verbose_name='城市名称', db_comment='餐厅所在城市名称')
     district = models.CharField(max_length=100, blank=True, verbose_name='区域', db_comment='餐厅所在区域或商圈')
     address = models.TextField(verbose_name='地址', db_comment='餐厅详细地址')
+    latitude = models.DecimalField(
+        max_digits=9,
+        decimal_places=6,
+        blank=True,
+        null=True,
+        verbose_name='纬度',
+        db_comment='地理纬度坐标,范围-90到90'
+    )
+    longitude = models.DecimalField(
+        max_digits=9,
+        decimal_places=6,
+        blank=True,
+        null=True,
+        verbose_name='经度',
+        db_comment='地理经度坐标,范围-180到180'
+    )
     cuisine_type = models.CharField(max_length=100, verbose_name='菜系', db_comment='餐厅主菜系,如中餐、西餐、日料等')
     sub_cuisine_types = JSONField(verbose_name='子菜系数组', default=list, db_comment='子菜系列表,如川菜、粤菜等')
     restaurant_type = models.CharField(
@@ -1,3 +1,5 @@
+import time
+
 from django.utils import timezone
 from datetime import timedelta
 from django.db.models import Q
@@ -34,43 +36,116 @@ class RequirementStatusManager:
         except Requirement.DoesNotExist:
             raise ValueError(f'需求不存在: {requirement_id}')
     
+    # 每批更新的条数：先按索引取出一批主键，再按主键更新，单条 UPDATE 只锁定这一批行
+    EXPIRY_BATCH_SIZE = 500
+
+    @staticmethod
+    def _expire_in_batches(queryset, order_field, now, batch_size=None, max_batches=None):
+        """
+        把查询集中的需求分批更新为已过期
+
+        Args:
+            queryset: 待过期的需求，条件需能走 (status, order_field) 复合索引
+            order_field: 取批次时的排序字段，与索引的第二列一致
+            now: 本次运行的时间，写入 updated_at
+            batch_size: 每批条数
+            max_batches: 最多执行的批次数，剩余的留给下次运行，为空时不限制
+
+        Returns:
+            (过期条数, 批次数)
+        """
+        from .requirement import Requirement
+        batch_size = batch_size or RequirementStatusManager.EXPIRY_BATCH_SIZE
+        expired = batches = 0
+        while max_batches is None or batches < max_batches:
+            ids = list(queryset.order_by(order_field).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            # 更新时再次带上筛选条件，取出主键后状态已被修改的需求不会被覆盖
+            expired += queryset.filter(pk__in=ids).update(status=Requirement.Status.EXPIRED, updated_at=now)
+            batches += 1
+            if len(ids) < batch_size:
+                break
+        return expired, batches
+
+    @staticmethod
+    def _expire_by_age(status, hours, now, batch_size=None, max_batches=None):
+        """未设置 expires_at 的需求按创建时间超过 hours 小时过期"""
+        from .requirement import Requirement
+        queryset = Requirement.objects.filter(
+            status=status, created_at__lt=now - timedelta(hours=hours), expires_at__isnull=True
+        )
+        return RequirementStatusManager._expire_in_batches(queryset, 'created_at', now, batch_size, max_batches)
+
+    @staticmethod
+    def _expire_due(now, batch_size=None, max_batches=None):
+        """expires_at 已到的待审核和已确认需求过期"""
+        from .requirement import Requirement
+        expired = batches = 0
+        for status in (Requirement.Status.PENDING_REVIEW, Requirement.Status.CONFIRMED):
+            count, runs = RequirementStatusManager._expire_in_batches(
+                Requirement.objects.filter(status=status, expires_at__lte=now), 'expires_at', now,
+                batch_size, max_batches
+            )
+            expired += count
+            batches += runs
+        return expired, batches
+
     @staticmethod
     def check_and_expire_pending_requirements(pending_hours=72):
         from .requirement import Requirement
-        expiry_time = timezone.now() - timedelta(hours=pending_hours)
-        expired_requirements = Requirement.objects.filter(
-            status=Requirement.Status.PENDING_REVIEW,
-            created_at__lt=expiry_time
+        count, _ = RequirementStatusManager._expire_by_age(
+            Requirement.Status.PENDING_REVIEW, pending_hours, timezone.now()
         )
-        
-        count = expired_requirements.count()
-        expired_requirements.update(status=Requirement.Status.EXPIRED)
-        
         return count
     
     @staticmethod
     def check_and_expire_confirmed_requirements(validity_hours=168):
         from .requirement import Requirement
-        expiry_time = timezone.now() - timedelta(hours=validity_hours)
-        expired_requirements = Requirement.objects.filter(
-            status=Requirement.Status.CONFIRMED,
-            created_at__lt=expiry_time
+        count, _ = RequirementStatusManager._expire_by_age(
+            Requirement.Status.CONFIRMED, validity_hours, timezone.now()
         )
-        
-        count = expired_requirements.count()
-        expired_requirements.update(status=Requirement.Status.EXPIRED)
-        
+        return count
+
+    @staticmethod
+    def check_and_expire_due_requirements():
+        count, _ = RequirementStatusManager._expire_due(timezone.now())
         return count
     
     @staticmethod
-    def check_all_expired_requirements(pending_hours=72, confirmed_hours=168):
-        pending_count = RequirementStatusManager.check_and_expire_pending_requirements(pending_hours)
-        confirmed_count = RequirementStatusManager.check_and_expire_confirmed_requirements(confirmed_hours)
+    def check_all_expired_requirements(pending_hours=72, confirmed_hours=168, batch_size=None, max_batches=None):
+        """
+        过期所有到期的需求：设置了 expires_at 的按 expires_at，未设置的按创建时间和状态对应的时长
+
+        Args:
+            pending_hours: 待审核需求的有效时长（小时）
+            confirmed_hours: 已确认需求的有效时长（小时）
+            batch_size: 每批更新条数
+            max_batches: 每类规则最多执行的批次数，为空时不限制
+
+        Returns:
+            dict: 各规则过期条数、批次数和耗时（毫秒）
+        """
+        from .requirement import Requirement
+        started = time.monotonic()
+        now = timezone.now()
+        due_count, batches = RequirementStatusManager._expire_due(now, batch_size, max_batches)
+        pending_count, count = RequirementStatusManager._expire_by_age(
+            Requirement.Status.PENDING_REVIEW, pending_hours, now, batch_size, max_batches
+        )
+        batches += count
+        confirmed_count, count = RequirementStatusManager._expire_by_age(
+            Requirement.Status.CONFIRMED, confirmed_hours, now, batch_size, max_batches
+        )
+        batches += count
         
         return {
             'pending_expired': pending_count,
             'confirmed_expired': confirmed_count,
-            'total_expired': pending_count + confirmed_count
+            'due_expired': due_count,
+            'total_expired': pending_count + confirmed_count + due_count,
+            'batches': batches,
+            'duration_ms': round((time.monotonic() - started) * 1000, 1),
         }
     
     @staticmethod
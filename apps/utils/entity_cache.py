@@ -0,0 +1,94 @@
+"""
+实体缓存
+在一次请求或一次服务调用内按主键缓存目录实体（景点、酒店、餐厅等）：未命中的主键合并为一条 IN 查询批量加载，
+同一实体在作用域内只查询一次；作用域结束即丢弃，不跨请求共享，因此不需要失效策略。
+作用域内保存或删除的实体由信号从缓存中移除，之后重新读取
+"""
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+from django.db.models.signals import post_delete, post_save
+
+
+_current: contextvars.ContextVar[Optional['EntityCache']] = contextvars.ContextVar('entity_cache', default=None)
+
+
+class EntityCache:
+    """按模型和主键缓存实体，不存在的主键也记录，避免重复查询"""
+
+    def __init__(self):
+        self._entities: Dict[type, Dict] = {}
+
+    def _key(self, model, pk):
+        # 主键统一转换为字段的Python类型，字符串形式的UUID与 uuid.UUID 命中同一条缓存
+        return model._meta.pk.to_python(pk)
+
+    def load(self, model, pks: Iterable):
+        """批量加载尚未缓存的主键，一条 IN 查询"""
+        cached = self._entities.setdefault(model, {})
+        missing = {self._key(model, pk) for pk in pks if pk is not None} - cached.keys()
+        if not missing:
+            return
+        found = model._default_manager.in_bulk(missing)
+        for pk in missing:
+            cached[pk] = found.get(pk)
+
+    def get(self, model, pk):
+        """返回主键对应的实体，不存在时返回 None"""
+        if pk is None:
+            return None
+        self.load(model, [pk])
+        return self._entities[model][self._key(model, pk)]
+
+    def get_many(self, model, pks: Iterable) -> Dict:
+        """返回 {主键: 实体}，不存在的主键不包含在结果中"""
+        pks = [self._key(model, pk) for pk in pks if pk is not None]
+        self.load(model, pks)
+        cached = self._entities[model]
+        return {pk: cached[pk] for pk in pks if cached[pk] is not None}
+
+    def discard(self, model, pk=None):
+        """移除缓存的实体，pk 为空时移除该模型的全部缓存"""
+        if model not in self._entities:
+            return
+        if pk is None:
+            del self._entities[model]
+        else:
+            self._entities[model].pop(self._key(model, pk), None)
+
+
+@contextmanager
+def entity_cache():
+    """
+    开启实体缓存作用域；已在作用域内时复用外层缓存，嵌套的服务调用共享同一批已加载的实体
+
+    Usage:
+        with entity_cache() as cache:
+            attractions = cache.get_many(Attraction, attraction_ids)
+    """
+    cache = _current.get()
+    if cache is not None:
+        yield cache
+        return
+    cache = EntityCache()
+    token = _current.set(cache)
+    try:
+        yield cache
+    finally:
+        _current.reset(token)
+
+
+def current_entity_cache() -> EntityCache:
+    """当前作用域的实体缓存；不在作用域内时返回一次性的缓存，仍按批量加载"""
+    return _current.get() or EntityCache()
+
+
+def _discard_saved(sender, instance, **kwargs):
+    cache = _current.get()
+    if cache is not None:
+        cache.discard(sender, instance.pk)
+
+
+post_save.connect(_discard_saved, dispatch_uid='entity_cache_post_save')
+post_delete.connect(_discard_saved, dispatch_uid='entity_cache_post_delete')
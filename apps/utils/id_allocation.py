@@ -0,0 +1,25 @@
+"""
+业务ID分配辅助
+行程、需求按 PREFIX_YYYYMMDD_NNN 的日期序号分配主键，并发写入时可能分配到同一个ID；
+插入失败时据此区分主键重复与外键、非空等其他约束错误，只有前者值得重新分配ID
+"""
+from django.db import IntegrityError
+
+
+def is_id_conflict(error: IntegrityError, model) -> bool:
+    """
+    判断 IntegrityError 是否由模型主键重复引起，兼容 SQLite、MySQL 与 PostgreSQL 的错误信息
+
+    Args:
+        error: 插入时抛出的 IntegrityError
+        model: 按日期序号分配主键的模型类
+    """
+    table, column = model._meta.db_table, model._meta.pk.column
+    message = str(error)
+    if 'UNIQUE constraint failed: ' in message:
+        # SQLite，复合唯一约束会列出多个字段，需整体相等
+        return message.split('UNIQUE constraint failed: ', 1)[1].strip() == f'{table}.{column}'
+    if 'Duplicate entry' in message:
+        # MySQL 8.0.19 起键名带表名前缀
+        return f"for key '{table}.PRIMARY'" in message or "for key 'PRIMARY'" in message
+    return f'"{table}_pkey"' in message
@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.api.middleware.RequestIdMiddleware',
+    'apps.api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -167,6 +169,34 @@ Q_CLUSTER = {
     'orm': 'default',
 }
 
+# Requirement Expiry Configuration
+# 由 django_q 计划任务 expire_requirements 定期执行（默认每15分钟，可在 Admin 的计划任务中调整）
+REQUIREMENT_PENDING_EXPIRY_HOURS = int(os.getenv('REQUIREMENT_PENDING_EXPIRY_HOURS', '72'))  # 待审核需求未设置过期时间时的有效时长（小时）
+REQUIREMENT_CONFIRMED_EXPIRY_HOURS = int(os.getenv('REQUIREMENT_CONFIRMED_EXPIRY_HOURS', '168'))  # 已确认需求未设置过期时间时的有效时长（小时）
+REQUIREMENT_EXPIRY_BATCH_SIZE = int(os.getenv('REQUIREMENT_EXPIRY_BATCH_SIZE', '500'))  # 每条 UPDATE 更新的需求数
+REQUIREMENT_EXPIRY_MAX_BATCHES = int(os.getenv('REQUIREMENT_EXPIRY_MAX_BATCHES', '100'))  # 每类规则单次运行最多批次，剩余的留给下次运行
+
+# Cache Configuration
+# 多个 gunicorn worker 和 qcluster 进程共享的缓存：幂等锁、查询结果，以及分层缓存的二级缓存。
+# 配置 CACHE_REDIS_URL 时使用 Redis（需安装 redis 包），否则使用项目目录下的文件缓存（web 与 worker 容器共享挂载目录）
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', '')
+CACHE_FILE_LOCATION = os.getenv('CACHE_FILE_LOCATION', str(BASE_DIR / '.cache'))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_REDIS_URL,
+    } if CACHE_REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_FILE_LOCATION,
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_FILE_MAX_ENTRIES', '10000'))},
+    },
+}
+TIERED_CACHE_L1_MAX_ENTRIES = int(os.getenv('TIERED_CACHE_L1_MAX_ENTRIES', '1024'))  # 分层缓存每个命名空间的进程内条目上限
+TIERED_CACHE_L1_TTL = float(os.getenv('TIERED_CACHE_L1_TTL', '60'))  # 进程内条目有效期（秒）
+TIERED_CACHE_VERSION_CHECK_INTERVAL = float(os.getenv('TIERED_CACHE_VERSION_CHECK_INTERVAL', '1'))  # 检查命名空间版本的间隔（秒），即失效传播到其他进程的最大延迟
+CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', '600'))  # 按城市缓存的候选目录有效期（秒），目录数据保存或删除时立即失效
+EXPORT_CACHE_TTL = int(os.getenv('EXPORT_CACHE_TTL', '3600'))  # 行程导出文件缓存有效期（秒），行程修改后重新生成
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173',
@@ -225,26 +255,115 @@ N8N_API_KEY = os.getenv('N8N_API_KEY', '')
 # Webhook Request Configuration
 WEBHOOK_TIMEOUT = 120  # 120秒超时
 WEBHOOK_MAX_RETRIES = 0  # 最多0次重试
+WEBHOOK_IDEMPOTENCY_TTL = int(os.getenv('WEBHOOK_IDEMPOTENCY_TTL', '600'))  # 重复提交返回原结果的有效期（秒）
+WEBHOOK_BATCH_MAX_ITEMS = int(os.getenv('WEBHOOK_BATCH_MAX_ITEMS', '100'))  # 批量webhook单次最多条数
+WEBHOOK_MAX_BODY_SIZE = int(os.getenv('WEBHOOK_MAX_BODY_SIZE', str(10 * 1024 * 1024)))  # webhook请求体上限（字节），超过返回413
+DATA_UPLOAD_MAX_MEMORY_SIZE = WEBHOOK_MAX_BODY_SIZE  # Django读取request.body的上限，与webhook上限保持一致
+ASYNC_DB_MAX_WORKERS = int(os.getenv('ASYNC_DB_MAX_WORKERS', '8'))  # 异步webhook视图的ORM线程池大小，需小于数据库连接上限
+ITINERARY_WEBHOOK_MODE = os.getenv('ITINERARY_WEBHOOK_MODE', 'sync')  # sync: 同步生成行程; enqueue: 暂存后返回202由worker生成
+ITINERARY_INGEST_MAX_ATTEMPTS = int(os.getenv('ITINERARY_INGEST_MAX_ATTEMPTS', '3'))  # 导入任务最多执行次数
+ITINERARY_INGEST_RETRY_DELAY = int(os.getenv('ITINERARY_INGEST_RETRY_DELAY', '60'))  # 首次重试间隔（秒），之后指数递增
+ITINERARY_INGEST_PROCESSING_TIMEOUT = int(os.getenv('ITINERARY_INGEST_PROCESSING_TIMEOUT', '600'))  # 处理中超过该时长（秒）视为中断，可重新执行或手动重试，需大于 Q_CLUSTER 的 retry
+
+# Itinerary Planning Configuration
+ITINERARY_TRAVEL_SPEED_KMH = float(os.getenv('ITINERARY_TRAVEL_SPEED_KMH', '25'))  # 城市内平均交通速度
+ITINERARY_TRANSFER_BUFFER_MINUTES = int(os.getenv('ITINERARY_TRANSFER_BUFFER_MINUTES', '10'))  # 每次换乘缓冲时间
+
+# Quote Engine Configuration
+# 各年龄段相对成人的计价系数
+QUOTE_AGE_BAND_MULTIPLIERS = {
+    'adult': 1.0,
+    'senior': float(os.getenv('QUOTE_SENIOR_MULTIPLIER', '0.8')),
+    'child': float(os.getenv('QUOTE_CHILD_MULTIPLIER', '0.5')),
+    'infant': float(os.getenv('QUOTE_INFANT_MULTIPLIER', '0')),
+}
+QUOTE_GUESTS_PER_ROOM = int(os.getenv('QUOTE_GUESTS_PER_ROOM', '2'))  # 每间客房入住人数
+# 餐厅未填写人均价格时按价格范围估算的人均消费
+QUOTE_MEAL_PRICE_BY_RANGE = {'$': 50, '$$': 120, '$$$': 300, '$$$$': 600}
+
+# Currency Configuration
+CURRENCY_BASE = os.getenv('CURRENCY_BASE', 'CNY')  # 汇率基准货币
+CURRENCY_RATE_PROVIDER = os.getenv('CURRENCY_RATE_PROVIDER', 'database')  # 汇率来源: database 或 stub
+CURRENCY_RATE_CACHE_TTL = int(os.getenv('CURRENCY_RATE_CACHE_TTL', '300'))  # 进程内汇率缓存有效期（秒）
+
+# Country Code Configuration
+COUNTRY_CODE_FILE = os.getenv('COUNTRY_CODE_FILE', '')  # 补充或覆盖内置国家代码的JSON文件（{国家代码: 中文名称}），进程启动时加载
+
+# Candidate Selection Configuration
+# 行程规划时各类别返回给LLM的候选资源数量
+CANDIDATE_TOP_K = {
+    'attractions': int(os.getenv('CANDIDATE_TOP_K_ATTRACTIONS', '30')),
+    'hotels': int(os.getenv('CANDIDATE_TOP_K_HOTELS', '10')),
+    'restaurants': int(os.getenv('CANDIDATE_TOP_K_RESTAURANTS', '20')),
+}
+
+# Prompt Context Configuration
+PROMPT_CONTEXT_TOKEN_BUDGET = int(os.getenv('PROMPT_CONTEXT_TOKEN_BUDGET', '6000'))  # 目录上下文token预算
+PROMPT_CONTEXT_MAX_ITEMS = {'attractions': 40, 'hotels': 15, 'restaurants': 30}  # 每类条数硬上限
+PROMPT_CONTEXT_TEXT_LIMIT = 40  # 特色描述截断长度（字符）
+PROMPT_CONTEXT_MAX_TAGS = 4  # 每条记录保留的标签数
+
+# Query Gateway Configuration
+QUERY_GATEWAY_TABLES = ['attractions', 'hotels', 'restaurants', 'destinations', 'currency_rates']  # 允许查询的目录表
+QUERY_GATEWAY_MAX_ROWS = int(os.getenv('QUERY_GATEWAY_MAX_ROWS', '200'))  # 单次查询最多返回行数
+QUERY_GATEWAY_MAX_STATEMENT_TIME = float(os.getenv('QUERY_GATEWAY_MAX_STATEMENT_TIME', '5'))  # 单条语句超时（秒）
+QUERY_GATEWAY_CACHE_TTL = int(os.getenv('QUERY_GATEWAY_CACHE_TTL', '300'))  # 查询结果缓存时间（秒）
+# 执行查询的数据库别名。生产环境应指向单独的数据库连接，其账号只授予 QUERY_GATEWAY_TABLES 中目录表的 SELECT 权限，
+# 表白名单校验之外再由数据库权限兜底（例如不能读取 auth_user）
+QUERY_GATEWAY_DATABASE = os.getenv('QUERY_GATEWAY_DATABASE', 'default')
+
+# Performance Instrumentation Configuration
+PERF_METRICS_ENABLED = os.getenv('PERF_METRICS_ENABLED', 'True') == 'True'  # 记录每个请求的耗时、查询数等指标
+PERF_SERVER_TIMING = os.getenv('PERF_SERVER_TIMING', 'True') == 'True'  # 在响应头中返回 Server-Timing
+PERF_SLOW_REQUEST_MS = float(os.getenv('PERF_SLOW_REQUEST_MS', '1000'))  # 超过该耗时（毫秒）记为慢请求
+PERF_SLOW_QUERY_COUNT = int(os.getenv('PERF_SLOW_QUERY_COUNT', '50'))  # 单个请求查询数达到该值记为慢请求，用于发现N+1查询
+PERF_TOP_QUERIES = int(os.getenv('PERF_TOP_QUERIES', '5'))  # 慢请求日志附带的最慢SQL条数
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'warn' if DEBUG else 'off')  # 超出查询预算时 raise 抛异常（测试）/ warn 记日志 / off 不检查
+ADMIN_QUERY_BUDGET = int(os.getenv('ADMIN_QUERY_BUDGET', '40'))  # Admin视图默认查询预算，ModelAdmin.query_budgets 可按视图覆盖
+METRICS_AUTH_TOKEN = os.getenv('METRICS_AUTH_TOKEN', '')  # /metrics 的 Bearer token，为空时不校验（应只在内网开放）
 
 # Logging Configuration
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text' if DEBUG else 'json')  # text: 便于阅读; json: 每行一条JSON，便于日志采集
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # 日志队列容量，写满后丢弃并计数
+LOG_RATE_LIMIT_PER_SECOND = float(os.getenv('LOG_RATE_LIMIT_PER_SECOND', '100'))  # 每个logger每秒最多输出的INFO及以下日志，0为不限
+LOG_RATE_LIMITS = {'django.db.backends': 20}  # 按logger名前缀覆盖限流值
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
         'verbose': {
-            'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+            'format': '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
         },
         'simple': {
             'format': '%(levelname)s - %(message)s'
         },
+        'json': {
+            '()': 'apps.api.utils.log_pipeline.JsonLinesFormatter',
+        },
+    },
+    'filters': {
+        'request_id': {
+            '()': 'apps.api.utils.log_pipeline.RequestIdFilter',
+        },
+        'sensitive_data': {
+            '()': 'apps.api.utils.logging_utils.SensitiveDataFilter',
+        },
+        'rate_limit': {
+            '()': 'apps.api.utils.log_pipeline.RateLimitFilter',
+            'rate': LOG_RATE_LIMIT_PER_SECOND,
+            'overrides': LOG_RATE_LIMITS,
+        },
     },
     'handlers': {
+        # 请求线程只入队，由后台线程写出到 stdout
         'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
-            'level': LOG_LEVEL,
+            '()': 'apps.api.utils.log_pipeline.QueueLogHandler',
+            'maxsize': LOG_QUEUE_SIZE,
             'stream': 'ext://sys.stdout',
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'verbose',
+            'level': LOG_LEVEL,
+            'filters': ['request_id', 'rate_limit', 'sensitive_data'],
         },
     },
     'loggers': {
@@ -273,6 +392,11 @@ LOGGING = {
             'level': LOG_LEVEL,
             'propagate': False,
         },
+        'apps.api.performance': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
     },
     'root': {
         'handlers': ['console'],
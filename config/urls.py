@@ -15,8 +15,10 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.urls import path, include
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from apps.admin import admin_site
 from apps.views import test_itinerary_save_logs
+from apps.api.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', include('apps.admin.urls')),
@@ -25,4 +27,8 @@ urlpatterns = [
     path('api/llm/', include('apps.api.urls')),
     #path('api/webhook/', include('apps.api.urls')),
     path('test_save_logs/', test_itinerary_save_logs, name='test_save_logs'),
+    path('metrics', metrics_view, name='metrics'),
 ]
+
+# runserver 之外（gunicorn/uvicorn）在 DEBUG 模式下也能直接访问静态文件
+urlpatterns += staticfiles_urlpatterns()
@@ -33,7 +33,7 @@ from apps.admin_ext.filters import (
 from apps.admin_ext.actions import (
     mark_as_confirmed, mark_as_expired, mark_as_pending_review,
     mark_as_template, unmark_as_template, set_reviewer,
-    clear_reviewer, copy_as_template
+    clear_reviewer, copy_as_template, optimize_itinerary_routes
 )
 
 
@@ -1242,6 +1242,20 @@ class ItineraryAdminTest(TestCase):
         self.assertIsNotNone(DayScheduleInline)
         print("✓ DaySchedule内联类已成功定义")
     
+    def test_optimize_routes_reports_failure_only(self):
+        print("\n测试: 路线优化全部失败时不提示成功")
+        from unittest.mock import patch
+        
+        request = MockRequest(self.superuser)
+        queryset = Itinerary.objects.filter(pk=self.itinerary.pk)
+        with patch('apps.admin_ext.actions.RouteOptimizerService.optimize', return_value=(False, None, '缺少坐标')), \
+                patch('apps.admin_ext.actions.messages') as mock_messages:
+            optimize_itinerary_routes(self.admin, request, queryset)
+        
+        mock_messages.error.assert_called_once()
+        mock_messages.success.assert_not_called()
+        print("✓ 只提示失败信息")
+    
     def test_preview_itinerary(self):
         print("\n测试14: 行程详情预览功能")
         
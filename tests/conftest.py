@@ -22,6 +22,31 @@ def django_db_setup(django_db_blocker):
     pass
 
 
+@pytest.fixture(scope='session', autouse=True)
+def enforce_query_budgets():
+    """测试中超出查询预算直接失败"""
+    from django.test import override_settings
+    with override_settings(QUERY_BUDGET_MODE='raise'):
+        yield
+
+
+@pytest.fixture(scope='session', autouse=True)
+def local_cache():
+    """测试使用进程内缓存代替共享的文件缓存/Redis，不读到上次运行留下的条目"""
+    from django.test import override_settings
+    with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """每个用例前清空缓存，回滚的测试数据不会通过缓存影响后续用例"""
+    from django.core.cache import cache
+    from apps.api.utils.tiered_cache import clear_local_caches
+    cache.clear()
+    clear_local_caches()
+
+
 @pytest.fixture
 def db(django_db_blocker):
     """启用数据库访问"""
@@ -3,13 +3,20 @@ Webhook 模块测试
 测试 Serializer、Service 和 View 层的功能
 包含: webhook 响应处理、数据导入、API 连接测试
 """
+import io
 import json
+import logging
+import os
+import signal
+import sys
+import unittest
 import requests
 from datetime import date, time
 from unittest.mock import patch, MagicMock
 from django.test import TestCase, override_settings
 from django.test.client import RequestFactory
 from django.db import transaction
+from django.http import HttpResponse
 
 from apps.api.serializers.webhook_serializers import (
     ItineraryWebhookSerializer,
@@ -26,7 +33,27 @@ from apps.api.services.webhook_services import (
     RequirementService,
     ItineraryOptimizationService,
 )
+from apps.api.services.idempotency_services import IdempotencyService
 from apps.api.utils.logging_utils import LogSanitizer, SensitiveDataFilter
+from apps.api.utils.log_pipeline import (
+    JsonLinesFormatter,
+    QueueLogHandler,
+    RateLimitFilter,
+    RequestIdFilter,
+    bind_request_id,
+    get_pipeline_stats,
+    get_request_id,
+    reset_request_id,
+)
+from apps.api.utils.request_metrics import (
+    RequestMetrics,
+    current_metrics,
+    start_request_metrics,
+    stop_request_metrics,
+    track_external,
+)
+from apps.api.middleware import PerformanceMiddleware
+from apps.models.requirement import Requirement
 
 
 # =============================================================================
@@ -334,6 +361,81 @@ class ItineraryWebhookSerializerTests(TestCase):
         self.assertIn('requirement_id', serializer.errors)
 
 
+class FastValidationTests(TestCase):
+    """行程快速校验路径测试"""
+    
+    def setUp(self):
+        from apps.management.commands.benchmark_webhook_validation import build_sample_itinerary
+        self.payload = build_sample_itinerary(days=3, activities_per_day=4)
+    
+    def _both(self, payload):
+        from apps.management.commands.benchmark_webhook_validation import FieldByFieldItinerarySerializer
+        fast = ItineraryWebhookSerializer(data=payload)
+        slow = FieldByFieldItinerarySerializer(data=payload)
+        return (fast.is_valid(), slow.is_valid()), fast, slow
+    
+    def test_fast_path_matches_field_by_field_validation(self):
+        """测试快速路径与逐字段校验结果一致"""
+        from apps.api.serializers.fast_validation import validate_itinerary
+        
+        self.payload['requirement_id'] = '  REQ_20260401_001  '
+        self.payload['daily_schedules'][0]['activities'][0]['activity_description'] = None
+        del self.payload['traveler_stats']
+        
+        self.assertIsNotNone(validate_itinerary(self.payload))
+        (fast_ok, slow_ok), fast, slow = self._both(self.payload)
+        self.assertTrue(fast_ok and slow_ok)
+        self.assertEqual(fast.validated_data, slow.validated_data)
+        self.assertEqual(fast.validated_data['requirement_id'], 'REQ_20260401_001')
+        self.assertEqual(fast.validated_data['traveler_stats'], {})
+    
+    def test_invalid_or_unusual_payloads_fall_back_with_identical_results(self):
+        """测试不合法或非常规数据交给逐字段校验，结果和错误信息一致"""
+        cases = [
+            ('activities', 0, 'activity_type', 'DANCE'),
+            ('activities', 1, 'end_time', '07:00'),
+            ('activities', 2, 'start_time', '9:00'),
+            ('destinations', 0, 'destination_order', '1'),
+            ('destinations', 1, 'arrival_date', '2026-4-2'),
+            ('destinations', 2, 'city_name', ''),
+        ]
+        for collection, index, field, value in cases:
+            payload = json.loads(json.dumps(self.payload))
+            if collection == 'activities':
+                payload['daily_schedules'][0]['activities'][index][field] = value
+            else:
+                payload['destinations'][index][field] = value
+            with self.subTest(field=field, value=value):
+                (fast_ok, slow_ok), fast, slow = self._both(payload)
+                self.assertEqual(fast_ok, slow_ok)
+                if fast_ok:
+                    self.assertEqual(fast.validated_data, slow.validated_data)
+                else:
+                    self.assertEqual(fast.errors, slow.errors)
+    
+    def test_flexible_date_dispatch_matches_strptime(self):
+        """测试日期分派表与原有 strptime 格式顺序的解析结果一致"""
+        from datetime import datetime
+        from apps.api.serializers.fast_validation import parse_flexible_date, parse_flexible_datetime
+        
+        def strptime_date(value):
+            for fmt in ['%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y', '%m/%d/%Y', '%Y%m%d']:
+                try:
+                    return datetime.strptime(value, fmt).date()
+                except ValueError:
+                    pass
+            return None
+        
+        for value in ['2026-04-01', '2026-4-1', '2026/04/01', '03/04/2026', '12/13/2026',
+                      '20260401', '2026-02-30', '13/13/2026', 'next friday']:
+            with self.subTest(value=value):
+                self.assertEqual(parse_flexible_date(value), strptime_date(value))
+        
+        self.assertEqual(parse_flexible_datetime('2026-04-01T10:00:00.5'), datetime(2026, 4, 1, 10, 0, 0, 500000))
+        self.assertEqual(parse_flexible_datetime('2026/04/01 10:00:00'), datetime(2026, 4, 1, 10, 0, 0))
+        self.assertIsNone(parse_flexible_datetime('2026/04/01T10:00:00'))
+
+
 class RequirementWebhookSerializerTests(TestCase):
     """RequirementWebhookSerializer 测试"""
     
@@ -672,6 +774,811 @@ class SensitiveDataFilterTests(TestCase):
         
         filter_instance.filter(record)
         self.assertEqual(record.msg, 'password=***REDACTED***')
+    
+    def test_filter_patterns(self):
+        """测试 JSON 键值、大小写和较长字段优先匹配"""
+        filter_instance = SensitiveDataFilter()
+        sanitize = filter_instance._sanitize_message
+        
+        self.assertEqual(sanitize('{"name": "张三", "city": "北京"}'), '{"name": "***REDACTED***", "city": "北京"}')
+        self.assertEqual(sanitize('Contact_Phone: 13812345678'), 'Contact_Phone=***REDACTED***')
+        self.assertEqual(sanitize('itinerary_id=ITI_20260401_001'), 'itinerary_id=ITI_20260401_001')
+        self.assertEqual(sanitize('没有分隔符的消息 password'), '没有分隔符的消息 password')
+    
+    def test_custom_fields_and_key_cache(self):
+        """测试自定义字段和字段名分类缓存"""
+        from apps.api.utils.logging_utils import is_sensitive_key
+        
+        self.assertEqual(SensitiveDataFilter({'order_no'})._sanitize_message('order_no=A1 password=x'),
+                         'order_no=***REDACTED*** password=x')
+        
+        is_sensitive_key.cache_clear()
+        self.assertTrue(is_sensitive_key('Contact_Phone'))
+        self.assertTrue(is_sensitive_key('Contact_Phone'))
+        self.assertFalse(is_sensitive_key('itinerary_id'))
+        self.assertEqual(is_sensitive_key.cache_info().hits, 1)
+
+
+class LogPipelineTests(TestCase):
+    """非阻塞日志管道测试"""
+    
+    def _record(self, msg='行程数据解析并保存成功', level=logging.INFO, name='apps.api'):
+        return logging.LogRecord(name, level, '', 0, msg, (), None)
+    
+    def test_queue_full_drops_and_reports(self):
+        """测试队列写满时丢弃计数，恢复后补一条丢弃汇总"""
+        stream = io.StringIO()
+        handler = QueueLogHandler(maxsize=1, stream=stream)
+        handler._listener.stop()
+        try:
+            for _ in range(3):
+                handler.handle(self._record())
+            self.assertEqual(handler.dropped, 2)
+            self.assertEqual(get_pipeline_stats()['dropped'], 2)
+            
+            handler.queue.get_nowait()
+            handler.handle(self._record('恢复后的日志'))
+            handler._start_listener()
+            handler.flush()
+            self.assertIn('丢弃了 2 条日志', stream.getvalue())
+        finally:
+            handler.close()
+    
+    def test_handler_writes_in_background_with_request_id(self):
+        """测试日志由后台线程写出并带上关联ID，参数和异常在入队前格式化"""
+        stream = io.StringIO()
+        handler = QueueLogHandler(stream=stream)
+        handler.addFilter(RequestIdFilter())
+        handler.setFormatter(JsonLinesFormatter())
+        token = bind_request_id('n8n-exec-42')
+        try:
+            handler.handle(logging.LogRecord('apps.api', logging.INFO, '', 0, '处理行程 %s', ('ITI_1',), None))
+            try:
+                raise ValueError('坏数据')
+            except ValueError:
+                handler.handle(logging.LogRecord('apps.api', logging.ERROR, '', 0, '失败', (), sys.exc_info()))
+        finally:
+            reset_request_id(token)
+        handler.flush()
+        handler.close()
+        
+        first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(first['message'], '处理行程 ITI_1')
+        self.assertEqual(first['request_id'], 'n8n-exec-42')
+        self.assertEqual(first['level'], 'INFO')
+        self.assertIn('ValueError: 坏数据', second['exc'])
+    
+    @unittest.skipUnless(hasattr(os, 'register_at_fork'), '需要 os.fork')
+    def test_forked_child_uses_fresh_queue(self):
+        """测试 fork 后子进程重建队列和写出线程，父进程持有队列锁时子进程也不会死锁"""
+        stream = io.StringIO()
+        handler = QueueLogHandler(stream=stream)
+        inherited_queue = handler.queue
+        try:
+            inherited_queue.mutex.acquire()
+            pid = os.fork()
+            if pid == 0:
+                signal.alarm(5)
+                status = 1
+                try:
+                    handler.handle(self._record('子进程日志'))
+                    handler.flush()
+                    if handler.queue is not inherited_queue and '子进程日志' in stream.getvalue():
+                        status = 0
+                finally:
+                    os._exit(status)
+            inherited_queue.mutex.release()
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+            self.assertIs(handler.queue, inherited_queue)
+        finally:
+            if inherited_queue.mutex.locked():
+                inherited_queue.mutex.release()
+            handler.close()
+    
+    def test_rate_limit_filter(self):
+        """测试按 logger 限流，WARNING 不受限，按最长前缀取覆盖值"""
+        log_filter = RateLimitFilter(rate=2, overrides={'django': 0, 'django.db.backends': 1})
+        
+        self.assertEqual([log_filter.filter(self._record()) for _ in range(3)], [True, True, False])
+        self.assertTrue(log_filter.filter(self._record(level=logging.WARNING)))
+        self.assertEqual(log_filter.suppressed, {'apps.api': 1})
+        
+        self.assertTrue(all(log_filter.filter(self._record(name='django.request')) for _ in range(5)))
+        db_results = [log_filter.filter(self._record(name='django.db.backends.schema')) for _ in range(2)]
+        self.assertEqual(db_results, [True, False])
+    
+    def test_request_id_middleware(self):
+        """测试沿用或生成 X-Request-ID 并在响应头返回"""
+        response = self.client.get('/api/no-such-endpoint/', HTTP_X_REQUEST_ID='n8n-exec-42')
+        self.assertEqual(response['X-Request-ID'], 'n8n-exec-42')
+        
+        response = self.client.get('/api/no-such-endpoint/', HTTP_X_REQUEST_ID='bad id\r\n<script>')
+        self.assertEqual(response['X-Request-ID'], 'badidscript')
+        
+        response = self.client.get('/api/no-such-endpoint/')
+        self.assertEqual(len(response['X-Request-ID']), 32)
+        self.assertIsNone(get_request_id())
+
+
+
+# =============================================================================
+# Idempotency Tests
+# =============================================================================
+
+class WebhookIdempotencyTests(TestCase):
+    """webhook 幂等处理测试"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.payload = {
+            'structured_data': {
+                'base_info': {
+                    'origin': {'name': '上海', 'code': 'SHA'},
+                    'destination_cities': ['北京'],
+                    'trip_days': 3,
+                    'group_size': {'adults': 2, 'total': 2},
+                    'travel_date': {'start_date': '2026-04-01', 'end_date': '2026-04-03'}
+                }
+            }
+        }
+    
+    def _post(self, body, **headers):
+        from django.urls import reverse
+        return self.client.post(
+            reverse('requirement_webhook_callback'), data=body, content_type='application/json', headers=headers
+        )
+    
+    def test_canonical_hash_ignores_key_order_and_whitespace(self):
+        """测试规范化哈希与键顺序和空白无关"""
+        first = IdempotencyService.canonical_hash(b'{"a": 1, "b": [1, 2]}')
+        second = IdempotencyService.canonical_hash(b'{"b":[1,2],"a":1}')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, IdempotencyService.canonical_hash(b'{"a": 2, "b": [1, 2]}'))
+    
+    def test_replay_by_request_id(self):
+        """测试相同 X-Request-ID 重放原响应且不重复创建需求"""
+        from apps.models.requirement import Requirement
+        
+        first = self._post(json.dumps(self.payload), **{'X-Request-ID': 'n8n-exec-1'})
+        with self.assertNumQueries(0):
+            second = self._post(json.dumps(self.payload), **{'X-Request-ID': 'n8n-exec-1'})
+        
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['requirement_id'], first.json()['requirement_id'])
+        self.assertEqual(second['X-Idempotent-Replay'], 'true')
+        self.assertEqual(Requirement.objects.count(), 1)
+    
+    def test_replay_by_payload_hash(self):
+        """测试无请求ID时按请求体去重，不同请求ID视为新请求"""
+        from apps.models.requirement import Requirement
+        
+        first = self._post(json.dumps(self.payload))
+        second = self._post(json.dumps(self.payload, indent=2))
+        third = self._post(json.dumps(self.payload), **{'X-Request-ID': 'n8n-exec-2'})
+        
+        self.assertEqual(second.json()['requirement_id'], first.json()['requirement_id'])
+        self.assertNotEqual(third.json()['requirement_id'], first.json()['requirement_id'])
+        self.assertEqual(Requirement.objects.count(), 2)
+    
+    def test_failed_request_is_not_stored(self):
+        """测试失败响应不保存，重试时重新处理"""
+        first = self._post('{"output": ')
+        second = self._post('{"output": ')
+        
+        self.assertNotIn('X-Idempotent-Replay', second)
+        self.assertEqual(first.status_code, second.status_code)
+
+
+
+# =============================================================================
+# Async View Tests
+# =============================================================================
+
+async def _run_in_test_thread(func, *args, **kwargs):
+    """代替 run_in_db_thread，在测试线程中执行ORM操作，使用用例的事务，数据随用例回滚"""
+    from asgiref.sync import sync_to_async
+    from apps.api.utils.query_budget import track_budgets
+    from apps.api.utils.request_metrics import track_queries
+
+    def call():
+        with track_queries(), track_budgets():
+            return func(*args, **kwargs)
+    return await sync_to_async(call)()
+
+
+class AsyncWebhookViewTests(TestCase):
+    """
+    异步 webhook 视图测试
+
+    线程池中的ORM操作使用独立连接，看不到用例事务内的数据，写入也不会回滚；
+    TransactionTestCase 又会在结束时清空整个数据库。视图测试把 run_in_db_thread 换成在测试线程中执行
+    """
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        patcher = patch('apps.api.views.async_webhook_views.run_in_db_thread', _run_in_test_thread)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    async def test_run_in_db_thread_uses_bounded_pool(self):
+        """测试 ORM 调用在数据库线程池中执行（不访问数据库）"""
+        import threading
+        from apps.api.utils.async_utils import run_in_db_thread
+        
+        thread_name = await run_in_db_thread(lambda: threading.current_thread().name)
+        self.assertTrue(thread_name.startswith('async-db'))
+    
+    async def test_requirement_callback_creates_and_replays(self):
+        """测试异步需求回调创建需求，重复请求返回原结果"""
+        from django.urls import reverse
+        from apps.models.requirement import Requirement
+        
+        body = json.dumps({'structured_data': {'base_info': {'origin': {'name': '上海'}, 'trip_days': 3}}})
+        url = reverse('async_requirement_webhook_callback')
+        first = await self.async_client.post(url, data=body, content_type='application/json')
+        second = await self.async_client.post(url, data=body, content_type='application/json')
+        
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.json()['requirement_id'].startswith('REQ_'))
+        self.assertEqual(second.json()['requirement_id'], first.json()['requirement_id'])
+        self.assertEqual(second['X-Idempotent-Replay'], 'true')
+        self.assertEqual(await Requirement.objects.acount(), 1)
+    
+    async def test_callbacks_validate_and_report_missing_itinerary(self):
+        """测试异步回调的校验错误和行程不存在"""
+        from django.urls import reverse
+        
+        invalid = await self.async_client.post(
+            reverse('async_itinerary_quote_callback'), data='{}', content_type='application/json'
+        )
+        missing = await self.async_client.post(
+            reverse('async_itinerary_optimization_callback'),
+            data=json.dumps({'itinerary_id': 'ITI_NOT_EXIST', 'description': '优化说明'}),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(missing.status_code, 404)
+
+
+
+# =============================================================================
+# Itinerary Ingest (Enqueue Mode) Tests
+# =============================================================================
+
+class ItineraryIngestTests(TestCase):
+    """行程 webhook 入队模式测试"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        from apps.models.requirement import Requirement
+        cache.clear()
+        self.requirement = Requirement.objects.create(
+            origin_name='上海', destination_cities='北京', trip_days=3, group_adults=2, group_total=2,
+        )
+        self.payload = {
+            'output': {
+                'requirement_id': self.requirement.requirement_id,
+                'itinerary_name': '北京三日游',
+                'start_date': '2026-04-01',
+                'end_date': '2026-04-03',
+                'destinations': [{
+                    'destination_order': 1,
+                    'city_name': '北京',
+                    'country_code': 'CN',
+                    'arrival_date': '2026-04-01',
+                    'departure_date': '2026-04-03'
+                }],
+                'traveler_stats': {'adults': 2},
+                'daily_schedules': []
+            }
+        }
+    
+    def _enqueue(self, payload):
+        from django.urls import reverse
+        with patch('django_q.tasks.async_task') as mock_async_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('itinerary_webhook') + '?mode=enqueue',
+                    data=json.dumps(payload), content_type='application/json'
+                )
+        return response, mock_async_task
+    
+    def test_enqueue_returns_202_and_submits_task(self):
+        """测试入队模式返回202并投递后台任务"""
+        from apps.models.itinerary import Itinerary
+        from apps.models.itinerary_ingest_job import ItineraryIngestJob
+        from apps.api.services.ingest_services import ItineraryIngestService
+        
+        response, mock_async_task = self._enqueue(self.payload)
+        
+        self.assertEqual(response.status_code, 202)
+        job = ItineraryIngestJob.objects.get(job_id=response.json()['job_id'])
+        self.assertEqual(job.status, ItineraryIngestJob.Status.PENDING)
+        self.assertEqual(job.requirement_id, self.requirement.requirement_id)
+        self.assertIn(str(job.job_id), response.json()['status_url'])
+        mock_async_task.assert_called_once_with(
+            ItineraryIngestService.TASK_FUNC, str(job.job_id), group=ItineraryIngestService.TASK_GROUP
+        )
+        self.assertFalse(Itinerary.objects.exists())
+    
+    def test_enqueue_rejects_invalid_envelope(self):
+        """测试入队前的轻量校验"""
+        from apps.models.itinerary_ingest_job import ItineraryIngestJob
+        
+        response, mock_async_task = self._enqueue({'output': {'itinerary_name': '缺少需求ID'}})
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ItineraryIngestJob.objects.exists())
+        mock_async_task.assert_not_called()
+    
+    def test_materialize_creates_itinerary_and_reports_status(self):
+        """测试后台任务生成行程，重复执行不会重复创建"""
+        from django.urls import reverse
+        from apps.models.itinerary import Itinerary
+        from apps.models.itinerary_ingest_job import ItineraryIngestJob
+        from apps.api.tasks import materialize_itinerary_job
+        
+        response, _ = self._enqueue(self.payload)
+        job_id = response.json()['job_id']
+        
+        result = materialize_itinerary_job(job_id)
+        materialize_itinerary_job(job_id)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(Itinerary.objects.count(), 1)
+        status_response = self.client.get(reverse('itinerary_ingest_job_status', kwargs={'job_id': job_id}))
+        self.assertEqual(status_response.json()['status'], ItineraryIngestJob.Status.SUCCEEDED)
+        self.assertEqual(status_response.json()['itinerary_id'], result['itinerary_id'])
+        self.assertEqual(status_response.json()['attempts'], 1)
+    
+    def test_failures_retry_only_when_transient(self):
+        """测试数据错误直接失败，写库失败按退避重试"""
+        from apps.models.itinerary_ingest_job import ItineraryIngestJob
+        from apps.api.services.ingest_services import ItineraryIngestService
+        
+        self.payload['output']['start_date'] = '2026-13-01'
+        invalid_job = ItineraryIngestService.enqueue(self.payload['output'])
+        self.payload['output']['start_date'] = '2026-04-01'
+        transient_job = ItineraryIngestService.enqueue(self.payload['output'])
+        
+        with patch.object(ItineraryIngestService, '_submit') as mock_submit:
+            ItineraryIngestService.materialize(invalid_job.job_id)
+            with patch('apps.api.services.ingest_services.ItineraryService.create_itinerary',
+                       return_value=(False, None, '数据库写入失败')):
+                ItineraryIngestService.materialize(transient_job.job_id)
+        
+        invalid_job.refresh_from_db()
+        transient_job.refresh_from_db()
+        self.assertEqual(invalid_job.status, ItineraryIngestJob.Status.FAILED)
+        self.assertIn('数据验证失败', invalid_job.last_error)
+        self.assertEqual(transient_job.last_error, '数据库写入失败')
+        mock_submit.assert_called_once_with(transient_job.job_id, delay=ItineraryIngestService.retry_delay(1))
+
+    def test_processing_job_not_materialized_twice(self):
+        """测试重复投递时跳过仍在处理中的任务，超时后可重新执行"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.models.itinerary import Itinerary
+        from apps.models.itinerary_ingest_job import ItineraryIngestJob
+        from apps.api.services.ingest_services import ItineraryIngestService
+
+        job = ItineraryIngestService.enqueue(self.payload['output'])
+        ItineraryIngestJob.objects.filter(job_id=job.job_id).update(
+            status=ItineraryIngestJob.Status.PROCESSING, started_at=timezone.now(),
+        )
+        success, _, error_msg = ItineraryIngestService.materialize(job.job_id)
+        self.assertFalse(success)
+        self.assertIn('正在处理中', error_msg)
+        self.assertFalse(Itinerary.objects.exists())
+
+        stale = timezone.now() - timedelta(seconds=ItineraryIngestService.processing_timeout() + 1)
+        ItineraryIngestJob.objects.filter(job_id=job.job_id).update(started_at=stale)
+        success, _, _ = ItineraryIngestService.materialize(job.job_id)
+        self.assertTrue(success)
+        self.assertEqual(Itinerary.objects.count(), 1)
+
+    def test_retry_accepts_failed_and_stale_processing_jobs(self):
+        """测试手动重试只接受失败或处理超时的任务"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.models.itinerary_ingest_job import ItineraryIngestJob
+        from apps.api.services.ingest_services import ItineraryIngestService
+
+        now = timezone.now()
+        stale = now - timedelta(seconds=ItineraryIngestService.processing_timeout() + 1)
+        Status = ItineraryIngestJob.Status
+        cases = [(Status.FAILED, None, True), (Status.PROCESSING, stale, True),
+                 (Status.PROCESSING, now, False), (Status.SUCCEEDED, stale, False)]
+        for status, started_at, expected in cases:
+            job = ItineraryIngestJob.objects.create(
+                requirement_id='REQ_1', payload='{}', status=status, started_at=started_at,
+            )
+            with patch.object(ItineraryIngestService, '_submit'), self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(ItineraryIngestService.retry(job), expected)
+            job.refresh_from_db()
+            self.assertEqual(job.status == Status.PENDING, expected)
+
+    def test_status_of_unknown_job(self):
+        """测试查询不存在的任务"""
+        import uuid
+        from django.urls import reverse
+        
+        response = self.client.get(reverse('itinerary_ingest_job_status', kwargs={'job_id': uuid.uuid4()}))
+        self.assertEqual(response.status_code, 404)
+
+
+# =============================================================================
+# Batch Webhook Tests
+# =============================================================================
+
+class BatchWebhookTests(TestCase):
+    """批量 webhook 接口测试"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        from apps.models.requirement import Requirement
+        cache.clear()
+        self.requirement = Requirement.objects.create(
+            origin_name='上海', destination_cities='北京', trip_days=3, group_adults=2, group_total=2,
+        )
+    
+    def _itinerary(self, name):
+        return {
+            'output': {
+                'requirement_id': self.requirement.requirement_id,
+                'itinerary_name': name,
+                'start_date': '2026-04-01',
+                'end_date': '2026-04-03',
+                'destinations': [{
+                    'destination_order': 1,
+                    'city_name': '北京',
+                    'country_code': 'CN',
+                    'arrival_date': '2026-04-01',
+                    'departure_date': '2026-04-03'
+                }],
+                'traveler_stats': {'adults': 2, 'children': 1},
+                'daily_schedules': [{
+                    'day': 1,
+                    'date': '2026-04-01',
+                    'city': '北京',
+                    'activities': [{
+                        'activity_type': 'FREE',
+                        'activity_title': '自由活动',
+                        'start_time': '09:00',
+                        'end_time': '12:00'
+                    }]
+                }]
+            }
+        }
+    
+    def _requirement(self, adults):
+        return {
+            'structured_data': {
+                'base_info': {
+                    'origin': {'name': '上海', 'code': 'SHA'},
+                    'destination_cities': ['北京'],
+                    'trip_days': 3,
+                    'group_size': {'adults': adults, 'children': 1, 'total': 99},
+                    'travel_date': {'start_date': '2026-04-01', 'end_date': '2026-04-03'}
+                }
+            }
+        }
+    
+    def _post(self, name, body):
+        from django.urls import reverse
+        return self.client.post(reverse(name), data=json.dumps(body), content_type='application/json')
+    
+    def test_itinerary_batch_creates_all_items(self):
+        """测试批量创建行程，关联数据和JSON快照与单条接口一致"""
+        from apps.models.itinerary import Itinerary
+        from apps.models.requirement_itinerary import RequirementItinerary
+        
+        response = self._post('itinerary_batch_webhook', [self._itinerary('行程A'), self._itinerary('行程B')])
+        
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertTrue(body['success'])
+        self.assertEqual((body['total'], body['created'], body['failed']), (2, 2, 0))
+        ids = [result['itinerary_id'] for result in body['results']]
+        self.assertEqual(len(set(ids)), 2)
+        
+        itinerary = Itinerary.objects.get(itinerary_id=ids[1])
+        self.assertEqual(itinerary.itinerary_name, '行程B')
+        self.assertEqual(itinerary.total_days, 3)
+        self.assertEqual(itinerary.destinations.get().nights, 2)
+        self.assertEqual(itinerary.traveler_stats.get().child_count, 1)
+        self.assertEqual(itinerary.dailyschedule_set.get().destination_id.city_name, '北京')
+        self.assertEqual(itinerary.itinerary_json_data['itinerary_id'], ids[1])
+        self.assertIsNotNone(itinerary.itinerary_quote_json_data)
+        self.assertEqual(RequirementItinerary.objects.filter(requirement=self.requirement).count(), 2)
+    
+    def test_itinerary_batch_reports_per_item_errors(self):
+        """测试校验失败和需求不存在的条目单独报错，其余条目正常创建"""
+        from apps.models.itinerary import Itinerary
+        
+        missing = self._itinerary('需求不存在')
+        missing['output']['requirement_id'] = 'REQ_00000000_999'
+        invalid = self._itinerary('日期错误')
+        invalid['output']['start_date'] = '2026-13-01'
+        
+        response = self._post('itinerary_batch_webhook', [invalid, self._itinerary('行程A'), missing])
+        
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertFalse(body['success'])
+        self.assertEqual((body['created'], body['failed']), (1, 2))
+        self.assertIn('start_date', body['results'][0]['validation_errors'])
+        self.assertTrue(body['results'][1]['success'])
+        self.assertIn('REQ_00000000_999', body['results'][2]['error'])
+        self.assertEqual(Itinerary.objects.count(), 1)
+    
+    def test_itinerary_batch_rolls_back_on_write_failure(self):
+        """测试写库失败时整批回滚"""
+        from apps.models.itinerary import Itinerary
+        from apps.models.traveler_stats import TravelerStats
+        
+        with patch.object(TravelerStats.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+            response = self._post('itinerary_batch_webhook', [self._itinerary('行程A'), self._itinerary('行程B')])
+        
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()['created'], 0)
+        self.assertFalse(Itinerary.objects.exists())
+    
+    def test_batch_rejects_non_list_and_oversize_body(self):
+        """测试请求体必须为数组且不超过条数上限"""
+        self.assertEqual(self._post('itinerary_batch_webhook', self._itinerary('行程A')).status_code, 400)
+        with override_settings(WEBHOOK_BATCH_MAX_ITEMS=1):
+            response = self._post('requirement_batch_webhook_callback', [self._requirement(1), self._requirement(2)])
+        self.assertEqual(response.status_code, 400)
+    
+    def test_requirement_batch_creates_all_items(self):
+        """测试批量创建需求，ID连续分配且总人数按明细重新计算"""
+        from apps.models.requirement import Requirement
+        
+        response = self._post('requirement_batch_webhook_callback', [
+            self._requirement(1), {'output': self._requirement(2)}, self._requirement(3)
+        ])
+        
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['created'], 3)
+        ids = [result['requirement_id'] for result in body['results']]
+        sequences = [int(requirement_id.split('_')[-1]) for requirement_id in ids]
+        self.assertEqual(sequences, list(range(sequences[0], sequences[0] + 3)))
+        self.assertEqual(Requirement.objects.get(requirement_id=ids[2]).group_total, 4)
+        self.assertEqual(Requirement.objects.get(requirement_id=ids[0]).travel_start_date, date(2026, 4, 1))
+    
+    def test_reserve_sequence_ids_continues_after_existing(self):
+        """测试预留ID从当日最大序号之后连续分配"""
+        from apps.models.requirement import Requirement
+        from apps.api.services.webhook_services import reserve_sequence_ids
+        
+        existing = int(self.requirement.requirement_id.split('_')[-1])
+        prefix = self.requirement.requirement_id.rsplit('_', 1)[0]
+        
+        self.assertEqual(
+            reserve_sequence_ids(Requirement, 'requirement_id', 'REQ', 2),
+            [f'{prefix}_{existing + 1:03d}', f'{prefix}_{existing + 2:03d}']
+        )
+
+
+# =============================================================================
+# Request Body Parsing Tests
+# =============================================================================
+
+class RequestBodyTests(TestCase):
+    """webhook 请求体解析测试"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+    
+    def test_body_over_limit_is_rejected_before_processing(self):
+        """测试超过大小上限的请求体返回413，且不进入幂等和业务处理"""
+        from django.urls import reverse
+        
+        body = json.dumps({'itinerary_id': 'ITI_20260401_001', 'itinerary_quote': 'x' * 2048})
+        with override_settings(WEBHOOK_MAX_BODY_SIZE=1024):
+            with patch('apps.api.services.idempotency_services.IdempotencyService.acquire') as mock_acquire:
+                response = self.client.post(
+                    reverse('requirement_webhook_callback'), data=body, content_type='application/json'
+                )
+            quote_response = self.client.post(
+                reverse('itinerary_quote_callback'), data=body, content_type='application/json'
+            )
+        
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(response.json()['success'])
+        mock_acquire.assert_not_called()
+        self.assertEqual(quote_response.status_code, 413)
+    
+    def test_invalid_json_returns_400(self):
+        """测试JSON格式错误返回400"""
+        from django.urls import reverse
+        
+        for name in ('itinerary_webhook', 'requirement_webhook_callback', 'itinerary_optimization_callback'):
+            with self.subTest(name=name):
+                response = self.client.post(reverse(name), data=b'{"output": ', content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+    
+    def test_log_excerpt_is_bounded(self):
+        """测试日志片段长度有上限，长字符串不会被完整编码"""
+        from apps.api.utils.request_utils import log_excerpt
+        
+        data = {'description': '很长的描述' * 100000, 'items': list(range(100000))}
+        excerpt = log_excerpt(data, 100)
+        
+        self.assertEqual(len(excerpt), 103)
+        self.assertTrue(excerpt.startswith('{"description": "很长的描述'))
+        self.assertEqual(log_excerpt({'a': [1, None, True]}), '{"a": [1, null, true]}')
+        self.assertEqual(log_excerpt({'date': date(2026, 4, 1)}), '{"date": "2026-04-01"}')
+
+
+
+# =============================================================================
+# Performance Middleware Tests
+# =============================================================================
+
+class PerformanceMiddlewareTests(TestCase):
+    """请求性能指标测试"""
+    
+    def setUp(self):
+        self.factory = RequestFactory()
+    
+    def _view(self, query_count=1):
+        def view(request):
+            for _ in range(query_count):
+                Requirement.objects.count()
+            with track_external('n8n'):
+                pass
+            return HttpResponse('abc')
+        return view
+    
+    def test_metrics_header_and_log(self):
+        """测试 Server-Timing 响应头和结构化日志"""
+        middleware = PerformanceMiddleware(self._view(query_count=2))
+        with self.assertLogs('apps.api.performance', level='INFO') as logs:
+            response = middleware(self.factory.get('/api/webhook/itinerary/'))
+        
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        self.assertIn('n8n;dur=', response['Server-Timing'])
+        record = logs.records[0]
+        self.assertEqual(record.levelno, logging.INFO)
+        self.assertEqual(record.data['db_queries'], 2)
+        self.assertEqual(record.data['response_bytes'], 3)
+        self.assertNotIn('slow_queries', record.data)
+        self.assertIsNone(current_metrics())
+    
+    @override_settings(PERF_SLOW_QUERY_COUNT=3, PERF_TOP_QUERIES=2)
+    def test_slow_request_logs_top_queries(self):
+        """测试查询数超过阈值时以 WARNING 输出最慢的SQL"""
+        middleware = PerformanceMiddleware(self._view(query_count=4))
+        with self.assertLogs('apps.api.performance', level='INFO') as logs:
+            middleware(self.factory.get('/api/webhook/itinerary/'))
+        
+        record = logs.records[0]
+        self.assertEqual(record.levelno, logging.WARNING)
+        self.assertEqual(len(record.data['slow_queries']), 2)
+        self.assertIn('SELECT COUNT(*)', record.data['slow_queries'][0]['sql'])
+    
+    def test_template_render_time(self):
+        """测试 TemplateResponse 渲染耗时计入指标"""
+        from django.template import engines
+        from django.template.response import TemplateResponse
+        
+        request = self.factory.get('/admin/')
+        middleware = PerformanceMiddleware(lambda request: HttpResponse())
+        metrics, token = start_request_metrics()
+        try:
+            response = middleware.process_template_response(
+                request, TemplateResponse(request, engines['django'].from_string('{{ name }}'), {'name': '行程'})
+            )
+            response.render()
+        finally:
+            stop_request_metrics(token)
+        self.assertGreater(metrics.template_time, 0)
+    
+    def test_top_queries_and_external_outside_request(self):
+        """测试只保留最慢的N条SQL，请求之外记录外部调用不报错"""
+        metrics = RequestMetrics(top_queries=2)
+        for index, duration in enumerate([0.01, 0.05, 0.02, 0.04]):
+            metrics.record_query(f'SELECT {index}', duration)
+        
+        self.assertEqual(metrics.db_count, 4)
+        self.assertEqual([query['sql'] for query in metrics.slowest_queries()], ['SELECT 1', 'SELECT 3'])
+        with track_external('n8n'):
+            pass
+
+
+
+# =============================================================================
+# Load Test Tool Tests
+# =============================================================================
+
+class _RoutedResponse:
+    """模拟 requests.Response 中压测工具和 send_to_n8n 用到的部分"""
+
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.text = content.decode()
+        self.headers = headers or {}
+        self.ok = status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class LoadTestToolTests(TestCase):
+    """
+    webhook压测工具测试
+
+    不启动 live server（LiveServerTestCase 结束时会清空整个数据库），
+    发往 Django 的请求经测试客户端处理，发往n8n替身的请求直接交给替身处理，全部在测试线程和用例事务中执行
+    """
+    
+    def test_summarize_samples(self):
+        """测试延迟分位数、错误率和服务端耗时汇总"""
+        from apps.management.commands.load_test_webhooks import summarize_samples
+        
+        samples = [{'ms': float(ms), 'status': 200, 'error': None, 'server_ms': ms / 2} for ms in range(1, 100)]
+        samples.append({'ms': 1000.0, 'status': None, 'error': 'ReadTimeout', 'server_ms': None})
+        result = summarize_samples(samples, elapsed=2.0)
+        
+        self.assertEqual(result['requests'], 100)
+        self.assertEqual(result['throughput_rps'], 50.0)
+        self.assertEqual((result['p50_ms'], result['p95_ms'], result['p99_ms']), (51.0, 96.0, 1000.0))
+        self.assertEqual(result['error_rate'], 0.01)
+        self.assertEqual(result['error_types'], {'ReadTimeout': 1})
+        self.assertEqual(result['server_p50_ms'], 25.0)
+    
+    def test_n8n_stub_and_webhook_flow(self):
+        """测试n8n替身回调需求接口，行程场景使用回调返回的需求ID"""
+        from types import SimpleNamespace
+        from apps.management.commands.load_test_webhooks import (
+            LoadRunner, N8nStub, PayloadFactory, load_fixture_catalog
+        )
+        from apps.models import Itinerary
+        
+        base_url = 'http://testserver'
+        payloads = PayloadFactory(load_fixture_catalog(), days=2, activities=3)
+        stub = N8nStub(payloads, base_url, port=0, latency_ms=0).start()
+        
+        def route(url, **kwargs):
+            body = kwargs.get('json') or {}
+            if url.startswith(stub.address):
+                status, data = stub.handle(url[len(stub.address):].strip('/'), body)
+                return _RoutedResponse(status, json.dumps(data).encode())
+            response = self.client.post(
+                url[len(base_url):], data=json.dumps(body), content_type='application/json', headers=kwargs.get('headers')
+            )
+            return _RoutedResponse(response.status_code, response.content, response.headers)
+        
+        requirements_before = Requirement.objects.count()
+        runner = LoadRunner(base_url, payloads, ['n8n', 'itinerary'], timeout=30)
+        try:
+            with override_settings(N8N_REQUIREMENT_WEBHOOK_URL=stub.url('requirement')), \
+                    patch('requests.post', route), \
+                    patch.object(runner, '_session', return_value=SimpleNamespace(post=route)):
+                # LoadRunner.run 在线程池中执行，这里在测试线程中逐次执行场景
+                runner.run_once()
+                runner.run_once()
+        finally:
+            stub.stop()
+        report = runner.report(elapsed=1.0)
+        
+        for name in ('n8n', 'requirement', 'itinerary'):
+            self.assertEqual(report['endpoints'][name]['requests'], 1, name)
+        self.assertEqual(report['overall']['errors'], 0, report)
+        self.assertEqual(stub.stats['callback_200'], 1)
+        self.assertEqual(Requirement.objects.count() - requirements_before, 2)
+        self.assertTrue(Itinerary.objects.filter(itinerary_name__contains=payloads.run_id).exists())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,157 @@
+import pytest
+import os
+import sys
+
+# 设置Django环境
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+django.setup()
+
+import io
+import json
+import uuid
+from datetime import date, time
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.api.serializers.webhook_serializers import ItineraryWebhookSerializer
+from apps.api.services.candidate_services import CandidateSelectionService
+from apps.api.services.webhook_services import ItineraryService
+from apps.api.utils.tiered_cache import TieredCache
+from apps.api.views.export_views import ItineraryWordExportView, export_cache
+from apps.management.commands.benchmark_webhook_validation import build_sample_itinerary
+from apps.models import Attraction, DailySchedule, Hotel, Itinerary, Restaurant
+from apps.models.requirement import Requirement
+from apps.utils.entity_cache import entity_cache
+
+
+@pytest.mark.django_db
+class TestEntityCache:
+    """实体缓存测试"""
+
+    @pytest.fixture(autouse=True)
+    def catalog(self):
+        call_command('generate_test_data', count=3, seed=3, stdout=io.StringIO())
+        self.attractions = list(Attraction.objects.order_by('pk'))
+        self.hotel = Hotel.objects.first()
+        self.restaurant = Restaurant.objects.first()
+
+    def test_batch_load_and_memoize(self, django_assert_num_queries):
+        """测试未命中的主键合并为一条查询，不存在的主键和字符串形式的UUID也命中缓存"""
+        missing = uuid.uuid4()
+        pks = [attraction.pk for attraction in self.attractions]
+        with entity_cache() as cache:
+            with django_assert_num_queries(1):
+                found = cache.get_many(Attraction, pks + [missing])
+            with django_assert_num_queries(0):
+                assert set(found) == set(pks)
+                assert cache.get(Attraction, str(pks[0])) == self.attractions[0]
+                assert cache.get(Attraction, missing) is None
+                with entity_cache() as nested:
+                    assert nested is cache
+
+    def test_saved_entity_is_reloaded(self, django_assert_num_queries):
+        """测试作用域内保存的实体从缓存移除，之后重新读取"""
+        attraction = self.attractions[0]
+        with entity_cache() as cache:
+            cache.get(Attraction, attraction.pk)
+            Attraction.objects.filter(pk=attraction.pk).update(attraction_name='改名后的景点')
+            attraction.refresh_from_db()
+            attraction.save()
+            with django_assert_num_queries(1):
+                assert cache.get(Attraction, attraction.pk).attraction_name == '改名后的景点'
+
+    def test_create_itinerary_loads_each_entity_once(self):
+        """测试创建行程时重复引用的酒店和餐厅只查询一次，报价快照复用已加载的实体"""
+        requirement = Requirement.objects.create(
+            origin_name='上海', destination_cities='北京', trip_days=2, group_adults=2, group_total=2
+        )
+        payload = build_sample_itinerary(2, 2, cities=('北京',), country_code='CN')
+        payload['requirement_id'] = requirement.requirement_id
+        references = [('CHECK_IN', self.hotel.pk), ('MEAL', self.restaurant.pk),
+                      ('CHECK_OUT', self.hotel.pk), ('MEAL', self.restaurant.pk)]
+        activities = [activity for schedule in payload['daily_schedules'] for activity in schedule['activities']]
+        for activity, (activity_type, pk) in zip(activities, references):
+            activity.update(activity_type=activity_type, id_reference=str(pk))
+        serializer = ItineraryWebhookSerializer(data=payload)
+        assert serializer.is_valid(), serializer.errors
+
+        with CaptureQueriesContext(connection) as context:
+            success, itinerary, error = ItineraryService.create_itinerary(serializer.validated_data, requirement)
+
+        assert success, error
+        catalog_queries = [query['sql'] for query in context.captured_queries
+                           if query['sql'].startswith('SELECT') and ('"hotels"' in query['sql'] or '"restaurants"' in query['sql'])]
+        assert len(catalog_queries) == 2, catalog_queries
+        quote = json.loads(itinerary.itinerary_quote_json_data)
+        assert [hotel['hotel_id'] for hotel in quote['hotels']] == [str(self.hotel.pk)]
+        assert [restaurant['restaurant_id'] for restaurant in quote['restaurants']] == [str(self.restaurant.pk)]
+
+
+@pytest.mark.django_db
+class TestTieredCache:
+    """分层缓存测试"""
+
+    def test_l1_lru_and_l2_fallback(self):
+        """测试进程内缓存按 LRU 淘汰，淘汰的条目从共享缓存读回"""
+        cache = TieredCache('test_lru', l1_max_entries=2)
+        cache.set_many({'a': 1, 'b': 2})
+        cache.get('a')
+        cache.set('c', 3)
+        assert list(cache._l1) == ['a', 'c']
+        assert cache.get_many(['a', 'b', 'c', 'd']) == {'a': 1, 'b': 2, 'c': 3}
+        assert cache.get_or_set('d', lambda: 4) == 4
+        assert TieredCache('test_lru').get('d') == 4
+
+    def test_invalidate_reaches_other_processes(self, settings):
+        """测试递增命名空间版本后，其他进程（另一个实例）的进程内缓存同时失效"""
+        settings.TIERED_CACHE_VERSION_CHECK_INTERVAL = 0
+        writer, reader = TieredCache('test_broadcast'), TieredCache('test_broadcast')
+        writer.set('country', '中国')
+        assert reader.get('country') == '中国'
+        writer.invalidate()
+        assert reader.get('country') is None
+        assert reader._l1 == {}
+        assert reader.version() == writer.version()
+
+    def test_catalog_cached_per_city_and_invalidated_on_save(self, django_assert_num_queries):
+        """测试候选目录按城市缓存，新增景点后立即可见"""
+        requirement = Requirement.objects.create(
+            origin_name='上海', destination_cities='北京,杭州', trip_days=3, group_adults=2, group_total=2
+        )
+        Attraction.objects.create(attraction_name='故宫博物院', city_name='北京', country_code='CN', status='ACTIVE')
+        CandidateSelectionService.select(requirement)
+        with django_assert_num_queries(0):
+            first = CandidateSelectionService.select(requirement)
+        assert [a['name'] for a in first['attractions']] == ['故宫博物院']
+
+        Attraction.objects.create(attraction_name='西湖', city_name='杭州', country_code='CN', status='ACTIVE')
+        names = {a['name'] for a in CandidateSelectionService.select(requirement)['attractions']}
+        assert names == {'故宫博物院', '西湖'}
+
+    def test_word_export_cached_until_itinerary_changes(self, rf, django_assert_num_queries):
+        """测试Word导出结果被缓存，修改活动后重新生成"""
+        itinerary = Itinerary.objects.create(
+            itinerary_name='缓存导出行程', start_date=date(2026, 5, 1), end_date=date(2026, 5, 1),
+            contact_person='张三', contact_phone='13800138000', departure_city='北京', return_city='北京'
+        )
+        schedule = DailySchedule.objects.create(
+            itinerary_id=itinerary, day_number=1, schedule_date=date(2026, 5, 1),
+            start_time=time(9, 0), end_time=time(12, 0), activity_type='SHOPPING', activity_title='参观故宫'
+        )
+        view = ItineraryWordExportView.as_view()
+        request = rf.get('/')
+        first = view(request, itinerary_id=itinerary.itinerary_id)
+        with django_assert_num_queries(1):
+            second = view(request, itinerary_id=itinerary.itinerary_id)
+        assert first.content == second.content
+        assert second['Content-Disposition'] == first['Content-Disposition']
+
+        schedule.activity_title = '游览颐和园'
+        schedule.save()
+        assert export_cache.get(f'docx:{itinerary.itinerary_id}') is None
+        view(request, itinerary_id=itinerary.itinerary_id)
+        assert export_cache.get(f'docx:{itinerary.itinerary_id}') is not None
@@ -0,0 +1,33 @@
+import pytest
+import os
+import sys
+
+# 设置Django环境
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+django.setup()
+
+import io
+from django.core.management import call_command
+
+from apps.models import Attraction, Hotel, Restaurant
+
+
+@pytest.mark.django_db
+class TestGenerateTestData:
+    """基准测试数据生成测试"""
+
+    def test_generate_test_data_is_reproducible(self):
+        """测试相同种子生成相同数据，并可按起始序号追加"""
+        call_command('generate_test_data', count=5, seed=7, stdout=io.StringIO())
+        first = sorted(Attraction.objects.values_list('attraction_code', flat=True))
+        Attraction.objects.all().delete()
+        call_command('generate_test_data', count=5, seed=7, stdout=io.StringIO())
+
+        assert sorted(Attraction.objects.values_list('attraction_code', flat=True)) == first
+        assert Hotel.objects.count() == 5
+        call_command('generate_test_data', count=3, start=5, seed=8, stdout=io.StringIO())
+        assert Attraction.objects.count() == 8
+        assert Restaurant.objects.count() == 8
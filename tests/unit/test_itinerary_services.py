@@ -0,0 +1,589 @@
+import pytest
+import os
+import sys
+
+# 设置Django环境
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+django.setup()
+
+import json
+import uuid
+import numpy as np
+from datetime import date, time
+from decimal import Decimal
+
+from apps.models.attraction import Attraction
+from apps.models.hotel import Hotel
+from apps.models.restaurant import Restaurant
+from apps.models.itinerary import Itinerary
+from apps.models.destinations import Destination
+from apps.models.daily_schedule import DailySchedule
+from apps.models.traveler_stats import TravelerStats
+from apps.models.currency_rate import CurrencyRate
+from django.utils import timezone
+from apps.api.services.distance_services import (
+    DistanceMatrixService,
+    haversine_km,
+    distance_matrix_km,
+)
+from apps.api.services.route_services import RouteOptimizerService, parse_opening_hours
+from apps.api.services.quote_services import QuoteEngineService
+from apps.api.services.currency_services import CurrencyService
+from apps.api.services.candidate_services import CandidateSelectionService
+from apps.models.requirement import Requirement
+from apps.api.services.prompt_context_services import PromptContextService, estimate_tokens
+from apps.api.services.schema_services import SchemaDescriptionService
+from apps.api.services.query_gateway_services import QueryGatewayService
+
+
+def _create_itinerary():
+    """创建用于测试的行程及目的地"""
+    itinerary = Itinerary.objects.create(
+        itinerary_name='本地计算测试行程',
+        travel_purpose='LEISURE',
+        start_date=date(2026, 4, 1),
+        end_date=date(2026, 4, 2),
+        contact_person='测试联系人',
+        contact_phone='13800138000',
+        departure_city='上海',
+        return_city='上海',
+        current_status='DRAFT',
+        created_by='tester',
+    )
+    destination = Destination.objects.create(
+        itinerary=itinerary,
+        destination_order=1,
+        city_name='东京',
+        country_code='JP',
+        latitude=Decimal('35.681236'),
+        longitude=Decimal('139.767125'),
+        arrival_date=date(2026, 4, 1),
+        departure_date=date(2026, 4, 2),
+    )
+    return itinerary, destination
+
+
+def _create_attraction(name, latitude, longitude, duration=None):
+    return Attraction.objects.create(
+        attraction_code=f'test_{uuid.uuid4().hex[:8]}',
+        attraction_name=name,
+        country_code='JP',
+        city_name='东京',
+        latitude=Decimal(latitude),
+        longitude=Decimal(longitude),
+        recommended_duration=duration,
+        ticket_price=Decimal('100.00'),
+        status='ACTIVE',
+    )
+
+
+def _add_schedule(itinerary, destination, title, start, end, activity_type='ATTRACTION', day=1, **resources):
+    return DailySchedule.objects.create(
+        itinerary_id=itinerary,
+        day_number=day,
+        schedule_date=date(2026, 4, day),
+        destination_id=destination,
+        activity_type=activity_type,
+        activity_title=title,
+        start_time=start,
+        end_time=end,
+        **resources,
+    )
+
+
+class TestHaversine:
+    """测试向量化距离计算"""
+
+    def test_known_distance(self):
+        """东京站到浅草寺约 4.5 公里"""
+        distance = float(haversine_km(35.681236, 139.767125, 35.714765, 139.796655))
+        assert 4.0 < distance < 5.0
+
+    def test_matrix_is_symmetric_with_zero_diagonal(self):
+        coordinates = np.array([[35.68, 139.76], [35.71, 139.79], [35.65, 139.70]])
+        matrix = distance_matrix_km(coordinates)
+        assert matrix.shape == (3, 3)
+        assert np.allclose(matrix, matrix.T)
+        assert np.allclose(np.diag(matrix), 0)
+
+    def test_missing_coordinates_propagate_nan(self):
+        coordinates = np.array([[35.68, 139.76], [np.nan, np.nan]])
+        matrix = distance_matrix_km(coordinates)
+        assert np.isnan(matrix[0, 1])
+        assert matrix[0, 0] == 0
+
+
+@pytest.mark.django_db
+class TestDistanceMatrixService:
+    """测试行程可行性检查"""
+
+    def test_zero_distance_needs_no_transfer(self):
+        minutes = DistanceMatrixService.estimate_transfer_minutes(np.array([0.0, 5.0]))
+        assert minutes[0] == 0
+        assert minutes[1] > DistanceMatrixService.transfer_buffer_minutes()
+
+    def test_feasible_day(self):
+        itinerary, destination = _create_itinerary()
+        first = _create_attraction('东京塔', '35.658581', '139.745433')
+        second = _create_attraction('增上寺', '35.657420', '139.748280')
+        _add_schedule(itinerary, destination, '东京塔', time(9, 0), time(10, 30), attraction_id=first)
+        _add_schedule(itinerary, destination, '增上寺', time(11, 0), time(12, 0), attraction_id=second)
+
+        result = DistanceMatrixService.check_feasibility(itinerary)
+
+        assert result['feasible'] is True
+        assert result['days'][1]['activity_count'] == 2
+        assert result['days'][1]['total_distance_km'] < 1
+
+    def test_insufficient_transfer_and_short_stay(self):
+        itinerary, destination = _create_itinerary()
+        near = _create_attraction('东京塔', '35.658581', '139.745433', duration=120)
+        far = _create_attraction('镰仓大佛', '35.316700', '139.535800')
+        _add_schedule(itinerary, destination, '东京塔', time(9, 0), time(10, 0), attraction_id=near)
+        _add_schedule(itinerary, destination, '镰仓大佛', time(10, 15), time(12, 0), attraction_id=far)
+
+        result = DistanceMatrixService.check_feasibility(itinerary)
+        codes = {issue['code'] for issue in result['issues']}
+
+        assert result['feasible'] is False
+        assert 'too_short' in codes
+        assert 'insufficient_transfer' in codes
+
+    def test_overlap_detected(self):
+        itinerary, destination = _create_itinerary()
+        attraction = _create_attraction('东京塔', '35.658581', '139.745433')
+        _add_schedule(itinerary, destination, '东京塔', time(9, 0), time(11, 0), attraction_id=attraction)
+        _add_schedule(itinerary, destination, '自由活动', time(10, 0), time(12, 0), activity_type='FREE')
+
+        result = DistanceMatrixService.check_feasibility(itinerary)
+
+        assert [issue['code'] for issue in result['issues']] == ['overlap']
+
+    def test_matrix_falls_back_to_destination(self):
+        itinerary, destination = _create_itinerary()
+        hotel = Hotel.objects.create(
+            hotel_code=f'test_{uuid.uuid4().hex[:8]}',
+            hotel_name='测试酒店',
+            country_code='JP',
+            city_name='东京',
+            address='东京都千代田区',
+            latitude=Decimal('35.681236'),
+            longitude=Decimal('139.767125'),
+        )
+        restaurant = Restaurant.objects.create(
+            restaurant_code=f'test_{uuid.uuid4().hex[:8]}',
+            restaurant_name='无坐标餐厅',
+            country_code='JP',
+            city_name='东京',
+            address='东京都中央区',
+            cuisine_type='日料',
+            price_range='$$',
+        )
+        _add_schedule(itinerary, destination, '入住', time(14, 0), time(15, 0), activity_type='CHECK_IN', hotel_id=hotel)
+        _add_schedule(itinerary, destination, '晚餐', time(18, 0), time(19, 0), activity_type='MEAL', restaurant_id=restaurant)
+
+        result = DistanceMatrixService.build_distance_matrix(itinerary)
+
+        assert len(result['schedule_ids']) == 2
+        # 餐厅无坐标时回退到目的地坐标，与酒店坐标相同
+        assert result['distance_km'][0][1] == 0
+        assert result['transfer_minutes'][0][1] == 0
+
+
+class TestOpeningHours:
+    """测试开放时间解析"""
+
+    def test_weekday_ranges(self):
+        hours = {"周一至周五": "09:00-17:00", "周六至周日": "08:30-17:30"}
+        assert parse_opening_hours(hours, 0) == (540, 1020)
+        assert parse_opening_hours(hours, 6) == (510, 1050)
+
+    def test_plain_string_and_unknown(self):
+        assert parse_opening_hours('10:00-22:00', 3) == (600, 1320)
+        assert parse_opening_hours('全天开放', 3) is None
+        assert parse_opening_hours(None, 3) is None
+
+
+@pytest.mark.django_db
+class TestRouteOptimizerService:
+    """测试每日路线优化"""
+
+    def _zigzag_day(self):
+        """构造 东 -> 西 -> 中 的来回折返行程，午餐作为锚点（无餐厅时回退到目的地坐标，位于东侧）"""
+        itinerary, destination = _create_itinerary()
+        east = _create_attraction('东侧景点', '35.680000', '139.800000')
+        west = _create_attraction('西侧景点', '35.680000', '139.700000')
+        middle = _create_attraction('中间景点', '35.680000', '139.750000')
+        first = _add_schedule(itinerary, destination, '东侧景点', time(9, 0), time(10, 0), attraction_id=east)
+        second = _add_schedule(itinerary, destination, '西侧景点', time(10, 30), time(11, 30), attraction_id=west)
+        third = _add_schedule(itinerary, destination, '中间景点', time(12, 0), time(13, 0), attraction_id=middle)
+        lunch = _add_schedule(itinerary, destination, '午餐', time(17, 0), time(18, 0), activity_type='MEAL')
+        return itinerary, first, second, third, lunch
+
+    def test_plan_reduces_distance(self):
+        itinerary, first, second, third, lunch = self._zigzag_day()
+
+        plan = RouteOptimizerService.plan(itinerary)
+        day = plan['days'][1]
+
+        assert day['optimized_distance_km'] < day['original_distance_km']
+        changed = {schedule.schedule_id for schedule, _, _ in plan['changes']}
+        assert lunch.schedule_id not in changed
+        # 计划阶段不修改数据库
+        first.refresh_from_db()
+        assert first.start_time == time(9, 0)
+
+    def test_optimize_rewrites_times_in_order(self):
+        itinerary, first, second, third, lunch = self._zigzag_day()
+
+        success, summary, error_msg = RouteOptimizerService.optimize(itinerary)
+
+        assert success is True, error_msg
+        assert summary['updated_count'] > 0
+        for schedule in (first, second, third, lunch):
+            schedule.refresh_from_db()
+        # 新顺序：西 -> 中 -> 东，最后靠近午餐地点，从原最早开始时间起排
+        assert second.start_time == time(9, 0)
+        assert second.end_time < third.start_time
+        assert third.end_time < first.start_time
+        assert first.end_time <= lunch.start_time
+        assert lunch.start_time == time(17, 0)
+
+    def test_opening_hours_keep_original_order(self):
+        itinerary, first, second, third, lunch = self._zigzag_day()
+        # 中间景点上午早早关门，新顺序无法满足时保持原安排
+        middle = third.attraction_id
+        middle.opening_hours = {"每天": "08:00-10:30"}
+        middle.save()
+
+        plan = RouteOptimizerService.plan(itinerary)
+
+        assert plan['changes'] == []
+
+
+@pytest.mark.django_db
+class TestQuoteEngineService:
+    """测试本地报价计算"""
+
+    def test_calculate_quote(self):
+        itinerary, destination = _create_itinerary()
+        TravelerStats.objects.create(itinerary=itinerary, adult_count=2, child_count=1, infant_count=1)
+        hotel = Hotel.objects.create(
+            hotel_code=f'test_{uuid.uuid4().hex[:8]}',
+            hotel_name='测试酒店',
+            country_code='JP',
+            city_name='东京',
+            address='东京都千代田区',
+            min_price=Decimal('500.00'),
+            max_price=Decimal('800.00'),
+        )
+        restaurant = Restaurant.objects.create(
+            restaurant_code=f'test_{uuid.uuid4().hex[:8]}',
+            restaurant_name='测试餐厅',
+            country_code='JP',
+            city_name='东京',
+            address='东京都中央区',
+            cuisine_type='日料',
+            price_range='$$',
+        )
+        attraction = _create_attraction('东京塔', '35.658581', '139.745433')
+        _add_schedule(itinerary, destination, '入住', time(14, 0), time(15, 0), activity_type='CHECK_IN', hotel_id=hotel)
+        _add_schedule(itinerary, destination, '东京塔', time(15, 30), time(17, 0), attraction_id=attraction)
+        _add_schedule(itinerary, destination, '晚餐', time(18, 0), time(19, 0), activity_type='MEAL', restaurant_id=restaurant)
+        _add_schedule(itinerary, destination, '退房', time(9, 0), time(9, 30), activity_type='CHECK_OUT', day=2, hotel_id=hotel)
+        _add_schedule(itinerary, destination, '机场交通', time(10, 0), time(11, 0), activity_type='TRANSPORT', day=2,
+                      estimated_cost=Decimal('300.00'))
+        _add_schedule(itinerary, destination, '自由活动', time(12, 0), time(13, 0), activity_type='FREE', day=2)
+
+        quote = QuoteEngineService.calculate(itinerary)
+        by_category = quote['totals']['CNY']['by_category']
+
+        # 2成人 + 1儿童(0.5) + 1婴儿(0) = 2.5 计价人数，3人需2间房，住1晚
+        assert quote['weighted_heads'] == 2.5
+        assert quote['rooms'] == 2
+        assert by_category['hotel'] == {'low': 1000.0, 'high': 1600.0}
+        assert by_category['attraction'] == {'low': 250.0, 'high': 250.0}
+        assert by_category['meal'] == {'low': 300.0, 'high': 300.0}
+        assert by_category['other'] == {'low': 300.0, 'high': 300.0}
+        assert quote['totals']['CNY']['low'] == 1850.0
+        assert quote['converted_total']['low'] == 1850.0
+        assert len(quote['line_items']) == 4
+        assert quote['warnings'] == []
+
+
+@pytest.mark.django_db
+class TestCurrencyService:
+    """测试汇率加载与批量换算"""
+
+    def setup_method(self):
+        CurrencyService.invalidate()
+
+    def teardown_method(self):
+        CurrencyService.invalidate()
+
+    def test_load_from_file_and_convert_many(self, tmp_path):
+        rate_file = tmp_path / 'rates.json'
+        rate_file.write_text(json.dumps({
+            'base': 'USD',
+            'effective_date': '2026-01-01',
+            'rates': {'CNY': 0.125, 'JPY': 0.0075},
+        }), encoding='utf-8')
+
+        success, count, error_msg = CurrencyService.load_from_file(str(rate_file))
+
+        assert success is True, error_msg
+        assert count == 3
+        converted = CurrencyService.convert_many([100, 8, 1000, 5], ['CNY', 'USD', 'JPY', 'XXX'])
+        assert converted[:3] == pytest.approx([100, 64, 60])
+        assert np.isnan(converted[3])
+        assert CurrencyService.convert(64, 'CNY', 'USD') == Decimal('8.00')
+
+    def test_load_rejects_non_positive_rates(self, tmp_path):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        rate_file = tmp_path / 'rates.json'
+        rate_file.write_text(json.dumps({'base': 'CNY', 'rates': {'USD': 7.2, 'JPY': 0, 'KRW': 0.000000001}}), encoding='utf-8')
+
+        success, count, error_msg = CurrencyService.load_from_file(str(rate_file))
+
+        assert success is False
+        assert error_msg == '汇率必须大于0: JPY, KRW'
+        assert not CurrencyRate.objects.exists()
+        with pytest.raises(CommandError, match='汇率必须大于0'):
+            call_command('load_currency_rates', str(rate_file))
+
+    def test_zero_rate_in_table_treated_as_missing(self):
+        CurrencyRate.objects.create(currency='JPY', rate_to_base=Decimal('0'))
+
+        converted = CurrencyService.convert_many([100], ['JPY'])
+
+        assert np.isnan(converted[0])
+        assert CurrencyService.missing_currencies(['JPY']) == ['JPY']
+
+    def test_summarize_reports_missing_currencies(self, settings):
+        settings.CURRENCY_RATE_PROVIDER = 'stub'
+
+        summary = CurrencyService.summarize([100, 10, 5], ['CNY', 'USD', 'XXX'])
+
+        assert summary['total'] == 172.0
+        assert summary['missing_currencies'] == ['XXX']
+
+    def test_cache_reloads_when_table_changes(self, settings, tmp_path):
+        settings.CURRENCY_RATE_CACHE_TTL = 0
+        rate_file = tmp_path / 'rates.json'
+        rate_file.write_text(json.dumps({'base': 'CNY', 'rates': {'USD': 7}}), encoding='utf-8')
+        CurrencyService.load_from_file(str(rate_file))
+        assert CurrencyService.get_rates()['USD'] == 7
+
+        CurrencyRate.objects.filter(currency='USD').update(rate_to_base=Decimal('7.5'), updated_at=timezone.now())
+
+        assert CurrencyService.get_rates()['USD'] == 7.5
+
+
+@pytest.mark.django_db
+class TestCandidateSelectionService:
+    """测试按预算筛选候选资源"""
+
+    def _hotel(self, name, star, price):
+        return Hotel.objects.create(
+            hotel_code=f'test_{uuid.uuid4().hex[:8]}',
+            hotel_name=name,
+            country_code='JP',
+            city_name='东京',
+            address='东京都',
+            hotel_star=star,
+            min_price=Decimal(price),
+            max_price=Decimal(price),
+            status='ACTIVE',
+        )
+
+    def test_select_ranks_by_budget_and_level(self):
+        requirement = Requirement.objects.create(
+            origin_name='上海',
+            destination_cities="['东京']",
+            trip_days=4,
+            group_adults=2,
+            group_total=2,
+            budget_level=Requirement.BudgetLevel.ECONOMY,
+            hotel_level=Requirement.HotelLevel.COMFORT,
+            budget_currency='CNY',
+            budget_max=Decimal('8000'),
+            preference_tags=['拍照'],
+            must_visit_spots=['浅草寺'],
+        )
+        self._hotel('平价酒店', 3, '600')
+        self._hotel('奢华酒店', 5, '5000')
+        Hotel.objects.create(
+            hotel_code=f'test_{uuid.uuid4().hex[:8]}', hotel_name='外地酒店', country_code='JP',
+            city_name='大阪', address='大阪', hotel_star=3, min_price=Decimal('500'), status='ACTIVE',
+        )
+        popular = _create_attraction('东京塔', '35.658581', '139.745433')
+        popular.popularity_score = Decimal('4.90')
+        popular.save()
+        _create_attraction('浅草寺', '35.714765', '139.796655')
+
+        result = CandidateSelectionService.select(requirement, top_k=5)
+
+        # 8000 / 2人 / 4天 = 1000 人均每日
+        assert result['cities'] == ['东京']
+        assert result['budget']['daily_per_person'] == 1000.0
+        assert [h['name'] for h in result['hotels']] == ['平价酒店', '奢华酒店']
+        # 必游景点排在最前
+        assert result['attractions'][0]['name'] == '浅草寺'
+
+    def test_top_k_limits_results(self):
+        requirement = Requirement.objects.create(
+            origin_name='上海', destination_cities='东京', trip_days=2, group_adults=1, group_total=1,
+        )
+        for index in range(4):
+            self._hotel(f'酒店{index}', 3, '500')
+
+        result = CandidateSelectionService.select(requirement, top_k=2)
+
+        assert len(result['hotels']) == 2
+        assert result['budget']['daily_per_person'] is None
+
+
+@pytest.mark.django_db
+class TestPromptContextService:
+    """测试紧凑提示词上下文"""
+
+    def test_estimate_tokens(self):
+        assert estimate_tokens('') == 0
+        assert estimate_tokens('abcdefgh') == 2
+        assert estimate_tokens('东京塔') == 3
+        assert estimate_tokens('东京abcd') == 3
+
+    def test_build_compacts_rows_and_maps_ids(self):
+        attraction = _create_attraction('东京塔', '35.658581', '139.745433', duration=90)
+        attraction.category = 'CULTURAL'
+        attraction.tags = ['夜景', '拍照', '夜景 ', '地标']
+        attraction.highlights = ['俯瞰东京全景' * 10]
+        attraction.save()
+
+        context = PromptContextService.build(attractions=[attraction])
+
+        row = context['attractions']['rows'][0]
+        assert row[0] == 'A1'
+        assert context['id_map'] == {'A1': str(attraction.attraction_id)}
+        assert row[3] == 'CUL'
+        assert context['legend'] == {'CUL': '文化景点'}
+        assert len(row[9]) == PromptContextService.DEFAULT_TEXT_LIMIT + 1
+        assert row[8] == ['地标', '夜景', '拍照']
+        assert context['estimated_tokens'] == estimate_tokens(PromptContextService.to_prompt(context))
+        assert 'id_map' not in PromptContextService.to_prompt(context)
+
+    def test_budget_and_cap_drop_rows(self, settings):
+        settings.PROMPT_CONTEXT_MAX_ITEMS = {'attractions': 3, 'hotels': 15, 'restaurants': 30}
+        attractions = [_create_attraction(f'景点{i}', '35.6', '139.7') for i in range(5)]
+
+        capped = PromptContextService.build(attractions=attractions)
+        tight = PromptContextService.build(attractions=attractions, token_budget=100)
+
+        assert len(capped['attractions']['rows']) == 3
+        assert capped['dropped'] == {'attractions': 2}
+        assert len(tight['attractions']['rows']) < 3
+
+    def test_expand_ids(self):
+        data = {'daily_schedules': [{'activities': [{'id_reference': 'A1'}, {'id_reference': 'X9'}]}]}
+
+        expanded = PromptContextService.expand_ids(data, {'A1': 'uuid-1'})
+
+        activities = expanded['daily_schedules'][0]['activities']
+        assert [a['id_reference'] for a in activities] == ['uuid-1', 'X9']
+
+
+@pytest.mark.django_db
+class TestSchemaDescriptionService:
+    """数据库结构描述服务测试"""
+
+    def test_document_describes_tables_and_references(self):
+        document = SchemaDescriptionService.get_document(refresh=True)
+
+        tables = {table['table']: table for table in document['tables']}
+        assert 'currency_rates' in tables
+        assert '# 货币汇率表,存储各货币兑基准货币的汇率,用于报价和预算的币种换算 currency_rates' in document['text']
+        schedule_columns = {column['column']: column for column in tables['daily_schedules']['columns']}
+        assert schedule_columns['itinerary_id_id']['references'] == 'itinerary.itinerary_id'
+        assert '-> itinerary.itinerary_id' in document['text']
+
+    def test_version_is_stable_and_cached(self, django_assert_max_num_queries):
+        first = SchemaDescriptionService.get_document(refresh=True)
+
+        # 命中缓存时只读取迁移记录表
+        with django_assert_max_num_queries(2):
+            second = SchemaDescriptionService.get_document()
+
+        assert second['version'] == first['version']
+        assert second['text'] == first['text']
+
+
+@pytest.mark.django_db
+class TestQueryGatewayService:
+    """只读查询网关测试"""
+
+    @pytest.fixture(autouse=True)
+    def _reset_cache(self):
+        from django.core.cache import cache
+        cache.clear()
+        QueryGatewayService.invalidate()
+        yield
+        QueryGatewayService.invalidate()
+
+    @pytest.mark.parametrize('sql', [
+        'UPDATE attractions SET city_name = NULL',
+        'SELECT * FROM attractions; DELETE FROM attractions',
+        'SELECT * FROM itinerary',
+        'SELECT * FROM attractions a JOIN requirements r ON a.attraction_id = r.requirement_id',
+        'SELECT * FROM attractions WHERE attraction_id IN (SELECT itinerary_id FROM itinerary)',
+        'SELECT * FROM information_schema.tables',
+        'SELECT SLEEP(10) FROM attractions',
+        'SELECT * FROM attractions FOR UPDATE',
+        'SELECT username, password FROM hotels, (auth_user)',
+        'SELECT username, password FROM hotels JOIN (auth_user) ON 1=1',
+        'SELECT * FROM hotels, user',
+        'SELECT hotel_name FROM hotels UNION TABLE auth_user',
+        'SELECT hotel_name FROM hotels WHERE (1,2) IN (TABLE auth_user)',
+        'SELECT hotel_name FROM hotels UNION VALUES ROW(1)',
+    ])
+    def test_rejects_unsafe_queries(self, sql):
+        success, _, error = QueryGatewayService.prepare(sql)
+
+        assert not success
+        assert error
+
+    def test_normalizes_and_enforces_limit(self, settings):
+        settings.QUERY_GATEWAY_MAX_ROWS = 50
+
+        _, plain, _ = QueryGatewayService.prepare("select *\n  from attractions -- 全部\n where city_name = '东京';")
+        _, spaced, _ = QueryGatewayService.prepare("SELECT * FROM attractions WHERE city_name = '东京'")
+        _, clamped, _ = QueryGatewayService.prepare('SELECT * FROM hotels LIMIT 20, 500')
+
+        assert plain['sql'] == "SELECT * FROM attractions WHERE city_name = '东京' LIMIT 50"
+        assert plain['fingerprint'] == spaced['fingerprint']
+        assert clamped['sql'] == 'SELECT * FROM hotels LIMIT 50 OFFSET 20'
+        assert clamped['tables'] == ['hotels']
+        assert QueryGatewayService.prepare("SELECT `table` FROM hotels WHERE hotel_name = 'TABLE'")[0]
+
+    def test_execute_caches_until_catalog_changes(self, django_assert_num_queries):
+        _create_attraction('东京塔', '35.658581', '139.745433')
+        sql = 'SELECT attraction_name FROM attractions ORDER BY attraction_name'
+
+        success, first, _ = QueryGatewayService.execute(sql)
+        with django_assert_num_queries(0):
+            _, second, _ = QueryGatewayService.execute(sql)
+
+        assert success
+        assert first['rows'] == [['东京塔']] and not first['cached']
+        assert second['cached']
+
+        _create_attraction('浅草寺', '35.714765', '139.796655')
+        QueryGatewayService.invalidate()
+        _, third, _ = QueryGatewayService.execute(sql)
+
+        assert not third['cached']
+        assert third['row_count'] == 2
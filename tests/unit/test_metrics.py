@@ -0,0 +1,137 @@
+import pytest
+import os
+import sys
+
+# 设置Django环境
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+django.setup()
+
+import tempfile
+import requests
+from unittest.mock import MagicMock, patch
+from prometheus_client import REGISTRY
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
+
+from django.db import IntegrityError
+
+from apps.api.metrics import collect_metrics, n8n_dispatch
+from apps.api.services.webhook_services import RequirementService
+from apps.models.itinerary import Itinerary
+from apps.models.requirement import Requirement
+from apps.utils.id_allocation import is_id_conflict
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    """Prometheus 指标测试"""
+
+    def test_metrics_endpoint(self, client):
+        """测试 /metrics 输出和请求耗时直方图"""
+        before = _sample('tripquote_request_duration_seconds_count', endpoint='metrics', method='GET', status='2xx')
+        response = client.get('/metrics')
+
+        assert response.status_code == 200
+        assert b'tripquote_n8n_dispatch_duration_seconds_bucket{le="0.01",workflow="quote"}' in response.content
+        client.get('/metrics')
+        after = _sample('tripquote_request_duration_seconds_count', endpoint='metrics', method='GET', status='2xx')
+        assert after - before == 2
+
+    def test_metrics_endpoint_token(self, client, settings):
+        """测试配置 token 后需要 Bearer 认证"""
+        settings.METRICS_AUTH_TOKEN = 'scrape-secret'
+        assert client.get('/metrics').status_code == 403
+        response = client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        assert response.status_code == 200
+
+    def test_n8n_dispatch_errors(self):
+        """测试n8n调用按工作流记录耗时，HTTP错误和异常计入失败数"""
+        count_before = _sample('tripquote_n8n_dispatch_duration_seconds_count', workflow='planning')
+        http_before = _sample('tripquote_n8n_dispatch_errors_total', workflow='planning', reason='502')
+        timeout_before = _sample('tripquote_n8n_dispatch_errors_total', workflow='planning', reason='Timeout')
+
+        with n8n_dispatch('planning') as dispatch:
+            dispatch.status_code = 200
+        with n8n_dispatch('planning') as dispatch:
+            dispatch.status_code = 502
+        with pytest.raises(requests.Timeout):
+            with n8n_dispatch('planning'):
+                raise requests.Timeout()
+
+        assert _sample('tripquote_n8n_dispatch_duration_seconds_count', workflow='planning') - count_before == 3
+        assert _sample('tripquote_n8n_dispatch_errors_total', workflow='planning', reason='502') - http_before == 1
+        assert _sample('tripquote_n8n_dispatch_errors_total', workflow='planning', reason='Timeout') - timeout_before == 1
+
+    def test_requirement_dispatch_counts_http_error(self):
+        """测试需求工作流调用返回错误时计数"""
+        before = _sample('tripquote_n8n_dispatch_errors_total', workflow='requirement', reason='500')
+        with patch('requests.post') as mock_post:
+            mock_post.return_value = MagicMock(status_code=500, text='error')
+            success, _, _ = RequirementService.send_to_n8n('http://n8n.local/webhook', {'requirement_id': 'REQ_1'})
+
+        assert not success
+        assert _sample('tripquote_n8n_dispatch_errors_total', workflow='requirement', reason='500') - before == 1
+
+    def test_is_id_conflict(self):
+        """测试只把主键重复识别为ID冲突，外键、非空和关联表的复合唯一约束不算"""
+        assert is_id_conflict(IntegrityError('UNIQUE constraint failed: itinerary.itinerary_id'), Itinerary)
+        assert is_id_conflict(IntegrityError((1062, "Duplicate entry 'ITI_20260101_001' for key 'itinerary.PRIMARY'")), Itinerary)
+        assert is_id_conflict(IntegrityError('duplicate key value violates unique constraint "requirements_pkey"'), Requirement)
+
+        assert not is_id_conflict(IntegrityError('UNIQUE constraint failed: requirement_itinerary.requirement_id, requirement_itinerary.itinerary_id'), Itinerary)
+        assert not is_id_conflict(IntegrityError('NOT NULL constraint failed: itinerary.itinerary_name'), Itinerary)
+        assert not is_id_conflict(IntegrityError('FOREIGN KEY constraint failed'), Itinerary)
+        assert not is_id_conflict(IntegrityError('UNIQUE constraint failed: itinerary.itinerary_id'), Requirement)
+
+    def test_requirement_id_collisions(self):
+        """测试单条和批量创建需求时ID冲突计数，批量创建只对ID冲突重新预留ID"""
+        existing = Requirement.objects.create(origin_name='上海', destination_cities='北京', trip_days=3, group_adults=2)
+        data = {'base_info': {'origin': {'name': '杭州'}, 'destination_cities': ['东京'], 'trip_days': 5, 'group_size': {'adults': 1}}}
+        before = _sample('tripquote_id_allocation_collisions_total', model='requirement')
+
+        success, _, _ = RequirementService.create_requirement(existing.requirement_id, data)
+        assert not success
+        existing.refresh_from_db()
+        assert existing.origin_name == '上海'
+        assert _sample('tripquote_id_allocation_collisions_total', model='requirement') - before == 1
+
+        target = 'apps.api.services.webhook_services.reserve_sequence_ids'
+        with patch(target, side_effect=[[existing.requirement_id], ['REQ_20000101_001']]) as reserve:
+            success, requirements, _ = RequirementService.create_requirements([data])
+        assert success
+        assert reserve.call_count == 2
+        assert requirements[0].requirement_id == 'REQ_20000101_001'
+        assert _sample('tripquote_id_allocation_collisions_total', model='requirement') - before == 2
+
+        error = IntegrityError('NOT NULL constraint failed: requirements.origin_name')
+        with patch(target, return_value=['REQ_20000101_002']) as reserve, \
+                patch.object(Requirement.objects, 'bulk_create', side_effect=error):
+            success, _, _ = RequirementService.create_requirements([data])
+        assert not success
+        assert reserve.call_count == 1
+        assert _sample('tripquote_id_allocation_collisions_total', model='requirement') - before == 2
+
+    def test_multiprocess_collect(self):
+        """测试多进程目录模式下汇总输出"""
+        with tempfile.TemporaryDirectory() as directory, patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+            assert collect_metrics() == b''
+
+    def test_multiprocess_collect_extra_dirs(self):
+        """测试 qcluster 等其他容器目录中的指标一并汇总，同名序列累加"""
+        key = mmap_key('tripquote_requirements_expired_total', 'tripquote_requirements_expired_total', ['rule'], ['due'], 'help')
+        with tempfile.TemporaryDirectory() as web, tempfile.TemporaryDirectory() as worker:
+            for directory, value in ((web, 1), (worker, 2)):
+                store = MmapedDict(os.path.join(directory, 'counter_1.db'))
+                store.write_value(key, value, 0)
+                store.close()
+            env = {'PROMETHEUS_MULTIPROC_DIR': web, 'PROMETHEUS_MULTIPROC_EXTRA_DIRS': worker}
+            with patch.dict(os.environ, env):
+                output = collect_metrics().decode()
+
+        assert 'tripquote_requirements_expired_total{rule="due"} 3.0' in output
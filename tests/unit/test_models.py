@@ -612,3 +612,119 @@ class TestItineraryModel:
         
         with pytest.raises(DailySchedule.DoesNotExist):
             DailySchedule.objects.get(schedule_id=daily_schedule_id)
+
+
+class TestCountryCodeDict:
+    """测试国家代码字典"""
+
+    def setup_method(self):
+        from apps.models.country_code import CountryCodeDict
+        self.original = CountryCodeDict.COUNTRY_CODES
+
+    def teardown_method(self):
+        from apps.models.country_code import CountryCodeDict
+        CountryCodeDict.COUNTRY_CODES = self.original
+
+    def test_lookup_without_cache(self):
+        """测试查询直接读取进程内只读映射，不访问缓存"""
+        from unittest.mock import patch
+        from apps.models.country_code import CountryCodeDict
+
+        with patch('django.core.cache.cache.get') as cache_get:
+            assert CountryCodeDict.get_country_name('cn') == '中国'
+            assert CountryCodeDict.get_country_name(None) == ''
+            assert CountryCodeDict.get_country_names(['JP', 'us', 'XX']) == {'JP': '日本', 'us': '美国', 'XX': ''}
+        cache_get.assert_not_called()
+        with pytest.raises(TypeError):
+            CountryCodeDict.get_all_countries()['XX'] = '不存在'
+
+    def test_load_from_file_bumps_version(self, tmp_path):
+        """测试从文件热加载后映射整体替换、版本号递增"""
+        import json
+        from apps.models.country_code import CountryCodeDict
+
+        code_file = tmp_path / 'countries.json'
+        code_file.write_text(json.dumps({'xk': '科索沃', 'CN': '中华人民共和国'}), encoding='utf-8')
+        version = CountryCodeDict.version
+        before = CountryCodeDict.get_all_countries()
+
+        assert CountryCodeDict.load_from_file(str(code_file)) is True
+        assert CountryCodeDict.version == version + 1
+        assert CountryCodeDict.get_country_names(['XK', 'CN']) == {'XK': '科索沃', 'CN': '中华人民共和国'}
+        assert before['CN'] == '中国'
+
+        code_file.write_text('["CN"]', encoding='utf-8')
+        assert CountryCodeDict.load_from_file(str(code_file)) is False
+        assert CountryCodeDict.version == version + 1
+
+
+@pytest.mark.django_db
+class TestRequirementExpiry:
+    """需求过期任务测试"""
+
+    def _create(self, status, age_hours, expires_in_hours=None):
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.models.requirement import Requirement
+
+        requirement = Requirement.objects.create(
+            origin_name='上海', destination_cities='北京', trip_days=3, group_adults=2, group_total=2, status=status,
+            expires_at=timezone.now() + timedelta(hours=expires_in_hours) if expires_in_hours is not None else None,
+        )
+        Requirement.objects.filter(pk=requirement.pk).update(created_at=timezone.now() - timedelta(hours=age_hours))
+        return requirement
+
+    def test_expire_by_age_and_expires_at_in_batches(self):
+        """测试按创建时间和 expires_at 分批过期，expires_at 未到的需求不按创建时间过期"""
+        from apps.models.requirement import Requirement
+        from apps.models.status_manager import RequirementStatusManager
+
+        pending, confirmed = Requirement.Status.PENDING_REVIEW, Requirement.Status.CONFIRMED
+        old_pending = [self._create(pending, 100) for _ in range(3)]
+        fresh_pending = self._create(pending, 1)
+        old_confirmed = self._create(confirmed, 200)
+        due = self._create(confirmed, 1, expires_in_hours=-1)
+        extended = self._create(pending, 100, expires_in_hours=24)
+
+        result = RequirementStatusManager.check_all_expired_requirements(batch_size=2)
+
+        counts = (result['pending_expired'], result['confirmed_expired'], result['due_expired'], result['total_expired'])
+        assert counts == (3, 1, 1, 5)
+        assert result['batches'] == 4
+        expired = set(Requirement.objects.filter(status=Requirement.Status.EXPIRED).values_list('pk', flat=True))
+        assert expired == {r.pk for r in old_pending + [old_confirmed, due]}
+        assert fresh_pending.pk not in expired
+        assert extended.pk not in expired
+
+    def test_max_batches_leaves_rest_for_next_run(self):
+        """测试单次运行的批次上限，剩余的需求由下次运行处理"""
+        from apps.models.requirement import Requirement
+        from apps.models.status_manager import RequirementStatusManager
+
+        for _ in range(3):
+            self._create(Requirement.Status.PENDING_REVIEW, 100)
+
+        first = RequirementStatusManager.check_all_expired_requirements(batch_size=2, max_batches=1)
+        second = RequirementStatusManager.check_all_expired_requirements(batch_size=2, max_batches=1)
+
+        assert (first['pending_expired'], second['pending_expired']) == (2, 1)
+
+    def test_scheduled_task(self):
+        """测试迁移注册的计划任务指向任务函数，任务返回运行记录"""
+        import importlib
+        from django.apps import apps as django_apps
+        from django_q.models import Schedule
+        from apps.api.tasks import expire_requirements
+        from apps.models.requirement import Requirement
+
+        # 不依赖迁移写入的数据仍在库中，在用例事务内执行迁移的注册函数
+        migration = importlib.import_module('apps.migrations.0033_schedule_requirement_expiry')
+        migration.create_schedule(django_apps, None)
+        schedule = Schedule.objects.get(name=migration.SCHEDULE_NAME)
+        assert schedule.func == 'apps.api.tasks.expire_requirements'
+        self._create(Requirement.Status.PENDING_REVIEW, 100)
+
+        result = expire_requirements()
+
+        assert result['total_expired'] == 1
+        assert 'duration_ms' in result
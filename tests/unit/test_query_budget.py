@@ -0,0 +1,124 @@
+import pytest
+import os
+import sys
+
+# 设置Django环境
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+django.setup()
+
+import io
+import logging
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+
+from apps.admin import admin_site
+from apps.api.serializers.webhook_serializers import ItineraryWebhookSerializer
+from apps.api.services.webhook_services import ItineraryService
+from apps.api.utils.async_utils import run_in_db_thread
+from apps.api.utils.query_budget import QueryBudgetExceeded, extend_query_budget, query_budget
+from apps.management.commands.benchmark_webhook_validation import build_sample_itinerary
+from apps.models import Attraction, Restaurant
+from apps.models.requirement import Requirement
+
+
+def _queries(count):
+    for _ in range(count):
+        Requirement.objects.filter(requirement_id='REQ_NONE').exists()
+
+
+@pytest.mark.django_db
+class TestQueryBudget:
+    """查询预算测试"""
+
+    def test_tests_run_in_raise_mode(self, settings):
+        """测试测试环境中超出预算直接失败"""
+        assert settings.QUERY_BUDGET_MODE == 'raise'
+
+    def test_exceeded_reports_repeated_sql_and_stack(self):
+        """测试超出预算时报告重复SQL和项目代码调用栈"""
+        with pytest.raises(QueryBudgetExceeded) as exc_info:
+            with query_budget(2, name='quote snapshot'):
+                _queries(3)
+
+        report = str(exc_info.value)
+        assert 'quote snapshot 执行了 3 条查询，预算 2' in report
+        assert 'x3 SELECT' in report
+        assert 'tests/unit/test_query_budget.py' in report
+        assert 'in _queries' in report
+
+    def test_within_budget_and_nested(self):
+        """测试预算内不报错，嵌套预算分别计数"""
+        with query_budget(3) as outer:
+            _queries(1)
+            with query_budget(2) as inner:
+                _queries(2)
+        assert (outer.count, inner.count) == (3, 2)
+
+    def test_warn_and_off_modes(self, settings, caplog):
+        """测试 warn 模式记录日志，off 模式不计数"""
+        settings.QUERY_BUDGET_MODE = 'warn'
+        # 该 logger 不向上传播，直接挂上 caplog 的 handler
+        logger = logging.getLogger('apps.api.performance')
+        logger.addHandler(caplog.handler)
+        try:
+            with query_budget(0, name='warned'):
+                _queries(1)
+        finally:
+            logger.removeHandler(caplog.handler)
+        assert 'warned' in caplog.records[0].getMessage()
+        assert caplog.records[0].data['query_budget']['queries'] == 1
+
+        settings.QUERY_BUDGET_MODE = 'off'
+        with query_budget(0) as budget:
+            _queries(1)
+        assert budget is None
+
+    def test_extend_for_batches(self):
+        """测试批量接口按条数追加预算"""
+        with query_budget(1):
+            extend_query_budget(2)
+            _queries(3)
+
+    def test_async_view_counts_worker_thread_queries(self):
+        """测试异步函数的预算统计 run_in_db_thread 工作线程中的查询"""
+        @query_budget(1, name='async lookup')
+        async def lookup():
+            await run_in_db_thread(_queries, 2)
+
+        with pytest.raises(QueryBudgetExceeded, match='async lookup 执行了 2 条查询'):
+            async_to_sync(lookup)()
+
+    def test_admin_views_within_budget(self, client):
+        """测试所有Admin列表页、新增页和行程详情页在预算内（列表页逐行访问外键会超出）"""
+        call_command('generate_test_data', count=5, seed=1, stdout=io.StringIO())
+        for index in range(3):
+            requirement = Requirement.objects.create(
+                origin_name='上海', destination_cities='北京,上海', trip_days=4, group_adults=index + 1, group_total=index + 1
+            )
+            payload = build_sample_itinerary(4, 5, cities=('北京', '上海'), country_code='CN')
+            payload['requirement_id'] = requirement.requirement_id
+            for schedule in payload['daily_schedules']:
+                for activity in schedule['activities']:
+                    # 景点和餐饮引用目录数据，使详情页显示关联对象
+                    model = {'ATTRACTION': Attraction, 'MEAL': Restaurant}.get(activity['activity_type'])
+                    activity['id_reference'] = str(model.objects.first().pk) if model else None
+            serializer = ItineraryWebhookSerializer(data=payload)
+            assert serializer.is_valid(), serializer.errors
+            success, itinerary, error = ItineraryService.create_itinerary(serializer.validated_data, requirement)
+            assert success, error
+        client.force_login(User.objects.create_superuser('budget', 'budget@example.com', 'password'))
+
+        for model in admin_site._registry:
+            info = (model._meta.app_label, model._meta.model_name)
+            response = client.get(reverse('smart_trip_admin:%s_%s_changelist' % info))
+            assert response.status_code == 200, model.__name__
+        response = client.get(reverse('smart_trip_admin:apps_itinerary_change', args=[itinerary.itinerary_id]))
+        assert response.status_code == 200
+        schedule = itinerary.dailyschedule_set.first()
+        response = client.get(reverse('smart_trip_admin:apps_dailyschedule_change', args=[schedule.pk]))
+        assert response.status_code == 200